@@ -1,7 +1,11 @@
 from django.contrib import admin
-from .models import Driver, Shipment
+from .models import Driver, Shipment, ShipmentTransition, PaymentWebhook, OutboxMessage, TariffTable
 
 admin.site.register(Driver)
 admin.site.register(Shipment)
+admin.site.register(ShipmentTransition)
+admin.site.register(PaymentWebhook)
+admin.site.register(OutboxMessage)
+admin.site.register(TariffTable)
 
 # Register your models here.
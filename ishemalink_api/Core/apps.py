@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'Core'
+
+    def ready(self):
+        from Core import signals  # noqa: F401
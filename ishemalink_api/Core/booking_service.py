@@ -1,8 +1,29 @@
-from typing import Any, Dict, Optional
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from payments import MomoMock
 from notifications import NotificationEngine
-from django.db import transaction
-from Core.models import Shipment, Driver
+from django.db import connection, transaction
+from django.utils import timezone
+from Core.models import Shipment, Driver, PaymentWebhook
+from Core import metrics, outbox, state_machine, taskqueue
+from Core.dispatch import DispatchEngine
+from Core.tariffs import TariffEngine, get_engine
+from gov.ebm import EBM_SIGN_TASK
+
+# Rows per INSERT statement in bulk booking
+BULK_INSERT_BATCH_SIZE = 500
+
+# Outbox topic for payment prompts, and the task the relay hands them to (Core.tasks)
+PAYMENT_INITIATE_TOPIC = "payment.initiate"
+
+# Task that drains the webhook inbox, enqueued by every accepted webhook (Core.tasks)
+APPLY_WEBHOOKS_TASK = "payment.apply_webhooks"
+
+# Webhook inbox draining: rows claimed per batch, attempts before a row is parked
+WEBHOOK_BATCH_SIZE = 200
+MAX_WEBHOOK_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
 
 class BookingService:
     """
@@ -11,75 +32,231 @@ class BookingService:
     - Integrates with Payment and Notification services via dependency injection
     - Ensures ACID compliance using atomic transactions
     - Supports async payment callbacks
+    - Supports bulk booking with batched inserts
+    - Requests payments through the transactional outbox, never inside a transaction
+    - Prices shipments through the cached TariffEngine (vectorized for bulk)
+    - Delegates driver assignment to a race-free DispatchEngine
+    - Applies payment webhooks exactly once from the PaymentWebhook inbox
+    - Defers receipt signing for paid shipments to the task queue (Core.taskqueue)
+    - Times its hot paths into booking_operation_duration_seconds (Core.metrics)
     """
-    def __init__(self, payment_gateway: MomoMock, notifier: NotificationEngine):
+    def __init__(self, payment_gateway: MomoMock, notifier: NotificationEngine,
+                 dispatcher: Optional[DispatchEngine] = None,
+                 tariffs: Callable[[], TariffEngine] = get_engine):
         self.payment_gateway = payment_gateway
         self.notifier = notifier
+        self.dispatcher = dispatcher or DispatchEngine()
+        self.tariffs = tariffs
 
-    @transaction.atomic
-    def create_shipment(self, shipment_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_shipment(self, shipment_data: Dict[str, Any]) -> Shipment:
+        """Validate one booking row without touching the DB; pricing happens separately."""
         shipment_type = shipment_data.get("type", "domestic")
+        if shipment_type not in dict(Shipment.SHIPMENT_TYPE_CHOICES):
+            raise ValueError(f"Unknown shipment type: {shipment_type}")
         weight = shipment_data.get("weight", 1)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError("weight must be a positive number")
         phone_number = shipment_data.get("phone_number", "0780000000")
-        base_tariff = 1000 if shipment_type == "domestic" else 3000
-        tariff = base_tariff * weight
-        # Create shipment in DB
-        shipment = Shipment.objects.create(
+        for field in ("origin", "destination", "commodity", "sector"):
+            value = shipment_data.get(field, "")
+            if not isinstance(value, str) or len(value) > 50:
+                raise ValueError(f"{field} must be a string of at most 50 characters")
+        pickup = shipment_data.get("pickup") or {}
+        if not isinstance(pickup, dict):
+            raise ValueError("pickup must be an object with lat and lng")
+        return Shipment(
             shipment_type=shipment_type,
             weight=weight,
             phone_number=phone_number,
-            tariff=tariff,
+            pickup_latitude=pickup.get("lat"),
+            pickup_longitude=pickup.get("lng"),
+            origin=shipment_data.get("origin", ""),
+            destination=shipment_data.get("destination", ""),
+            commodity=shipment_data.get("commodity", ""),
+            sector=shipment_data.get("sector", ""),
             status="pending_payment"
         )
-        payment_response = self.payment_gateway.initiate_payment(
-            amount=tariff,
-            phone_number=phone_number,
-            reference=str(shipment.id)
+
+    @metrics.timed("create_shipment")
+    @transaction.atomic
+    def create_shipment(self, shipment_data: Dict[str, Any]) -> Dict[str, Any]:
+        shipment = self._build_shipment(shipment_data)
+        engine = self.tariffs()
+        shipment.tariff = engine.quote(
+            shipment.shipment_type, shipment.weight, shipment.origin, shipment.destination, shipment.commodity
         )
+        shipment.tariff_version = engine.version
+        # Create shipment in DB
+        shipment.save()
+        # The prompt is sent by the outbox relay once this transaction commits
+        outbox.enqueue(PAYMENT_INITIATE_TOPIC, self._payment_request(shipment), key=str(shipment.id))
         return {
             "status": "pending_payment",
             "shipment_id": shipment.id,
-            "tariff": tariff,
-            "payment": payment_response
+            "tariff": shipment.tariff,
+            "payment": {"status": "queued", "reference": str(shipment.id)}
         }
 
+    @staticmethod
+    def _payment_request(shipment: Shipment) -> Dict[str, Any]:
+        return {"amount": shipment.tariff, "phone_number": shipment.phone_number, "reference": str(shipment.id)}
+
+    @metrics.timed("publish_payment_requests")
+    def publish_payment_requests(self, requests: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Outbox handler: one gateway round-trip per batch, an error (or None) per request."""
+        responses = self.payment_gateway.initiate_payments(requests)
+        return [
+            None if response.get("status") != "failed" else response.get("message", "payment initiation failed")
+            for response in responses
+        ]
+
+    def outbox_handlers(self) -> Dict[str, outbox.Handler]:
+        return {PAYMENT_INITIATE_TOPIC: self.publish_payment_requests}
+
+    @metrics.timed("create_shipments_bulk")
+    def create_shipments_bulk(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Bulk booking flow:
+        1. Validate and price every row in one pass (invalid rows are rejected, not fatal)
+        2. Insert all valid shipments with bulk_create in a single transaction
+        3. Queue their payment requests in the outbox within that same transaction
+        Returns one result per input row, in input order.
+        """
+        results: List[Optional[Dict[str, Any]]] = []
+        pending = []
+        for index, row in enumerate(rows):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("row must be a JSON object")
+                pending.append((index, self._build_shipment(row)))
+                results.append(None)
+            except ValueError as e:
+                results.append({"row": index, "status": "rejected", "error": str(e)})
+
+        shipments = [shipment for _, shipment in pending]
+        if shipments:
+            engine = self.tariffs()
+            tariffs = engine.quote_batch(
+                [s.shipment_type for s in shipments],
+                [s.weight for s in shipments],
+                [s.origin for s in shipments],
+                [s.destination for s in shipments],
+                [s.commodity for s in shipments],
+            )
+            for shipment, tariff in zip(shipments, tariffs.tolist()):
+                shipment.tariff = tariff
+                shipment.tariff_version = engine.version
+        with transaction.atomic():
+            Shipment.objects.bulk_create(shipments, batch_size=BULK_INSERT_BATCH_SIZE)
+            outbox.enqueue_many(
+                PAYMENT_INITIATE_TOPIC, ((str(s.id), self._payment_request(s)) for s in shipments),
+                batch_size=BULK_INSERT_BATCH_SIZE,
+            )
+
+        for index, shipment in pending:
+            results[index] = {
+                "row": index,
+                "status": "pending_payment",
+                "shipment_id": shipment.id,
+                "tariff": shipment.tariff,
+                "payment": {"status": "queued", "reference": str(shipment.id)}
+            }
+        return results
+
+    @metrics.timed("handle_payment_callback")
     def handle_payment_callback(self, payment_result: Dict[str, Any]) -> None:
         transaction_id = payment_result.get("transaction_id")
         status = payment_result.get("status")
-        # shipment_id is the DB id
+        # The reference we sent with the prompt is the shipment id; MomoMock encodes it in the transaction id
         try:
-            shipment_id = int(transaction_id.replace("MOCK-", ""))
-            shipment = Shipment.objects.get(id=shipment_id)
+            reference = payment_result.get("reference")
+            shipment_id = int(reference) if reference else int(transaction_id.replace("MOCK-", ""))
         except Exception:
-            print("Shipment not found for transaction_id", transaction_id)
+            logger.warning("Payment callback without a shipment reference", extra={"transaction_id": transaction_id})
             return
-        if status == "success":
-            # Assign first available driver
-            driver = Driver.objects.filter(is_available=True).first()
-            if driver:
-                shipment.assigned_driver = driver
-                shipment.status = "confirmed"
-                driver.is_available = False
-                driver.save()
-                shipment.save()
-                self.notifier.send_sms(
-                    phone_number=shipment.phone_number,
-                    message=f"Your shipment {shipment.id} is confirmed. Driver: {driver.name}"
-                )
-                self.notifier.send_email(
-                    email="exporter@example.com",
-                    subject="Shipment Confirmed",
-                    body=f"Your shipment {shipment.id} is confirmed and assigned to driver {driver.name}."
-                )
-                print(f"Shipment {shipment.id} confirmed and driver {driver.name} assigned.")
+        driver = None
+        with transaction.atomic():
+            # Optimistic: no row lock is held while a driver is matched; the versioned
+            # UPDATE in state_machine.transition() detects a concurrent settlement
+            shipment = (
+                Shipment.objects
+                .only("id", "status", "version", "tariff", "phone_number", "weight", "pickup_latitude", "pickup_longitude")
+                .filter(id=shipment_id)
+                .first()
+            )
+            if shipment is None:
+                logger.warning("Payment callback for an unknown shipment",
+                               extra={"transaction_id": transaction_id, "shipment_id": shipment_id})
+                return
+            if shipment.status != state_machine.PENDING_PAYMENT:
+                logger.info("Payment callback ignored", extra={
+                    "transaction_id": transaction_id, "shipment_id": shipment.id, "shipment_status": shipment.status,
+                })
+                return
+            if status == "success":
+                driver = self.dispatcher.claim_driver(shipment)
+                new_status = state_machine.CONFIRMED if driver else state_machine.CONFIRMED_NO_DRIVER
             else:
-                shipment.status = "confirmed_no_driver"
-                shipment.save()
-                print(f"Shipment {shipment.id} confirmed but no driver available.")
+                new_status = state_machine.PAYMENT_FAILED
+            try:
+                state_machine.transition(shipment, new_status, actor="payment_webhook", assigned_driver=driver)
+            except state_machine.StaleShipment:
+                # Another worker settled this shipment first; release the driver claim
+                transaction.set_rollback(True)
+                return
+            # Notification rows are themselves an outbox: queued with the state change,
+            # delivered after commit by notifications.dispatcher.NotificationDispatcher
+            self._notify_payment_outcome(shipment, new_status, driver)
+            if new_status != state_machine.PAYMENT_FAILED:
+                taskqueue.enqueue(EBM_SIGN_TASK, {"shipment_id": shipment.id})
+
+    def _notify_payment_outcome(self, shipment: Shipment, new_status: str, driver: Optional[Driver]) -> None:
+        if new_status == "confirmed":
+            self.notifier.send_sms(
+                phone_number=shipment.phone_number,
+                message=f"Your shipment {shipment.id} is confirmed. Driver: {driver.name}"
+            )
+            self.notifier.send_email(
+                email="exporter@example.com",
+                subject="Shipment Confirmed",
+                body=f"Your shipment {shipment.id} is confirmed and assigned to driver {driver.name}."
+            )
+            logger.info("Shipment confirmed", extra={"shipment_id": shipment.id, "driver_id": driver.id})
+        elif new_status == "confirmed_no_driver":
+            logger.info("Shipment confirmed without a driver", extra={"shipment_id": shipment.id})
         else:
-            shipment.status = "payment_failed"
-            shipment.save()
             self.notifier.send_sms(
                 phone_number=shipment.phone_number,
                 message=f"Payment failed for shipment {shipment.id}. Please try again."
             )
+
+    @metrics.timed("drain_webhook_inbox")
+    def drain_webhook_inbox(self, batch_size: int = WEBHOOK_BATCH_SIZE) -> int:
+        """
+        Applies one batch of unprocessed webhooks and returns how many were claimed.
+        Rows are claimed with SKIP LOCKED so several workers can drain in parallel;
+        each row is applied in its own savepoint so one bad payload cannot block the batch.
+        """
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        with transaction.atomic():
+            pending = PaymentWebhook.objects.filter(processed_at__isnull=True).order_by("id")
+            if skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            hooks = list(pending.only("id", "payload", "attempts")[:batch_size])
+            done, failed = [], []
+            for hook in hooks:
+                try:
+                    with transaction.atomic():
+                        self.handle_payment_callback(hook.payload)
+                    done.append(hook.id)
+                except Exception as e:
+                    hook.attempts += 1
+                    hook.last_error = str(e)
+                    if hook.attempts >= MAX_WEBHOOK_ATTEMPTS:
+                        hook.processed_at = timezone.now()
+                    failed.append(hook)
+            if done:
+                PaymentWebhook.objects.filter(id__in=done).update(processed_at=timezone.now())
+            if failed:
+                PaymentWebhook.objects.bulk_update(failed, ["attempts", "last_error", "processed_at"])
+        return len(hooks)
@@ -0,0 +1,228 @@
+import functools
+import hashlib
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from Core.metrics import registry
+from Core.cachelib import LruTtlCache, SingleFlight
+
+# Responses held in each process's LRU tier
+VIEW_CACHE_LOCAL_SIZE = 2000
+
+# Seconds a process trusts its copy of a tag's version before re-reading the shared tier,
+# so an invalidation in another worker is seen within this long
+VIEW_CACHE_TAG_SYNC = 1.0
+
+VIEW_CACHE_PREFIX = "view:"
+
+# Every entry depends on ALL; invalidating it empties the cache. The others are invalidated
+# by Core.signals (Driver saves) and analytics.rollups (each refresh that moved a rollup)
+ALL = "*"
+ANALYTICS = "analytics"
+DRIVERS = "drivers"
+
+VIEW_CACHE_REQUESTS = registry.counter(
+    "view_cache_requests_total", "Cached view lookups by view and result (hit, stale, miss, coalesced, bypass).",
+    ("view", "result"),
+)
+VIEW_CACHE_SAVED_SECONDS = registry.counter(
+    "view_cache_saved_seconds_total", "View time not spent thanks to cache hits, by view.", ("view",),
+)
+
+Entry = Dict[str, Any]
+
+
+def _etag(content: bytes) -> str:
+    return '"' + hashlib.sha1(content).hexdigest() + '"'
+
+
+class ResponseCache:
+    """
+    Whole-response cache for read-mostly GET views.
+    - Two tiers: a per-process LRU, then the shared Django cache (Redis in production)
+    - Entries are fresh for `ttl`, then served stale for up to `stale` more seconds while
+      one request recomputes them; concurrent misses of one key run the view once (SingleFlight)
+    - Entries carry the versions of their tags; invalidate(tag) changes the version, so
+      every dependent entry misses from then on, in this process at once and in others
+      within VIEW_CACHE_TAG_SYNC
+    - ETag on every response; a matching If-None-Match is answered 304
+    - Hits, misses and the view time saved are counted in /metrics/
+    """
+    def __init__(self, shared=None, local: Optional[LruTtlCache] = None, clock: Callable[[], float] = time.time):
+        self.shared = shared
+        self.clock = clock
+        self.local = local if local is not None else LruTtlCache(VIEW_CACHE_LOCAL_SIZE)
+        self.flights = SingleFlight()
+        self._tags: Dict[str, Tuple[str, float]] = {}
+        self._tags_lock = threading.Lock()
+
+    def _shared_call(self, method: str, *args, **kwargs) -> Any:
+        if self.shared is None:
+            return None
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except Exception:
+            # The shared tier is an optimisation; an outage must not fail the request
+            return None
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, str]:
+        now = self.clock()
+        wanted = (ALL,) + tuple(tags)
+        with self._tags_lock:
+            due = [t for t in wanted if t not in self._tags or now - self._tags[t][1] >= VIEW_CACHE_TAG_SYNC]
+        if due:
+            found = self._shared_call("get_many", [VIEW_CACHE_PREFIX + "tag:" + t for t in due]) or {}
+            with self._tags_lock:
+                for tag in due:
+                    version = found.get(VIEW_CACHE_PREFIX + "tag:" + tag)
+                    if version is None:
+                        version = self._tags.get(tag, ("0", 0.0))[0]
+                    self._tags[tag] = (version, now)
+        with self._tags_lock:
+            return {t: self._tags[t][0] for t in wanted}
+
+    def invalidate(self, *tags: str) -> None:
+        """Every entry depending on any of `tags` misses from now on, in every process."""
+        now = self.clock()
+        for tag in tags:
+            version = uuid.uuid4().hex
+            with self._tags_lock:
+                self._tags[tag] = (version, now)
+            self._shared_call("set", VIEW_CACHE_PREFIX + "tag:" + tag, version, timeout=None)
+
+    def clear(self) -> None:
+        self.local.clear()
+        self.invalidate(ALL)
+
+    def _lookup(self, key: str) -> Optional[Entry]:
+        entry = self.local.get(key, allow_stale=True)
+        if entry is None:
+            entry = self._shared_call("get", key)
+            if entry is not None:
+                self.local.set(key, entry, max(entry["expires_at"] - self.clock(), 0))
+        return entry
+
+    def _store(self, key: str, entry: Entry) -> None:
+        ttl = entry["expires_at"] - self.clock()
+        self.local.set(key, entry, ttl)
+        self._shared_call("set", key, entry, timeout=ttl)
+
+    def _compute(self, view, request, args, kwargs, key: str, ttl: float, stale: float,
+                 versions: Dict[str, str]) -> Tuple[HttpResponse, Optional[Entry]]:
+        started = time.perf_counter()
+        response = view(request, *args, **kwargs)
+        cost = time.perf_counter() - started
+        if response.status_code != 200 or response.streaming or "no-store" in response.get("Cache-Control", ""):
+            return response, None
+        now = self.clock()
+        entry = {
+            "content": response.content,
+            "content_type": response["Content-Type"],
+            "etag": _etag(response.content),
+            "tags": versions,
+            "cost": cost,
+            "fresh_until": now + ttl,
+            "expires_at": now + ttl + stale,
+        }
+        self._store(key, entry)
+        return response, entry
+
+    def respond(self, view, request, args, kwargs, name: str, ttl: float, stale: float = 0,
+                tags: Iterable[str] = ()) -> HttpResponse:
+        if request.method not in ("GET", "HEAD"):
+            VIEW_CACHE_REQUESTS.inc(name, "bypass")
+            return view(request, *args, **kwargs)
+        key = VIEW_CACHE_PREFIX + hashlib.md5(f"{name}:{request.get_full_path()}".encode()).hexdigest()
+        versions = self.tag_versions(tags)
+        entry = self._lookup(key)
+        if entry is not None and entry["tags"] != versions:
+            entry = None
+        now = self.clock()
+        if entry is not None and now < entry["fresh_until"]:
+            result = "hit"
+        elif entry is not None and now < entry["expires_at"] and self.flights.running(key):
+            # Another request is already recomputing it; serve the previous copy meanwhile
+            result = "stale"
+        else:
+            compute = lambda: self._compute(view, request, args, kwargs, key, ttl, stale, versions)
+            (response, fresh), shared = self.flights.do(key, compute)
+            if shared and fresh is None:
+                # The leader's response was not cacheable and belongs to the leader's request
+                response = view(request, *args, **kwargs)
+            if not shared or fresh is None:
+                VIEW_CACHE_REQUESTS.inc(name, "miss")
+                return self._finish(request, response, fresh, "MISS")
+            entry, result = fresh, "coalesced"
+        VIEW_CACHE_REQUESTS.inc(name, result)
+        VIEW_CACHE_SAVED_SECONDS.inc(name, amount=entry["cost"])
+        return self._finish(request, HttpResponse(entry["content"], content_type=entry["content_type"]),
+                            entry, result.upper())
+
+    @staticmethod
+    def _finish(request, response: HttpResponse, entry: Optional[Entry], result: str) -> HttpResponse:
+        if entry is None:
+            return response
+        if request.headers.get("If-None-Match") == entry["etag"]:
+            response = HttpResponseNotModified()
+        response["ETag"] = entry["etag"]
+        # Clients may keep the body but must revalidate, so an invalidation reaches them at once
+        response["Cache-Control"] = "no-cache"
+        response["X-Cache"] = result
+        return response
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """The process-wide response cache, backed by caches["default"]."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(shared=caches["default"])
+        return _cache
+
+
+def invalidate(*tags: str) -> None:
+    get_response_cache().invalidate(*tags)
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """Per view: lookups by result, hit rate, and seconds of view time saved."""
+    views: Dict[str, Dict[str, float]] = {}
+    for (view, result), count in VIEW_CACHE_REQUESTS.samples().items():
+        views.setdefault(view, {"hit": 0, "stale": 0, "coalesced": 0, "miss": 0, "bypass": 0})[result] = count
+    for (view,), seconds in VIEW_CACHE_SAVED_SECONDS.samples().items():
+        views.setdefault(view, {})["saved_seconds"] = seconds
+    for counts in views.values():
+        served = counts.get("hit", 0) + counts.get("stale", 0) + counts.get("coalesced", 0)
+        lookups = served + counts.get("miss", 0)
+        counts["hit_rate"] = served / lookups if lookups else 0.0
+    return views
+
+
+def cached_view(ttl: float, stale: float = 0, tags: Iterable[str] = ()):
+    """
+    Caches a view's 200 responses to GET, keyed by path and query string, for `ttl`
+    seconds plus `stale` seconds of stale-while-revalidate. `tags` name what the
+    response is built from; Core.caching.invalidate(tag) drops it early.
+    A response with Cache-Control: no-store is never cached. VIEW_CACHE=0 disables caching.
+    """
+    tags = tuple(tags)
+
+    def decorator(view):
+        name = view.__name__
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.VIEW_CACHE:
+                return view(request, *args, **kwargs)
+            return get_response_cache().respond(view, request, args, kwargs, name, ttl, stale, tags)
+        wrapper.cache_tags = tags
+        return wrapper
+    return decorator
@@ -0,0 +1,106 @@
+import random
+from typing import Any, Dict, Optional
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+from Core.models import DashboardCounter, Driver, Shipment
+
+ACTIVE_TRUCKS = "active_trucks"
+TOTAL_REVENUE = "total_revenue"
+AVAILABLE_DRIVERS = "available_drivers"
+COUNTER_KEYS = (ACTIVE_TRUCKS, TOTAL_REVENUE, AVAILABLE_DRIVERS)
+
+# Rows per counter key; writers pick one at random, readers sum them all
+COUNTER_SHARDS = 8
+
+# Shipment statuses that count as an active truck, and as earned revenue
+ACTIVE_STATUSES = ("confirmed", "in_transit")
+REVENUE_STATUSES = ("confirmed", "in_transit", "delivered")
+
+
+def bump(**deltas: float) -> None:
+    """
+    Applies counter deltas in the caller's transaction with one
+    UPDATE ... SET value = value + delta per key.
+    """
+    now = timezone.now()
+    shard = random.randrange(COUNTER_SHARDS)
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        updated = DashboardCounter.objects.filter(key=key, shard=shard).update(value=F("value") + delta, updated_at=now)
+        if not updated:
+            DashboardCounter.objects.bulk_create([DashboardCounter(key=key, shard=shard)], ignore_conflicts=True)
+            DashboardCounter.objects.filter(key=key, shard=shard).update(value=F("value") + delta, updated_at=now)
+
+
+def shipment_changed(old_status: Optional[str], old_tariff: float, new_status: Optional[str], new_tariff: float) -> None:
+    """Moves one shipment's contribution from (old status, old tariff) to (new status, new tariff)."""
+    bump(**{
+        ACTIVE_TRUCKS: int(new_status in ACTIVE_STATUSES) - int(old_status in ACTIVE_STATUSES),
+        TOTAL_REVENUE: (new_tariff or 0) * (new_status in REVENUE_STATUSES)
+        - (old_tariff or 0) * (old_status in REVENUE_STATUSES),
+    })
+
+
+def shipment_status_changed(old_status: Optional[str], new_status: Optional[str], tariff: float,
+                            count: int = 1) -> None:
+    """`count` shipments moved between statuses; `tariff` is their combined tariff."""
+    bump(**{
+        ACTIVE_TRUCKS: count * (int(new_status in ACTIVE_STATUSES) - int(old_status in ACTIVE_STATUSES)),
+        TOTAL_REVENUE: (tariff or 0) * (int(new_status in REVENUE_STATUSES) - int(old_status in REVENUE_STATUSES)),
+    })
+
+
+def driver_availability_changed(was_available: Optional[bool], is_available: Optional[bool]) -> None:
+    delta = int(bool(is_available)) - int(bool(was_available))
+    bump(**{AVAILABLE_DRIVERS: delta})
+
+
+def snapshot() -> Dict[str, Any]:
+    """Current totals from at most len(COUNTER_KEYS) * COUNTER_SHARDS rows, plus freshness."""
+    rows = DashboardCounter.objects.values("key").annotate(total=Sum("value"), as_of=Max("updated_at"))
+    values: Dict[str, Any] = {key: 0 for key in COUNTER_KEYS}
+    as_of = None
+    for row in rows:
+        values[row["key"]] = row["total"]
+        if as_of is None or row["as_of"] > as_of:
+            as_of = row["as_of"]
+    values[ACTIVE_TRUCKS] = int(values[ACTIVE_TRUCKS])
+    values[AVAILABLE_DRIVERS] = int(values[AVAILABLE_DRIVERS])
+    values["as_of"] = as_of
+    return values
+
+
+def compute_from_source() -> Dict[str, float]:
+    totals = Shipment.objects.aggregate(
+        count=Count("id", filter=Q(status__in=ACTIVE_STATUSES)),
+        revenue=Sum("tariff", filter=Q(status__in=REVENUE_STATUSES)),
+    )
+    return {
+        ACTIVE_TRUCKS: totals["count"],
+        TOTAL_REVENUE: totals["revenue"] or 0,
+        AVAILABLE_DRIVERS: Driver.objects.filter(is_available=True).count(),
+    }
+
+
+@transaction.atomic
+def reconcile() -> Dict[str, float]:
+    """
+    Recomputes every counter from the source tables and returns the drift that was corrected.
+    Counter rows are locked first, so concurrent bumps either land before the
+    recount (and are included) or wait and apply on top of it.
+    """
+    for key in COUNTER_KEYS:
+        DashboardCounter.objects.bulk_create(
+            [DashboardCounter(key=key, shard=shard) for shard in range(COUNTER_SHARDS)], ignore_conflicts=True
+        )
+    current = {key: 0.0 for key in COUNTER_KEYS}
+    for row in DashboardCounter.objects.select_for_update().filter(key__in=COUNTER_KEYS):
+        current[row.key] += row.value
+    truth = compute_from_source()
+    now = timezone.now()
+    for key in COUNTER_KEYS:
+        DashboardCounter.objects.filter(key=key).exclude(shard=0).update(value=0, updated_at=now)
+        DashboardCounter.objects.filter(key=key, shard=0).update(value=truth[key], updated_at=now)
+    return {key: truth[key] - current[key] for key in COUNTER_KEYS}
@@ -0,0 +1,109 @@
+from typing import Dict, Optional, Type
+from django.db import connection, transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+from Core import counters
+from Core.models import Driver, Shipment
+
+# How many times a claim is retried when another worker takes the same driver first.
+# Only reachable on backends without SKIP LOCKED (e.g. SQLite in development).
+MAX_CLAIM_ATTEMPTS = 5
+
+# Half-width in degrees of the box searched before falling back to the whole pool (~55 km)
+NEAREST_SEARCH_RADIUS_DEG = 0.5
+
+
+class MatchingStrategy:
+    """
+    Orders the available-driver pool for one shipment.
+    Strategies only shape the query; locking and claiming belong to DispatchEngine.
+    """
+    name = "base"
+
+    def candidates(self, pool: QuerySet, shipment: Shipment) -> QuerySet:
+        raise NotImplementedError
+
+
+class LeastRecentlyUsedStrategy(MatchingStrategy):
+    """Spreads work evenly: drivers never assigned go first, then the longest idle."""
+    name = "lru"
+
+    def candidates(self, pool: QuerySet, shipment: Shipment) -> QuerySet:
+        return pool.order_by(F("last_assigned_at").asc(nulls_first=True), "id")
+
+
+class CapacityAwareStrategy(MatchingStrategy):
+    """Picks the smallest truck that can carry the load; unknown capacity is used last."""
+    name = "capacity"
+
+    def candidates(self, pool: QuerySet, shipment: Shipment) -> QuerySet:
+        pool = pool.filter(Q(capacity_kg__gte=shipment.weight) | Q(capacity_kg__isnull=True))
+        return pool.order_by(F("capacity_kg").asc(nulls_last=True), "id")
+
+
+class NearestStrategy(MatchingStrategy):
+    """
+    Picks the driver closest to the pickup point.
+    A bounding box on the indexed position columns keeps the sort small; when
+    no available driver is inside it the whole pool is ranked, drivers with no
+    known position last. Shipments without a pickup point fall back to
+    least-recently-used.
+    """
+    name = "nearest"
+
+    def candidates(self, pool: QuerySet, shipment: Shipment) -> QuerySet:
+        lat, lng = shipment.pickup_latitude, shipment.pickup_longitude
+        if lat is None or lng is None:
+            return LeastRecentlyUsedStrategy().candidates(pool, shipment)
+        radius = NEAREST_SEARCH_RADIUS_DEG
+        boxed = pool.filter(
+            latitude__range=(lat - radius, lat + radius),
+            longitude__range=(lng - radius, lng + radius),
+        )
+        if boxed.exists():
+            pool = boxed
+        # Squared planar distance is enough to rank drivers; it only misorders across very long distances
+        distance = (F("latitude") - lat) * (F("latitude") - lat) + (F("longitude") - lng) * (F("longitude") - lng)
+        return pool.annotate(distance=distance).order_by(F("distance").asc(nulls_last=True), "id")
+
+
+STRATEGIES: Dict[str, Type[MatchingStrategy]] = {
+    strategy.name: strategy
+    for strategy in (LeastRecentlyUsedStrategy, CapacityAwareStrategy, NearestStrategy)
+}
+
+
+class DispatchEngine:
+    """
+    Claims an available driver for a shipment without races.
+    - Candidate rows are locked with SELECT ... FOR UPDATE SKIP LOCKED where supported,
+      so concurrent workers pick different drivers instead of queueing on one row
+    - The claim itself is a conditional UPDATE (is_available=True), so a driver can
+      never be handed to two shipments even on backends without row locks
+    Must be called inside the caller's transaction so the claim commits with the shipment.
+    """
+    def __init__(self, strategy: Optional[MatchingStrategy] = None):
+        self.strategy = strategy or LeastRecentlyUsedStrategy()
+
+    @classmethod
+    def from_name(cls, name: str) -> "DispatchEngine":
+        return cls(STRATEGIES[name]())
+
+    def claim_driver(self, shipment: Shipment) -> Optional[Driver]:
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            with transaction.atomic():
+                candidates = self.strategy.candidates(Driver.objects.filter(is_available=True), shipment)
+                if skip_locked:
+                    candidates = candidates.select_for_update(skip_locked=True)
+                driver = candidates.only("id", "name", "phone_number").first()
+                if driver is None:
+                    return None
+                claimed = Driver.objects.filter(pk=driver.pk, is_available=True).update(
+                    is_available=False,
+                    last_assigned_at=timezone.now(),
+                )
+                if claimed:
+                    counters.driver_availability_changed(True, False)
+                    return driver
+        return None
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from Core.booking_service import WEBHOOK_BATCH_SIZE
+from Core.services import booking_service
+
+
+class Command(BaseCommand):
+    help = "Apply pending payment webhooks from the PaymentWebhook inbox exactly once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=WEBHOOK_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep draining until interrupted.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Idle sleep in seconds when looping.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            claimed = booking_service.drain_webhook_inbox(options["batch_size"])
+            total += claimed
+            if claimed:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(f"Processed {total} webhook(s).")
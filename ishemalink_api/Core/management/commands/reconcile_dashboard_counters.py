@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from Core import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized dashboard counters from Shipment and Driver."
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile()
+        for key, delta in drift.items():
+            self.stdout.write(f"{key}: corrected by {delta:+g}")
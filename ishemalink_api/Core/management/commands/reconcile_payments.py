@@ -0,0 +1,61 @@
+import sys
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from Core import reconciliation
+from Core.models import Shipment
+from Core.services import booking_service
+
+
+class Command(BaseCommand):
+    help = "Reconcile a MoMo/Airtel settlement statement (CSV or JSON lines, optionally .gz) against shipments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("statement", help="Statement file path, or - for stdin.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Default: from the file extension.")
+        parser.add_argument("--report", help="Write every mismatch to this file (.csv or JSON lines).")
+        parser.add_argument("--since-days", type=int, default=0,
+                            help="Index only shipments booked in the last N days (0: all).")
+        parser.add_argument("--apply", action="store_true",
+                            help="Queue corrections as payment webhooks and apply them.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        shipments = Shipment.objects.all()
+        if options["since_days"]:
+            shipments = shipments.filter(created_at__gte=timezone.now() - timedelta(days=options["since_days"]))
+        index = reconciliation.build_index(shipments)
+        indexed = time.monotonic()
+
+        source = sys.stdin if options["statement"] == "-" else options["statement"]
+        report_file = open(options["report"], "w", encoding="utf-8", newline="") if options["report"] else None
+        try:
+            report = reconciliation.ReportWriter(
+                report_file, "csv" if (options["report"] or "").endswith(".csv") else "jsonl"
+            )
+            try:
+                counts = reconciliation.run(source, index, report, apply=options["apply"], fmt=options["format"])
+            except OSError as e:
+                raise CommandError(f"Cannot read statement: {e}")
+        finally:
+            if report_file is not None:
+                report_file.close()
+
+        applied = 0
+        if options["apply"]:
+            while True:
+                claimed = booking_service.drain_webhook_inbox()
+                applied += claimed
+                if not claimed:
+                    break
+        elapsed = time.monotonic() - started
+        rows = counts.pop("rows")
+        self.stdout.write(
+            f"Indexed {len(index):,} shipment(s) in {indexed - started:.2f}s; "
+            f"read {rows:,} statement row(s) in {elapsed:.2f}s."
+        )
+        for kind in sorted(counts):
+            self.stdout.write(f"  {kind}: {counts[kind]:,}")
+        if options["apply"]:
+            self.stdout.write(f"Applied {applied:,} webhook(s) from the inbox.")
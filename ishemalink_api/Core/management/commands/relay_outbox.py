@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from Core.outbox import OUTBOX_BATCH_SIZE, OUTBOX_CLAIM_LIMIT, OutboxRelay
+from Core.services import booking_service
+
+
+class Command(BaseCommand):
+    help = "Publish committed outbox messages (payment prompts) in batches, with retries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=OUTBOX_CLAIM_LIMIT, help="Messages claimed per round.")
+        parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE, help="Messages per handler call.")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--loop", action="store_true", help="Keep publishing until interrupted.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Idle sleep in seconds when looping.")
+
+    def handle(self, *args, **options):
+        relay = OutboxRelay(
+            booking_service.outbox_handlers(), batch_size=options["batch_size"], max_workers=options["workers"]
+        )
+        total = 0
+        started = time.monotonic()
+        try:
+            while True:
+                claimed = relay.run_once(options["limit"])
+                total += claimed
+                if claimed:
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        finally:
+            relay.close()
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Processed {total} outbox message(s) in {elapsed:.2f}s.")
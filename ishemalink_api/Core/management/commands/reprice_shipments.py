@@ -0,0 +1,55 @@
+import time
+from itertools import islice
+from django.core.management.base import BaseCommand
+from Core.models import Shipment
+from Core.tariffs import get_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-price shipments with the active tariff table. Reports the revenue impact; "
+        "with --apply, updates the tariff of shipments still awaiting payment."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--status", default=None, help="Only shipments in this status (default: all).")
+        parser.add_argument("--chunk-size", type=int, default=50000)
+        parser.add_argument("--apply", action="store_true", help="Persist new tariffs for pending_payment shipments.")
+
+    def handle(self, *args, **options):
+        engine = get_engine()
+        shipments = Shipment.objects.order_by()
+        if options["status"]:
+            shipments = shipments.filter(status=options["status"])
+        rows = shipments.values_list(
+            "id", "status", "shipment_type", "weight", "origin", "destination", "commodity", "tariff"
+        ).iterator(chunk_size=options["chunk_size"])
+
+        started = time.monotonic()
+        total = changed = applied = 0
+        old_revenue = new_revenue = 0.0
+        while True:
+            chunk = list(islice(rows, options["chunk_size"]))
+            if not chunk:
+                break
+            ids, statuses, types, weights, origins, destinations, commodities, old = zip(*chunk)
+            new = engine.quote_batch(types, weights, origins, destinations, commodities)
+            total += len(chunk)
+            old_revenue += sum(old)
+            new_revenue += float(new.sum())
+            updates = []
+            for shipment_id, status, before, after in zip(ids, statuses, old, new.tolist()):
+                if abs(after - before) < 0.005:
+                    continue
+                changed += 1
+                if options["apply"] and status == "pending_payment":
+                    updates.append(Shipment(id=shipment_id, tariff=after, tariff_version=engine.version))
+            if updates:
+                Shipment.objects.bulk_update(updates, ["tariff", "tariff_version"], batch_size=1000)
+                applied += len(updates)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Re-priced {total} shipment(s) with tariff {engine.version} in {elapsed:.2f}s: "
+            f"{changed} changed, {applied} updated, revenue {old_revenue:,.0f} -> {new_revenue:,.0f} RWF."
+        )
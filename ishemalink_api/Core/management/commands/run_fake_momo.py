@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from payments.fakes import MockMomoServer
+
+
+class Command(BaseCommand):
+    help = "Run the local MTN MoMo / Airtel Money stand-in (point MTN_MOMO_URL and AIRTEL_MONEY_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=9096)
+        parser.add_argument("--latency", type=float, default=0.3, help="Seconds per request.")
+        parser.add_argument("--callback-url", default="", help="Webhook URL to settle accepted prompts, "
+                            "e.g. http://127.0.0.1:8000/api/payments/webhook/")
+        parser.add_argument("--success-rate", type=float, default=1.0, help="Fraction of prompts paid.")
+        parser.add_argument("--callback-delay", type=float, default=1.0, help="Seconds before each webhook.")
+
+    def handle(self, *args, **options):
+        server = MockMomoServer(
+            (options["host"], options["port"]), options["latency"], options["callback_url"],
+            options["success_rate"], options["callback_delay"],
+        )
+        self.stdout.write(f"Mobile money stand-in listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(
+                f"Served {server.requests} request(s) over {len(server.connections)} connection(s), "
+                f"accepted {server.accepted} prompt(s)."
+            )
+            server.server_close()
@@ -0,0 +1,46 @@
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from Core.taskqueue import PRIORITIES, TASK_CLAIM_LIMIT, TaskWorker, get_broker
+
+
+class Command(BaseCommand):
+    help = "Run background tasks from the broker: payments, webhooks, notifications, receipts, manifests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--priorities", default=",".join(PRIORITIES),
+                            help="Comma-separated queues to work, drained in the order given.")
+        parser.add_argument("--limit", type=int, default=TASK_CLAIM_LIMIT, help="Messages claimed per round.")
+        parser.add_argument("--workers", type=int, default=4, help="Task calls run concurrently.")
+        parser.add_argument("--loop", action="store_true", help="Keep working until interrupted.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Idle wait in seconds when looping.")
+        parser.add_argument("--no-periodic", action="store_true", help="Do not enqueue periodic sweeps.")
+        parser.add_argument("--requeue-dead", action="store_true", help="Move dead-lettered messages back and exit.")
+
+    def handle(self, *args, **options):
+        broker = get_broker()
+        if options["requeue_dead"]:
+            self.stdout.write(f"Requeued {broker.requeue_dead()} dead-lettered message(s).")
+            return
+        priorities = [p.strip() for p in options["priorities"].split(",") if p.strip()]
+        unknown = set(priorities) - set(PRIORITIES)
+        if unknown:
+            raise CommandError(f"Unknown priorities: {', '.join(sorted(unknown))}")
+        worker = TaskWorker(broker, priorities, max_workers=options["workers"], periodic=not options["no_periodic"])
+        started = time.monotonic()
+        try:
+            if options["loop"]:
+                total = worker.run(threading.Event(), options["limit"], options["interval"])
+            else:
+                total = 0
+                while True:
+                    claimed = worker.run_once(options["limit"])
+                    total += claimed
+                    if not claimed:
+                        break
+                    # Periodic sweeps are enqueued once per run, not once per round
+                    worker.periodic = False
+        finally:
+            worker.close()
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Processed {total} task message(s) in {elapsed:.2f}s. Queues: {broker.stats()}")
@@ -0,0 +1,197 @@
+import functools
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Histogram bucket upper bounds: request and operation seconds, and queries per request
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# With METRICS_DIR set, each process writes its samples there at most this often and
+# /metrics sums every process's file, so any worker process can answer a scrape
+METRICS_DUMP_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[str, ...]
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram:
+    """
+    Bucketed observations per label set; observe() is a bisect and three
+    additions under a lock, cheap enough for every request.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self) -> Dict[Labels, list]:
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+
+class Registry:
+    """The process's metrics, rendered in the Prometheus text exposition format."""
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self._last_dump = 0.0
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help_text, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, Dict[Labels, object]]:
+        return {name: metric.samples() for name, metric in self.metrics.items()}
+
+    def render(self, snapshots: Optional[List[Dict[str, Dict[Labels, object]]]] = None) -> str:
+        """Text exposition of this process, or of the sum of several processes' snapshots."""
+        merged = _merge(snapshots if snapshots is not None else [self.snapshot()])
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(merged.get(name, {}).items()):
+                pairs = list(zip(metric.labelnames, labels))
+                if metric.kind == "counter":
+                    lines.append(f"{name}{_label_text(pairs)} {value:g}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_label_text(pairs + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_label_text(pairs)} {total:g}")
+                lines.append(f"{name}_count{_label_text(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, directory: str) -> None:
+        """Writes this process's samples to <directory>/<pid>.json, replacing the previous dump."""
+        data = {name: [[list(labels), value] for labels, value in samples.items()]
+                for name, samples in self.snapshot().items()}
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def maybe_dump(self, directory: str, interval: float = METRICS_DUMP_INTERVAL) -> None:
+        now = time.monotonic()
+        if now - self._last_dump >= interval:
+            self._last_dump = now
+            try:
+                self.dump(directory)
+            except OSError:
+                # Metrics never fail a request; the next interval tries again
+                logger.exception("Metrics dump to %s failed", directory)
+
+
+def load_dumps(directory: str) -> List[Dict[str, Dict[Labels, object]]]:
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        snapshots.append({name: {tuple(labels): value for labels, value in rows} for name, rows in data.items()})
+    return snapshots
+
+
+def _merge(snapshots: List[Dict[str, Dict[Labels, object]]]) -> Dict[str, Dict[Labels, object]]:
+    merged: Dict[str, Dict[Labels, object]] = {}
+    for snapshot in snapshots:
+        for name, samples in snapshot.items():
+            into = merged.setdefault(name, {})
+            for labels, value in samples.items():
+                before = into.get(labels)
+                if before is None:
+                    into[labels] = value
+                elif isinstance(value, list):
+                    into[labels] = [[a + b for a, b in zip(before[0], value[0])], before[1] + value[1]]
+                else:
+                    into[labels] = before + value
+    return merged
+
+
+def _label_text(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter("http_requests_total", "HTTP requests by route, method and status.",
+                            ("route", "method", "status"))
+REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                                     ("route", "method"))
+DB_QUERIES = registry.histogram("http_request_db_queries", "Database queries per HTTP request by route.",
+                                ("route",), QUERY_COUNT_BUCKETS)
+DB_SECONDS = registry.histogram("http_request_db_duration_seconds", "Database time per HTTP request by route.",
+                                ("route",))
+OPERATION_SECONDS = registry.histogram("booking_operation_duration_seconds",
+                                       "BookingService operation latency.", ("operation", "outcome"))
+
+
+def timed(operation: str) -> Callable:
+    """Records each call's duration in booking_operation_duration_seconds, with outcome ok or error."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                OPERATION_SECONDS.observe(time.perf_counter() - started, operation, outcome)
+        return wrapper
+    return decorator
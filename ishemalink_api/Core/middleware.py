@@ -0,0 +1,89 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from Core.metrics import DB_QUERIES, DB_SECONDS, REQUEST_SECONDS, REQUESTS, registry
+
+
+class QueryTimer:
+    """execute_wrapper that counts the queries it sees and their total time."""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+# The QueryTimer of the request being served. Context variables follow async views' ORM calls
+# into the sync_to_async thread that runs them, where a wrapper added to this thread's connection never would
+_request_queries: ContextVar[Optional[QueryTimer]] = ContextVar("request_queries", default=None)
+
+
+def time_request_queries(execute, sql, params, many, context):
+    """execute_wrapper on every connection (see Core.signals): feeds the current request's QueryTimer."""
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, database query count and database time of every request.
+    Samples are labelled by URL pattern (e.g. api/shipments/<int:shipment_id>/transitions/),
+    never by raw path, so label cardinality stays bounded. Streaming responses are
+    timed to their first byte. Exposed at /metrics/ (see Core.metrics).
+    Runs natively under WSGI and ASGI, so async views never wait on a thread for it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.metrics_dir = settings.METRICS_DIR
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        queries = QueryTimer()
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def _acall(self, request):
+        queries = QueryTimer()
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    def _record(self, request, response, elapsed: float, queries: QueryTimer) -> None:
+        match = request.resolver_match
+        route = match.route if match is not None else "unmatched"
+        REQUESTS.inc(route, request.method, str(response.status_code))
+        REQUEST_SECONDS.observe(elapsed, route, request.method)
+        DB_QUERIES.observe(queries.count, route)
+        DB_SECONDS.observe(queries.seconds, route)
+        if self.metrics_dir:
+            registry.maybe_dump(self.metrics_dir)
@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='capacity_kg',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='last_assigned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='pickup_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='pickup_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['last_assigned_at', 'id'], name='driver_avail_lru_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['capacity_kg', 'id'], name='driver_avail_capacity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['latitude', 'longitude'], name='driver_avail_position_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0003_payment_webhook_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='license_class',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='region',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['region', 'is_available'], name='driver_region_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['license_class', 'region'], name='driver_license_class_idx'),
+        ),
+    ]
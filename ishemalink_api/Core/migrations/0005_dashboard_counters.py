@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:29
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def seed_counters(apps, schema_editor):
+    # Shard 0 carries the current totals; writers spread further deltas over all shards
+    Driver = apps.get_model('Core', 'Driver')
+    Shipment = apps.get_model('Core', 'Shipment')
+    DashboardCounter = apps.get_model('Core', 'DashboardCounter')
+    active = Shipment.objects.filter(status='confirmed').aggregate(count=Count('id'), revenue=Sum('tariff'))
+    totals = {
+        'active_trucks': active['count'],
+        'total_revenue': active['revenue'] or 0,
+        'available_drivers': Driver.objects.filter(is_available=True).count(),
+    }
+    DashboardCounter.objects.bulk_create([
+        DashboardCounter(key=key, shard=shard, value=value if shard == 0 else 0)
+        for key, value in totals.items()
+        for shard in range(8)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0004_driver_broadcast_segments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('value', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('key', 'shard'), name='dashboard_counter_key_shard_uniq')],
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0005_dashboard_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='commodity',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='destination',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='origin',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='sector',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(condition=models.Q(('rolled_up', False)), fields=['id'], name='shipment_rollup_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0006_shipment_analytics_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TariffTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=20, unique=True)),
+                ('rates', models.JSONField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='tariff_version',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
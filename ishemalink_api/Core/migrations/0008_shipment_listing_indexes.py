@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0007_tariff_tables'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['-created_at', '-id'], name='shipment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='shipment_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['shipment_type', '-created_at', '-id'], name='shipment_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['assigned_driver', '-created_at', '-id'], name='shipment_driver_created_idx'),
+        ),
+    ]
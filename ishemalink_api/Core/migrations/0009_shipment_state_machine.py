@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0008_shipment_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ShipmentTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(max_length=30)),
+                ('to_status', models.CharField(max_length=30)),
+                ('version', models.PositiveIntegerField()),
+                ('actor', models.CharField(blank=True, default='', max_length=150)),
+                ('reason', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('shipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='Core.shipment')),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:40
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+
+def reseed_counters(apps, schema_editor):
+    # 0005 counted only confirmed shipments; active trucks now include in_transit and
+    # revenue includes delivered (Core.counters), so recount with those definitions
+    Driver = apps.get_model('Core', 'Driver')
+    Shipment = apps.get_model('Core', 'Shipment')
+    DashboardCounter = apps.get_model('Core', 'DashboardCounter')
+    shipments = Shipment.objects.aggregate(
+        count=Count('id', filter=Q(status__in=('confirmed', 'in_transit'))),
+        revenue=Sum('tariff', filter=Q(status__in=('confirmed', 'in_transit', 'delivered'))),
+    )
+    totals = {
+        'active_trucks': shipments['count'],
+        'total_revenue': shipments['revenue'] or 0,
+        'available_drivers': Driver.objects.filter(is_available=True).count(),
+    }
+    DashboardCounter.objects.bulk_create([
+        DashboardCounter(key=key, shard=shard) for key in totals for shard in range(8)
+    ], ignore_conflicts=True)
+    for key, value in totals.items():
+        DashboardCounter.objects.filter(key=key).exclude(shard=0).update(value=0)
+        DashboardCounter.objects.filter(key=key, shard=0).update(value=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0010_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(reseed_counters, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,25 @@ class Driver(models.Model):
     name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=20)
     license_number = models.CharField(max_length=50)
+    license_class = models.CharField(max_length=10, blank=True, default="")
+    region = models.CharField(max_length=50, blank=True, default="")
     is_available = models.BooleanField(default=True)
+    # Dispatch inputs: null capacity means unknown, null position means not reporting
+    capacity_kg = models.FloatField(null=True, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    last_assigned_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Partial indexes cover only the available pool, so dispatch never scans busy drivers
+        indexes = [
+            models.Index(fields=["last_assigned_at", "id"], condition=models.Q(is_available=True), name="driver_avail_lru_idx"),
+            models.Index(fields=["capacity_kg", "id"], condition=models.Q(is_available=True), name="driver_avail_capacity_idx"),
+            models.Index(fields=["latitude", "longitude"], condition=models.Q(is_available=True), name="driver_avail_position_idx"),
+            # Broadcast segments: region (optionally narrowed by availability) and license class
+            models.Index(fields=["region", "is_available"], name="driver_region_idx"),
+            models.Index(fields=["license_class", "region"], name="driver_license_class_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.license_number})"
@@ -19,9 +37,130 @@ class Shipment(models.Model):
     phone_number = models.CharField(max_length=20)
     status = models.CharField(max_length=30, default="pending_payment")
     tariff = models.FloatField(default=0)
+    tariff_version = models.CharField(max_length=20, blank=True, default="")
+    pickup_latitude = models.FloatField(null=True, blank=True)
+    pickup_longitude = models.FloatField(null=True, blank=True)
+    # Analytics dimensions
+    origin = models.CharField(max_length=50, blank=True, default="")
+    destination = models.CharField(max_length=50, blank=True, default="")
+    commodity = models.CharField(max_length=50, blank=True, default="")
+    sector = models.CharField(max_length=50, blank=True, default="")
+    # Set once the shipment has been folded into analytics.ShipmentRollup
+    rolled_up = models.BooleanField(default=False)
+    # Bumped by every Core.state_machine transition; guards against lost updates
+    version = models.PositiveIntegerField(default=0)
     assigned_driver = models.ForeignKey(Driver, null=True, blank=True, on_delete=models.SET_NULL)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(rolled_up=False), name="shipment_rollup_pending_idx"),
+            # Listing API: each filter column leads, then the (created_at, id) keyset order
+            models.Index(fields=["-created_at", "-id"], name="shipment_created_idx"),
+            models.Index(fields=["status", "-created_at", "-id"], name="shipment_status_created_idx"),
+            models.Index(fields=["shipment_type", "-created_at", "-id"], name="shipment_type_created_idx"),
+            models.Index(fields=["assigned_driver", "-created_at", "-id"], name="shipment_driver_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.shipment_type} - {self.id}"
+
+class ShipmentTransition(models.Model):
+    """
+    Append-only status history written by Core.state_machine.
+    `version` is the shipment version the transition produced.
+    """
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name="transitions")
+    from_status = models.CharField(max_length=30)
+    to_status = models.CharField(max_length=30)
+    version = models.PositiveIntegerField()
+    actor = models.CharField(max_length=150, blank=True, default="")
+    reason = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.shipment_id}: {self.from_status} -> {self.to_status}"
+
+class PaymentWebhook(models.Model):
+    """
+    Append-only inbox of payment provider callbacks.
+    The unique transaction_id makes provider retries a no-op insert;
+    a worker drains unprocessed rows and applies each one exactly once.
+    """
+    transaction_id = models.CharField(max_length=100, unique=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(processed_at__isnull=True), name="webhook_unprocessed_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} ({'processed' if self.processed_at else 'pending'})"
+
+class OutboxMessage(models.Model):
+    """
+    A side effect recorded in the same transaction as the change that causes it.
+    Core.outbox.OutboxRelay publishes pending rows after commit, so a rollback
+    never leaves an orphan payment prompt and no transaction waits on a gateway.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("published", "Published"),
+        ("failed", "Failed"),
+    ]
+    topic = models.CharField(max_length=50)
+    key = models.CharField(max_length=100, blank=True, default="")
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    # Due time for a retry, or the end of a relay's claim on the row
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["next_attempt_at", "id"], condition=models.Q(status="pending"), name="outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.key} ({self.status})"
+
+class DashboardCounter(models.Model):
+    """
+    Materialized control-tower totals, kept current by Core.counters.
+    Each key is spread over a few shard rows so concurrent bookings do not
+    queue on one hot row; readers sum the shards.
+    """
+    key = models.CharField(max_length=50)
+    shard = models.PositiveSmallIntegerField(default=0)
+    value = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["key", "shard"], name="dashboard_counter_key_shard_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.key}[{self.shard}] = {self.value}"
+
+class TariffTable(models.Model):
+    """
+    A versioned set of pricing rules loaded by Core.tariffs.
+    The most recently created active table is the one in force.
+    """
+    version = models.CharField(max_length=20, unique=True)
+    rates = models.JSONField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Tariff {self.version}{' (active)' if self.is_active else ''}"
@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from django.db import connection, transaction
+from django.utils import timezone
+from Core.models import OutboxMessage
+
+# Messages claimed per relay round, and messages handed to one handler call
+OUTBOX_CLAIM_LIMIT = 1000
+OUTBOX_BATCH_SIZE = 100
+
+# A claimed message becomes due again after this long, so a crashed relay loses nothing
+OUTBOX_LEASE_SECONDS = 300
+
+# Publish attempts before a message is parked as failed, and the first retry delay
+MAX_OUTBOX_ATTEMPTS = 8
+OUTBOX_BACKOFF_SECONDS = 2.0
+
+# Takes a batch of payloads, returns one error message (or None on success) per payload
+Handler = Callable[[List[Dict[str, Any]]], List[Optional[str]]]
+
+
+def enqueue(topic: str, payload: Dict[str, Any], key: str = "") -> OutboxMessage:
+    """Records a message in the caller's transaction; it is published only if that transaction commits."""
+    return OutboxMessage.objects.create(topic=topic, key=key, payload=payload)
+
+
+def enqueue_many(topic: str, messages: Iterable[Tuple[str, Dict[str, Any]]], batch_size: int = 500) -> int:
+    """(key, payload) pairs, inserted batch_size rows per statement; returns how many were queued."""
+    rows = [OutboxMessage(topic=topic, key=key, payload=payload) for key, payload in messages]
+    OutboxMessage.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+class OutboxRelay:
+    """
+    Publishes pending outbox messages to their topic handlers.
+    - Claims due rows in one short transaction (SKIP LOCKED where supported) and
+      leases them, rather than holding a lock while publishing
+    - Groups messages per topic into batches, one handler call per batch, run
+      concurrently on a thread pool
+    - Retries failures with exponential backoff, then marks them failed
+    Delivery is at least once: handlers must tolerate a repeated message.
+    Only the relay thread touches the database.
+    """
+    def __init__(self, handlers: Dict[str, Handler], batch_size: int = OUTBOX_BATCH_SIZE, max_workers: int = 8,
+                 max_attempts: int = MAX_OUTBOX_ATTEMPTS, backoff_seconds: float = OUTBOX_BACKOFF_SECONDS,
+                 lease_seconds: float = OUTBOX_LEASE_SECONDS):
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="outbox")
+
+    def claim(self, limit: int) -> List[OutboxMessage]:
+        now = timezone.now()
+        with transaction.atomic():
+            due = OutboxMessage.objects.filter(status="pending").exclude(next_attempt_at__gt=now).order_by("id")
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            claimed = list(due.only("id", "topic", "payload", "attempts")[:limit])
+            OutboxMessage.objects.filter(id__in=[m.id for m in claimed]).update(
+                next_attempt_at=now + timedelta(seconds=self.lease_seconds)
+            )
+        return claimed
+
+    def _publish(self, topic: str, batch: List[OutboxMessage]) -> List[Optional[str]]:
+        handler = self.handlers.get(topic)
+        if handler is None:
+            return [f"no handler for topic {topic}"] * len(batch)
+        try:
+            return handler([m.payload for m in batch])
+        except Exception as e:
+            return [str(e)] * len(batch)
+
+    def run_once(self, limit: int = OUTBOX_CLAIM_LIMIT) -> int:
+        """Publishes up to `limit` due messages and returns how many were claimed."""
+        claimed = self.claim(limit)
+        if not claimed:
+            return 0
+        by_topic: Dict[str, List[OutboxMessage]] = {}
+        for m in claimed:
+            by_topic.setdefault(m.topic, []).append(m)
+        futures = []
+        for topic, items in by_topic.items():
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                futures.append((batch, self.executor.submit(self._publish, topic, batch)))
+
+        now = timezone.now()
+        for batch, future in futures:
+            for m, error in zip(batch, future.result()):
+                m.attempts += 1
+                if error is None:
+                    m.status = "published"
+                    m.published_at = now
+                    m.last_error = ""
+                    m.next_attempt_at = None
+                elif m.attempts >= self.max_attempts:
+                    m.status = "failed"
+                    m.last_error = error
+                    m.next_attempt_at = None
+                else:
+                    m.last_error = error
+                    m.next_attempt_at = now + timedelta(seconds=self.backoff_seconds * 2 ** (m.attempts - 1))
+        OutboxMessage.objects.bulk_update(
+            claimed, ["status", "attempts", "published_at", "last_error", "next_attempt_at"], batch_size=500
+        )
+        return len(claimed)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
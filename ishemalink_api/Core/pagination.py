@@ -0,0 +1,53 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from django.db.models import Q, QuerySet
+
+# Default and largest page sizes for cursor-paginated list endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(when: datetime, pk: int) -> str:
+    raw = json.dumps([when.isoformat(), pk], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        when, pk = json.loads(raw)
+        return datetime.fromisoformat(when), int(pk)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def page_size(value: Optional[str]) -> int:
+    size = int(value) if value else DEFAULT_PAGE_SIZE
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return size
+
+
+def keyset_page(queryset: QuerySet, time_field: str, cursor: Optional[str], limit: int,
+                descending: bool = True) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of `queryset` ordered by (time_field, id), newest first by default.
+    The cursor holds the last row's (time, id), so page N is a range seek on the
+    composite index rather than an OFFSET scan. The queryset may be a values()
+    query as long as it includes time_field and "id". Returns (rows, next cursor or None).
+    """
+    op = "lt" if descending else "gt"
+    if cursor:
+        when, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f"{time_field}__{op}": when}) | Q(**{time_field: when, f"id__{op}": pk}))
+    prefix = "-" if descending else ""
+    rows = list(queryset.order_by(f"{prefix}{time_field}", f"{prefix}id")[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(last[time_field], last["id"])
+    return rows, encode_cursor(getattr(last, time_field), last.id)
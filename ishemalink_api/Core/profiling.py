@@ -0,0 +1,230 @@
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from django.conf import settings
+from django.db import DatabaseError, NotSupportedError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# The same query shape from one call site this many times in a request is reported as an N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+# Queries at least this slow (ms) have their plan captured with EXPLAIN, at most MAX_EXPLAINS per request
+SLOW_QUERY_MS = 100.0
+MAX_EXPLAINS = 5
+
+PROFILER_MIDDLEWARE = "Core.profiling.QueryProfilerMiddleware"
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+# Multi-row VALUES and IN lists: batches by construction, never N+1 suspects however often they repeat
+_BATCH = re.compile(r"\)\s*,\s*\(|\bIN\s*\(\s*%s\s*,", re.IGNORECASE)
+_TRANSACTION_CONTROL = re.compile(r"^\s*(?:SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)\b", re.IGNORECASE)
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+# Frames from these files are instrumentation wrappers, never a call site
+_OWN_FILES = frozenset(
+    os.path.join(os.path.dirname(__file__), name) for name in ("profiling.py", "middleware.py", "metrics.py")
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecord(NamedTuple):
+    sql: str
+    params: Any
+    many: bool
+    ms: float
+    site: str
+
+
+def query_shape(sql: str) -> str:
+    """The SQL with literals and IN-list lengths erased, so one query in a loop always has the same shape."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _IN_LIST.sub("(%s, ...)", sql)
+
+
+def call_site(root: str = "") -> str:
+    """file:line (function) of the innermost project frame that is not library code."""
+    root = root or str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and "site-packages" not in filename and filename not in _OWN_FILES:
+            return f"{os.path.relpath(filename, root)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "<library>"
+
+
+def explain(sql: str, params: Any, using=None) -> str:
+    """The database's plan for one statement, '' when it cannot be explained."""
+    using = using or connection
+    if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return ""
+    try:
+        # A savepoint keeps a failed EXPLAIN from aborting the caller's transaction on Postgres
+        with transaction.atomic(using=using.alias), using.cursor() as cursor:
+            cursor.execute(f"{using.ops.explain_query_prefix()} {sql}", params)
+            return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+    except (DatabaseError, NotSupportedError) as e:
+        return f"EXPLAIN failed: {e}"
+
+
+def query_budget(max_queries: int):
+    """Declares a view's query budget, enforced by QueryProfilerMiddleware and QueryBudgetMixin."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+class QueryReport:
+    """
+    One request's (or block's) queries, grouped by call site, with N+1 suspects,
+    slow queries and their plans, and the budget they were held to.
+    """
+    def __init__(self, queries: List[QueryRecord], budget: Optional[int] = None, route: str = "",
+                 n_plus_one: int = N_PLUS_ONE_THRESHOLD, slow_ms: float = SLOW_QUERY_MS,
+                 max_explains: int = MAX_EXPLAINS):
+        self.queries = queries
+        self.budget = budget
+        self.route = route
+        self.count = len(queries)
+        self.total_ms = sum(q.ms for q in queries)
+        self.by_site: Dict[str, Tuple[int, float]] = {}
+        repeats: Dict[Tuple[str, str], int] = {}
+        for q in queries:
+            count, ms = self.by_site.get(q.site, (0, 0.0))
+            self.by_site[q.site] = (count + 1, ms + q.ms)
+            if not (q.many or _TRANSACTION_CONTROL.match(q.sql) or _BATCH.search(q.sql)):
+                key = (q.site, query_shape(q.sql))
+                repeats[key] = repeats.get(key, 0) + 1
+        self.n_plus_one = [(site, shape, count) for (site, shape), count in repeats.items() if count >= n_plus_one]
+        slow = sorted((q for q in queries if q.ms >= slow_ms), key=lambda q: q.ms, reverse=True)
+        self.slow = [(q, "" if q.many else explain(q.sql, q.params)) for q in slow[:max_explains]]
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+    def problems(self) -> List[str]:
+        """Budget overruns and N+1 suspects: deterministic, so tests fail on them. Slow queries are only reported."""
+        found = []
+        if self.over_budget:
+            found.append(f"{self.count} queries, budget {self.budget}")
+        for site, shape, count in self.n_plus_one:
+            found.append(f"N+1: {count}x from {site}: {shape[:200]}")
+        return found
+
+    def format(self) -> str:
+        lines = [f"{self.route or 'block'}: {self.count} queries, {self.total_ms:.1f} ms"]
+        lines += [f"  {problem}" for problem in self.problems()]
+        lines += [f"  slow: {q.ms:.1f} ms from {q.site}: {q.sql[:200]}" for q, _ in self.slow]
+        for site, (count, ms) in sorted(self.by_site.items(), key=lambda item: -item[1][0]):
+            lines.append(f"  {count:>4}x {ms:8.1f} ms  {site}")
+        for q, plan in self.slow:
+            if plan:
+                lines.append(f"  plan for {q.sql[:120]}:")
+                lines += [f"    {line}" for line in plan.splitlines()]
+        return "\n".join(lines)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "queries": self.count,
+            "budget": self.budget,
+            "total_ms": round(self.total_ms, 2),
+            "by_site": {site: count for site, (count, _) in self.by_site.items()},
+            "n_plus_one": [{"site": site, "count": count, "sql": shape} for site, shape, count in self.n_plus_one],
+            "slow": [{"site": q.site, "ms": round(q.ms, 2), "sql": q.sql, "plan": plan} for q, plan in self.slow],
+        }
+
+
+class QueryProfiler:
+    """execute_wrapper recording every query's SQL, parameters, time and call site."""
+    def __init__(self):
+        self.queries: List[QueryRecord] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(QueryRecord(sql, params, many, (time.perf_counter() - started) * 1000, call_site()))
+
+    @contextmanager
+    def capture(self, using=None) -> Iterator["QueryProfiler"]:
+        with (using or connection).execute_wrapper(self):
+            yield self
+
+    def report(self, budget: Optional[int] = None, route: str = "") -> QueryReport:
+        return QueryReport(self.queries, budget, route, slow_ms=settings.SLOW_QUERY_MS)
+
+
+@contextmanager
+def assert_query_budget(max_queries: Optional[int] = None) -> Iterator[QueryProfiler]:
+    """
+    Fails the enclosed block when it runs more than max_queries queries or repeats
+    a query shape N+1 style; the failure lists every call site.
+    """
+    profiler = QueryProfiler()
+    with profiler.capture():
+        yield profiler
+    report = profiler.report(budget=max_queries)
+    if report.problems():
+        raise QueryBudgetExceeded(report.format())
+
+
+class QueryProfilerMiddleware:
+    """
+    Development and CI query profiler, installed when QUERY_PROFILER is set.
+    - Groups each request's queries by call site, flags N+1 shapes and slow queries
+      (with their EXPLAIN plans) and checks the view's @query_budget
+    - Adds X-Query-Count and X-Query-Time-Ms headers and response.query_report
+    - Logs a warning with the full report for requests with problems or slow queries;
+      with QUERY_PROFILER_RAISE (tests) an overrun or N+1 raises QueryBudgetExceeded
+    Not for production: it walks the stack on every query.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profiler = QueryProfiler()
+        with profiler.capture():
+            response = self.get_response(request)
+        match = request.resolver_match
+        budget = getattr(match.func, "query_budget", None) if match is not None else None
+        report = profiler.report(budget, match.route if match is not None else request.path)
+        response["X-Query-Count"] = str(report.count)
+        response["X-Query-Time-Ms"] = f"{report.total_ms:.1f}"
+        response.query_report = report
+        if report.problems() and settings.QUERY_PROFILER_RAISE:
+            raise QueryBudgetExceeded(f"{request.method} {request.path}\n{report.format()}")
+        if report.problems() or report.slow:
+            logger.warning("Query problems in %s %s", request.method, request.path,
+                           extra={"query_report": report.as_dict()})
+        return response
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin: every test client request goes through QueryProfilerMiddleware,
+    and one over its view's @query_budget or with an N+1 fails the test.
+    """
+    def setUp(self):
+        super().setUp()
+        middleware = list(settings.MIDDLEWARE)
+        if PROFILER_MIDDLEWARE not in middleware:
+            middleware.insert(0, PROFILER_MIDDLEWARE)
+        from django.test import override_settings
+        override = override_settings(MIDDLEWARE=middleware, QUERY_PROFILER_RAISE=True)
+        override.enable()
+        self.addCleanup(override.disable)
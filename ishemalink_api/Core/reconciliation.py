@@ -0,0 +1,281 @@
+import csv
+import gzip
+import json
+from typing import IO, Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from django.db import transaction
+from Core import state_machine
+from Core.models import PaymentWebhook, Shipment
+from Core.state_machine import PAID_STATUSES, PAYMENT_FAILED, PENDING_PAYMENT
+
+# Shipments fetched per round trip while building the index
+INDEX_CHUNK_SIZE = 10000
+
+# Synthetic webhooks inserted per statement
+CORRECTION_BATCH_SIZE = 1000
+
+# Paid and expected amounts closer than this (RWF) are treated as equal
+AMOUNT_TOLERANCE = 1.0
+
+# Statement column names accepted for each field; MTN and Airtel exports differ
+COLUMN_ALIASES = {
+    "reference": ("reference", "external_id", "externalid", "external id", "shipment_id"),
+    "transaction_id": ("transaction_id", "financial transaction id", "financialtransactionid", "id", "txn_id"),
+    "amount": ("amount", "transaction_amount", "value"),
+    "status": ("status", "transaction_status", "state"),
+}
+SUCCESS_STATUSES = frozenset({"success", "successful", "succeeded", "completed", "ts"})
+FAILED_STATUSES = frozenset({"failed", "failure", "rejected", "expired", "tf"})
+
+# Mismatches fixed by applying the statement's outcome as a payment webhook
+CORRECTABLE = frozenset({"missed_payment", "missed_failure"})
+
+
+class StatementRow(NamedTuple):
+    line: int
+    reference: str
+    transaction_id: str
+    amount: float
+    status: str
+
+
+class Mismatch(NamedTuple):
+    kind: str
+    line: int
+    reference: str
+    transaction_id: str
+    amount: Optional[float]
+    expected: Optional[float]
+    shipment_status: Optional[str]
+    detail: str
+
+
+def _open(source: Union[str, IO]) -> IO:
+    if not isinstance(source, str):
+        return source
+    if source.endswith(".gz"):
+        return gzip.open(source, "rt", encoding="utf-8", newline="")
+    return open(source, "r", encoding="utf-8", newline="")
+
+
+def statement_format(source: Union[str, IO], fmt: Optional[str] = None) -> str:
+    if fmt:
+        return fmt
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    name = name[:-3] if name.endswith(".gz") else name
+    return "csv" if name.endswith(".csv") else "jsonl"
+
+
+def read_statement(source: Union[str, IO], fmt: Optional[str] = None) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Yields (line number, raw row) from a CSV or JSON-lines statement, optionally
+    gzipped, one row at a time. Unreadable JSON lines yield a None row.
+    """
+    fmt = statement_format(source, fmt)
+    stream = _open(source)
+    try:
+        if fmt == "csv":
+            for line, row in enumerate(csv.DictReader(stream), start=2):
+                yield line, row
+        else:
+            for line, text in enumerate(stream, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except json.JSONDecodeError:
+                    row = None
+                yield line, row if isinstance(row, dict) else None
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def _column_map(keys: Iterable[str]) -> Dict[str, str]:
+    lowered = {k.strip().lower(): k for k in keys if k}
+    found = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                found[field] = lowered[alias]
+                break
+    return found
+
+
+def parse_rows(raw: Iterable[Tuple[int, Optional[Dict[str, Any]]]]) -> Iterator[Union[StatementRow, Mismatch]]:
+    """Normalises raw rows to StatementRow; rows that cannot be read become "unparseable" mismatches."""
+    columns: Optional[Dict[str, str]] = None
+    keys: Optional[Tuple[str, ...]] = None
+    for line, row in raw:
+        try:
+            if row is None:
+                raise ValueError("not a JSON object")
+            row_keys = tuple(row)
+            if row_keys != keys:
+                # CSV rows share one header; JSON lines usually do too, so the lookup is cached
+                keys, columns = row_keys, _column_map(row_keys)
+            missing = COLUMN_ALIASES.keys() - columns.keys()
+            if missing:
+                raise ValueError(f"missing {', '.join(sorted(missing))}")
+            status = str(row[columns["status"]]).strip().lower()
+            yield StatementRow(
+                line=line,
+                reference=str(row[columns["reference"]]).strip(),
+                transaction_id=str(row[columns["transaction_id"]]).strip(),
+                amount=float(str(row[columns["amount"]]).replace(",", "")),
+                status="success" if status in SUCCESS_STATUSES else "failed" if status in FAILED_STATUSES else status,
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            yield Mismatch("unparseable", line, "", "", None, None, None, str(e))
+
+
+def shipment_id_for(reference: str) -> Optional[int]:
+    # References are shipment ids; MomoMock statements carry them as MOCK-<id>
+    try:
+        return int(reference.replace("MOCK-", ""))
+    except ValueError:
+        return None
+
+
+def build_index(shipments=None, chunk_size: int = INDEX_CHUNK_SIZE) -> Dict[int, Tuple[str, float]]:
+    """
+    shipment id -> (status, tariff), streamed from a values_list iterator so
+    no model instances are built. Status strings are shared, so each entry
+    costs one small tuple.
+    """
+    shipments = shipments if shipments is not None else Shipment.objects.all()
+    statuses: Dict[str, str] = {}
+    return {
+        shipment_id: (statuses.setdefault(status, status), tariff)
+        for shipment_id, status, tariff in shipments.values_list("id", "status", "tariff").iterator(chunk_size=chunk_size)
+    }
+
+
+def reconcile(rows: Iterable[Union[StatementRow, Mismatch]], index: Dict[int, Tuple[str, float]],
+              tolerance: float = AMOUNT_TOLERANCE) -> Iterator[Mismatch]:
+    """
+    Joins statement rows to the shipment index and yields every disagreement:
+    unknown_reference, duplicate_payment, amount_mismatch, missed_payment (paid
+    but still unpaid here), missed_failure (failed but still pending here) and
+    reversed_payment (failed at the provider but paid here).
+    Successful references are remembered in a one-byte-per-shipment-id flag
+    array, to spot duplicates without a set that grows with the statement.
+    """
+    paid = bytearray(max(index, default=0) + 1)
+    for row in rows:
+        if isinstance(row, Mismatch):
+            yield row
+            continue
+        shipment_id = shipment_id_for(row.reference)
+        entry = index.get(shipment_id) if shipment_id is not None else None
+        if entry is None:
+            yield Mismatch("unknown_reference", row.line, row.reference, row.transaction_id, row.amount, None, None,
+                           "no shipment with this reference")
+            continue
+        status, tariff = entry
+        if row.status == "success":
+            if paid[shipment_id]:
+                yield Mismatch("duplicate_payment", row.line, row.reference, row.transaction_id, row.amount, tariff,
+                               status, "reference already paid earlier in this statement")
+                continue
+            paid[shipment_id] = 1
+            if abs(row.amount - tariff) > tolerance:
+                yield Mismatch("amount_mismatch", row.line, row.reference, row.transaction_id, row.amount, tariff,
+                               status, f"paid {row.amount:.2f}, expected {tariff:.2f}")
+            elif status in (PENDING_PAYMENT, PAYMENT_FAILED):
+                yield Mismatch("missed_payment", row.line, row.reference, row.transaction_id, row.amount, tariff,
+                               status, "settled by the provider, not confirmed here")
+        elif row.status == "failed":
+            if status == PENDING_PAYMENT:
+                yield Mismatch("missed_failure", row.line, row.reference, row.transaction_id, row.amount, tariff,
+                               status, "failed at the provider, still pending here")
+            elif status in PAID_STATUSES and not paid[shipment_id]:
+                yield Mismatch("reversed_payment", row.line, row.reference, row.transaction_id, row.amount, tariff,
+                               status, "failed at the provider but marked paid here")
+
+
+def _webhook(mismatch: Mismatch) -> PaymentWebhook:
+    # The provider's own transaction id: if the lost webhook turns up later it is absorbed as a duplicate
+    return PaymentWebhook(transaction_id=mismatch.transaction_id or f"RECON-{mismatch.reference}", payload={
+        "transaction_id": mismatch.transaction_id,
+        "reference": str(shipment_id_for(mismatch.reference)),
+        "status": "success" if mismatch.kind == "missed_payment" else "failed",
+        "source": "reconciliation",
+    })
+
+
+def _flush_corrections(batch: List[Mismatch]) -> None:
+    webhooks = [_webhook(m) for m in batch]
+    # Providers may reuse one transaction id for a failure and the later settlement (MTN derives it
+    # from the reference): for a reopened shipment that id is the failure already in the inbox, and
+    # the settlement would be dropped as its duplicate, so it gets an id of its own
+    taken = set(PaymentWebhook.objects.filter(
+        transaction_id__in=[w.transaction_id for w in webhooks]
+    ).values_list("transaction_id", flat=True))
+    for mismatch, webhook in zip(batch, webhooks):
+        if mismatch.shipment_status == PAYMENT_FAILED and webhook.transaction_id in taken:
+            webhook.transaction_id = f"RECON-{mismatch.reference}-{webhook.transaction_id}"[:100]
+    # One transaction, so a shipment is never reopened without the webhook that settles it
+    with transaction.atomic():
+        # A failed shipment that was in fact paid is reopened first, so the webhook path accepts it
+        reopen = [shipment_id_for(m.reference) for m in batch if m.shipment_status == PAYMENT_FAILED]
+        if reopen:
+            state_machine.bulk_transition(reopen, PAYMENT_FAILED, PENDING_PAYMENT, actor="reconciliation",
+                                          reason="settled in provider statement")
+        PaymentWebhook.objects.bulk_create(webhooks, ignore_conflicts=True)
+
+
+def queue_corrections(mismatches: Iterable[Mismatch], batch_size: int = CORRECTION_BATCH_SIZE) -> Iterator[Mismatch]:
+    """
+    Passes mismatches through unchanged, inserting a synthetic PaymentWebhook for
+    each correctable one in batches of batch_size. The inbox worker then applies
+    them through the normal callback path (state machine, dispatch, notifications).
+    """
+    batch: List[Mismatch] = []
+    for mismatch in mismatches:
+        if mismatch.kind in CORRECTABLE:
+            batch.append(mismatch)
+            if len(batch) >= batch_size:
+                _flush_corrections(batch)
+                batch = []
+        yield mismatch
+    if batch:
+        _flush_corrections(batch)
+
+
+class ReportWriter:
+    """Streams mismatches to a CSV or JSON-lines report and counts them by kind."""
+    def __init__(self, stream: Optional[IO] = None, fmt: str = "jsonl"):
+        self.stream = stream
+        self.fmt = fmt
+        self.counts: Dict[str, int] = {}
+        self._csv = csv.writer(stream) if stream is not None and fmt == "csv" else None
+        if self._csv is not None:
+            self._csv.writerow(Mismatch._fields)
+
+    def write(self, mismatch: Mismatch) -> None:
+        self.counts[mismatch.kind] = self.counts.get(mismatch.kind, 0) + 1
+        if self._csv is not None:
+            self._csv.writerow(mismatch)
+        elif self.stream is not None:
+            self.stream.write(json.dumps(mismatch._asdict()) + "\n")
+
+
+def run(source: Union[str, IO], index: Dict[int, Tuple[str, float]], report: Optional[ReportWriter] = None,
+        apply: bool = False, fmt: Optional[str] = None) -> Dict[str, int]:
+    """The whole pipeline; returns mismatch counts by kind plus the number of rows read."""
+    report = report or ReportWriter()
+    rows_read = 0
+
+    def counted(raw):
+        nonlocal rows_read
+        for item in raw:
+            rows_read += 1
+            yield item
+
+    mismatches = reconcile(parse_rows(counted(read_statement(source, fmt))), index)
+    if apply:
+        mismatches = queue_corrections(mismatches)
+    for mismatch in mismatches:
+        report.write(mismatch)
+    return {"rows": rows_read, **report.counts}
+
@@ -0,0 +1,11 @@
+from django.conf import settings
+from Core.booking_service import BookingService
+from Core.dispatch import DispatchEngine
+from notifications import NotificationEngine
+from payments.client import get_gateway
+
+# Dependency injection: one BookingService per process, shared by the views, tasks and management commands
+payment_gateway = get_gateway()
+notifier = NotificationEngine()
+dispatcher = DispatchEngine.from_name(settings.DISPATCH_STRATEGY)
+booking_service = BookingService(payment_gateway, notifier, dispatcher)
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from Core import caching, counters, tariffs
+from Core.middleware import time_request_queries
+from Core.models import Driver, Shipment, TariffTable
+
+# Model.save()/delete() paths (admin, objects.create) keep the dashboard counters current.
+# Queryset .update() paths bypass signals and call Core.counters directly.
+
+
+@receiver(pre_save, sender=Driver)
+def remember_driver_availability(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._was_available = None
+        return
+    instance._was_available = Driver.objects.filter(pk=instance.pk).values_list("is_available", flat=True).first()
+
+
+@receiver(post_save, sender=Driver)
+def count_driver_availability(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    counters.driver_availability_changed(getattr(instance, "_was_available", None), instance.is_available)
+
+
+@receiver(post_delete, sender=Driver)
+def uncount_deleted_driver(sender, instance, **kwargs):
+    counters.driver_availability_changed(instance.is_available, False)
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_delete, sender=Driver)
+def invalidate_driver_responses(sender, raw=False, **kwargs):
+    if raw:
+        return
+    # After commit, so a concurrent request cannot re-cache the old names under the new version
+    transaction.on_commit(lambda: caching.invalidate(caching.DRIVERS))
+
+
+@receiver(pre_save, sender=Shipment)
+def remember_shipment_status(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._previous = (None, 0)
+        return
+    instance._previous = Shipment.objects.filter(pk=instance.pk).values_list("status", "tariff").first() or (None, 0)
+
+
+@receiver(post_save, sender=Shipment)
+def count_shipment_status(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_status, old_tariff = getattr(instance, "_previous", (None, 0))
+    # Covers re-pricing too: only the revenue difference moves when the status does not
+    counters.shipment_changed(old_status, old_tariff, instance.status, instance.tariff)
+
+
+@receiver(post_delete, sender=Shipment)
+def uncount_deleted_shipment(sender, instance, **kwargs):
+    counters.shipment_status_changed(instance.status, None, instance.tariff)
+
+
+@receiver(post_save, sender=TariffTable)
+@receiver(post_delete, sender=TariffTable)
+def reload_tariffs(sender, **kwargs):
+    # Other processes notice the new active version within tariffs.TARIFF_CACHE_TTL
+    tariffs.invalidate()
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Per connection rather than per request, so queries run in sync_to_async threads are counted too
+    if time_request_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_request_queries)
@@ -0,0 +1,153 @@
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+PENDING_PAYMENT = "pending_payment"
+PAYMENT_FAILED = "payment_failed"
+CONFIRMED = "confirmed"
+CONFIRMED_NO_DRIVER = "confirmed_no_driver"
+IN_TRANSIT = "in_transit"
+DELIVERED = "delivered"
+RETURNED = "returned"
+CANCELLED = "cancelled"
+
+# Every allowed move; a status missing from the right-hand sets can only be entered at creation
+TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    PENDING_PAYMENT: frozenset({CONFIRMED, CONFIRMED_NO_DRIVER, PAYMENT_FAILED, CANCELLED}),
+    PAYMENT_FAILED: frozenset({PENDING_PAYMENT, CANCELLED}),
+    CONFIRMED_NO_DRIVER: frozenset({CONFIRMED, CANCELLED}),
+    CONFIRMED: frozenset({IN_TRANSIT, CANCELLED}),
+    IN_TRANSIT: frozenset({DELIVERED, RETURNED}),
+    DELIVERED: frozenset(),
+    RETURNED: frozenset(),
+    CANCELLED: frozenset(),
+}
+STATUSES = tuple(TRANSITIONS)
+
+# Paid shipments: billed, receipted and declared at the border from here on
+PAID_STATUSES = (CONFIRMED, CONFIRMED_NO_DRIVER, IN_TRANSIT, DELIVERED)
+
+# Entering these frees the assigned driver for dispatch again
+RELEASE_DRIVER_STATUSES = (DELIVERED, RETURNED, CANCELLED)
+
+# Shipments moved per statement by bulk_transition(), and history rows per INSERT
+BULK_TRANSITION_CHUNK = 5000
+HISTORY_BATCH_SIZE = 1000
+
+
+class InvalidTransition(ValueError):
+    def __init__(self, from_status: str, to_status: str):
+        super().__init__(f"Cannot move a shipment from {from_status} to {to_status}")
+        self.from_status = from_status
+        self.to_status = to_status
+
+
+class StaleShipment(Exception):
+    """The shipment's status or version changed after it was read; re-read and retry."""
+
+
+def can_transition(from_status: str, to_status: str) -> bool:
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def check_transition(from_status: str, to_status: str) -> None:
+    if to_status not in TRANSITIONS:
+        raise ValueError(f"Unknown status: {to_status}")
+    if not can_transition(from_status, to_status):
+        raise InvalidTransition(from_status, to_status)
+
+
+def _release_drivers(driver_ids: Iterable[Optional[int]]) -> int:
+    from Core import counters
+    from Core.models import Driver
+    ids = {i for i in driver_ids if i is not None}
+    if not ids:
+        return 0
+    released = Driver.objects.filter(id__in=ids, is_available=False).update(is_available=True)
+    counters.bump(**{counters.AVAILABLE_DRIVERS: released})
+    return released
+
+
+def transition(shipment, to_status: str, actor: str = "", reason: str = "", **changes: Any):
+    """
+    Moves one shipment to `to_status` with a single
+    UPDATE ... SET status, version = version + 1, <changes> WHERE id AND status AND version,
+    using the status and version on the instance as the expected values.
+    Raises InvalidTransition for a move the table does not allow and StaleShipment
+    when another writer got there first. The history row and dashboard counters are
+    written in the same transaction; the instance is updated and returned.
+    """
+    from Core import counters
+    from Core.models import Shipment, ShipmentTransition
+    from_status = shipment.status
+    check_transition(from_status, to_status)
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Shipment.objects.filter(id=shipment.id, status=from_status, version=shipment.version).update(
+            status=to_status, version=F("version") + 1, updated_at=now, **changes
+        )
+        if not updated:
+            raise StaleShipment(f"Shipment {shipment.id} is no longer {from_status} at version {shipment.version}")
+        shipment.status = to_status
+        shipment.version += 1
+        shipment.updated_at = now
+        for field, value in changes.items():
+            setattr(shipment, field, value)
+        ShipmentTransition.objects.create(
+            shipment_id=shipment.id, from_status=from_status, to_status=to_status, version=shipment.version,
+            actor=actor[:150], reason=reason[:255],
+        )
+        counters.shipment_status_changed(from_status, to_status, shipment.tariff)
+        if to_status in RELEASE_DRIVER_STATUSES:
+            _release_drivers([shipment.assigned_driver_id])
+    return shipment
+
+
+def bulk_transition(shipment_ids: Iterable[int], from_status: str, to_status: str, actor: str = "",
+                    reason: str = "", chunk_size: int = BULK_TRANSITION_CHUNK) -> Dict[str, Any]:
+    """
+    Moves every listed shipment currently in `from_status` to `to_status`.
+    Each chunk is one locking SELECT, one UPDATE for the whole chunk, batched history
+    INSERTs and one counter bump, committed together. Shipments in any other status
+    are left alone and reported as skipped.
+    """
+    from Core import counters
+    from Core.models import Shipment, ShipmentTransition
+    check_transition(from_status, to_status)
+    ids = list(dict.fromkeys(shipment_ids))
+    moved: List[int] = []
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        with transaction.atomic():
+            rows = list(
+                Shipment.objects.select_for_update().filter(id__in=chunk, status=from_status)
+                .order_by("id").values_list("id", "version", "tariff", "assigned_driver_id")
+            )
+            if not rows:
+                continue
+            chunk_ids = [row[0] for row in rows]
+            # Rows are locked, so the status filter above still holds for this UPDATE
+            Shipment.objects.filter(id__in=chunk_ids).update(
+                status=to_status, version=F("version") + 1, updated_at=timezone.now()
+            )
+            ShipmentTransition.objects.bulk_create([
+                ShipmentTransition(shipment_id=shipment_id, from_status=from_status, to_status=to_status,
+                                   version=version + 1, actor=actor[:150], reason=reason[:255])
+                for shipment_id, version, _, _ in rows
+            ], batch_size=HISTORY_BATCH_SIZE)
+            counters.shipment_status_changed(
+                from_status, to_status, sum(tariff or 0 for _, _, tariff, _ in rows), count=len(rows)
+            )
+            if to_status in RELEASE_DRIVER_STATUSES:
+                _release_drivers(driver_id for _, _, _, driver_id in rows)
+            moved.extend(chunk_ids)
+    moved_set = set(moved)
+    return {"moved": len(moved), "skipped": [i for i in ids if i not in moved_set]}
+
+
+def history(shipment_id: int) -> List[Dict[str, Any]]:
+    from Core.models import ShipmentTransition
+    return list(ShipmentTransition.objects.filter(shipment_id=shipment_id).order_by("id").values(
+        "from_status", "to_status", "version", "actor", "reason", "created_at"
+    ))
@@ -0,0 +1,142 @@
+import threading
+import time
+from itertools import repeat
+from typing import Any, Dict, Hashable, Iterable, Optional, Sequence
+import numpy as np
+
+# Rules in force when no TariffTable exists: the original flat per-kg pricing
+DEFAULT_VERSION = "default"
+DEFAULT_RATES: Dict[str, Any] = {
+    # RWF per kg by shipment type
+    "base_per_kg": {"domestic": 1000, "international": 3000},
+    # [upper bound in kg (inclusive, null = no limit), multiplier on the per-kg charge]
+    "weight_bands": [[None, 1.0]],
+    # RWF per km of route distance, by shipment type
+    "per_km": {"domestic": 0, "international": 0},
+    # Route distances in km keyed "Origin - Destination"
+    "route_km": {},
+    # Fractional surcharge on the weight charge by commodity
+    "commodity_surcharge": {},
+    # Flat EAC cross-border fee for international shipments by destination; "*" is the fallback
+    "border_fee": {"*": 0},
+}
+
+# Seconds a worker trusts its cached table before checking for a newer active version
+TARIFF_CACHE_TTL = 60
+
+
+def route_key(origin: str, destination: str) -> str:
+    return f"{origin} - {destination}"
+
+
+class TariffEngine:
+    """
+    Prices shipments from one immutable rate table.
+    - quote() prices a single shipment (booking path)
+    - quote_batch() prices arrays of shipments with NumPy (bulk booking, re-pricing)
+    Both apply the same formula:
+        weight charge = base_per_kg[type] * weight * band multiplier * (1 + commodity surcharge)
+        tariff = weight charge + per_km[type] * route_km + border fee (international only)
+    """
+    def __init__(self, rates: Dict[str, Any], version: str = DEFAULT_VERSION):
+        self.version = version
+        self.rates = rates
+        self.base_per_kg = {k: float(v) for k, v in rates.get("base_per_kg", {}).items()}
+        self.per_km = {k: float(v) for k, v in rates.get("per_km", {}).items()}
+        self.route_km = {k: float(v) for k, v in rates.get("route_km", {}).items()}
+        # Same distances keyed by (origin, destination) so batches skip building strings
+        self._route_pairs = {tuple(k.split(" - ", 1)): v for k, v in self.route_km.items() if " - " in k}
+        self.commodity_surcharge = {k: float(v) for k, v in rates.get("commodity_surcharge", {}).items()}
+        self.border_fee = {k: float(v) for k, v in rates.get("border_fee", {}).items()}
+        bands = rates.get("weight_bands") or [[None, 1.0]]
+        self.band_edges = np.array([np.inf if upper is None else float(upper) for upper, _ in bands])
+        self.band_multipliers = np.array([float(multiplier) for _, multiplier in bands])
+
+    def quote(self, shipment_type: str, weight: float, origin: str = "", destination: str = "",
+              commodity: str = "") -> float:
+        if shipment_type not in self.base_per_kg:
+            raise ValueError(f"No tariff for shipment type: {shipment_type}")
+        band = min(int(np.searchsorted(self.band_edges, weight, side="left")), len(self.band_multipliers) - 1)
+        charge = self.base_per_kg[shipment_type] * weight * self.band_multipliers[band]
+        charge *= 1 + self.commodity_surcharge.get(commodity, 0.0)
+        charge += self.per_km.get(shipment_type, 0.0) * self.route_km.get(route_key(origin, destination), 0.0)
+        if shipment_type == "international":
+            charge += self.border_fee.get(destination, self.border_fee.get("*", 0.0))
+        return float(charge)
+
+    @staticmethod
+    def _lookup(keys: Iterable[Hashable], table: Dict[Any, float], default: float, n: int) -> np.ndarray:
+        # dict.get driven by map() stays in C; no per-row Python frames or string sorting
+        return np.fromiter(map(table.get, keys, repeat(default, n)), dtype=float, count=n)
+
+    def quote_batch(self, shipment_types: Sequence[str], weights: Sequence[float],
+                    origins: Optional[Sequence[str]] = None, destinations: Optional[Sequence[str]] = None,
+                    commodities: Optional[Sequence[str]] = None) -> np.ndarray:
+        weights = np.asarray(weights, dtype=float)
+        n = len(weights)
+        origins = origins if origins is not None else repeat("", n)
+        destinations = list(destinations) if destinations is not None else [""] * n
+        commodities = commodities if commodities is not None else repeat("", n)
+
+        base = self._lookup(shipment_types, self.base_per_kg, np.nan, n)
+        if np.isnan(base).any():
+            unknown = sorted({t for t, b in zip(shipment_types, base) if np.isnan(b)})
+            raise ValueError(f"No tariff for shipment type(s): {', '.join(unknown)}")
+        bands = np.minimum(np.searchsorted(self.band_edges, weights, side="left"), len(self.band_multipliers) - 1)
+        charge = base * weights * self.band_multipliers[bands]
+        charge *= 1 + self._lookup(commodities, self.commodity_surcharge, 0.0, n)
+
+        if self.route_km:
+            distance = self._lookup(zip(origins, destinations), self._route_pairs, 0.0, n)
+            charge += self._lookup(shipment_types, self.per_km, 0.0, n) * distance
+
+        international = np.fromiter(map("international".__eq__, shipment_types), dtype=bool, count=n)
+        if international.any():
+            fees = self._lookup(destinations, self.border_fee, self.border_fee.get("*", 0.0), n)
+            charge += np.where(international, fees, 0.0)
+        return charge
+
+
+_lock = threading.Lock()
+_cached: Optional[TariffEngine] = None
+_checked_at = 0.0
+
+
+def _active_version() -> Optional[str]:
+    from Core.models import TariffTable
+    return TariffTable.objects.filter(is_active=True).order_by("-created_at").values_list("version", flat=True).first()
+
+
+def _load(version: Optional[str]) -> TariffEngine:
+    from Core.models import TariffTable
+    if version is None:
+        return TariffEngine(DEFAULT_RATES, DEFAULT_VERSION)
+    return TariffEngine(TariffTable.objects.get(version=version).rates, version)
+
+
+def get_engine() -> TariffEngine:
+    """
+    Returns the engine for the active table, loaded once per process.
+    After TARIFF_CACHE_TTL seconds one cheap version lookup decides whether to reload,
+    so tables activated from another process are picked up without a restart.
+    """
+    global _cached, _checked_at
+    now = time.monotonic()
+    engine = _cached
+    if engine is not None and now - _checked_at < TARIFF_CACHE_TTL:
+        return engine
+    with _lock:
+        if _cached is not None and now - _checked_at < TARIFF_CACHE_TTL:
+            return _cached
+        version = _active_version()
+        if _cached is None or _cached.version != (version or DEFAULT_VERSION):
+            _cached = _load(version)
+        _checked_at = now
+        return _cached
+
+
+def invalidate() -> None:
+    """Drops this process's cached table; the next get_engine() reloads it."""
+    global _cached
+    with _lock:
+        _cached = None
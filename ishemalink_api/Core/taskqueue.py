@@ -0,0 +1,511 @@
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import autodiscover_modules
+from Core.metrics import registry
+
+# Queues in the order workers drain them: nothing in DEFAULT is claimed while HIGH has work ready
+HIGH = "high"
+DEFAULT = "default"
+LOW = "low"
+PRIORITIES = (HIGH, DEFAULT, LOW)
+
+# Messages claimed per worker round; a claimed message not acknowledged within the lease is delivered again
+TASK_CLAIM_LIMIT = 500
+TASK_LEASE_SECONDS = 300
+
+# Attempts before a message is dead-lettered, and the first retry delay (doubling per attempt)
+MAX_TASK_ATTEMPTS = 5
+TASK_BACKOFF_SECONDS = 2.0
+
+TASK_RUNS = registry.counter(
+    "task_runs_total", "Task messages handled, by task and result (ok, retry, dead).", ("task", "result"),
+)
+TASK_SECONDS = registry.histogram(
+    "task_duration_seconds", "Time per task call (one batch of messages for batched tasks).", ("task",),
+)
+
+Message = Dict[str, Any]
+
+logger = logging.getLogger(__name__)
+
+
+class TaskFailed(Exception):
+    pass
+
+
+class Task:
+    """
+    A named unit of background work, registered with @task.
+    - Plain tasks are called with one message's payload as keyword arguments
+    - Batched tasks (batch_size > 1) are called with a list of payloads, so many small
+      messages cost one call; they return None, or one error (None on success) per payload
+    - An exception fails every message of the call
+    - `every` seconds, workers enqueue the task with an empty payload (a sweep)
+    """
+    def __init__(self, name: str, func: Callable, priority: str = DEFAULT, batch_size: int = 1,
+                 max_attempts: int = MAX_TASK_ATTEMPTS, backoff_seconds: float = TASK_BACKOFF_SECONDS,
+                 every: Optional[float] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.every = every
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def run(self, payloads: List[Dict[str, Any]]) -> List[Optional[str]]:
+        if self.batch_size > 1:
+            errors = self.func(payloads)
+            return list(errors) if errors is not None else [None] * len(payloads)
+        for payload in payloads:
+            self.func(**payload)
+        return [None] * len(payloads)
+
+    def delay(self, **payload) -> None:
+        enqueue(self.name, payload)
+
+
+TASKS: Dict[str, Task] = {}
+
+
+def task(name: str, priority: str = DEFAULT, batch_size: int = 1, max_attempts: int = MAX_TASK_ATTEMPTS,
+         backoff_seconds: float = TASK_BACKOFF_SECONDS, every: Optional[float] = None):
+    """Registers the decorated function as the task `name`; task modules are <app>/tasks.py."""
+    def decorator(func) -> Task:
+        TASKS[name] = Task(name, func, priority, batch_size, max_attempts, backoff_seconds, every)
+        return TASKS[name]
+    return decorator
+
+
+def autodiscover() -> None:
+    autodiscover_modules("tasks")
+
+
+def get_task(name: str) -> Task:
+    if name not in TASKS:
+        autodiscover()
+    try:
+        return TASKS[name]
+    except KeyError:
+        raise KeyError(f"No task registered as {name}") from None
+
+
+def _failed(message: Message, error: str) -> Message:
+    return dict(message, attempts=message["attempts"] + 1, error=error)
+
+
+def new_message(task: Task, payload: Dict[str, Any], priority: Optional[str] = None) -> Message:
+    priority = priority or task.priority
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+    return {"id": uuid.uuid4().hex, "task": task.name, "priority": priority, "payload": payload,
+            "attempts": 0, "error": ""}
+
+
+class LocalBroker:
+    """
+    In-process broker: the stand-in for RedisBroker in development and tests.
+    Same contract - a queue per priority, delayed messages, leases that redeliver
+    unacknowledged messages, a dead-letter list - but messages never leave the process.
+    """
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.ready: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self.scheduled: List[Tuple[float, int, Message]] = []
+        self.leased: Dict[str, Tuple[float, Message]] = {}
+        self.dead: List[Message] = []
+        self._seq = itertools.count()
+        self._changed = threading.Condition()
+
+    def publish(self, messages: Sequence[Message], delay: float = 0) -> None:
+        with self._changed:
+            for message in messages:
+                if delay > 0:
+                    heapq.heappush(self.scheduled, (self.clock() + delay, next(self._seq), message))
+                else:
+                    self.ready[message["priority"]].append(message)
+            self._changed.notify_all()
+
+    def _promote(self, now: float) -> None:
+        while self.scheduled and self.scheduled[0][0] <= now:
+            message = heapq.heappop(self.scheduled)[2]
+            self.ready[message["priority"]].append(message)
+        for message_id, (deadline, message) in list(self.leased.items()):
+            if deadline <= now:
+                del self.leased[message_id]
+                self.ready[message["priority"]].append(message)
+
+    def claim(self, limit: int, priorities: Sequence[str] = PRIORITIES,
+              lease_seconds: float = TASK_LEASE_SECONDS) -> List[Message]:
+        with self._changed:
+            now = self.clock()
+            self._promote(now)
+            claimed = []
+            for priority in priorities:
+                queue = self.ready[priority]
+                while queue and len(claimed) < limit:
+                    message = queue.popleft()
+                    self.leased[message["id"]] = (now + lease_seconds, message)
+                    claimed.append(message)
+            return claimed
+
+    def ack(self, messages: Sequence[Message]) -> None:
+        with self._changed:
+            for message in messages:
+                self.leased.pop(message["id"], None)
+
+    def retry(self, message: Message, error: str, delay: float) -> None:
+        self.ack([message])
+        self.publish([_failed(message, error)], delay)
+
+    def dead_letter(self, message: Message, error: str) -> None:
+        with self._changed:
+            self.leased.pop(message["id"], None)
+            self.dead.append(_failed(message, error))
+
+    def requeue_dead(self) -> int:
+        with self._changed:
+            dead, self.dead = self.dead, []
+        self.publish([dict(message, attempts=0) for message in dead])
+        return len(dead)
+
+    def wait(self, timeout: float) -> None:
+        """Returns when a message may be ready, or after `timeout` seconds."""
+        with self._changed:
+            if any(self.ready.values()):
+                return
+            if self.scheduled:
+                timeout = min(timeout, max(self.scheduled[0][0] - self.clock(), 0))
+            self._changed.wait(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._changed:
+            counts = {priority: len(queue) for priority, queue in self.ready.items()}
+            counts.update(scheduled=len(self.scheduled), leased=len(self.leased), dead=len(self.dead))
+            return counts
+
+    def purge(self) -> None:
+        with self._changed:
+            for queue in self.ready.values():
+                queue.clear()
+            self.scheduled.clear()
+            self.leased.clear()
+            self.dead.clear()
+
+
+# Moves due delayed messages and expired leases back onto their priority lists.
+# KEYS: scheduled zset, leased zset, one list per priority; ARGV: now, then the priority names
+_PROMOTE_SCRIPT = """
+local lists = {}
+for i = 2, #ARGV do lists[ARGV[i]] = KEYS[i + 1] end
+for k = 1, 2 do
+  for _, raw in ipairs(redis.call('ZRANGEBYSCORE', KEYS[k], '-inf', ARGV[1], 'LIMIT', 0, 1000)) do
+    redis.call('ZREM', KEYS[k], raw)
+    redis.call('RPUSH', lists[cjson.decode(raw)['priority']], raw)
+  end
+end
+"""
+
+# Pops up to ARGV[2] messages from the lists in KEYS[2..], in order, leasing each until ARGV[1]
+_CLAIM_SCRIPT = """
+local claimed = {}
+local limit = tonumber(ARGV[2])
+for i = 2, #KEYS do
+  while #claimed < limit do
+    local raw = redis.call('LPOP', KEYS[i])
+    if not raw then break end
+    redis.call('ZADD', KEYS[1], ARGV[1], raw)
+    claimed[#claimed + 1] = raw
+  end
+end
+return claimed
+"""
+
+
+def _encode(message: Message) -> str:
+    return json.dumps(message, sort_keys=True, separators=(",", ":"))
+
+
+class RedisBroker:
+    """
+    Broker shared by web and worker processes (TASK_BROKER_URL; requires the redis package).
+    - A list per priority, a sorted set of delayed messages scored by due time,
+      and a dead-letter list
+    - Claiming pops and leases in one Lua script, so a worker that dies mid-task
+      loses nothing: its leased messages are due again when the lease runs out
+    Messages are canonical JSON, so acknowledging removes the exact leased member.
+    """
+    def __init__(self, url: str, prefix: str = "tasks:", client=None, clock: Callable[[], float] = time.time):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.redis = client
+        self.clock = clock
+        self.scheduled_key = prefix + "scheduled"
+        self.leased_key = prefix + "leased"
+        self.dead_key = prefix + "dead"
+        self.list_keys = {priority: prefix + priority for priority in PRIORITIES}
+        self._promote = client.register_script(_PROMOTE_SCRIPT)
+        self._claim = client.register_script(_CLAIM_SCRIPT)
+
+    def publish(self, messages: Sequence[Message], delay: float = 0) -> None:
+        pipe = self.redis.pipeline()
+        for message in messages:
+            if delay > 0:
+                pipe.zadd(self.scheduled_key, {_encode(message): self.clock() + delay})
+            else:
+                pipe.rpush(self.list_keys[message["priority"]], _encode(message))
+        pipe.execute()
+
+    def claim(self, limit: int, priorities: Sequence[str] = PRIORITIES,
+              lease_seconds: float = TASK_LEASE_SECONDS) -> List[Message]:
+        now = self.clock()
+        self._promote(keys=[self.scheduled_key, self.leased_key, *self.list_keys.values()],
+                      args=[now, *self.list_keys])
+        raw = self._claim(keys=[self.leased_key, *(self.list_keys[p] for p in priorities)],
+                          args=[now + lease_seconds, limit])
+        return [json.loads(item) for item in raw]
+
+    def ack(self, messages: Sequence[Message]) -> None:
+        if messages:
+            self.redis.zrem(self.leased_key, *(_encode(m) for m in messages))
+
+    def retry(self, message: Message, error: str, delay: float) -> None:
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.leased_key, _encode(message))
+        pipe.zadd(self.scheduled_key, {_encode(_failed(message, error)): self.clock() + delay})
+        pipe.execute()
+
+    def dead_letter(self, message: Message, error: str) -> None:
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.leased_key, _encode(message))
+        pipe.rpush(self.dead_key, _encode(_failed(message, error)))
+        pipe.execute()
+
+    def requeue_dead(self) -> int:
+        requeued = 0
+        while True:
+            raw = self.redis.lpop(self.dead_key)
+            if raw is None:
+                return requeued
+            message = dict(json.loads(raw), attempts=0)
+            self.redis.rpush(self.list_keys[message["priority"]], _encode(message))
+            requeued += 1
+
+    def wait(self, timeout: float) -> None:
+        # Polls: a blocking pop would take the message out from under the claim script
+        time.sleep(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        pipe = self.redis.pipeline()
+        for key in self.list_keys.values():
+            pipe.llen(key)
+        pipe.zcard(self.scheduled_key)
+        pipe.zcard(self.leased_key)
+        pipe.llen(self.dead_key)
+        counts = pipe.execute()
+        return dict(zip((*self.list_keys, "scheduled", "leased", "dead"), counts))
+
+    def purge(self) -> None:
+        self.redis.delete(self.scheduled_key, self.leased_key, self.dead_key, *self.list_keys.values())
+
+
+class TaskWorker:
+    """
+    Runs task messages from a broker.
+    - Claims up to `limit` ready messages per round, higher priorities first, each under a lease
+    - Coalesces the messages of a batched task into calls of up to its batch_size
+    - Runs the calls on a thread pool (max_workers=0 runs them inline, for tests)
+    - Acknowledges successes; retries failures with exponential backoff, then dead-letters them
+    - Enqueues periodic tasks (Task.every) when they are due
+    Delivery is at least once: tasks must tolerate a repeated message. A slow LOW task holds
+    its round open, so latency-sensitive deployments run a worker per priority.
+    """
+    def __init__(self, broker=None, priorities: Sequence[str] = PRIORITIES, max_workers: int = 4,
+                 lease_seconds: float = TASK_LEASE_SECONDS, periodic: bool = True):
+        autodiscover()
+        self.broker = broker or get_broker()
+        self.priorities = tuple(priorities)
+        self.lease_seconds = lease_seconds
+        self.periodic = periodic
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="task") if max_workers else None
+        self._next_due: Dict[str, float] = {}
+
+    def enqueue_periodic(self) -> None:
+        now = time.monotonic()
+        for task in list(TASKS.values()):
+            if task.every is None or task.priority not in self.priorities:
+                continue
+            if now >= self._next_due.get(task.name, 0):
+                self._next_due[task.name] = now + task.every
+                self.broker.publish([new_message(task, {})])
+
+    def _call(self, task: Task, batch: List[Message]) -> List[Optional[str]]:
+        # Pool threads outlive requests, so they manage their connections as a request would
+        pooled = self.executor is not None
+        if pooled:
+            close_old_connections()
+        started = time.perf_counter()
+        try:
+            return task.run([m["payload"] for m in batch])
+        except Exception as e:
+            logger.warning("Task failed", exc_info=True, extra={"task": task.name, "messages": len(batch)})
+            return [str(e) or type(e).__name__] * len(batch)
+        finally:
+            TASK_SECONDS.observe(time.perf_counter() - started, task.name)
+            if pooled:
+                close_old_connections()
+
+    def _settle(self, task: Optional[Task], batch: List[Message], errors: List[Optional[str]]) -> None:
+        done = []
+        for message, error in zip(batch, errors):
+            if error is None:
+                done.append(message)
+                continue
+            attempts = message["attempts"] + 1
+            if task is None or attempts >= task.max_attempts:
+                self.broker.dead_letter(message, error)
+                TASK_RUNS.inc(message["task"], "dead")
+                logger.error("Task dead-lettered", extra={
+                    "task": message["task"], "message_id": message["id"], "attempts": attempts, "error": error,
+                })
+            else:
+                self.broker.retry(message, error, task.backoff_seconds * 2 ** (attempts - 1))
+                TASK_RUNS.inc(message["task"], "retry")
+        self.broker.ack(done)
+        if done:
+            TASK_RUNS.inc(task.name, "ok", amount=len(done))
+
+    def run_once(self, limit: int = TASK_CLAIM_LIMIT) -> int:
+        """Runs up to `limit` ready messages and returns how many were claimed."""
+        if self.periodic:
+            self.enqueue_periodic()
+        claimed = self.broker.claim(limit, self.priorities, self.lease_seconds)
+        by_task: Dict[str, List[Message]] = {}
+        for message in claimed:
+            by_task.setdefault(message["task"], []).append(message)
+        calls = []
+        for name, messages in by_task.items():
+            task = TASKS.get(name)
+            if task is None:
+                self._settle(None, messages, [f"no task registered as {name}"] * len(messages))
+                continue
+            for start in range(0, len(messages), task.batch_size):
+                calls.append((task, messages[start:start + task.batch_size]))
+        if self.executor is None:
+            results = [self._call(task, batch) for task, batch in calls]
+        else:
+            futures = [self.executor.submit(self._call, task, batch) for task, batch in calls]
+            results = [future.result() for future in futures]
+        for (task, batch), errors in zip(calls, results):
+            self._settle(task, batch, errors)
+        return len(claimed)
+
+    def run(self, stop: Optional[threading.Event] = None, limit: int = TASK_CLAIM_LIMIT,
+            interval: float = 1.0) -> int:
+        """Works until `stop` is set, waiting on the broker between empty rounds; returns messages claimed."""
+        stop = stop or threading.Event()
+        total = 0
+        while not stop.is_set():
+            if self.executor is None:
+                close_old_connections()
+            claimed = self.run_once(limit)
+            total += claimed
+            if not claimed:
+                self.broker.wait(interval)
+        return total
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker: Redis when TASK_BROKER_URL is set, else a LocalBroker."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = RedisBroker(settings.TASK_BROKER_URL) if settings.TASK_BROKER_URL else LocalBroker()
+        return _broker
+
+
+def _run_eager(task: Task, payload: Dict[str, Any]) -> None:
+    error = task.run([payload])[0]
+    if error is not None:
+        raise TaskFailed(f"{task.name}: {error}")
+
+
+def enqueue(name: str, payload: Optional[Dict[str, Any]] = None, priority: Optional[str] = None,
+            delay: float = 0) -> None:
+    """
+    Queues the task `name` once the caller's transaction commits (at once outside one),
+    so a worker never sees work for rows that were rolled back. With TASKS_EAGER the
+    task runs inline at that point instead, and a failure raises TaskFailed.
+    """
+    task = get_task(name)
+    payload = payload or {}
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: _run_eager(task, payload))
+        return
+    message = new_message(task, payload, priority)
+    transaction.on_commit(lambda: get_broker().publish([message], delay))
+
+
+def outbox_handlers() -> Dict[str, Callable[[List[Dict[str, Any]]], List[Optional[str]]]]:
+    """
+    For Core.outbox.OutboxRelay: each task is a topic, and relaying a message queues it
+    on the shared broker. With TASKS_EAGER, or when the broker is the in-memory LocalBroker,
+    the relay runs the task there and then: a message handed to memory would be lost on
+    restart after its outbox row was marked published, so the row stays pending until the
+    task itself succeeds.
+    """
+    autodiscover()
+
+    def publisher(task: Task):
+        def publish(payloads: List[Dict[str, Any]]) -> List[Optional[str]]:
+            if settings.TASKS_EAGER or isinstance(get_broker(), LocalBroker):
+                return task.run(payloads)
+            get_broker().publish([new_message(task, payload) for payload in payloads])
+            return [None] * len(payloads)
+        return publish
+    return {name: publisher(task) for name, task in TASKS.items()}
+
+
+_local_worker: Optional[threading.Thread] = None
+
+
+def start_local_workers() -> None:
+    """
+    Serving processes without a shared broker work their own LocalBroker from a background
+    thread, so development needs no Redis. With TASK_BROKER_URL set this does nothing:
+    the run_tasks workers own the queue.
+    """
+    global _local_worker
+    broker = get_broker()
+    if not isinstance(broker, LocalBroker) or settings.TASKS_EAGER or not settings.TASK_LOCAL_WORKERS:
+        return
+    with _broker_lock:
+        if _local_worker is not None and _local_worker.is_alive():
+            return
+        worker = TaskWorker(broker, max_workers=settings.TASK_LOCAL_WORKERS)
+        _local_worker = threading.Thread(target=worker.run, name="task-worker", daemon=True)
+        _local_worker.start()
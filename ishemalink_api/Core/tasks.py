@@ -0,0 +1,41 @@
+import threading
+from typing import Any, Dict, List, Optional
+from Core import taskqueue
+from Core.booking_service import APPLY_WEBHOOKS_TASK, PAYMENT_INITIATE_TOPIC, WEBHOOK_BATCH_SIZE
+from Core.outbox import OUTBOX_BATCH_SIZE, OUTBOX_CLAIM_LIMIT, OutboxRelay
+from Core.services import booking_service
+
+# Hands committed outbox messages to the broker; the outbox stays the durable record
+RELAY_OUTBOX_TASK = "outbox.relay"
+
+_relay: Optional[OutboxRelay] = None
+_relay_lock = threading.Lock()
+
+
+def get_relay() -> OutboxRelay:
+    global _relay
+    with _relay_lock:
+        if _relay is None:
+            # Without a shared broker the relay runs the gateway calls itself, on its own pool
+            _relay = OutboxRelay(taskqueue.outbox_handlers())
+        return _relay
+
+
+@taskqueue.task(RELAY_OUTBOX_TASK, priority=taskqueue.HIGH, batch_size=100, every=1.0)
+def relay_outbox(payloads: List[Dict[str, Any]]) -> None:
+    relay = get_relay()
+    while relay.run_once(OUTBOX_CLAIM_LIMIT) == OUTBOX_CLAIM_LIMIT:
+        pass
+
+
+@taskqueue.task(PAYMENT_INITIATE_TOPIC, priority=taskqueue.HIGH, batch_size=OUTBOX_BATCH_SIZE)
+def initiate_payments(payloads: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """One gateway round-trip per batch of prompts; a failed prompt is retried on its own."""
+    return booking_service.publish_payment_requests(payloads)
+
+
+@taskqueue.task(APPLY_WEBHOOKS_TASK, priority=taskqueue.HIGH, batch_size=1000, every=30.0)
+def apply_webhooks(payloads: List[Dict[str, Any]]) -> None:
+    """Settles paid shipments and claims their drivers; one drain covers every webhook in the batch."""
+    while booking_service.drain_webhook_inbox(WEBHOOK_BATCH_SIZE) == WEBHOOK_BATCH_SIZE:
+        pass
@@ -1,7 +1,41 @@
-from django.test import TestCase, Client
-from Core.models import Driver, Shipment
+import asyncio
+import csv
+import gzip
+import importlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+from django.apps import apps as django_apps
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.utils import timezone
+from django.db import connection, transaction
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from Core import caching, counters, metrics, outbox, reconciliation, state_machine, tariffs, taskqueue, tasks
+from Core.logs import JsonFormatter, SampleFilter
+from Core.middleware import MetricsMiddleware
+from Core.models import DashboardCounter, Driver, OutboxMessage, Shipment, ShipmentTransition, PaymentWebhook, TariffTable
+from Core.services import booking_service
+from Core.booking_service import PAYMENT_INITIATE_TOPIC, BookingService
+from Core.dispatch import DispatchEngine, CapacityAwareStrategy, NearestStrategy
+from Core import views as core_views
+from Core.profiling import QueryBudgetExceeded, QueryBudgetMixin, assert_query_budget, query_shape
+from payments import MomoMock
+from gov.middleware import AuditMiddleware
+from notifications import NotificationEngine
+from notifications.models import Notification
+from gov.models import EbmReceipt
+from tracking.store import Position, positions
 
-class BookingFlowTest(TestCase):
+class BookingFlowTest(QueryBudgetMixin, TestCase):
     def setUp(self):
         self.client = Client()
         Driver.objects.create(name="Test Driver", phone_number="0780000000", license_number="RWA12345", is_available=True)
@@ -20,6 +54,870 @@ class BookingFlowTest(TestCase):
             "status": "success"
         }, content_type="application/json")
         self.assertEqual(response2.status_code, 200)
+        # The webhook is only recorded on the request path; a worker applies it
+        booking_service.drain_webhook_inbox()
         shipment = Shipment.objects.get(id=shipment_id)
         self.assertEqual(shipment.status, "confirmed")
         self.assertIsNotNone(shipment.assigned_driver)
+
+
+class BulkBookingTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def test_bulk_json_array_returns_per_row_results(self):
+        rows = [
+            {"type": "domestic", "weight": 2, "phone_number": "0781111111"},
+            {"type": "cargo-ship", "weight": 1},
+            {"type": "international", "weight": 3, "phone_number": "0782222222"},
+        ]
+        response = self.client.post("/api/shipments/bulk/", data=rows, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body["created"], 2)
+        self.assertEqual(body["rejected"], 1)
+        results = body["results"]
+        self.assertEqual([r["row"] for r in results], [0, 1, 2])
+        self.assertEqual(results[1]["status"], "rejected")
+        self.assertEqual(results[0]["tariff"], 2000)
+        self.assertEqual(results[2]["tariff"], 9000)
+        self.assertEqual(results[2]["payment"], {"status": "queued", "reference": str(results[2]["shipment_id"])})
+        self.assertEqual(OutboxMessage.objects.filter(topic=PAYMENT_INITIATE_TOPIC).count(), 2)
+
+    def test_bulk_ndjson_uses_constant_queries(self):
+        rows = "\n".join('{"type": "domestic", "weight": %d}' % (i + 1) for i in range(50))
+        # SAVEPOINT + one multi-row shipment INSERT + one outbox INSERT + RELEASE, regardless of row count
+        with self.assertNumQueries(4):
+            response = self.client.post("/api/shipments/bulk/", data=rows, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 50)
+        self.assertEqual(Shipment.objects.count(), 50)
+
+
+class DispatchStrategyTest(TestCase):
+    def test_capacity_aware_picks_smallest_truck_that_fits(self):
+        Driver.objects.create(name="Small", phone_number="1", license_number="RWA1", capacity_kg=500)
+        fit = Driver.objects.create(name="Medium", phone_number="2", license_number="RWA2", capacity_kg=2000)
+        Driver.objects.create(name="Large", phone_number="3", license_number="RWA3", capacity_kg=10000)
+        shipment = Shipment.objects.create(shipment_type="domestic", weight=1500, phone_number="078")
+        driver = DispatchEngine(CapacityAwareStrategy()).claim_driver(shipment)
+        self.assertEqual(driver.pk, fit.pk)
+        self.assertFalse(Driver.objects.get(pk=fit.pk).is_available)
+
+    def test_nearest_picks_closest_driver(self):
+        Driver.objects.create(name="Huye", phone_number="1", license_number="RWA1", latitude=-2.60, longitude=29.74)
+        near = Driver.objects.create(name="Kigali", phone_number="2", license_number="RWA2", latitude=-1.95, longitude=30.06)
+        shipment = Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="078",
+                                           pickup_latitude=-1.94, pickup_longitude=30.05)
+        driver = DispatchEngine(NearestStrategy()).claim_driver(shipment)
+        self.assertEqual(driver.pk, near.pk)
+
+    def test_nearest_falls_back_to_the_whole_pool_outside_the_search_box(self):
+        Driver.objects.create(name="Unknown", phone_number="1", license_number="RWA1")
+        huye = Driver.objects.create(name="Huye", phone_number="2", license_number="RWA2", latitude=-2.60, longitude=29.74)
+        Driver.objects.create(name="Gisenyi", phone_number="3", license_number="RWA3", latitude=-1.70, longitude=29.26)
+        # Rusizi: no driver within the ~55 km box
+        shipment = Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="078",
+                                           pickup_latitude=-2.48, pickup_longitude=28.90)
+        engine = DispatchEngine(NearestStrategy())
+        self.assertEqual(engine.claim_driver(shipment).pk, huye.pk)
+        self.assertEqual(engine.claim_driver(shipment).name, "Gisenyi")
+        # Drivers with no known position are still used, last
+        self.assertEqual(engine.claim_driver(shipment).name, "Unknown")
+
+
+class DispatchConcurrencyTest(TransactionTestCase):
+    callbacks = 20
+    drivers = 5
+
+    def _callback(self, service, shipment_id):
+        try:
+            service.handle_payment_callback({"transaction_id": f"MOCK-{shipment_id}", "status": "success"})
+        finally:
+            connection.close()
+
+    def test_parallel_callbacks_never_double_book_a_driver(self):
+        for i in range(self.drivers):
+            Driver.objects.create(name=f"Driver {i}", phone_number=f"07800000{i}", license_number=f"RWA{i}")
+        shipment_ids = [
+            Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="0781234567").id
+            for _ in range(self.callbacks)
+        ]
+        service = BookingService(MomoMock(), NotificationEngine())
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda sid: self._callback(service, sid), shipment_ids))
+
+        assigned = list(Shipment.objects.exclude(assigned_driver=None).values_list("assigned_driver_id", flat=True))
+        self.assertEqual(len(assigned), len(set(assigned)))
+        self.assertEqual(len(assigned), self.drivers)
+        self.assertEqual(Shipment.objects.filter(status="confirmed").count(), self.drivers)
+        self.assertEqual(Shipment.objects.filter(status="confirmed_no_driver").count(), self.callbacks - self.drivers)
+        self.assertFalse(Driver.objects.filter(is_available=True).exists())
+
+
+class RecordingNotifier(NotificationEngine):
+    def __init__(self):
+        self.sent = []
+
+    def send_sms(self, phone_number, message):
+        self.sent.append(("sms", phone_number))
+
+    def send_email(self, email, subject, body):
+        self.sent.append(("email", email))
+
+
+class WebhookInboxTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.notifier = RecordingNotifier()
+        self.service = BookingService(MomoMock(), self.notifier)
+        Driver.objects.create(name="Test Driver", phone_number="0780000000", license_number="RWA12345")
+        self.shipment = Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="0781234567")
+
+    def test_replayed_webhooks_are_applied_once(self):
+        payload = {"transaction_id": f"MOCK-{self.shipment.id}", "status": "success"}
+        for _ in range(5):
+            response = self.client.post("/api/payments/webhook/", data=payload, content_type="application/json")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(PaymentWebhook.objects.count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.service.drain_webhook_inbox(), 1)
+        self.assertEqual(self.service.drain_webhook_inbox(), 0)
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.status, "confirmed")
+        self.assertEqual(self.notifier.sent, [("sms", "0781234567"), ("email", "exporter@example.com")])
+
+    def test_webhook_without_transaction_id_is_rejected(self):
+        response = self.client.post("/api/payments/webhook/", data={"status": "success"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentWebhook.objects.exists())
+
+
+class DashboardCounterTest(QueryBudgetMixin, TestCase):
+    def test_counters_follow_bookings_and_reconcile(self):
+        client = Client()
+        Driver.objects.create(name="A", phone_number="0780000001", license_number="RWA1")
+        Driver.objects.create(name="B", phone_number="0780000002", license_number="RWA2")
+        self.assertEqual(counters.snapshot()["available_drivers"], 2)
+
+        shipment = Shipment.objects.create(shipment_type="domestic", weight=3, tariff=3000, phone_number="078")
+        booking_service.handle_payment_callback({"transaction_id": f"MOCK-{shipment.id}", "status": "success"})
+        with self.assertNumQueries(1):
+            summary = client.get("/dashboard/summary/").json()
+        self.assertEqual(
+            (summary["active_trucks"], summary["total_revenue"], summary["available_drivers"]),
+            (1, 3000, 1)
+        )
+        self.assertIsNotNone(summary["as_of"])
+
+        # Drift introduced behind the counters' back is repaired by reconciliation
+        Driver.objects.filter(is_available=False).update(is_available=True)
+        self.assertEqual(counters.reconcile()["available_drivers"], 1)
+        self.assertEqual(counters.snapshot()["available_drivers"], 2)
+        self.assertEqual(client.get("/dashboard/").status_code, 200)
+
+    def test_migration_reseeds_counters_seeded_with_confirmed_only(self):
+        for status, tariff in (("confirmed", 1000), ("in_transit", 2000), ("delivered", 4000)):
+            Shipment.objects.create(shipment_type="domestic", weight=1, tariff=tariff, phone_number="078", status=status)
+        # What 0005 seeded: only confirmed shipments counted
+        DashboardCounter.objects.filter(key=counters.ACTIVE_TRUCKS, shard=0).update(value=1)
+        DashboardCounter.objects.filter(key=counters.TOTAL_REVENUE, shard=0).update(value=1000)
+        DashboardCounter.objects.filter(shard=3).update(value=5)
+        reseed = importlib.import_module("Core.migrations.0011_reseed_dashboard_counters").reseed_counters
+        reseed(django_apps, None)
+        snapshot = counters.snapshot()
+        self.assertEqual((snapshot["active_trucks"], snapshot["total_revenue"]), (2, 7000))
+        self.assertEqual(set(counters.reconcile().values()), {0})
+
+
+class TariffEngineTest(TestCase):
+    rates = {
+        "base_per_kg": {"domestic": 1000, "international": 3000},
+        "weight_bands": [[100, 1.0], [1000, 0.9], [None, 0.8]],
+        "per_km": {"domestic": 10, "international": 20},
+        "route_km": {"Kigali - Musanze": 95},
+        "commodity_surcharge": {"Electronics": 0.5},
+        "border_fee": {"*": 10000, "Kampala": 25000},
+    }
+
+    def setUp(self):
+        self.addCleanup(tariffs.invalidate)
+
+    def test_default_table_keeps_flat_pricing(self):
+        engine = tariffs.TariffEngine(tariffs.DEFAULT_RATES)
+        self.assertEqual(engine.quote("domestic", 2), 2000)
+        self.assertEqual(engine.quote("international", 3), 9000)
+
+    def test_batch_matches_scalar(self):
+        engine = tariffs.TariffEngine(self.rates, "t1")
+        rows = [
+            ("domestic", 100, "Kigali", "Musanze", "Electronics"),
+            ("domestic", 500, "Kigali", "Huye", ""),
+            ("international", 2000, "Kigali", "Kampala", "Beans"),
+            ("international", 10, "Kigali", "Goma", "Electronics"),
+        ]
+        batch = engine.quote_batch(*zip(*rows)).tolist()
+        self.assertEqual(batch, [engine.quote(*row) for row in rows])
+        self.assertEqual(batch[0], 100 * 1000 * 1.5 + 10 * 95)
+        self.assertEqual(batch[2], 2000 * 3000 * 0.8 + 25000)
+        with self.assertRaises(ValueError):
+            engine.quote_batch(["rail"], [1])
+
+    def test_activating_a_table_reprices_new_bookings(self):
+        self.assertEqual(booking_service.create_shipment({"weight": 2})["tariff"], 2000)
+        TariffTable.objects.create(version="2026-10", rates=self.rates)
+        result = booking_service.create_shipment({"weight": 2, "commodity": "Electronics"})
+        self.assertEqual(result["tariff"], 3000)
+        self.assertEqual(Shipment.objects.get(id=result["shipment_id"]).tariff_version, "2026-10")
+
+
+class ShipmentListingTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.driver = Driver.objects.create(name="D", phone_number="078", license_number="RWA-1")
+        Shipment.objects.bulk_create([
+            Shipment(shipment_type="international" if i % 3 == 0 else "domestic", weight=i + 1,
+                     phone_number="078", status="confirmed" if i % 2 else "pending_payment",
+                     assigned_driver=self.driver if i % 4 == 0 else None)
+            for i in range(25)
+        ])
+        # Identical timestamps: the id tie-breaker must still give a stable order
+        Shipment.objects.filter(id__lte=Shipment.objects.order_by("id")[9].id).update(
+            created_at=Shipment.objects.order_by("id").first().created_at
+        )
+
+    def _pages(self, params):
+        ids, cursor = [], None
+        while True:
+            page = self.client.get("/api/shipments/", {**params, **({"cursor": cursor} if cursor else {})}).json()
+            ids.extend(s["id"] for s in page["shipments"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_cursor_pages_cover_every_row_once_in_order(self):
+        expected = list(Shipment.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(self._pages({"limit": 4}), expected)
+
+    def test_deep_pages_seek_instead_of_offset(self):
+        first = self.client.get("/api/shipments/", {"limit": 20}).json()
+        with self.assertNumQueries(1) as queries:
+            self.client.get("/api/shipments/", {"limit": 20, "cursor": first["next_cursor"]})
+        self.assertNotIn("OFFSET", queries.captured_queries[0]["sql"].upper())
+
+    def test_filters_and_sparse_fields(self):
+        rows = self.client.get("/api/shipments/", {
+            "status": "confirmed", "type": "domestic", "fields": "status,weight", "limit": 100,
+        }).json()["shipments"]
+        expected = Shipment.objects.filter(status="confirmed", shipment_type="domestic").count()
+        self.assertEqual(len(rows), expected)
+        self.assertEqual(set(rows[0]), {"id", "created_at", "status", "weight"})
+
+        driven = self._pages({"driver": self.driver.id, "limit": 2})
+        self.assertEqual(len(driven), Shipment.objects.filter(assigned_driver=self.driver).count())
+        self.assertEqual(len(self._pages({"driver": "none"})), 25 - len(driven))
+
+    def test_invalid_parameters(self):
+        for params in ({"fields": "secret"}, {"limit": 0}, {"cursor": "x"}, {"driver": "abc"}, {"from": "soon"}):
+            self.assertEqual(self.client.get("/api/shipments/", params).status_code, 400, params)
+
+
+class ShipmentStateMachineTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.driver = Driver.objects.create(name="D", phone_number="078", license_number="RWA-1", is_available=False)
+        self.shipment = Shipment.objects.create(
+            shipment_type="domestic", weight=1, phone_number="078", status="confirmed", tariff=1000,
+            assigned_driver=self.driver,
+        )
+        counters.reconcile()
+
+    def test_transition_bumps_version_and_records_history(self):
+        state_machine.transition(self.shipment, "in_transit", actor="ops", reason="picked up")
+        self.assertEqual((self.shipment.status, self.shipment.version), ("in_transit", 1))
+        with self.assertRaises(state_machine.InvalidTransition):
+            state_machine.transition(self.shipment, "pending_payment")
+        state_machine.transition(self.shipment, "delivered")
+        self.shipment.refresh_from_db()
+        self.driver.refresh_from_db()
+        self.assertEqual((self.shipment.status, self.shipment.version), ("delivered", 2))
+        self.assertTrue(self.driver.is_available)
+        self.assertEqual(
+            [(h["from_status"], h["to_status"], h["version"]) for h in state_machine.history(self.shipment.id)],
+            [("confirmed", "in_transit", 1), ("in_transit", "delivered", 2)],
+        )
+        # Delivered keeps its revenue but no longer occupies a truck
+        snapshot = counters.snapshot()
+        self.assertEqual((snapshot["active_trucks"], snapshot["total_revenue"]), (0, 1000))
+        self.assertEqual(snapshot["available_drivers"], 1)
+        self.assertEqual(set(counters.reconcile().values()), {0})
+
+    def test_stale_version_is_rejected(self):
+        stale = Shipment.objects.get(id=self.shipment.id)
+        state_machine.transition(self.shipment, "in_transit")
+        with self.assertRaises(state_machine.StaleShipment):
+            state_machine.transition(stale, "cancelled")
+        self.assertEqual(Shipment.objects.get(id=self.shipment.id).status, "in_transit")
+        self.assertEqual(ShipmentTransition.objects.count(), 1)
+
+    def test_bulk_transition_moves_matching_shipments_only(self):
+        others = Shipment.objects.bulk_create([
+            Shipment(shipment_type="domestic", weight=1, phone_number="078", status="confirmed", tariff=10)
+            for _ in range(30)
+        ])
+        ids = [self.shipment.id] + [s.id for s in others]
+        Shipment.objects.filter(id=ids[-1]).update(status="pending_payment")
+        counters.reconcile()
+        # Per chunk: locking SELECT, one UPDATE, one history INSERT (counters do not move here)
+        with self.assertNumQueries(10):
+            result = state_machine.bulk_transition(ids, "confirmed", "in_transit", actor="ops", chunk_size=20)
+        self.assertEqual(result, {"moved": 30, "skipped": [ids[-1]]})
+        self.assertEqual(Shipment.objects.filter(status="in_transit", version=1).count(), 30)
+        self.assertEqual(ShipmentTransition.objects.filter(to_status="in_transit").count(), 30)
+        self.assertEqual(set(counters.reconcile().values()), {0})
+
+    def test_transition_api(self):
+        url = f"/api/shipments/{self.shipment.id}/transitions/"
+        response = self.client.post(url, {"status": "in_transit", "version": 0}, content_type="application/json")
+        self.assertEqual(response.json(), {"shipment_id": self.shipment.id, "status": "in_transit", "version": 1})
+        # Replaying the same request carries an outdated version
+        response = self.client.post(url, {"status": "delivered", "version": 0}, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.post(url, {"status": "confirmed"}, content_type="application/json").status_code, 409)
+        self.assertEqual(self.client.post(url, {"status": "lost"}, content_type="application/json").status_code, 400)
+        body = self.client.get(url).json()
+        self.assertEqual((body["status"], body["version"], body["allowed"]), ("in_transit", 1, ["delivered", "returned"]))
+        self.assertEqual(len(body["history"]), 1)
+        response = self.client.post("/api/shipments/transitions/", {
+            "shipment_ids": [self.shipment.id], "from": "in_transit", "to": "delivered",
+        }, content_type="application/json")
+        self.assertEqual(response.json(), {"moved": 1, "skipped": []})
+        self.assertEqual(self.client.get("/api/shipments/999999/transitions/").status_code, 404)
+
+
+class RecordingGateway(MomoMock):
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def initiate_payments(self, payments):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("gateway timeout")
+        self.batches.append(payments)
+        return super().initiate_payments(payments)
+
+
+class PaymentOutboxTest(TestCase):
+    def setUp(self):
+        self.gateway = RecordingGateway()
+        self.service = BookingService(self.gateway, NotificationEngine())
+
+    def _relay(self, **kwargs):
+        relay = outbox.OutboxRelay(self.service.outbox_handlers(), **kwargs)
+        self.addCleanup(relay.close)
+        return relay
+
+    def test_payment_is_requested_only_after_commit(self):
+        result = self.service.create_shipment({"weight": 2, "phone_number": "0781234567"})
+        self.assertEqual(self.gateway.batches, [])
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.service.create_shipment({"weight": 3})
+            raise RuntimeError("booking rolled back")
+        # The rolled-back booking took its outbox message with it
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(self._relay().run_once(), 1)
+        self.assertEqual(self.gateway.batches, [[{
+            "amount": result["tariff"], "phone_number": "0781234567", "reference": str(result["shipment_id"]),
+        }]])
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ("published", 1))
+        self.assertEqual(self._relay().run_once(), 0)
+
+    def test_relay_batches_per_topic_and_retries(self):
+        self.service.create_shipments_bulk([{"weight": i + 1} for i in range(5)])
+        self.gateway.failures = 1
+        relay = self._relay(batch_size=2, backoff_seconds=0)
+        self.assertEqual(relay.run_once(), 5)
+        # One of the three batches hit the timeout and is due again immediately
+        self.assertEqual(OutboxMessage.objects.filter(status="pending", attempts=1).exclude(last_error="").count(), 2)
+        self.assertEqual(relay.run_once(), 2)
+        self.assertEqual(OutboxMessage.objects.filter(status="published").count(), 5)
+        self.assertEqual(sorted(len(b) for b in self.gateway.batches), [1, 2, 2])
+
+    def test_unroutable_messages_are_parked_after_max_attempts(self):
+        outbox.enqueue("unknown.topic", {"x": 1})
+        relay = self._relay(max_attempts=2, backoff_seconds=0)
+        relay.run_once()
+        relay.run_once()
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ("failed", 2))
+        self.assertEqual(relay.run_once(), 0)
+
+    def test_provider_callbacks_are_matched_by_reference(self):
+        result = self.service.create_shipment({"weight": 2, "phone_number": "0731234567"})
+        self.service.handle_payment_callback({
+            "transaction_id": "AIRTEL-TX-9", "reference": str(result["shipment_id"]), "status": "failed",
+        })
+        self.assertEqual(Shipment.objects.get(id=result["shipment_id"]).status, "payment_failed")
+
+    def test_claimed_messages_are_leased(self):
+        outbox.enqueue(PAYMENT_INITIATE_TOPIC, {"amount": 1, "phone_number": "078", "reference": "1"})
+        self.assertEqual(len(self._relay().claim(10)), 1)
+        # A second relay does not pick up a message another relay is publishing
+        self.assertEqual(self._relay().claim(10), [])
+
+
+class PaymentReconciliationTest(TestCase):
+    def setUp(self):
+        Driver.objects.create(name="D", phone_number="078", license_number="RWA-1")
+        self.pending, self.failing, self.matched, self.short, self.reopened = Shipment.objects.bulk_create([
+            Shipment(shipment_type="domestic", weight=1, phone_number="078", tariff=1000, status=status)
+            for status in ("pending_payment", "pending_payment", "confirmed", "confirmed", "payment_failed")
+        ])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _statement(self, name, lines):
+        path = os.path.join(self.tmp.name, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8", newline="") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def test_mismatches_are_reported_and_corrected(self):
+        row = lambda s, tx, amount, status: json.dumps(
+            {"reference": str(s), "transaction_id": tx, "amount": amount, "status": status})
+        statement = self._statement("momo.jsonl", [
+            row(self.pending.id, "TX1", 1000, "SUCCESSFUL"),
+            row(self.failing.id, "TX2", 1000, "FAILED"),
+            row(self.matched.id, "TX3", 1000, "SUCCESSFUL"),
+            row(self.matched.id, "TX3b", 1000, "SUCCESSFUL"),
+            row(self.short.id, "TX4", 600, "SUCCESSFUL"),
+            row(self.reopened.id, "TX5", 1000, "SUCCESSFUL"),
+            row(999999, "TX6", 1000, "SUCCESSFUL"),
+            "not json",
+        ])
+        report = os.path.join(self.tmp.name, "report.csv")
+        out = StringIO()
+        call_command("reconcile_payments", statement, "--report", report, "--apply", stdout=out)
+        with open(report, newline="") as f:
+            kinds = {(r["kind"], r["reference"]) for r in csv.DictReader(f)}
+        self.assertEqual(kinds, {
+            ("missed_payment", str(self.pending.id)), ("missed_failure", str(self.failing.id)),
+            ("duplicate_payment", str(self.matched.id)), ("amount_mismatch", str(self.short.id)),
+            ("missed_payment", str(self.reopened.id)), ("unknown_reference", "999999"), ("unparseable", ""),
+        })
+        self.assertIn("missed_payment: 2", out.getvalue())
+        statuses = dict(Shipment.objects.values_list("id", "status"))
+        self.assertEqual(statuses[self.pending.id], "confirmed")
+        self.assertEqual(statuses[self.failing.id], "payment_failed")
+        self.assertEqual(statuses[self.reopened.id], "confirmed_no_driver")
+        self.assertEqual(statuses[self.short.id], "confirmed")
+        # A re-run finds nothing left to correct, and the late real webhook is a no-op duplicate
+        counts = reconciliation.run(statement, reconciliation.build_index(), apply=True)
+        self.assertNotIn("missed_payment", counts)
+        self.assertEqual(PaymentWebhook.objects.filter(transaction_id="TX1").count(), 1)
+
+    def test_settlement_reusing_the_failure_transaction_id_is_not_dropped(self):
+        # The failure webhook for this shipment is already in the inbox under the same provider id
+        PaymentWebhook.objects.create(transaction_id=f"MOCK-{self.reopened.id}", processed_at=timezone.now(), payload={
+            "transaction_id": f"MOCK-{self.reopened.id}", "reference": str(self.reopened.id), "status": "failed",
+        })
+        statement = self._statement("momo.jsonl", [json.dumps({
+            "reference": str(self.reopened.id), "transaction_id": f"MOCK-{self.reopened.id}", "amount": 1000,
+            "status": "SUCCESSFUL",
+        })])
+        call_command("reconcile_payments", statement, "--apply", stdout=StringIO())
+        self.assertEqual(Shipment.objects.get(pk=self.reopened.id).status, "confirmed")
+        self.assertTrue(PaymentWebhook.objects.filter(transaction_id__startswith="RECON-").exists())
+
+    def test_provider_csv_exports_are_streamed(self):
+        statement = self._statement("mtn.csv.gz", [
+            "Financial Transaction Id,External Id,Amount,Currency,Status",
+            f'FT1,{self.pending.id},"1,000",RWF,SUCCESSFUL',
+            f"FT2,{self.matched.id},1000,RWF,SUCCESSFUL",
+        ])
+        rows = list(reconciliation.parse_rows(reconciliation.read_statement(statement)))
+        self.assertEqual(rows[0], reconciliation.StatementRow(2, str(self.pending.id), "FT1", 1000.0, "success"))
+        mismatches = list(reconciliation.reconcile(rows, reconciliation.build_index()))
+        self.assertEqual([m.kind for m in mismatches], ["missed_payment"])
+
+
+class MetricsTest(TestCase):
+    def _scrape(self):
+        response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def test_requests_and_booking_operations_are_exported_per_route(self):
+        route = 'route="api/shipments/create/"'
+        before = metrics.REQUESTS.samples().get(("api/shipments/create/", "POST", "201"), 0)
+        response = self.client.post("/api/shipments/create/", data={"type": "domestic", "weight": 2},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        body = self._scrape()
+        self.assertIn(f'http_requests_total{{{route},method="POST",status="201"}} {before + 1:g}', body)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{route},method="POST",le="+Inf"}}', body)
+        self.assertIn('booking_operation_duration_seconds_count{operation="create_shipment",outcome="ok"}', body)
+        # The booking's INSERTs were counted, against the pattern rather than the raw path
+        counts, _ = metrics.DB_QUERIES.samples()[("api/shipments/create/",)]
+        self.assertEqual(counts[0], 0)
+        self.client.get("/api/shipments/12345/transitions/")
+        self.assertIn(("api/shipments/<int:shipment_id>/transitions/", "GET", "404"), metrics.REQUESTS.samples())
+
+    def test_worker_dumps_are_summed(self):
+        registry = metrics.Registry()
+        hits = registry.counter("hits_total", "Hits.", ("route",))
+        latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        hits.inc("a")
+        latency.observe(0.05)
+        latency.observe(0.5)
+        with tempfile.TemporaryDirectory() as tmp:
+            registry.dump(tmp)
+            # A second worker's dump
+            with open(os.path.join(tmp, "other.json"), "w") as f:
+                json.dump({"hits_total": [[["a"], 2.0]], "latency_seconds": [[[], [[0, 0, 1], 3.0]]]}, f)
+            body = registry.render(metrics.load_dumps(tmp))
+        self.assertIn('hits_total{route="a"} 3', body)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', body)
+        self.assertIn('latency_seconds_bucket{le="1"} 2', body)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', body)
+        self.assertIn("latency_seconds_sum 3.55", body)
+        with tempfile.TemporaryDirectory() as tmp, override_settings(METRICS_DIR=tmp):
+            self.assertIn("http_requests_total", self._scrape())
+            self.assertTrue(os.listdir(tmp))
+
+    def test_logs_are_json_and_sampled_below_warning(self):
+        record = logging.LogRecord("Core.booking_service", logging.INFO, __file__, 1, "Shipment %s", ("confirmed",),
+                                   None)
+        record.shipment_id = 7
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual((entry["level"], entry["message"], entry["shipment_id"]), ("INFO", "Shipment confirmed", 7))
+        drop_all = SampleFilter(rate=0.0)
+        self.assertFalse(drop_all.filter(record))
+        record.levelno = logging.WARNING
+        self.assertTrue(drop_all.filter(record))
+
+
+class AsgiStackTest(TestCase):
+    def test_middleware_stays_async_around_async_views(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(view)))
+        self.assertTrue(iscoroutinefunction(AuditMiddleware(view)))
+        self.assertFalse(iscoroutinefunction(MetricsMiddleware(lambda request: HttpResponse())))
+
+    async def test_async_views_are_served_and_their_queries_counted(self):
+        route = ("api/payments/webhook/",)
+        _, before = metrics.DB_QUERIES.samples().get(route, [None, 0])
+        response = await self.async_client.post("/api/payments/webhook/", {"transaction_id": "MOCK-1"},
+                                                content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await PaymentWebhook.objects.filter(transaction_id="MOCK-1").aexists())
+        # The INSERT ran on a sync_to_async thread and still counts against the route
+        _, after = metrics.DB_QUERIES.samples()[route]
+        self.assertEqual(after - before, 1)
+
+        booked = await self.async_client.post("/api/shipments/create/", {"type": "domestic", "weight": 3},
+                                              content_type="application/json")
+        self.assertEqual(booked.status_code, 201)
+        self.assertTrue(await Shipment.objects.filter(pk=booked.json()["shipment_id"]).aexists())
+
+
+class AsgiStreamingTest(TransactionTestCase):
+    """Streams are read through Django's ASGI handler, as uvicorn serves them."""
+
+    async def _first_chunk(self, path):
+        incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+        await incoming.put({"type": "http.request", "body": b"", "more_body": False})
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "raw_path": path.encode(), "query_string": b"", "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+        }
+        task = asyncio.ensure_future(ASGIHandler()(scope, incoming.get, outgoing.put))
+        start = await asyncio.wait_for(outgoing.get(), 2)
+        body = await asyncio.wait_for(outgoing.get(), 2)
+        await incoming.put({"type": "http.disconnect"})
+        await asyncio.wait_for(task, 5)
+        return start, body
+
+    def test_sse_sends_the_latest_position_while_the_stream_is_open(self):
+        positions.append_many([(4242, Position(-1.95, 30.06, 1.0))])
+        self.addCleanup(positions.forget, 4242)
+        # Bounded so a stream that buffers to the end fails the test instead of hanging it
+        with mock.patch.object(core_views, "TRACKING_STREAM_MAX_SECONDS", 4):
+            start, body = asyncio.run(self._first_chunk("/tracking/4242/stream/"))
+        self.assertEqual(start["status"], 200)
+        self.assertTrue(body["more_body"])
+        self.assertIn(b'"lat": -1.95', body["body"])
+
+    def test_manifest_header_is_sent_before_the_rows_are_read(self):
+        Shipment.objects.create(shipment_type="international", weight=100, phone_number="0788000000",
+                                status="confirmed", origin="Kigali", destination="Kampala", commodity="Coffee")
+        start, body = asyncio.run(self._first_chunk("/gov/customs/generate-manifest/"))
+        self.assertEqual(start["status"], 200)
+        self.assertTrue(body["more_body"])
+        self.assertTrue(body["body"].startswith(b"<?xml"))
+        self.assertNotIn(b"Coffee", body["body"])
+
+
+class QueryProfilerTest(QueryBudgetMixin, TestCase):
+    def test_repeated_query_shapes_are_reported_by_call_site(self):
+        Driver.objects.bulk_create([
+            Driver(name=f"D{i}", phone_number="0780000000", license_number=f"RWA{i}") for i in range(6)
+        ])
+        with self.assertRaises(QueryBudgetExceeded) as failure:
+            with assert_query_budget():
+                for driver in Driver.objects.all():
+                    Shipment.objects.filter(assigned_driver=driver).count()
+        self.assertIn("N+1: 6x from Core/tests.py:", str(failure.exception))
+        # Batched statements repeat by design and are not suspects
+        with assert_query_budget() as profiler:
+            Shipment.objects.bulk_create([Shipment(weight=1) for _ in range(30)], batch_size=5)
+        self.assertEqual(len(profiler.queries), 6)
+        self.assertEqual(query_shape("SELECT 1 FROM t WHERE id IN (%s, %s, %s) AND name = 'x'"),
+                         "SELECT ? FROM t WHERE id IN (%s, ...) AND name = ?")
+
+    def test_requests_over_their_view_budget_fail(self):
+        response = self.client.post("/api/shipments/create/", data={"type": "domestic", "weight": 2},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertLessEqual(int(response["X-Query-Count"]), core_views.create_shipment_view.query_budget)
+        budget = core_views.create_shipment_view.query_budget
+        self.addCleanup(setattr, core_views.create_shipment_view, "query_budget", budget)
+        core_views.create_shipment_view.query_budget = 1
+        with self.assertRaises(QueryBudgetExceeded) as failure:
+            self.client.post("/api/shipments/create/", data={"type": "domestic", "weight": 2},
+                             content_type="application/json")
+        self.assertIn("budget 1", str(failure.exception))
+        self.assertIn("Core/booking_service.py", str(failure.exception))
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_carry_their_plan(self):
+        response = self.client.get("/api/shipments/?status=pending_payment")
+        report = response.query_report
+        self.assertTrue(report.slow)
+        query, plan = report.slow[0]
+        self.assertIn("Core_shipment", query.sql)
+        self.assertTrue(plan)
+        self.assertNotIn("EXPLAIN failed", plan)
+
+
+class ResponseCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = caching.ResponseCache(clock=lambda: self.now)
+        self.calls = 0
+        self.request = RequestFactory().get("/report/?limit=5")
+
+    def view(self, request, status=200, cache_control=""):
+        self.calls += 1
+        response = JsonResponse({"call": self.calls}, status=status)
+        if cache_control:
+            response["Cache-Control"] = cache_control
+        return response
+
+    def _get(self, request=None, view=None, **options):
+        options.setdefault("ttl", 10)
+        return self.cache.respond(view or self.view, request or self.request, (), {}, "report", **options)
+
+    def test_hits_etags_and_tag_invalidation(self):
+        first, second = self._get(tags=["drivers"]), self._get(tags=["drivers"])
+        self.assertEqual((first["X-Cache"], second["X-Cache"], self.calls), ("MISS", "HIT", 1))
+        self.assertEqual(first.content, second.content)
+        revalidate = RequestFactory().get("/report/?limit=5", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(self._get(revalidate, tags=["drivers"]).status_code, 304)
+        self.assertEqual(self._get(RequestFactory().get("/report/?limit=6"))["X-Cache"], "MISS")
+
+        self.cache.invalidate("analytics")
+        self.assertEqual(self._get(tags=["drivers"])["X-Cache"], "HIT")
+        self.cache.invalidate("drivers")
+        self.assertEqual(self._get(tags=["drivers"])["X-Cache"], "MISS")
+        self.now += 11
+        self.assertEqual(self._get(tags=["drivers"])["X-Cache"], "MISS")
+        self.assertEqual(self.calls, 4)
+
+    def test_errors_no_store_and_writes_are_not_cached(self):
+        for _ in range(2):
+            self._get(view=lambda r: self.view(r, status=503))
+            self._get(RequestFactory().get("/live/"), view=lambda r: self.view(r, cache_control="no-store"))
+            self._get(RequestFactory().post("/report/?limit=5"))
+        self.assertEqual(self.calls, 6)
+
+    def test_concurrent_misses_run_the_view_once(self):
+        entered, release = threading.Event(), threading.Event()
+
+        def slow(request):
+            entered.set()
+            release.wait(5)
+            return self.view(request)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(self._get, view=slow)
+            entered.wait(5)
+            followers = [pool.submit(self._get, view=slow) for _ in range(3)]
+            # Let the followers reach the in-flight call before it completes
+            time.sleep(0.2)
+            release.set()
+            results = [leader.result()] + [f.result() for f in followers]
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({r.content for r in results}, {results[0].content})
+        self.assertEqual(results[0]["X-Cache"], "MISS")
+
+    def test_stale_copy_is_served_while_one_request_recomputes(self):
+        self._get(ttl=10, stale=30)
+        self.now += 15
+        entered, release = threading.Event(), threading.Event()
+
+        def slow(request):
+            entered.set()
+            release.wait(5)
+            return self.view(request)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            refresh = pool.submit(self._get, view=slow, ttl=10, stale=30)
+            entered.wait(5)
+            stale = self._get(view=slow, ttl=10, stale=30)
+            release.set()
+            self.assertEqual(refresh.result()["X-Cache"], "MISS")
+        self.assertEqual(stale["X-Cache"], "STALE")
+        self.assertEqual(json.loads(stale.content), {"call": 1})
+        self.assertEqual(json.loads(self._get(ttl=10, stale=30).content), {"call": 2})
+        self.now += 41
+        self.assertEqual(self._get(ttl=10, stale=30)["X-Cache"], "MISS")
+
+    def test_hit_rate_and_saved_time_are_exported(self):
+        before = caching.stats().get("report", {})
+        self._get()
+        self._get()
+        self._get()
+        after = caching.stats()["report"]
+        self.assertEqual(after["hit"] - before.get("hit", 0), 2)
+        self.assertEqual(after["miss"] - before.get("miss", 0), 1)
+        self.assertGreater(after["saved_seconds"], before.get("saved_seconds", 0))
+        self.assertIn('view_cache_requests_total{view="report",result="hit"}', metrics.registry.render())
+
+    def test_api_root_is_cached_with_etag(self):
+        client = Client(SERVER_NAME="localhost")
+        first = client.get("/api/")
+        again = client.get("/api/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(first.json()["name"], "IshemaLink API")
+        self.assertEqual(again.status_code, 304)
+
+
+class TaskQueueTest(SimpleTestCase):
+    # Only for transaction.atomic() around enqueue; the tasks themselves touch no tables
+    databases = {"default"}
+
+    def setUp(self):
+        self.now = 1000.0
+        self.broker = taskqueue.LocalBroker(clock=lambda: self.now)
+        self.calls = []
+        self.failures = 0
+        for name, options in (("test.batch", {"batch_size": 3}), ("test.low", {"priority": taskqueue.LOW}),
+                              ("test.high", {"priority": taskqueue.HIGH, "max_attempts": 2, "backoff_seconds": 5})):
+            taskqueue.task(name, **options)(self._handler(name, options.get("batch_size", 1) > 1))
+            self.addCleanup(taskqueue.TASKS.pop, name)
+        self.worker = taskqueue.TaskWorker(self.broker, max_workers=0, periodic=False)
+
+    def _handler(self, name, batched):
+        def handler(*args, **payload):
+            self.calls.append((name, args[0] if batched else payload))
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("downstream timeout")
+        return handler
+
+    def _publish(self, name, **payload):
+        self.broker.publish([taskqueue.new_message(taskqueue.TASKS[name], payload)])
+
+    def test_priorities_and_batching(self):
+        self._publish("test.low", n=1)
+        for i in range(4):
+            self._publish("test.batch", n=i)
+        self._publish("test.high", n=2)
+        self.assertEqual(self.worker.run_once(limit=10), 6)
+        # HIGH first, then DEFAULT coalesced into calls of at most batch_size, then LOW
+        self.assertEqual(self.calls, [
+            ("test.high", {"n": 2}),
+            ("test.batch", [{"n": 0}, {"n": 1}, {"n": 2}]),
+            ("test.batch", [{"n": 3}]),
+            ("test.low", {"n": 1}),
+        ])
+        self.assertEqual(self.broker.stats(), {"high": 0, "default": 0, "low": 0, "scheduled": 0, "leased": 0, "dead": 0})
+
+    def test_failures_back_off_then_dead_letter(self):
+        self.failures = 2
+        self._publish("test.high", n=1)
+        self.worker.run_once()
+        self.assertEqual(self.broker.stats()["scheduled"], 1)
+        self.assertEqual(self.worker.run_once(), 0)
+        self.now += 5
+        self.worker.run_once()
+        [dead] = self.broker.dead
+        self.assertEqual((dead["attempts"], dead["error"]), (2, "downstream timeout"))
+        self.assertEqual(self.broker.requeue_dead(), 1)
+        self.worker.run_once()
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(self.broker.stats()["dead"], 0)
+
+    def test_unacknowledged_messages_are_redelivered_after_the_lease(self):
+        self._publish("test.low", n=1)
+        [message] = self.broker.claim(10, lease_seconds=60)
+        self.assertEqual(self.broker.claim(10), [])
+        self.now += 61
+        # The first worker died without acknowledging; the message is due again
+        self.assertEqual(self.broker.claim(10), [message])
+
+    def test_unknown_tasks_are_dead_lettered(self):
+        self.broker.publish([dict(taskqueue.new_message(taskqueue.TASKS["test.low"], {}), task="test.gone")])
+        self.worker.run_once()
+        self.assertEqual(self.broker.dead[0]["error"], "no task registered as test.gone")
+
+    def test_outbox_messages_are_run_by_the_relay_when_the_broker_is_in_memory(self):
+        handlers = taskqueue.outbox_handlers()
+        self.failures = 1
+        with mock.patch.object(taskqueue, "get_broker", return_value=self.broker):
+            # The relay records the failure and keeps the outbox row pending
+            with self.assertRaises(ConnectionError):
+                handlers["test.high"]([{"n": 1}])
+            self.assertEqual(handlers["test.high"]([{"n": 1}]), [None])
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.broker.stats()["high"], 0)
+
+    def test_enqueue_waits_for_commit(self):
+        with self.settings(TASKS_EAGER=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                taskqueue.enqueue("test.low", {"n": 1})
+                raise RuntimeError("rolled back")
+            self.assertEqual(self.calls, [])
+            with transaction.atomic():
+                taskqueue.enqueue("test.low", {"n": 2})
+                self.assertEqual(self.calls, [])
+            self.assertEqual(self.calls, [("test.low", {"n": 2})])
+
+
+@override_settings(TASKS_EAGER=True, EBM_SIGNING_KEY="test-key")
+class TaskPipelineTest(TestCase):
+    def test_booking_runs_through_the_tasks_without_a_broker(self):
+        Driver.objects.create(name="Eric", phone_number="0788000001", license_number="RWA1")
+        client = Client()
+        shipment_id = client.post("/api/shipments/create/", {"weight": 20, "phone_number": "0781234567"},
+                                  content_type="application/json").json()["shipment_id"]
+        # The relay hands the committed prompt to the payment task
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.relay_outbox([{}])
+        self.assertEqual(OutboxMessage.objects.get().status, "published")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/payments/webhook/", {"transaction_id": f"MOCK-{shipment_id}",
+                                   "status": "success"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        # The webhook task settled the shipment; its notifications and receipt followed
+        shipment = Shipment.objects.get(id=shipment_id)
+        self.assertEqual((shipment.status, shipment.assigned_driver.name), ("confirmed", "Eric"))
+        self.assertEqual(set(Notification.objects.values_list("status", flat=True)), {"sent"})
+        self.assertTrue(EbmReceipt.objects.filter(shipment_id=shipment_id).exists())
@@ -1,28 +1,77 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+import asyncio
+import gzip
 import json
-from Core.booking_service import BookingService
-from payments import MomoMock
-from notifications import NotificationEngine
-from Core.models import Shipment, Driver
+import queue
+from time import monotonic
+from datetime import datetime, time
+from itertools import islice
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from analytics import rollups
+from tracking.ingest import MAX_PINGS_PER_BATCH, ingest
+from tracking.store import positions
+from tracking.websocket import offer_newest
+from tracking import trajectory
+from gov import audit, ebm, manifest, rura
+from gov.models import AccessLogEntry, EbmReceipt
+from Core.booking_service import APPLY_WEBHOOKS_TASK
+from Core import counters, pagination, state_machine, taskqueue
+from Core.caching import ANALYTICS, DRIVERS, cached_view
+from Core.profiling import query_budget
+from Core.models import Shipment, Driver, PaymentWebhook
+from Core.services import booking_service
 from django.db import models
 
-# Dependency injection
-payment_gateway = MomoMock()
-notifier = NotificationEngine()
-booking_service = BookingService(payment_gateway, notifier)
+# Upper bound on rows accepted by one bulk booking request
+BULK_SHIPMENT_MAX_ROWS = 5000
+
+def _stream(request, chunks):
+    # Under ASGI Django reads a sync iterator to the end before sending anything; hand it one chunk at a time
+    if isinstance(request, ASGIRequest):
+        return _aiter_chunks(iter(chunks))
+    return chunks
+
+async def _aiter_chunks(chunks):
+    # Each chunk is pulled on the request's own sync thread, which also holds its database connection
+    pull = sync_to_async(next)
+    try:
+        while True:
+            chunk = await pull(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+def _iter_ndjson(stream):
+    # Parse one JSON object per line without buffering the whole body
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None
 
 @csrf_exempt
-def create_shipment_view(request):
+@query_budget(6)
+async def create_shipment_view(request):
     if request.method == 'POST':
         try:
             raw_body = request.body.decode('utf-8')
-            print('Raw request body:', raw_body)
             if not raw_body:
                 return JsonResponse({'error': 'Empty request body'}, status=400)
             data = json.loads(raw_body)
-            result = booking_service.create_shipment(data)
+            # The async ORM has no transactions: the atomic booking runs on the request's DB thread
+            result = await sync_to_async(booking_service.create_shipment)(data)
             return JsonResponse(result, status=201)
         except json.JSONDecodeError as e:
             return JsonResponse({'error': f'Invalid JSON: {str(e)}'}, status=400)
@@ -31,100 +80,583 @@ def create_shipment_view(request):
     return JsonResponse({'error': 'Invalid method'}, status=405)
 
 @csrf_exempt
-def payment_webhook_view(request):
+def bulk_create_shipments_view(request):
+    if request.method == 'POST':
+        try:
+            if request.content_type in ('application/x-ndjson', 'application/jsonl'):
+                rows = _iter_ndjson(request)
+            else:
+                rows = json.loads(request.body)
+                if not isinstance(rows, list):
+                    return JsonResponse({'error': 'Expected a JSON array of shipments'}, status=400)
+            rows = list(islice(rows, BULK_SHIPMENT_MAX_ROWS + 1))
+            if not rows:
+                return JsonResponse({'error': 'No shipments supplied'}, status=400)
+            if len(rows) > BULK_SHIPMENT_MAX_ROWS:
+                return JsonResponse({'error': f'At most {BULK_SHIPMENT_MAX_ROWS} shipments per request'}, status=413)
+            results = booking_service.create_shipments_bulk(rows)
+            created = sum(1 for r in results if r['status'] != 'rejected')
+            return JsonResponse({
+                'created': created,
+                'rejected': len(results) - created,
+                'results': results
+            }, status=201 if created else 400)
+        except json.JSONDecodeError as e:
+            return JsonResponse({'error': f'Invalid JSON: {str(e)}'}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'error': 'Invalid method'}, status=405)
+
+# Columns the listing API may return; id and created_at always are, since they form the cursor
+SHIPMENT_LIST_FIELDS = (
+    'id', 'created_at', 'shipment_type', 'status', 'weight', 'tariff', 'tariff_version', 'phone_number',
+    'origin', 'destination', 'commodity', 'sector', 'assigned_driver_id', 'updated_at',
+)
+
+@csrf_exempt
+@query_budget(2)
+def list_shipments_view(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        limit = pagination.page_size(request.GET.get('limit'))
+        fields = SHIPMENT_LIST_FIELDS
+        if request.GET.get('fields'):
+            requested = [f.strip() for f in request.GET['fields'].split(',') if f.strip()]
+            unknown = set(requested) - set(SHIPMENT_LIST_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+            fields = tuple(dict.fromkeys(('id', 'created_at', *requested)))
+        shipments = Shipment.objects.values(*fields)
+        if request.GET.get('status'):
+            shipments = shipments.filter(status__in=request.GET['status'].split(','))
+        if request.GET.get('type'):
+            shipments = shipments.filter(shipment_type=request.GET['type'])
+        driver = request.GET.get('driver')
+        if driver == 'none':
+            shipments = shipments.filter(assigned_driver__isnull=True)
+        elif driver:
+            shipments = shipments.filter(assigned_driver_id=int(driver))
+        start = _parse_when(request.GET.get('from'))
+        end = _parse_when(request.GET.get('to'), end_of_day=True)
+        if start:
+            shipments = shipments.filter(created_at__gte=start)
+        if end:
+            shipments = shipments.filter(created_at__lte=end)
+        # Keyset pagination: every page is an index range seek, never an OFFSET scan
+        rows, next_cursor = pagination.keyset_page(shipments, 'created_at', request.GET.get('cursor'), limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'shipments': rows, 'next_cursor': next_cursor})
+
+def _actor(request):
+    user = getattr(request, 'user', None)
+    return user.get_username() if user is not None and user.is_authenticated else ''
+
+@csrf_exempt
+@query_budget(8)
+def shipment_transitions_view(request, shipment_id):
+    shipment = Shipment.objects.only('id', 'status', 'version', 'tariff', 'assigned_driver').filter(id=shipment_id).first()
+    if shipment is None:
+        return JsonResponse({'error': 'Shipment not found'}, status=404)
+    if request.method == 'GET':
+        return JsonResponse({
+            'shipment_id': shipment.id,
+            'status': shipment.status,
+            'version': shipment.version,
+            'allowed': sorted(state_machine.TRANSITIONS.get(shipment.status, ())),
+            'history': state_machine.history(shipment.id),
+        })
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        data = json.loads(request.body)
+        to_status = data['status']
+        if data.get('version') is not None:
+            # The caller's view of the shipment; a newer version on the row is a conflict
+            shipment.version = int(data['version'])
+        state_machine.transition(shipment, to_status, actor=_actor(request), reason=str(data.get('reason', '')))
+    except (state_machine.InvalidTransition, state_machine.StaleShipment) as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'error': f'Expected JSON with a valid status: {e}'}, status=400)
+    return JsonResponse({'shipment_id': shipment.id, 'status': shipment.status, 'version': shipment.version})
+
+# Largest shipment list one bulk transition request may carry
+SHIPMENT_TRANSITION_MAX_IDS = 50000
+
+@csrf_exempt
+def bulk_shipment_transitions_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        data = json.loads(request.body)
+        shipment_ids = [int(i) for i in data['shipment_ids']]
+        from_status, to_status = data['from'], data['to']
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({'error': 'Expected JSON with shipment_ids, from and to'}, status=400)
+    if not shipment_ids or len(shipment_ids) > SHIPMENT_TRANSITION_MAX_IDS:
+        return JsonResponse({'error': f'Between 1 and {SHIPMENT_TRANSITION_MAX_IDS} shipment_ids per request'}, status=400)
+    try:
+        result = state_machine.bulk_transition(
+            shipment_ids, from_status, to_status, actor=_actor(request), reason=str(data.get('reason', ''))
+        )
+    except state_machine.InvalidTransition as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(result)
+
+@csrf_exempt
+@query_budget(2)
+async def payment_webhook_view(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            booking_service.handle_payment_callback(data)
-            return JsonResponse({'status': 'callback processed'})
+            transaction_id = data.get('transaction_id') if isinstance(data, dict) else None
+            if not transaction_id or not isinstance(transaction_id, str):
+                return JsonResponse({'error': 'transaction_id is required'}, status=400)
+            # One INSERT ... ON CONFLICT DO NOTHING; provider replays are absorbed here
+            await PaymentWebhook.objects.abulk_create(
+                [PaymentWebhook(transaction_id=transaction_id, payload=data)],
+                ignore_conflicts=True
+            )
+            # Settlement and driver assignment run in a worker; this response never waits on them
+            await sync_to_async(taskqueue.enqueue)(APPLY_WEBHOOKS_TASK)
+            return JsonResponse({'status': 'callback accepted'})
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
     return JsonResponse({'error': 'Invalid method'}, status=405)
 
 @csrf_exempt
+@query_budget(2)
 def dashboard_html_view(request):
-    active_trucks = Shipment.objects.filter(status="confirmed").count()
-    totl_revenue = Shipment.objects.filter(status="confirmed").aggregate(total=models.Sum('tariff'))['total'] or 0
-    available_drivers = Driver.objects.filter(is_available=True).count()
-    return render(request, "dashboard.html", {
-        "active_trucks": active_trucks,
-        "total_revenue": total_revenue,
-        "available_drivers": available_drivers
+    return render(request, "dashboard.html", counters.snapshot())
+
+# Largest top-N accepted by the analytics endpoints
+ANALYTICS_MAX_LIMIT = 100
+
+# Rollups move once per refresh (every minute by default), which invalidates these responses;
+# past the TTL one request recomputes while the others are served the previous copy
+ANALYTICS_CACHE_TTL = 60
+ANALYTICS_CACHE_STALE = 300
+
+def _parse_when(value, end_of_day=False):
+    if not value:
+        return None
+    # Bare dates cover the whole day; parse them first since parse_datetime accepts them too
+    try:
+        day = parse_date(value)
+        when = None if day is None else datetime.combine(day, time.max if end_of_day else time.min)
+        when = when or parse_datetime(value)
+    except ValueError:
+        when = None
+    if when is None:
+        raise ValueError(f"Invalid date: {value}")
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+def _analytics_params(request):
+    start = _parse_when(request.GET.get('from'))
+    end = _parse_when(request.GET.get('to'), end_of_day=True)
+    limit = int(request.GET.get('limit', 5))
+    if not 1 <= limit <= ANALYTICS_MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {ANALYTICS_MAX_LIMIT}')
+    return start, end, limit
+
+def _analytics_response(name, result, rows):
+    return JsonResponse({
+        name: rows,
+        "from": result["from"],
+        "to": result["to"],
+        "granularity": result["granularity"]
     })
 
 @csrf_exempt
+@query_budget(2)
+@cached_view(ANALYTICS_CACHE_TTL, ANALYTICS_CACHE_STALE, tags=[ANALYTICS])
 def analytics_routes_top_view(request):
-    data = [
-        {"route": "Kigali - Musanze", "count": 120},
-        {"route": "Kigali - Huye", "count": 95},
-        {"route": "Kigali - Rubavu", "count": 80},
-        {"route": "Kigali - Rusizi", "count": 60},
-        {"route": "Kigali - Nyagatare", "count": 50}
-    ]
-    return JsonResponse({"top_routes": data})
+    try:
+        start, end, limit = _analytics_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    result = rollups.top("route", "shipments", start, end, limit)
+    data = [{"route": key, "count": total} for key, total in result["rows"]]
+    return _analytics_response("top_routes", result, data)
 
 @csrf_exempt
+@query_budget(2)
+@cached_view(ANALYTICS_CACHE_TTL, ANALYTICS_CACHE_STALE, tags=[ANALYTICS])
 def analytics_commodities_breakdown_view(request):
-    data = [
-        {"commodity": "Potatoes", "volume": 20000},
-        {"commodity": "Electronics", "volume": 8000},
-        {"commodity": "Beans", "volume": 5000}
-    ]
-    return JsonResponse({"commodities": data})
+    try:
+        start, end, limit = _analytics_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    result = rollups.top("commodity", "weight", start, end, limit)
+    data = [{"commodity": key, "volume": total} for key, total in result["rows"]]
+    return _analytics_response("commodities", result, data)
 
 @csrf_exempt
+@query_budget(2)
+@cached_view(ANALYTICS_CACHE_TTL, ANALYTICS_CACHE_STALE, tags=[ANALYTICS])
 def analytics_revenue_heatmap_view(request):
-    data = [
-        {"sector": "Kicukiro", "revenue": 5000000},
-        {"sector": "Gasabo", "revenue": 4000000},
-        {"sector": "Nyarugenge", "revenue": 3500000}
-    ]
-    return JsonResponse({"revenue_heatmap": data})
+    try:
+        start, end, limit = _analytics_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    result = rollups.top("sector", "revenue", start, end, limit)
+    data = [{"sector": key, "revenue": total} for key, total in result["rows"]]
+    return _analytics_response("revenue_heatmap", result, data)
 
 @csrf_exempt
+@query_budget(2)
+@cached_view(ANALYTICS_CACHE_TTL, ANALYTICS_CACHE_STALE, tags=[ANALYTICS, DRIVERS])
 def analytics_drivers_leaderboard_view(request):
+    try:
+        start, end, limit = _analytics_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    result = rollups.top("driver", "shipments", start, end, limit)
+    names = rollups.driver_names([key for key, _ in result["rows"]])
     data = [
-        {"driver": "Jean Bosco", "on_time_deliveries": 45},
-        {"driver": "Alice Uwase", "on_time_deliveries": 40},
-        {"driver": "Eric Nshimiyimana", "on_time_deliveries": 38}
+        {"driver": names.get(key, f"Driver {key}"), "driver_id": int(key), "shipments": total}
+        for key, total in result["rows"]
     ]
-    return JsonResponse({"leaderboard": data})
+    return _analytics_response("leaderboard", result, data)
+
+# SSE streams end after this long so a sync worker thread is never held indefinitely
+TRACKING_STREAM_MAX_SECONDS = 300
+TRACKING_STREAM_KEEPALIVE_SECONDS = 15
+
+@csrf_exempt
+@query_budget(2)
+def tracking_pings_view(request):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError as e:
+            return JsonResponse({'error': f'Invalid JSON: {str(e)}'}, status=400)
+        pings = data.get('pings') if isinstance(data, dict) else data
+        if not isinstance(pings, list) or not pings:
+            return JsonResponse({'error': 'Expected a non-empty list of pings'}, status=400)
+        if len(pings) > MAX_PINGS_PER_BATCH:
+            return JsonResponse({'error': f'At most {MAX_PINGS_PER_BATCH} pings per request'}, status=413)
+        return JsonResponse(ingest(pings), status=202)
+    return JsonResponse({'error': 'Invalid method'}, status=405)
+
+@csrf_exempt
+@query_budget(2)
+def tracking_live_view(request, shipment_id):
+    # Served from the position store (memory, or Redis with REDIS_URL): no database query per poll
+    latest = positions.latest(shipment_id)
+    if latest is None:
+        return JsonResponse({'error': 'No position reported yet', 'shipment_id': shipment_id}, status=404)
+    version, position = latest
+    etag = positions.etag(shipment_id, version)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({'shipment_id': shipment_id, 'version': version, **position.as_dict()})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def _sse_event(shipment_id, version, position):
+    payload = json.dumps({'shipment_id': shipment_id, 'version': version, **position.as_dict()})
+    return f'id: {version}\nevent: position\ndata: {payload}\n\n'
+
+def _tracking_events(shipment_id):
+    updates = queue.Queue(maxsize=100)
+
+    def on_position(sid, version, position):
+        try:
+            updates.put_nowait((version, position))
+        except queue.Full:
+            pass
+
+    unsubscribe = positions.subscribe(shipment_id, on_position)
+    try:
+        latest = positions.latest(shipment_id)
+        if latest is not None:
+            yield _sse_event(shipment_id, *latest)
+        deadline = monotonic() + TRACKING_STREAM_MAX_SECONDS
+        while monotonic() < deadline:
+            try:
+                version, position = updates.get(timeout=TRACKING_STREAM_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield _sse_event(shipment_id, version, position)
+    finally:
+        unsubscribe()
+
+async def _atracking_events(shipment_id):
+    # ASGI: waits on the event loop, so an open stream holds no thread
+    loop = asyncio.get_running_loop()
+    updates = asyncio.Queue(maxsize=100)
+
+    def on_position(sid, version, position):
+        loop.call_soon_threadsafe(offer_newest, updates, (version, position))
+
+    unsubscribe = positions.subscribe(shipment_id, on_position)
+    try:
+        latest = positions.latest(shipment_id)
+        if latest is not None:
+            yield _sse_event(shipment_id, *latest)
+        deadline = monotonic() + TRACKING_STREAM_MAX_SECONDS
+        while monotonic() < deadline:
+            try:
+                version, position = await asyncio.wait_for(updates.get(), TRACKING_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield _sse_event(shipment_id, version, position)
+    finally:
+        unsubscribe()
+
+@csrf_exempt
+def tracking_stream_view(request, shipment_id):
+    if isinstance(request, ASGIRequest):
+        events = _atracking_events(shipment_id)
+    else:
+        events = _tracking_events(shipment_id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Largest simplification tolerance (metres) a trajectory request may ask for
+TRAJECTORY_MAX_TOLERANCE_M = 5000
+
+@csrf_exempt
+@query_budget(4)
+def tracking_trajectory_view(request, shipment_id):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        start = _parse_when(request.GET.get('from'))
+        end = _parse_when(request.GET.get('to'), end_of_day=True)
+        tolerance = float(request.GET.get('tolerance', 0))
+        bucket = float(request.GET.get('bucket', 0))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not 0 <= tolerance <= TRAJECTORY_MAX_TOLERANCE_M or bucket < 0:
+        return JsonResponse({'error': f'tolerance must be between 0 and {TRAJECTORY_MAX_TOLERANCE_M}, bucket >= 0'}, status=400)
+    fmt = request.GET.get('format', 'polyline')
+    if fmt not in ('polyline', 'json'):
+        return JsonResponse({'error': 'format must be polyline or json'}, status=400)
+    points = trajectory.load_track(
+        shipment_id,
+        start.timestamp() if start else None,
+        end.timestamp() if end else None,
+    )
+    if bucket:
+        points = trajectory.time_bucket(points, bucket)
+    if tolerance:
+        points = trajectory.douglas_peucker(points, tolerance)
+    data = {
+        'shipment_id': shipment_id,
+        'points': len(points),
+        'from': points[0, 2] if len(points) else None,
+        'to': points[-1, 2] if len(points) else None,
+    }
+    if fmt == 'polyline':
+        data['polyline'] = trajectory.encode_polyline(points)
+    else:
+        data['path'] = [[lat, lng, ts] for lat, lng, ts in points.tolist()]
+    return JsonResponse(data)
+
+# Largest explicit shipment list one batch signing request may carry
+EBM_BATCH_MAX_IDS = 10000
 
 @csrf_exempt
-def gov_ebm_sign_receipt_view(request):
-    # Simulate EBM signature
-    import uuid
-    data = json.loads(request.body)
+@query_budget(6)
+async def gov_ebm_sign_receipt_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        shipment_id = int(json.loads(request.body)['shipment_id'])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({'error': 'Expected JSON with a shipment_id'}, status=400)
+    # Idempotent: an existing receipt is returned as-is, never re-signed
+    await sync_to_async(ebm.sign_receipts)([shipment_id])
+    receipt = await EbmReceipt.objects.filter(shipment_id=shipment_id).afirst()
+    if receipt is None:
+        return JsonResponse({'error': 'Shipment not found or not paid', 'shipment_id': shipment_id}, status=404)
+    return JsonResponse(ebm.receipt_json(receipt))
+
+@csrf_exempt
+def gov_ebm_sign_receipts_batch_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        shipment_ids = {int(i) for i in json.loads(request.body)['shipment_ids']}
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({'error': 'Expected JSON with a shipment_ids list'}, status=400)
+    if not shipment_ids or len(shipment_ids) > EBM_BATCH_MAX_IDS:
+        return JsonResponse({'error': f'Between 1 and {EBM_BATCH_MAX_IDS} shipment_ids per request'}, status=400)
+    already = EbmReceipt.objects.filter(shipment_id__in=shipment_ids).count()
+    signed = ebm.sign_receipts(shipment_ids)
     return JsonResponse({
-        "receipt_id": str(uuid.uuid4()),
-        "signature": "EBM-MOCK-SIGNATURE",
-        "amount": data.get("amount"),
-        "timestamp": data.get("timestamp")
+        'requested': len(shipment_ids),
+        'signed': signed,
+        'already_signed': already,
+        'not_signable': len(shipment_ids) - signed - already,
     })
 
+# Largest explicit licence list one bulk verification request may carry
+RURA_BULK_MAX_LICENSES = 5000
+
+# Verdicts are cached by the verifier too; this saves the view and adds ETags for polling clients
+RURA_VIEW_CACHE_TTL = 60
+
 @csrf_exempt
+@query_budget(2)
+@cached_view(RURA_VIEW_CACHE_TTL)
 def gov_rura_verify_license_view(request, license_no):
-    # Simulate license check
-    valid = license_no.startswith("RWA")
+    try:
+        result = rura.get_verifier().verify(license_no)
+    except rura.RuraUnavailable as e:
+        return JsonResponse({'error': str(e), 'license_no': license_no}, status=503)
+    response = JsonResponse(result)
+    if result.get('stale'):
+        # Served while RURA is down: never cache it past this request
+        response['Cache-Control'] = 'no-store'
+    return response
+
+@csrf_exempt
+async def gov_rura_verify_licenses_view(request):
+    # Explicit {"license_numbers": [...]}, or no body to verify every driver in the fleet
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        data = json.loads(request.body) if request.content_type == 'application/json' and request.body else {}
+        license_numbers = data.get('license_numbers')
+        if license_numbers is not None and not all(isinstance(no, str) for no in license_numbers):
+            raise ValueError
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse({'error': 'Expected JSON with a license_numbers list of strings'}, status=400)
+    if license_numbers is not None:
+        if not 1 <= len(license_numbers) <= RURA_BULK_MAX_LICENSES:
+            return JsonResponse({'error': f'Between 1 and {RURA_BULK_MAX_LICENSES} license_numbers per request'}, status=400)
+        drivers = None
+    else:
+        drivers = [row async for row in Driver.objects.values_list('id', 'license_number')]
+        license_numbers = [no for _, no in drivers]
+    # Upstream chunks are requested concurrently; the event loop is free while RURA answers
+    results = await rura.get_verifier().averify_many(license_numbers)
+    if drivers is None:
+        rows = [results[rura.normalize(no)] for no in dict.fromkeys(license_numbers)]
+    else:
+        rows = [{'driver_id': driver_id, **results[rura.normalize(no)]} for driver_id, no in drivers]
     return JsonResponse({
-        "license_no": license_no,
-        "valid": valid,
-        "status": "active" if valid else "invalid"
+        'results': rows,
+        'valid': sum(1 for r in rows if r['valid']),
+        'invalid': sum(1 for r in rows if r['valid'] is False),
+        'unavailable': sum(1 for r in rows if r['valid'] is None),
     })
 
 @csrf_exempt
 def gov_customs_generate_manifest_view(request):
-    # Simulate EAC-compliant XML manifest
-    manifest_xml = """<Manifest><ShipmentID>12345</ShipmentID><Status>Generated</Status></Manifest>"""
-    return JsonResponse({"manifest": manifest_xml})
+    if request.method not in ('GET', 'POST'):
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    params = request.GET.dict()
+    if request.method == 'POST' and request.content_type == 'application/json' and request.body:
+        try:
+            params.update(json.loads(request.body))
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            return JsonResponse({'error': f'Invalid JSON: {str(e)}'}, status=400)
+    shipment_ids = params.get('shipment_ids')
+    try:
+        if isinstance(shipment_ids, str):
+            shipment_ids = shipment_ids.split(',')
+        if shipment_ids is not None:
+            shipment_ids = [int(i) for i in shipment_ids]
+        start = _parse_when(params.get('from'))
+        end = _parse_when(params.get('to'), end_of_day=True)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': f'Invalid manifest filter: {str(e)}'}, status=400)
+
+    if str(params.get('async', '')).lower() in ('1', 'true'):
+        # Large manifests are written by a worker and downloaded when ready
+        manifest_id = manifest.new_manifest_id()
+        taskqueue.enqueue(manifest.MANIFEST_TASK, {
+            'manifest_id': manifest_id,
+            'shipment_ids': shipment_ids,
+            'destination': params.get('destination'),
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+        })
+        return JsonResponse({
+            'manifest_id': manifest_id,
+            'status': 'queued',
+            'download': f'/gov/customs/manifests/{manifest_id}/',
+        }, status=202)
+
+    # Rows are pulled lazily by the stream, a chunk at a time, after the header is sent
+    rows = manifest.manifest_queryset(shipment_ids, params.get('destination'), start, end)
+    manifest_id = manifest.new_manifest_id()
+    chunks = manifest.stream_manifest(rows.iterator(chunk_size=manifest.MANIFEST_ITERATOR_CHUNK), manifest_id)
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+    if gzipped:
+        chunks = manifest.gzip_stream(chunks)
+    response = StreamingHttpResponse(_stream(request, chunks), content_type='application/xml; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{manifest_id}.xml"'
+    response['X-Manifest-ID'] = manifest_id
+    response['Vary'] = 'Accept-Encoding'
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+@csrf_exempt
+def gov_customs_manifest_view(request, manifest_id):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        path = manifest.manifest_path(manifest_id)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        stored = open(path, 'rb')
+    except FileNotFoundError:
+        response = JsonResponse({'error': 'Manifest not ready or unknown', 'manifest_id': manifest_id}, status=404)
+        response['Retry-After'] = '5'
+        return response
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+    response = FileResponse(stored if gzipped else gzip.GzipFile(fileobj=stored),
+                            content_type='application/xml; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{manifest_id}.xml"'
+    response['Vary'] = 'Accept-Encoding'
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    return response
 
 @csrf_exempt
+@query_budget(4)
 def gov_audit_access_log_view(request):
-    # Simulate audit log
-    logs = [
-        {"user": "admin", "action": "viewed shipment", "timestamp": "2026-02-17T10:00:00Z"},
-        {"user": "officer", "action": "verified license", "timestamp": "2026-02-17T11:00:00Z"}
-    ]
-    return JsonResponse({"audit_log": logs})
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        start = _parse_when(request.GET.get('from'))
+        end = _parse_when(request.GET.get('to'), end_of_day=True)
+        limit = pagination.page_size(request.GET.get('limit'))
+        # Entries still buffered in this process are written first so the log is never behind
+        audit.audit_log.flush()
+        entries = AccessLogEntry.objects.values(
+            'id', 'occurred_at', 'user', 'action', 'resource_type', 'resource_id', 'method', 'path',
+            'status_code', 'remote_addr',
+        )
+        for field in ('user', 'action', 'resource_type', 'resource_id'):
+            if request.GET.get(field):
+                entries = entries.filter(**{field: request.GET[field]})
+        if start:
+            entries = entries.filter(occurred_at__gte=start)
+        if end:
+            entries = entries.filter(occurred_at__lte=end)
+        rows, next_cursor = pagination.keyset_page(entries, 'occurred_at', request.GET.get('cursor'), limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'audit_log': rows, 'next_cursor': next_cursor})
 
 # Create your views he.
\ No newline at end of file
@@ -0,0 +1 @@
+# Analytics and BI rollups
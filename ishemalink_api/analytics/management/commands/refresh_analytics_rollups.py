@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from analytics.rollups import ROLLUP_BATCH_SIZE, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Fold newly paid shipments into the hourly and daily analytics rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep refreshing until interrupted.")
+        parser.add_argument("--interval", type=float, default=60.0, help="Idle sleep in seconds when looping.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            consumed = refresh_rollups(options["batch_size"])
+            total += consumed
+            if consumed:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(f"Rolled up {total} shipment(s).")
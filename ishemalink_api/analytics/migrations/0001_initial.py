@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=5)),
+                ('dimension', models.CharField(choices=[('route', 'Route'), ('commodity', 'Commodity'), ('sector', 'Sector'), ('driver', 'Driver')], max_length=10)),
+                ('key', models.CharField(max_length=120)),
+                ('bucket', models.DateTimeField()),
+                ('shipments', models.PositiveIntegerField(default=0)),
+                ('weight', models.FloatField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'dimension', 'bucket', 'key'), name='rollup_bucket_key_uniq')],
+            },
+        ),
+    ]
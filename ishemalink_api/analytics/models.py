@@ -0,0 +1,33 @@
+from django.db import models
+
+class ShipmentRollup(models.Model):
+    """
+    Pre-aggregated shipment totals per time bucket and dimension value.
+    Populated incrementally by analytics.rollups.refresh_rollups; the
+    /analytics/* endpoints read only this table, never Shipment.
+    """
+    GRANULARITY_CHOICES = [
+        ("hour", "Hourly"),
+        ("day", "Daily"),
+    ]
+    DIMENSION_CHOICES = [
+        ("route", "Route"),
+        ("commodity", "Commodity"),
+        ("sector", "Sector"),
+        ("driver", "Driver"),
+    ]
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=120)
+    bucket = models.DateTimeField()
+    shipments = models.PositiveIntegerField(default=0)
+    weight = models.FloatField(default=0)
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["granularity", "dimension", "bucket", "key"], name="rollup_bucket_key_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.key} @ {self.bucket:%Y-%m-%d %H:00} ({self.granularity})"
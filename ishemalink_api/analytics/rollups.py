@@ -0,0 +1,133 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from Core import caching
+from Core.models import Driver, Shipment
+from analytics.models import ShipmentRollup
+from Core.state_machine import PAID_STATUSES
+
+# Shipments are rolled up once they are paid; later status changes do not move them
+ROLLUP_STATUSES = PAID_STATUSES
+ROLLUP_BATCH_SIZE = 5000
+
+# Periodic task folding newly paid shipments into the rollups (analytics.tasks)
+REFRESH_ROLLUPS_TASK = "analytics.refresh_rollups"
+
+# Ranges up to this long are answered from hourly buckets, longer ones from daily
+HOURLY_RANGE_LIMIT = timedelta(hours=48)
+DEFAULT_RANGE = timedelta(days=30)
+
+UNSPECIFIED = "Unspecified"
+
+RollupKey = Tuple[str, str, datetime, str]
+
+
+def _buckets(created_at: datetime) -> Tuple[datetime, datetime]:
+    local = timezone.localtime(created_at)
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    return hour, hour.replace(hour=0)
+
+
+def _dimension_keys(row: Dict[str, Any]) -> List[Tuple[str, str]]:
+    origin = row["origin"] or UNSPECIFIED
+    destination = row["destination"] or UNSPECIFIED
+    keys = [
+        ("route", f"{origin} - {destination}"),
+        ("commodity", row["commodity"] or UNSPECIFIED),
+        ("sector", row["sector"] or UNSPECIFIED),
+    ]
+    if row["assigned_driver_id"]:
+        keys.append(("driver", str(row["assigned_driver_id"])))
+    return keys
+
+
+def refresh_rollups(batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """
+    Folds one batch of paid, not-yet-rolled-up shipments into ShipmentRollup
+    and returns how many shipments were consumed.
+    The rolled_up flag is set in the same transaction, so every shipment is
+    counted exactly once however often (or concurrently) the job runs.
+    """
+    with transaction.atomic():
+        pending = Shipment.objects.filter(rolled_up=False, status__in=ROLLUP_STATUSES).order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        rows = list(pending.values(
+            "id", "created_at", "origin", "destination", "commodity", "sector",
+            "assigned_driver_id", "weight", "tariff",
+        )[:batch_size])
+        if not rows:
+            return 0
+
+        totals: Dict[RollupKey, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        for row in rows:
+            hour, day = _buckets(row["created_at"])
+            for dimension, key in _dimension_keys(row):
+                for granularity, bucket in (("hour", hour), ("day", day)):
+                    total = totals[(granularity, dimension, bucket, key)]
+                    total[0] += 1
+                    total[1] += row["weight"]
+                    total[2] += row["tariff"]
+
+        # One read of the touched buckets, then one bulk UPDATE and one bulk INSERT
+        buckets = {bucket for _, _, bucket, _ in totals}
+        existing = {
+            (r.granularity, r.dimension, r.bucket, r.key): r
+            for r in ShipmentRollup.objects.select_for_update().filter(bucket__in=buckets)
+            if (r.granularity, r.dimension, r.bucket, r.key) in totals
+        }
+        to_update, to_create = [], []
+        for rollup_key, (count, weight, revenue) in totals.items():
+            rollup = existing.get(rollup_key)
+            if rollup is None:
+                granularity, dimension, bucket, key = rollup_key
+                to_create.append(ShipmentRollup(
+                    granularity=granularity, dimension=dimension, bucket=bucket, key=key,
+                    shipments=count, weight=weight, revenue=revenue,
+                ))
+            else:
+                rollup.shipments += count
+                rollup.weight += weight
+                rollup.revenue += revenue
+                to_update.append(rollup)
+        ShipmentRollup.objects.bulk_update(to_update, ["shipments", "weight", "revenue"], batch_size=1000)
+        ShipmentRollup.objects.bulk_create(to_create, batch_size=1000)
+        Shipment.objects.filter(id__in=[row["id"] for row in rows]).update(rolled_up=True)
+        transaction.on_commit(lambda: caching.invalidate(caching.ANALYTICS))
+    return len(rows)
+
+
+def resolve_range(start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime, str]:
+    end = end or timezone.now()
+    start = start or end - DEFAULT_RANGE
+    granularity = "hour" if end - start <= HOURLY_RANGE_LIMIT else "day"
+    return start, end, granularity
+
+
+def top(dimension: str, metric: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+        limit: int = 5) -> Dict[str, Any]:
+    """Top `limit` keys of one dimension by `metric` (shipments, weight or revenue) over a range."""
+    start, end, granularity = resolve_range(start, end)
+    # Whole buckets that contain the range edges, so a mid-hour or mid-day start keeps its first bucket
+    start = _buckets(start)[0 if granularity == "hour" else 1]
+    rows = (
+        ShipmentRollup.objects
+        .filter(dimension=dimension, granularity=granularity, bucket__gte=start, bucket__lte=end)
+        .values("key")
+        .annotate(total=Sum(metric))
+        .order_by("-total", "key")[:limit]
+    )
+    return {
+        "from": start,
+        "to": end,
+        "granularity": granularity,
+        "rows": [(row["key"], row["total"]) for row in rows],
+    }
+
+
+def driver_names(driver_ids: List[str]) -> Dict[str, str]:
+    ids = [int(i) for i in driver_ids if i.isdigit()]
+    return {str(pk): name for pk, name in Driver.objects.filter(pk__in=ids).values_list("pk", "name")}
@@ -0,0 +1,10 @@
+from typing import Any, Dict, List
+from Core import taskqueue
+from analytics.rollups import REFRESH_ROLLUPS_TASK, ROLLUP_BATCH_SIZE, refresh_rollups
+
+
+# Batched so sweeps queued while a worker was busy run once
+@taskqueue.task(REFRESH_ROLLUPS_TASK, priority=taskqueue.LOW, batch_size=100, every=60.0)
+def refresh(payloads: List[Dict[str, Any]]) -> None:
+    while refresh_rollups(ROLLUP_BATCH_SIZE) == ROLLUP_BATCH_SIZE:
+        pass
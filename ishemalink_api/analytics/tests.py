@@ -0,0 +1,99 @@
+from datetime import timedelta
+from django.test import TestCase, Client
+from django.utils import timezone
+from Core.caching import get_response_cache
+from Core.models import Driver, Shipment
+from Core.profiling import QueryBudgetMixin
+from analytics.models import ShipmentRollup
+from analytics.rollups import REFRESH_ROLLUPS_TASK, refresh_rollups, top
+from Core import taskqueue
+
+
+class AnalyticsRollupTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        get_response_cache().clear()
+        self.driver = Driver.objects.create(name="Jean Bosco", phone_number="0780000001", license_number="RWA1")
+        self._ship("Kigali", "Musanze", "Potatoes", "Gasabo", 1000, driver=self.driver)
+        self._ship("Kigali", "Musanze", "Beans", "Gasabo", 500)
+        self._ship("Kigali", "Huye", "Potatoes", "Kicukiro", 200)
+        self._ship("Kigali", "Rubavu", "Beans", "Kicukiro", 100, status="pending_payment")
+
+    def _ship(self, origin, destination, commodity, sector, weight, driver=None, status="confirmed"):
+        return Shipment.objects.create(
+            shipment_type="domestic", weight=weight, tariff=weight * 1000, phone_number="078",
+            origin=origin, destination=destination, commodity=commodity, sector=sector,
+            assigned_driver=driver, status=status
+        )
+
+    def test_rollups_are_incremental_and_exactly_once(self):
+        self.assertEqual(refresh_rollups(), 3)
+        self.assertEqual(refresh_rollups(), 0)
+        Shipment.objects.filter(status="pending_payment").update(status="confirmed")
+        self.assertEqual(refresh_rollups(), 1)
+        daily = ShipmentRollup.objects.get(granularity="day", dimension="route", key="Kigali - Musanze")
+        self.assertEqual((daily.shipments, daily.weight), (2, 1500))
+
+    def test_rollups_are_refreshed_by_a_periodic_task(self):
+        broker = taskqueue.LocalBroker()
+        worker = taskqueue.TaskWorker(broker, priorities=[taskqueue.LOW], max_workers=0)
+        worker.run_once()
+        self.assertEqual(ShipmentRollup.objects.filter(granularity="day", dimension="route").count(), 2)
+
+    def test_endpoints_read_rollups_only(self):
+        refresh_rollups()
+        with self.assertNumQueries(1):
+            routes = self.client.get("/analytics/routes/top/?limit=2").json()
+        self.assertEqual(routes["top_routes"], [{"route": "Kigali - Musanze", "count": 2}, {"route": "Kigali - Huye", "count": 1}])
+        self.assertEqual(routes["granularity"], "day")
+
+        commodities = self.client.get("/analytics/commodities/breakdown/").json()["commodities"]
+        self.assertEqual(commodities[0], {"commodity": "Potatoes", "volume": 1200})
+        heatmap = self.client.get("/analytics/revenue/heatmap/").json()["revenue_heatmap"]
+        self.assertEqual(heatmap[0], {"sector": "Gasabo", "revenue": 1500000})
+        leaderboard = self.client.get("/analytics/drivers/leaderboard/").json()["leaderboard"]
+        self.assertEqual(leaderboard, [{"driver": "Jean Bosco", "driver_id": self.driver.id, "shipments": 1}])
+
+    def test_date_range_selects_granularity(self):
+        refresh_rollups()
+        today = timezone.localdate()
+        hourly = self.client.get(f"/analytics/routes/top/?from={today}&to={today}").json()
+        self.assertEqual(hourly["granularity"], "hour")
+        self.assertEqual(hourly["top_routes"][0]["count"], 2)
+        past = today - timedelta(days=10)
+        empty = self.client.get(f"/analytics/routes/top/?from={past}&to={past}").json()
+        self.assertEqual(empty["top_routes"], [])
+        self.assertEqual(self.client.get("/analytics/routes/top/?from=yesterday").status_code, 400)
+
+    def test_hourly_range_starting_mid_hour_keeps_its_first_bucket(self):
+        hour = timezone.localtime(timezone.now() - timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+        Shipment.objects.update(created_at=hour + timedelta(minutes=45))
+        refresh_rollups()
+        routes = top("route", "shipments", start=hour + timedelta(minutes=30), end=hour + timedelta(hours=3))
+        self.assertEqual(routes["granularity"], "hour")
+        self.assertEqual(routes["rows"][0], ("Kigali - Musanze", 2))
+
+    def test_responses_are_cached_until_rollups_or_drivers_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_rollups()
+        first = self.client.get("/analytics/drivers/leaderboard/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/analytics/drivers/leaderboard/")
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(first.content, second.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.driver.name = "Jean Bosco Habimana"
+            self.driver.save()
+        renamed = self.client.get("/analytics/drivers/leaderboard/")
+        self.assertEqual(renamed["X-Cache"], "MISS")
+        self.assertEqual(renamed.json()["leaderboard"][0]["driver"], "Jean Bosco Habimana")
+
+        self.client.get("/analytics/routes/top/")
+        self._ship("Kigali", "Huye", "Beans", "Kicukiro", 50)
+        self._ship("Kigali", "Huye", "Beans", "Kicukiro", 50)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_rollups()
+        routes = self.client.get("/analytics/routes/top/")
+        self.assertEqual(routes["X-Cache"], "MISS")
+        self.assertEqual(routes.json()["top_routes"][0], {"route": "Kigali - Huye", "count": 3})
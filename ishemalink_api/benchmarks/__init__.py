@@ -0,0 +1 @@
+# Standalone performance benchmarks; run from ishemalink_api/ with `python -m benchmarks.<name>`
@@ -0,0 +1,137 @@
+"""
+Concurrent-request capacity of one serving process: gunicorn sync worker (WSGI) vs uvicorn (ASGI).
+
+    python -m benchmarks.bench_asgi [--concurrency 1,8,32] [--duration 10] [--latency 0.1] [--licenses 400]
+    python -m benchmarks.bench_asgi --endpoint webhook
+
+Starts each server with one worker process on a throwaway SQLite database and
+drives it with `concurrency` clients for `duration` seconds. The default
+endpoint is fleet licence verification. Every request carries licences no
+cache has seen, so each one waits on the local FakeRuraServer, which answers
+after `latency` seconds per bulk call of 200 licences. The webhook endpoint is
+database-bound instead and shows what async costs where there is no I/O wait
+to overlap. Needs gunicorn and uvicorn (requirements.txt).
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+import httpx
+import numpy as np
+from gov.fakes import FakeRuraServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    # One sync worker: the unit that `--workers 4` multiplies in the WSGI deployment
+    "wsgi": ["-m", "gunicorn", "ishemalink_api.wsgi:application", "--worker-class", "sync", "--workers", "1",
+             "--timeout", "120", "--log-level", "warning", "--bind", "127.0.0.1:{port}"],
+    "asgi": ["-m", "uvicorn", "ishemalink_api.asgi:application", "--workers", "1", "--no-access-log",
+             "--log-level", "warning", "--port", "{port}"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(mode: str, env: Dict[str, str]) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    command = [sys.executable] + [arg.format(port=port) for arg in SERVERS[mode]]
+    process = subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/api/status/").status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start (exit code {process.poll()})")
+
+
+def request_body(endpoint: str, n: int, licenses: int, tag: str) -> Tuple[str, dict]:
+    if endpoint == "webhook":
+        return "/api/payments/webhook/", {"transaction_id": f"BENCH-{tag}-{n}", "status": "success"}
+    return "/gov/rura/verify-licenses/", {"license_numbers": [f"RWA-{tag}-{n}-{i}" for i in range(licenses)]}
+
+
+async def drive(url: str, endpoint: str, concurrency: int, duration: float, licenses: int,
+                tag: str) -> Tuple[List[float], int, float]:
+    """Latencies of the successful requests, the error count, and the wall time until the last answer."""
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+    deadline = time.monotonic() + duration
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while time.monotonic() < deadline:
+            path, body = request_body(endpoint, next(counter), licenses, tag)
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+    # Requests queued at the deadline still finish, so throughput is over the real wall time
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=("rura", "webhook"), default="rura")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated client counts.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per server and client count.")
+    parser.add_argument("--latency", type=float, default=0.1, help="FakeRuraServer seconds per call.")
+    parser.add_argument("--licenses", type=int, default=400, help="Licences per verification request.")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    rura = FakeRuraServer(latency=args.latency).start()
+    tmp = tempfile.TemporaryDirectory()
+    env = dict(os.environ, SECRET_KEY="bench", SQLITE_PATH=os.path.join(tmp.name, "bench.sqlite3"),
+               RURA_API_URL=rura.url, LOG_LEVEL="WARNING", DJANGO_SETTINGS_MODULE="ishemalink_api.settings")
+    subprocess.run([sys.executable, "manage.py", "migrate", "-v", "0"], env=env, cwd=ROOT, check=True)
+
+    print(f"{args.endpoint}: {'server':6} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    try:
+        for mode in SERVERS:
+            process, url = start(mode, env)
+            try:
+                for concurrency in levels:
+                    tag = f"{mode}{concurrency}"
+                    latencies, errors, wall = asyncio.run(
+                        drive(url, args.endpoint, concurrency, args.duration, args.licenses, tag)
+                    )
+                    p50, p95 = np.percentile(latencies, [50, 95]) * 1000 if latencies else (float("nan"),) * 2
+                    print(f"{args.endpoint}: {mode:6} {concurrency:7d} {len(latencies) / wall:8.1f} "
+                          f"{p50:8.1f} {p95:8.1f} {errors:7d}")
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        rura.stop()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
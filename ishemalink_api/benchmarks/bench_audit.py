@@ -0,0 +1,49 @@
+"""
+Audit middleware overhead on the request path.
+
+    python -m benchmarks.bench_audit [--requests 200000]
+
+Times AuditMiddleware around a trivial view against the bare view, for an audited
+and an unaudited path. Flushing is disabled, so no database is needed.
+"""
+import argparse
+import time
+from django.conf import settings
+
+settings.configure(ALLOWED_HOSTS=["*"], USE_TZ=True)
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+from gov import audit
+from gov.middleware import AuditMiddleware
+
+
+def per_call_us(handler, request, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        handler(request)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200_000)
+    args = parser.parse_args()
+
+    audit.audit_log.flush_size = audit.audit_log.max_buffer = args.requests * 3
+
+    def view(request):
+        return HttpResponse()
+
+    middleware = AuditMiddleware(view)
+    factory = RequestFactory()
+    for path in ("/tracking/42/live/", "/health/"):
+        request = factory.get(path)
+        bare = per_call_us(view, request, args.requests)
+        audited = per_call_us(middleware, request, args.requests)
+        print(f"{path:<22} bare {bare:6.2f} µs  with audit {audited:6.2f} µs  overhead {audited - bare:5.2f} µs")
+    print(f"events buffered: {audit.audit_log.pending():,}")
+
+
+if __name__ == "__main__":
+    main()
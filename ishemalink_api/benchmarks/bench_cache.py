@@ -0,0 +1,100 @@
+"""
+Response cache: latency of the cached read endpoints with VIEW_CACHE off and on.
+
+    python -m benchmarks.bench_cache [--shipments 20000] [--requests 2000]
+
+Seeds a throwaway SQLite database with paid shipments, rolls them up, then
+requests each cached endpoint through the full middleware stack, cycling
+through a few query strings as dashboards do. Prints median latency per
+endpoint uncached and cached, and the hit rate and view time saved as
+exported at /metrics/.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["SQLITE_PATH"] = os.path.join(_tmp.name, "bench.sqlite3")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ishemalink_api.settings")
+
+import django
+
+django.setup()
+
+from django.core.management import call_command
+from django.test import Client, override_settings
+from analytics.rollups import refresh_rollups
+from Core import caching
+from Core.models import Driver, Shipment
+
+PATHS = [
+    "/api/",
+    "/analytics/routes/top/",
+    "/analytics/commodities/breakdown/",
+    "/analytics/revenue/heatmap/",
+    "/analytics/drivers/leaderboard/",
+    "/gov/rura/verify-license/RWA1234/",
+]
+# Distinct query strings per endpoint, as from a handful of dashboard widgets
+VARIANTS = ["", "?limit=10", "?limit=20"]
+
+TOWNS = ["Kigali", "Huye", "Musanze", "Rubavu", "Rusizi", "Nyagatare", "Muhanga"]
+COMMODITIES = ["Potatoes", "Beans", "Coffee", "Tea", "Maize", "Cement"]
+SECTORS = ["Gasabo", "Kicukiro", "Nyarugenge", "Remera", "Kimironko"]
+
+
+def seed(shipments: int) -> None:
+    rng = random.Random(7)
+    drivers = Driver.objects.bulk_create([
+        Driver(name=f"Driver {i}", phone_number="0780000000", license_number=f"RWA{i}") for i in range(200)
+    ])
+    Shipment.objects.bulk_create([
+        Shipment(
+            shipment_type="domestic", weight=rng.uniform(10, 2000), tariff=rng.uniform(1e4, 2e6),
+            phone_number="0781234567", status="confirmed", origin=rng.choice(TOWNS), destination=rng.choice(TOWNS),
+            commodity=rng.choice(COMMODITIES), sector=rng.choice(SECTORS), assigned_driver=rng.choice(drivers),
+        )
+        for _ in range(shipments)
+    ], batch_size=2000)
+    while refresh_rollups():
+        pass
+
+
+def latency(client: Client, path: str, n: int) -> float:
+    samples = []
+    for i in range(n):
+        started = time.perf_counter()
+        response = client.get(path + VARIANTS[i % len(VARIANTS)])
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.content
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shipments", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint and variant.")
+    args = parser.parse_args()
+    call_command("migrate", verbosity=0)
+    seed(args.shipments)
+
+    client = Client(SERVER_NAME="localhost")
+    print(f"{'endpoint':36} {'uncached':>10} {'cached':>10} {'speed-up':>9}")
+    for path in PATHS:
+        with override_settings(VIEW_CACHE=False):
+            uncached = latency(client, path, args.requests)
+        cached = latency(client, path, args.requests)
+        print(f"{path:36} {uncached * 1e6:8.0f}us {cached * 1e6:8.0f}us {uncached / cached:8.1f}x")
+
+    print()
+    for view, counts in sorted(caching.stats().items()):
+        print(f"{view:40} hit rate {counts['hit_rate']:6.1%}   "
+              f"view time saved {counts.get('saved_seconds', 0.0):7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
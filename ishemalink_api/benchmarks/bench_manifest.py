@@ -0,0 +1,56 @@
+"""
+Customs manifest streaming: time-to-first-byte and peak memory vs manifest size.
+
+    python -m benchmarks.bench_manifest [--sizes 1000 10000 100000] [--gzip]
+
+Feeds synthetic values_list rows to gov.manifest.stream_manifest, so no database is needed.
+Peak memory should stay flat as the consignment count grows.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+
+settings.configure(USE_TZ=True)
+
+from gov.manifest import gzip_stream, stream_manifest
+
+STARTED = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def synthetic(rows: int):
+    for i in range(1, rows + 1):
+        yield (i, "Kigali", "Kampala", "Coffee", 100.0 + i % 900, 300000.0 + i, "0788000000", "confirmed",
+               "Driver %d" % (i % 50), "RWA-%05d" % (i % 50), STARTED + timedelta(minutes=i))
+
+
+def run(rows: int, compress: bool):
+    tracemalloc.start()
+    started = time.perf_counter()
+    chunks = stream_manifest(synthetic(rows), "IL-BENCH")
+    if compress:
+        chunks = gzip_stream(chunks)
+    first = next(chunks)
+    ttfb = time.perf_counter() - started
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ttfb, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--gzip", action="store_true", help="Measure the gzip-encoded stream.")
+    args = parser.parse_args()
+
+    print(f"{'consignments':>12}  {'TTFB ms':>8}  {'total s':>8}  {'output MiB':>10}  {'peak KiB':>9}")
+    for rows in args.sizes:
+        ttfb, total, size, peak = run(rows, args.gzip)
+        print(f"{rows:>12,}  {ttfb * 1000:8.2f}  {total:8.2f}  {size / 2**20:10.2f}  {peak / 1024:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Instrumentation overhead: MetricsMiddleware and the BookingService timers vs a booking request.
+
+    python -m benchmarks.bench_metrics [--requests 2000] [--rounds 5]
+
+Books shipments through the full middleware stack, on a throwaway SQLite
+database, with and without MetricsMiddleware in interleaved rounds. Round-to-round
+noise is larger than the overhead itself, so the instrumentation's own costs are
+also timed in isolation: the middleware around a no-op view, the query wrapper per
+query, and one timer. Their sum for a booking's query count, as a share of the
+booking's latency, is the figure to keep under 1%.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["SQLITE_PATH"] = os.path.join(_tmp.name, "bench.sqlite3")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ishemalink_api.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve
+from Core import metrics
+from Core.middleware import MetricsMiddleware, QueryTimer
+
+BOOKING = {"type": "domestic", "weight": 120, "phone_number": "0781234567", "origin": "Kigali", "destination": "Huye"}
+
+
+def per_call(func, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - started) / n
+
+
+def book(client: Client) -> None:
+    response = client.post("/api/shipments/create/", BOOKING, content_type="application/json")
+    assert response.status_code == 201, response.content
+
+
+def bookings(client: Client, n: int) -> float:
+    return per_call(lambda: book(client), n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Bookings per round and variant.")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    call_command("migrate", verbosity=0)
+
+    without = [m for m in settings.MIDDLEWARE if m != "Core.middleware.MetricsMiddleware"]
+    # A client loads the middleware setting on its first request
+    with override_settings(MIDDLEWARE=without):
+        plain = Client(SERVER_NAME="localhost")
+        bookings(plain, 50)
+    instrumented = Client(SERVER_NAME="localhost")
+    bookings(instrumented, 50)
+    plain_times, instrumented_times = [], []
+    for _ in range(args.rounds):
+        plain_times.append(bookings(plain, args.requests))
+        instrumented_times.append(bookings(instrumented, args.requests))
+    base, measured = statistics.median(plain_times), statistics.median(instrumented_times)
+    print(f"booking request   plain {base * 1e6:8.1f} us   instrumented {measured * 1e6:8.1f} us   "
+          f"difference {(measured / base - 1) * 100:+.2f}% (median of {args.rounds} rounds)")
+
+    queries = QueryTimer()
+    with connection.execute_wrapper(queries):
+        book(plain)
+    per_booking = queries.count
+
+    request = RequestFactory().post("/api/shipments/create/")
+    request.resolver_match = resolve("/api/shipments/create/")
+    response = HttpResponse()
+    middleware = MetricsMiddleware(lambda r: response)
+    n = 100000
+    fixed = per_call(lambda: middleware(request), n) - per_call(lambda: response, n)
+
+    cursor = connection.cursor()
+    query = lambda: cursor.execute("SELECT 1")
+    bare = per_call(query, n)
+    with connection.execute_wrapper(QueryTimer()):
+        wrapped = per_call(query, n)
+    per_query = wrapped - bare
+
+    timer = metrics.timed("bench")(lambda: None)
+    timed = per_call(timer, n) - per_call(lambda: None, n)
+
+    total = fixed + per_query * per_booking + timed
+    print(f"middleware        {fixed * 1e6:8.2f} us per request")
+    print(f"query wrapper     {per_query * 1e6:8.2f} us per query x {per_booking} queries per booking")
+    print(f"operation timer   {timed * 1e6:8.2f} us per call")
+    print(f"overhead          {total * 1e6:8.2f} us per booking = {total / base * 100:.2f}% of {base * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
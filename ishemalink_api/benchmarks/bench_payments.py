@@ -0,0 +1,66 @@
+"""
+Payment prompts: one blocking request per prompt vs the pooled async client.
+
+    python -m benchmarks.bench_payments [--prompts 300] [--latency 0.05] [--concurrency 50]
+
+Runs against the local MockMomoServer, so no database or provider access is needed.
+The blocking baseline opens a connection per prompt, as a urllib call per booking would.
+"""
+import argparse
+import json
+import time
+import urllib.request
+from payments.client import PaymentGateway, build_providers
+from payments.fakes import MockMomoServer
+
+
+def prompts(count: int):
+    # Half MTN, half Airtel numbers
+    return [
+        {"amount": 1000 + i, "phone_number": f"07{8 if i % 2 else 3}{i:07d}", "reference": str(i)}
+        for i in range(count)
+    ]
+
+
+def blocking(url: str, payments):
+    for p in payments:
+        body = json.dumps({"externalId": p["reference"], "amount": str(p["amount"])}).encode("utf-8")
+        request = urllib.request.Request(
+            f"{url}/collection/v1_0/requesttopay", data=body, headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        urllib.request.urlopen(request, timeout=10).close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="Provider seconds per request.")
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    payments = prompts(args.prompts)
+    server = MockMomoServer(latency=args.latency).start()
+    try:
+        started = time.perf_counter()
+        blocking(server.url, payments)
+        wall = time.perf_counter() - started
+        print(f"{'blocking':<8} {wall:6.2f} s  {args.prompts / wall:8.1f} prompts/s  connections {len(server.connections):,}")
+
+        server.connections.clear()
+        gateway = PaymentGateway(build_providers(server.url, server.url), concurrency=args.concurrency)
+        try:
+            started = time.perf_counter()
+            results = gateway.initiate_payments(payments)
+            wall = time.perf_counter() - started
+        finally:
+            gateway.close()
+        pending = sum(1 for r in results if r["status"] == "pending")
+        print(f"{'pooled':<8} {wall:6.2f} s  {args.prompts / wall:8.1f} prompts/s  connections {len(server.connections):,}"
+              f"  accepted {pending:,}/{len(results):,}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
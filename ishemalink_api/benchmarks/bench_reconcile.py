@@ -0,0 +1,69 @@
+"""
+Payment reconciliation: statement rows per second and peak memory vs statement size.
+
+    python -m benchmarks.bench_reconcile [--rows 100000 1000000] [--format csv|jsonl]
+
+Writes a synthetic provider statement to a temporary file and streams it through
+Core.reconciliation against an in-memory shipment index (one entry per statement
+row), so no database is needed. Memory beyond the index should stay flat as the
+statement grows; one row in a hundred is a mismatch.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import django
+from django.conf import settings
+
+settings.configure(USE_TZ=True, INSTALLED_APPS=["Core"])
+django.setup()
+
+from Core import reconciliation
+
+
+def write_statement(path: str, rows: int, fmt: str) -> None:
+    rng = random.Random(5)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            f.write("Financial Transaction Id,External Id,Amount,Currency,Status\n")
+        for i in range(1, rows + 1):
+            amount = 1000.0 + i % 500 + (250 if rng.random() < 0.01 else 0)
+            if fmt == "csv":
+                f.write(f"FT{i},{i},{amount:.0f},RWF,SUCCESSFUL\n")
+            else:
+                f.write(json.dumps({"transaction_id": f"FT{i}", "reference": str(i), "amount": amount,
+                                    "status": "SUCCESSFUL"}) + "\n")
+
+
+def run(rows: int, fmt: str):
+    index = {i: ("confirmed", 1000.0 + i % 500) for i in range(1, rows + 1)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"statement.{fmt}")
+        write_statement(path, rows, fmt)
+        size_mb = os.path.getsize(path) / 1e6
+        tracemalloc.start()
+        started = time.perf_counter()
+        counts = reconciliation.run(path, index)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return size_mb, elapsed, peak, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    args = parser.parse_args()
+    for rows in args.rows:
+        size_mb, elapsed, peak, counts = run(rows, args.format)
+        # Under tracemalloc; without it the pipeline runs several times faster
+        print(f"{rows:>9,} rows  {size_mb:7.1f} MB  {elapsed:6.2f} s  {rows / elapsed:9,.0f} rows/s  "
+              f"peak {peak / 1e6:6.2f} MB (traced)  mismatches {counts.get('amount_mismatch', 0):,}")
+
+
+if __name__ == "__main__":
+    main()
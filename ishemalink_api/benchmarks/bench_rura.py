@@ -0,0 +1,67 @@
+"""
+RURA licence verification: direct upstream calls vs the cached, coalescing verifier.
+
+    python -m benchmarks.bench_rura [--lookups 4000] [--licences 500] [--threads 16] [--latency 0.05]
+
+Runs against the local FakeRuraServer with Zipf-distributed lookups (a few busy drivers,
+a long tail), so no database or network access is needed.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from gov.fakes import FakeRuraServer
+from gov.rura import HttpRuraBackend, RuraVerifier
+
+
+def workload(lookups: int, licences: int, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.3, lookups), licences)
+    # One licence in ten is invalid, to exercise negative caching
+    return [f"{'RWA' if r % 10 else 'UNK'}-{r:05d}" for r in ranks]
+
+
+def run(verify, licences, threads):
+    latencies = []
+
+    def timed(no):
+        started = time.perf_counter()
+        verify(no)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(timed, licences))
+    wall = time.perf_counter() - started
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return wall, p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=4000)
+    parser.add_argument("--licences", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Upstream seconds per request.")
+    args = parser.parse_args()
+
+    lookups = workload(args.lookups, args.licences)
+    server = FakeRuraServer(latency=args.latency).start()
+    try:
+        backend = HttpRuraBackend(server.url)
+        wall, p50, p99 = run(lambda no: backend.verify_many([no]), lookups, args.threads)
+        direct_requests = server.requests
+        print(f"{'direct':<8} {wall:6.2f} s  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  upstream requests {direct_requests:,}")
+
+        verifier = RuraVerifier(backend)
+        wall, p50, p99 = run(verifier.verify, lookups, args.threads)
+        cached_requests = server.requests - direct_requests
+        print(f"{'cached':<8} {wall:6.2f} s  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  upstream requests {cached_requests:,}")
+        print(f"hit rate {verifier.hit_rate():.1%}, coalesced {verifier.stats['coalesced']:,} "
+              f"of {len(set(lookups)):,} distinct licences")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Re-pricing throughput: scalar TariffEngine.quote() vs NumPy quote_batch().
+
+    python -m benchmarks.bench_tariffs [--rows 1000000]
+
+Uses a synthetic rate table and synthetic shipments, so no database is needed.
+"""
+import argparse
+import time
+import numpy as np
+from Core.tariffs import TariffEngine
+
+RATES = {
+    "base_per_kg": {"domestic": 1000, "international": 3000},
+    "weight_bands": [[100, 1.0], [1000, 0.95], [5000, 0.9], [None, 0.85]],
+    "per_km": {"domestic": 50, "international": 80},
+    "route_km": {"Kigali - Musanze": 95, "Kigali - Huye": 135, "Kigali - Rubavu": 160, "Kigali - Kampala": 515},
+    "commodity_surcharge": {"Electronics": 0.15, "Perishables": 0.1},
+    "border_fee": {"*": 20000, "Kampala": 25000, "Nairobi": 35000},
+}
+ORIGINS = ["Kigali"]
+DESTINATIONS = ["Musanze", "Huye", "Rubavu", "Kampala", "Nairobi"]
+COMMODITIES = ["Potatoes", "Beans", "Electronics", "Perishables", ""]
+
+
+def synthetic(rows: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    types = rng.choice(["domestic", "international"], rows).tolist()
+    weights = rng.uniform(1, 8000, rows)
+    origins = rng.choice(ORIGINS, rows).tolist()
+    destinations = rng.choice(DESTINATIONS, rows).tolist()
+    commodities = rng.choice(COMMODITIES, rows).tolist()
+    return types, weights, origins, destinations, commodities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--scalar-rows", type=int, default=100_000, help="Sample size for the scalar baseline.")
+    args = parser.parse_args()
+
+    engine = TariffEngine(RATES, "bench")
+    types, weights, origins, destinations, commodities = synthetic(args.rows)
+
+    started = time.perf_counter()
+    batch = engine.quote_batch(types, weights, origins, destinations, commodities)
+    batch_seconds = time.perf_counter() - started
+
+    n = min(args.scalar_rows, args.rows)
+    started = time.perf_counter()
+    scalar = [engine.quote(types[i], weights[i], origins[i], destinations[i], commodities[i]) for i in range(n)]
+    scalar_seconds = (time.perf_counter() - started) * args.rows / n
+
+    assert np.allclose(batch[:n], scalar), "quote_batch diverges from quote"
+    print(f"rows:          {args.rows:,}")
+    print(f"quote_batch:   {batch_seconds:8.2f} s  ({args.rows / batch_seconds:,.0f} rows/s)")
+    print(f"quote (loop):  {scalar_seconds:8.2f} s  (extrapolated from {n:,} rows)")
+    print(f"speed-up:      {scalar_seconds / batch_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Background tasks: request latency with a slow payment gateway, and how long the workers take to catch up.
+
+    python -m benchmarks.bench_tasks [--shipments 200] [--latency 0,0.25,1] [--workers 4]
+
+Runs on a throwaway SQLite database against a local MockMomoServer that
+answers each request-to-pay after `latency` seconds. Task workers run in
+this process on a LocalBroker. For each latency it books `shipments`
+shipments and then posts their payment webhooks through the full middleware
+stack. It prints:
+- the median booking and webhook request times
+- the median time of one inline gateway call, which the request used to wait for
+- how long the workers took to send every prompt and to settle every shipment
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from payments.fakes import MockMomoServer
+
+_tmp = tempfile.TemporaryDirectory()
+_momo = MockMomoServer().start()
+os.environ["SQLITE_PATH"] = os.path.join(_tmp.name, "bench.sqlite3")
+os.environ["MTN_MOMO_URL"] = _momo.url
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ishemalink_api.settings")
+
+import django
+
+django.setup()
+
+from django.core.management import call_command
+from django.test import Client
+from Core import taskqueue
+from Core.models import Driver, Shipment
+from Core.services import booking_service
+
+BOOKING = {"type": "domestic", "weight": 120, "phone_number": "0781234567", "origin": "Kigali", "destination": "Huye"}
+
+
+def timed_posts(client: Client, path: str, bodies) -> float:
+    samples = []
+    for body in bodies:
+        started = time.perf_counter()
+        response = client.post(path, body, content_type="application/json")
+        samples.append(time.perf_counter() - started)
+        assert response.status_code in (200, 201), response.content
+    return statistics.median(samples)
+
+
+def timed_call(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def wait_until(condition, timeout: float = 600) -> float:
+    started = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError("workers did not catch up")
+        time.sleep(0.05)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shipments", type=int, default=200)
+    parser.add_argument("--latency", default="0,0.25,1", help="Comma-separated gateway seconds per request.")
+    parser.add_argument("--workers", type=int, default=4, help="Task calls run concurrently.")
+    args = parser.parse_args()
+    call_command("migrate", verbosity=0)
+    Driver.objects.bulk_create([
+        Driver(name=f"Driver {i}", phone_number="0780000000", license_number=f"RWA{i}") for i in range(50)
+    ])
+
+    worker = taskqueue.TaskWorker(taskqueue.get_broker(), max_workers=args.workers)
+    stop = threading.Event()
+    thread = threading.Thread(target=worker.run, args=(stop,), kwargs={"interval": 0.05}, daemon=True)
+    thread.start()
+    client = Client(SERVER_NAME="localhost")
+
+    print(f"{'gateway':>8} {'booking':>10} {'webhook':>10} {'inline call':>12} {'prompts sent':>13} {'settled':>9}")
+    try:
+        for latency in (float(x) for x in args.latency.split(",")):
+            _momo.latency = latency
+            accepted = _momo.accepted
+            first_id = (Shipment.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+            booking = timed_posts(client, "/api/shipments/create/", [BOOKING] * args.shipments)
+            sent = wait_until(lambda: _momo.accepted - accepted >= args.shipments)
+
+            ids = range(first_id, first_id + args.shipments)
+            webhooks = [{"transaction_id": f"BENCH-{i}", "reference": str(i), "status": "success"} for i in ids]
+            webhook = timed_posts(client, "/api/payments/webhook/", webhooks)
+            pending = Shipment.objects.filter(id__in=ids, status="pending_payment")
+            settled = wait_until(lambda: not pending.exists())
+
+            inline = statistics.median(
+                timed_call(lambda: booking_service.publish_payment_requests([{
+                    "amount": 1000, "phone_number": "0781234567", "reference": f"inline-{i}",
+                }])) for i in range(3)
+            )
+            print(f"{latency * 1000:6.0f}ms {booking * 1000:8.1f}ms {webhook * 1000:8.1f}ms {inline * 1000:10.1f}ms "
+                  f"{sent:12.2f}s {settled:8.2f}s")
+    finally:
+        stop.set()
+        thread.join()
+        worker.close()
+        _momo.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Trajectory storage: one row per GPS ping vs delta-encoded chunks per shipment-day.
+
+    python -m benchmarks.bench_trajectory [--trucks 200] [--hours 12] [--interval 5]
+
+Both layouts are written to throwaway SQLite files with the standard library, so no
+Django database is needed; the chunk layout uses the real tracking.trajectory codec.
+Reports on-disk size, the memory of a loaded day, and range-query latency.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+
+from tracking.trajectory import decode_points, douglas_peucker, encode_points, encode_polyline
+
+DAY_START = 1_760_000_000.0
+
+
+def synthetic_day(trucks: int, hours: float, interval: float, seed: int = 3):
+    """A random walk per truck with realistic GPS jitter, one ping every `interval` seconds."""
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 / interval)
+    for truck in range(1, trucks + 1):
+        heading = np.cumsum(rng.normal(0, 0.05, n))
+        step = interval * 12 / 111_320  # ~12 m/s
+        lat = -1.95 + np.cumsum(np.sin(heading) * step) + rng.normal(0, 2e-5, n)
+        lng = 30.06 + np.cumsum(np.cos(heading) * step) + rng.normal(0, 2e-5, n)
+        yield truck, np.column_stack((lat, lng, DAY_START + np.arange(n) * interval))
+
+
+def build(path_rows: str, path_chunks: str, args):
+    rows_db, chunks_db = sqlite3.connect(path_rows), sqlite3.connect(path_chunks)
+    rows_db.execute("CREATE TABLE ping (id INTEGER PRIMARY KEY, shipment_id INT, ts REAL, lat REAL, lng REAL)")
+    rows_db.execute("CREATE INDEX ping_shipment_ts ON ping (shipment_id, ts)")
+    chunks_db.execute(
+        "CREATE TABLE chunk (id INTEGER PRIMARY KEY, shipment_id INT, day TEXT, start_ts REAL, end_ts REAL,"
+        " points INT, data BLOB)"
+    )
+    chunks_db.execute("CREATE INDEX chunk_shipment_day ON chunk (shipment_id, day, start_ts)")
+    total = 0
+    for truck, points in synthetic_day(args.trucks, args.hours, args.interval):
+        rows_db.executemany(
+            "INSERT INTO ping (shipment_id, ts, lat, lng) VALUES (?, ?, ?, ?)",
+            ((truck, ts, lat, lng) for lat, lng, ts in points.tolist()),
+        )
+        # Chunks as the ingestion buffer writes them: one per flush window
+        for part in np.array_split(points, max(1, len(points) // args.chunk_points)):
+            data, start_ts = encode_points(part)
+            chunks_db.execute(
+                "INSERT INTO chunk (shipment_id, day, start_ts, end_ts, points, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (truck, "2025-10-09", start_ts, float(part[-1, 2]), len(part), data),
+            )
+        total += len(points)
+    rows_db.commit()
+    chunks_db.commit()
+    return rows_db, chunks_db, total
+
+
+def query_rows(db, truck, start, end):
+    rows = db.execute(
+        "SELECT lat, lng, ts FROM ping WHERE shipment_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+        (truck, start, end),
+    ).fetchall()
+    return rows
+
+
+def query_chunks(db, truck, start, end):
+    parts = [
+        decode_points(data, chunk_start, count)
+        for data, chunk_start, count in db.execute(
+            "SELECT data, start_ts, points FROM chunk WHERE shipment_id = ? AND day = ? AND end_ts >= ?"
+            " AND start_ts <= ? ORDER BY start_ts",
+            (truck, "2025-10-09", start, end),
+        )
+    ]
+    points = np.concatenate(parts)
+    return points[(points[:, 2] >= start) & (points[:, 2] <= end)]
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trucks", type=int, default=200)
+    parser.add_argument("--hours", type=float, default=12)
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between pings.")
+    parser.add_argument("--chunk-points", type=int, default=5000, help="Points per stored chunk.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path_rows, path_chunks = os.path.join(tmp, "rows.db"), os.path.join(tmp, "chunks.db")
+        rows_db, chunks_db, total = build(path_rows, path_chunks, args)
+        rows_size, chunks_size = os.path.getsize(path_rows), os.path.getsize(path_chunks)
+
+        truck, day_end = args.trucks // 2, DAY_START + args.hours * 3600
+        window = (DAY_START + 3600, DAY_START + 3 * 3600)
+        rows_day_ms, day_rows = timed(lambda: query_rows(rows_db, truck, DAY_START, day_end), args.repeat)
+        chunks_day_ms, day_points = timed(lambda: query_chunks(chunks_db, truck, DAY_START, day_end), args.repeat)
+        rows_win_ms, _ = timed(lambda: query_rows(rows_db, truck, *window), args.repeat)
+        chunks_win_ms, _ = timed(lambda: query_chunks(chunks_db, truck, *window), args.repeat)
+        polyline_ms, simplified = timed(lambda: douglas_peucker(day_points, 15.0), 3)
+        encoded = encode_polyline(simplified)
+
+    assert len(day_rows) == len(day_points), "layouts disagree on the day's point count"
+    rows_mem = sys.getsizeof(day_rows) + sum(sys.getsizeof(r) + 3 * 24 for r in day_rows)
+    print(f"points stored:        {total:,} ({args.trucks} trucks x {args.hours:g} h @ {args.interval:g} s)")
+    print(f"disk, per-row:        {rows_size / 2**20:8.1f} MiB  ({rows_size / total:.1f} B/point)")
+    print(f"disk, chunks:         {chunks_size / 2**20:8.1f} MiB  ({chunks_size / total:.1f} B/point)")
+    print(f"loaded day, per-row:  {rows_mem / 2**20:8.2f} MiB  ({len(day_rows):,} tuples)")
+    print(f"loaded day, chunks:   {day_points.nbytes / 2**20:8.2f} MiB  (ndarray)")
+    print(f"full day query:       {rows_day_ms:8.2f} ms per-row  vs {chunks_day_ms:8.2f} ms chunks")
+    print(f"2 h window query:     {rows_win_ms:8.2f} ms per-row  vs {chunks_win_ms:8.2f} ms chunks")
+    print(f"simplify day (15 m):  {polyline_ms:8.2f} ms  {len(day_points):,} -> {len(simplified):,} points,"
+          f" polyline {len(encoded):,} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Load test: replays booking and webhook traffic against the app and reports
+p50/p95/p99 latency and throughput per endpoint, failing on regressions.
+
+    python -m benchmarks.load [--duration 30] [--concurrency 10] [--mix book=6,bulk=1,webhook=3]
+                              [--url http://localhost:8000] [--postgres]
+                              [--thresholds benchmarks/load_thresholds.json]
+                              [--baseline last.json] [--max-regression 0.2] [--save report.json]
+
+Without --url the app is started in a subprocess on a fresh SQLite database (or,
+with --postgres, on the database configured by POSTGRES_*), with the webhook
+inbox and outbox relay draining in the background as in production. Virtual
+users book shipments, send bulk bookings, and settle their own bookings with
+provider webhooks, some of them replayed. Exits 1 when a threshold or, with
+--baseline, a previous report is exceeded by more than --max-regression.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(__file__), "load_thresholds.json")
+
+ENDPOINTS = {
+    "book": ("POST", "/api/shipments/create/"),
+    "bulk": ("POST", "/api/shipments/bulk/"),
+    "webhook": ("POST", "/api/payments/webhook/"),
+}
+
+# Shipments per bulk booking request
+BULK_ROWS = 50
+
+# Share of webhooks that report a failed payment, and that repeat an earlier delivery
+WEBHOOK_FAILURE_RATE = 0.1
+WEBHOOK_REPLAY_RATE = 0.05
+
+PLACES = ("Kigali", "Musanze", "Huye", "Rubavu", "Rusizi", "Nyagatare", "Kampala", "Goma")
+COMMODITIES = ("maize", "beans", "coffee", "tea", "potatoes", "rice")
+
+Sample = Tuple[str, float, bool]
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name.strip()!r}; expected one of {', '.join(ENDPOINTS)}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def booking(rng: random.Random) -> Dict[str, Any]:
+    origin, destination = rng.sample(PLACES, 2)
+    international = destination in ("Kampala", "Goma")
+    return {
+        "type": "international" if international else "domestic",
+        "weight": round(rng.uniform(5, 2000), 1),
+        "phone_number": f"07{rng.choice('2389')}{rng.randrange(10 ** 7):07d}",
+        "origin": origin,
+        "destination": destination,
+        "commodity": rng.choice(COMMODITIES),
+        "pickup": {"lat": round(rng.uniform(-2.8, -1.1), 5), "lng": round(rng.uniform(28.9, 30.8), 5)},
+    }
+
+
+class Traffic:
+    """
+    Shared state of one run: bookings awaiting their webhook, deliveries that
+    may be replayed, and the latency samples of every virtual user.
+    """
+    def __init__(self, mix: Dict[str, int], seed: int = 7):
+        self.rng = random.Random(seed)
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.unpaid: Deque[str] = deque()
+        self.delivered: Deque[Dict[str, Any]] = deque(maxlen=1000)
+        self.samples: List[Sample] = []
+
+    def next_request(self) -> Tuple[str, Dict[str, Any]]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        if name == "webhook":
+            if self.delivered and self.rng.random() < WEBHOOK_REPLAY_RATE:
+                return name, self.rng.choice(self.delivered)
+            if not self.unpaid:
+                # Nothing to settle yet; book instead so the webhook stream has work
+                return "book", booking(self.rng)
+            reference = self.unpaid.popleft()
+            payload = {
+                "transaction_id": f"LOAD-{reference}",
+                "reference": reference,
+                "status": "failed" if self.rng.random() < WEBHOOK_FAILURE_RATE else "success",
+            }
+            self.delivered.append(payload)
+            return name, payload
+        if name == "bulk":
+            return name, [booking(self.rng) for _ in range(BULK_ROWS)]
+        return name, booking(self.rng)
+
+    def record(self, name: str, latency: float, ok: bool, body: Optional[Dict[str, Any]],
+               measured: bool = True) -> None:
+        if measured:
+            self.samples.append((name, latency, ok))
+        if not ok or body is None:
+            return
+        if name == "book":
+            self.unpaid.append(str(body["shipment_id"]))
+        elif name == "bulk":
+            self.unpaid.extend(str(r["shipment_id"]) for r in body["results"] if r["status"] != "rejected")
+
+
+async def virtual_user(client: httpx.AsyncClient, traffic: Traffic, until: float, measure_from: float) -> None:
+    while True:
+        started = time.perf_counter()
+        if started >= until:
+            return
+        name, payload = traffic.next_request()
+        method, path = ENDPOINTS[name]
+        body = None
+        try:
+            response = await client.request(method, path, json=payload)
+            ok = response.status_code < 400
+            if ok and name != "webhook":
+                body = response.json()
+        except httpx.HTTPError:
+            ok = False
+        # Bookings made during warm-up are not measured but still feed the webhook stream
+        traffic.record(name, time.perf_counter() - started, ok, body, measured=started >= measure_from)
+
+
+async def drive(url: str, mix: Dict[str, int], duration: float, concurrency: int, warmup: float,
+                timeout: float = 30.0) -> Tuple[List[Sample], float]:
+    """Runs `concurrency` virtual users for warmup + duration seconds; returns the samples and measured seconds."""
+    traffic = Traffic(mix)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        measure_from, until = start + warmup, start + warmup + duration
+        await asyncio.gather(*(virtual_user(client, traffic, until, measure_from) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - measure_from
+    return traffic.samples, elapsed
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Dict[str, float]]:
+    """Per endpoint: requests, errors, error_rate, rps and p50/p95/p99/max latency in milliseconds."""
+    by_name: Dict[str, List[Tuple[float, bool]]] = {}
+    for name, latency, ok in samples:
+        by_name.setdefault(name, []).append((latency, ok))
+    summary = {}
+    for name, rows in sorted(by_name.items()):
+        latencies = np.array([latency for latency, _ in rows]) * 1000
+        errors = sum(1 for _, ok in rows if not ok)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary[name] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows),
+            "rps": len(rows) / elapsed if elapsed else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(latencies.max()),
+        }
+    return summary
+
+
+def check(summary: Dict[str, Dict[str, float]], thresholds: Dict[str, Dict[str, float]],
+          baseline: Optional[Dict[str, Dict[str, float]]] = None, max_regression: float = 0.2) -> List[str]:
+    """
+    Violations of the thresholds per endpoint, upper bounds keyed by statistic
+    ({"p95_ms": 300, "error_rate": 0.01}) and lower bounds by min_ ({"min_rps": 20});
+    with a baseline summary, also p50 or p95 latency more than max_regression
+    above it and throughput more than max_regression below.
+    """
+    violations = []
+    for name, limits in thresholds.items():
+        stats = summary.get(name)
+        if stats is None:
+            continue
+        for metric, limit in limits.items():
+            if metric.startswith("min_"):
+                value = stats[metric[4:]]
+                if value < limit:
+                    violations.append(f"{name}: {metric[4:]} {value:.1f} below {limit}")
+            else:
+                value = stats[metric]
+                if value > limit:
+                    violations.append(f"{name}: {metric} {value:.3g} above {limit}")
+    for name, before in (baseline or {}).items():
+        stats = summary.get(name)
+        if stats is None:
+            continue
+        # p99 of a short run is too noisy to compare; it is held to its threshold instead
+        for metric in ("p50_ms", "p95_ms"):
+            if before.get(metric) and stats[metric] > before[metric] * (1 + max_regression):
+                violations.append(f"{name}: {metric} {stats[metric]:.1f} regressed from {before[metric]:.1f}")
+        if before.get("rps") and stats["rps"] < before["rps"] * (1 - max_regression):
+            violations.append(f"{name}: rps {stats['rps']:.1f} regressed from {before['rps']:.1f}")
+    return violations
+
+
+def format_table(summary: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'endpoint':<8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+             f"{'p99 ms':>8} {'max ms':>8}"]
+    for name, s in summary.items():
+        lines.append(f"{name:<8} {s['requests']:>9,} {s['errors']:>7,} {s['rps']:>8.1f} {s['p50_ms']:>8.1f} "
+                     f"{s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+    return "\n".join(lines)
+
+
+def _background_workers(stop: threading.Event) -> None:
+    # The inbox worker and outbox relay, so webhooks and bookings contend for rows as in production
+    from django.db import connection
+    from Core.outbox import OutboxRelay
+    from Core.services import booking_service
+    relay = OutboxRelay(booking_service.outbox_handlers())
+    try:
+        while not stop.is_set():
+            busy = booking_service.drain_webhook_inbox() + relay.run_once()
+            if not busy:
+                stop.wait(0.2)
+    finally:
+        relay.close()
+        connection.close()
+
+
+def serve(port: int, workers: bool) -> None:
+    """Migrates the configured database and serves the app on 127.0.0.1:port; prints "ready <port>"."""
+    import django
+    from django.core.management import call_command
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ishemalink_api.settings")
+    django.setup()
+    call_command("migrate", verbosity=0)
+    from ishemalink_api.wsgi import application
+    server = ThreadedWSGIServer(("127.0.0.1", port), QuietHandler)
+    server.set_app(application)
+    stop = threading.Event()
+    if workers:
+        threading.Thread(target=_background_workers, args=(stop,), daemon=True).start()
+    print(f"ready {server.server_port}", flush=True)
+    # Views print per request; the driver only reads the ready line
+    sys.stdout = open(os.devnull, "w")
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+
+
+def start_server(postgres: bool, workers: bool, db_path: str) -> Tuple[subprocess.Popen, str]:
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "load-test")
+    if not postgres:
+        env["SQLITE_PATH"] = db_path
+    command = [sys.executable, "-m", "benchmarks.load", "--serve"] + ([] if workers else ["--no-workers"])
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, env=env,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    line = process.stdout.readline()
+    if not line.startswith("ready "):
+        process.kill()
+        raise RuntimeError(f"Server did not start (exit code {process.wait()})")
+    return process, f"http://127.0.0.1:{line.split()[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="", help="Target a running server instead of starting one.")
+    parser.add_argument("--postgres", action="store_true", help="Serve from the Postgres database in settings.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds first.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Virtual users.")
+    parser.add_argument("--mix", default="book=6,bulk=1,webhook=3", help="Relative request weights.")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="JSON limits per endpoint; '' for none.")
+    parser.add_argument("--baseline", default="", help="A report saved by --save to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--save", default="", help="Write the report as JSON.")
+    parser.add_argument("--no-workers", action="store_true", help="Do not drain the inbox and outbox meanwhile.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.port, not args.no_workers)
+
+    mix = parse_mix(args.mix)
+    process = None
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url
+        if not url:
+            process, url = start_server(args.postgres, not args.no_workers, os.path.join(tmp, "load.sqlite3"))
+        try:
+            samples, elapsed = asyncio.run(drive(url, mix, args.duration, args.concurrency, args.warmup))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    summary = summarize(samples, elapsed)
+    print(f"{url}  {args.concurrency} users  {elapsed:.1f} s  mix {args.mix}")
+    print(format_table(summary))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"url": url, "concurrency": args.concurrency, "duration": elapsed, "mix": mix,
+                       "endpoints": summary}, f, indent=2)
+
+    thresholds = {}
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["endpoints"]
+    violations = check(summary, thresholds, baseline, args.max_regression)
+    for violation in violations:
+        print(f"FAIL {violation}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+BookingService microbenchmarks (pytest-benchmark); skipped from timing unless enabled.
+
+    pip install -r requirements-dev.txt
+    SQLITE_PATH=/tmp/ishemalink.sqlite3 pytest benchmarks/perf_booking.py --benchmark-enable --benchmark-autosave
+    pytest benchmarks/perf_booking.py --benchmark-enable --benchmark-compare --benchmark-compare-fail=mean:20%
+
+The second run fails when any benchmark's mean is 20% slower than the last saved one.
+Calls go straight to the service, without HTTP, so these isolate validation,
+pricing and the database work of each booking step.
+"""
+import random
+import pytest
+from Core.booking_service import BookingService
+from Core.models import Driver, PaymentWebhook, Shipment
+from benchmarks.load import booking
+from notifications import NotificationEngine
+from payments import MomoMock
+
+pytestmark = pytest.mark.django_db
+
+# Rows per bulk booking call
+BULK_ROWS = 500
+
+
+@pytest.fixture
+def service():
+    return BookingService(MomoMock(), NotificationEngine())
+
+
+@pytest.fixture
+def rows():
+    rng = random.Random(11)
+    return [booking(rng) for _ in range(BULK_ROWS)]
+
+
+@pytest.fixture
+def drivers():
+    Driver.objects.bulk_create([
+        Driver(name=f"Driver {i}", phone_number=f"078{i:07d}", license_number=f"RWA{i:05d}", is_available=True)
+        for i in range(200)
+    ])
+
+
+def test_build_shipment(benchmark, service, rows):
+    benchmark(service._build_shipment, rows[0])
+
+
+def test_create_shipment(benchmark, service, rows):
+    result = benchmark(service.create_shipment, rows[0])
+    assert result["status"] == "pending_payment"
+
+
+def test_create_shipments_bulk(benchmark, service, rows):
+    results = benchmark.pedantic(service.create_shipments_bulk, args=(rows,), rounds=10)
+    assert all(r["status"] == "pending_payment" for r in results)
+
+
+def test_handle_payment_callback(benchmark, service, rows, drivers):
+    booked = iter(service.create_shipments_bulk(rows))
+
+    def setup():
+        reference = str(next(booked)["shipment_id"])
+        return ({"transaction_id": f"BENCH-{reference}", "reference": reference, "status": "success"},), {}
+
+    benchmark.pedantic(service.handle_payment_callback, setup=setup, rounds=100)
+    assert Shipment.objects.filter(status="confirmed").exists()
+
+
+def test_drain_webhook_inbox(benchmark, service, rows, drivers):
+    booked = [r["shipment_id"] for r in service.create_shipments_bulk(rows)]
+    batches = iter(range(0, len(booked), 50))
+
+    def setup():
+        start = next(batches)
+        PaymentWebhook.objects.bulk_create([
+            PaymentWebhook(transaction_id=f"BENCH-{i}", payload={
+                "transaction_id": f"BENCH-{i}", "reference": str(i), "status": "success",
+            })
+            for i in booked[start:start + 50]
+        ])
+        return (), {"batch_size": 50}
+
+    benchmark.pedantic(service.drain_webhook_inbox, setup=setup, rounds=len(booked) // 50)
+    assert not PaymentWebhook.objects.filter(processed_at__isnull=True).exists()
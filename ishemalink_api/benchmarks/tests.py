@@ -0,0 +1,37 @@
+from django.test import SimpleTestCase
+from benchmarks.load import Traffic, check, parse_mix, summarize
+
+
+class LoadReportTest(SimpleTestCase):
+    def test_summary_percentiles_and_throughput(self):
+        samples = [("book", i / 1000, True) for i in range(1, 101)] + [("webhook", 0.005, False)]
+        summary = summarize(samples, elapsed=10.0)
+        book = summary["book"]
+        self.assertEqual((book["requests"], book["errors"], book["rps"]), (100, 0, 10.0))
+        self.assertAlmostEqual(book["p50_ms"], 50.5)
+        self.assertAlmostEqual(book["p99_ms"], 99.01)
+        self.assertEqual(book["max_ms"], 100.0)
+        self.assertEqual(summary["webhook"]["error_rate"], 1.0)
+
+    def test_thresholds_and_baseline_regressions_fail(self):
+        summary = {"book": {"p50_ms": 40.0, "p95_ms": 130.0, "p99_ms": 400.0, "error_rate": 0.0, "rps": 70.0}}
+        self.assertEqual(check(summary, {"book": {"p95_ms": 200, "error_rate": 0.01, "min_rps": 50}}), [])
+        self.assertEqual(check(summary, {"book": {"p99_ms": 300, "min_rps": 80}}), [
+            "book: p99_ms 400 above 300", "book: rps 70.0 below 80",
+        ])
+        baseline = {"book": {"p50_ms": 38.0, "p95_ms": 100.0, "p99_ms": 200.0, "rps": 90.0}}
+        self.assertEqual(check(summary, {}, baseline, max_regression=0.2), [
+            "book: p95_ms 130.0 regressed from 100.0", "book: rps 70.0 regressed from 90.0",
+        ])
+        # Endpoints absent from this run are not judged
+        self.assertEqual(check(summary, {"bulk": {"p95_ms": 1}}, {"bulk": {"rps": 10.0}}), [])
+
+    def test_webhooks_settle_booked_shipments(self):
+        traffic = Traffic(parse_mix("webhook=1"))
+        # No bookings yet: a webhook turn books instead
+        self.assertEqual(traffic.next_request()[0], "book")
+        traffic.record("book", 0.01, True, {"shipment_id": 7})
+        name, payload = traffic.next_request()
+        self.assertEqual((name, payload["reference"], payload["transaction_id"]), ("webhook", "7", "LOAD-7"))
+        with self.assertRaises(ValueError):
+            parse_mix("book=1,search=2")
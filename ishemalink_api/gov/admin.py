@@ -0,0 +1,18 @@
+from django.contrib import admin
+from .models import AccessLogEntry, EbmReceipt
+
+admin.site.register(EbmReceipt)
+
+
+@admin.register(AccessLogEntry)
+class AccessLogEntryAdmin(admin.ModelAdmin):
+    list_display = ("occurred_at", "user", "action", "resource_type", "resource_id", "status_code")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
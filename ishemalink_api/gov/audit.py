@@ -0,0 +1,157 @@
+import atexit
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from typing import Optional, Tuple
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Events written per INSERT, and seconds the background writer waits between flushes
+AUDIT_FLUSH_SIZE = 1000
+AUDIT_FLUSH_INTERVAL = 1.0
+
+# Events held in memory at most; beyond this new events are counted as dropped, never blocked on
+AUDIT_MAX_BUFFER = 200_000
+
+# Audited paths: (pattern, resource type); the "id" group, when present, is the resource id
+AUDIT_RULES = (
+    (re.compile(r"^/api/shipments/(?:(?P<id>\d+)/)?"), "shipment"),
+    (re.compile(r"^/tracking/(?P<id>\d+)/"), "shipment"),
+    (re.compile(r"^/gov/rura/verify-license/(?P<id>[^/]+)/"), "license"),
+    (re.compile(r"^/gov/rura/verify-licenses/"), "license"),
+    (re.compile(r"^/gov/ebm/"), "receipt"),
+    (re.compile(r"^/gov/customs/"), "manifest"),
+    (re.compile(r"^/gov/audit/"), "audit_log"),
+)
+
+# Cheap pre-check so unaudited paths skip the patterns entirely
+AUDIT_PREFIXES = ("/api/shipments/", "/tracking/", "/gov/")
+
+# (epoch seconds, user, action, resource type, resource id, method, path, status, remote addr)
+Event = Tuple[float, str, str, str, str, str, str, int, Optional[str]]
+
+
+def classify(path: str) -> Optional[Tuple[str, str]]:
+    """(resource type, resource id) for an audited path, None for paths that are not audited."""
+    if not path.startswith(AUDIT_PREFIXES):
+        return None
+    for pattern, resource_type in AUDIT_RULES:
+        match = pattern.match(path)
+        if match:
+            return resource_type, match.groupdict().get("id") or ""
+    return None
+
+
+class AuditWriter:
+    """
+    Buffers access events in memory and appends them to AccessLogEntry in batches.
+    - record() is a deque append: no lock, no I/O on the request path
+    - With start() a daemon thread flushes every AUDIT_FLUSH_INTERVAL seconds, or
+      sooner once AUDIT_FLUSH_SIZE events are waiting
+    - Without a running thread (tests, management commands) the request that fills a
+      batch flushes it inline, after its response has been produced
+    - A failed INSERT puts the batch back at the head of the buffer for the next flush
+    """
+    def __init__(self, flush_size: int = AUDIT_FLUSH_SIZE, max_buffer: int = AUDIT_MAX_BUFFER):
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self.written = 0
+        self._buffer: "deque[Event]" = deque()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, event: Event) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(event)
+        if len(self._buffer) >= self.flush_size:
+            if self._thread is not None:
+                self._wake.set()
+            else:
+                self.flush()
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def flush(self) -> int:
+        """Writes everything buffered so far; returns the number of entries written."""
+        from gov.models import AccessLogEntry
+        written = 0
+        with self._flush_lock:
+            while self._buffer:
+                batch = []
+                try:
+                    while len(batch) < self.flush_size:
+                        batch.append(self._buffer.popleft())
+                except IndexError:
+                    pass
+                try:
+                    AccessLogEntry.objects.bulk_create([
+                        AccessLogEntry(
+                            occurred_at=datetime.fromtimestamp(ts, tz=dt_timezone.utc), user=user, action=action,
+                            resource_type=resource_type, resource_id=resource_id, method=method, path=path,
+                            status_code=status, remote_addr=remote_addr,
+                        )
+                        for ts, user, action, resource_type, resource_id, method, path, status, remote_addr in batch
+                    ])
+                except Exception:
+                    self._buffer.extendleft(reversed(batch))
+                    raise
+                written += len(batch)
+        self.written += written
+        return written
+
+    def _run(self, interval: float) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit log flush failed; %d event(s) kept for retry", len(self._buffer))
+                time.sleep(interval)
+            finally:
+                close_old_connections()
+
+    def start(self, interval: float = AUDIT_FLUSH_INTERVAL) -> "AuditWriter":
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="audit-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Final audit log flush failed; %d event(s) lost", len(self._buffer))
+
+
+# Process-wide writer fed by gov.middleware.AuditMiddleware
+audit_log = AuditWriter()
+
+
+def record_access(user: str, method: str, path: str, status: int, remote_addr: Optional[str] = None,
+                  writer: AuditWriter = audit_log) -> bool:
+    """Queues one access event if `path` is audited; returns whether it was."""
+    resource = classify(path)
+    if resource is None:
+        return False
+    action = "read" if method in ("GET", "HEAD") else "write"
+    writer.record((time.time(), user[:150], action, resource[0], resource[1][:64], method, path[:255], status, remote_addr))
+    return True
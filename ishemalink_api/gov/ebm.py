@@ -0,0 +1,275 @@
+import hashlib
+import hmac
+import json
+import multiprocessing
+import threading
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+from Core.state_machine import PAID_STATUSES
+
+# Paid shipments are the ones RRA needs a receipt for
+EBM_SIGNABLE_STATUSES = PAID_STATUSES
+
+# Shipments signed and inserted per round trip
+EBM_BATCH_SIZE = 5000
+
+# Below this many payloads a process pool costs more than it saves (HMAC is ~2 µs per receipt)
+EBM_POOL_MIN_BATCH = 20000
+
+# Receipts posted to RRA per request
+EBM_SUBMIT_BATCH_SIZE = 500
+
+# A claimed submission batch becomes due again after this long, so a crashed submitter strands nothing
+EBM_SUBMIT_LEASE_SECONDS = 300
+
+EBM_CURRENCY = "RWF"
+
+# Task signing (and, with RRA_EBM_URL, submitting) receipts for newly paid shipments (gov.tasks)
+EBM_SIGN_TASK = "ebm.sign"
+
+
+@lru_cache(maxsize=8)
+def _load_key(secret: str, path: str) -> bytes:
+    if path:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    if not secret:
+        raise ImproperlyConfigured("EBM_SIGNING_KEY or EBM_SIGNING_KEY_FILE must be set to sign EBM receipts")
+    return secret.encode("utf-8")
+
+
+def signing_key() -> bytes:
+    """Key material from settings, read once per process (and per key, so rotation needs no restart)."""
+    return _load_key(settings.EBM_SIGNING_KEY, settings.EBM_SIGNING_KEY_FILE)
+
+
+def receipt_number(shipment_id: int) -> str:
+    # Derived from the shipment so a retried batch produces the same numbers
+    return f"EBM-{shipment_id:010d}"
+
+
+def canonical_payload(number: str, shipment_id: int, amount: float, signed_at: datetime, seller_tin: str) -> bytes:
+    """The exact bytes that are signed; RRA recomputes this from the submitted fields."""
+    return "|".join((
+        number, seller_tin, str(shipment_id), f"{amount:.2f}", EBM_CURRENCY, signed_at.isoformat(),
+    )).encode("utf-8")
+
+
+def _sign_all(keyed: "hmac.HMAC", payloads: Iterable[bytes]) -> List[str]:
+    signatures = []
+    for payload in payloads:
+        mac = keyed.copy()
+        mac.update(payload)
+        signatures.append(mac.hexdigest())
+    return signatures
+
+
+_worker_mac: Optional["hmac.HMAC"] = None
+
+
+def _init_worker(key: bytes) -> None:
+    global _worker_mac
+    _worker_mac = hmac.new(key, digestmod=hashlib.sha256)
+
+
+def _sign_in_worker(payloads: List[bytes]) -> List[str]:
+    return _sign_all(_worker_mac, payloads)
+
+
+class EbmSigner:
+    """
+    HMAC-SHA256 signer for EBM receipts.
+    - The key is hashed into an HMAC state once; each signature copies that state
+      instead of re-deriving the key pads
+    - sign_many() splits batches of EBM_POOL_MIN_BATCH or more across a process pool,
+      whose workers receive the key once at start-up rather than with every chunk
+    """
+    def __init__(self, key: bytes, key_id: str, workers: int = 0, pool_min_batch: int = EBM_POOL_MIN_BATCH):
+        self.key_id = key_id
+        self.workers = workers
+        self.pool_min_batch = pool_min_batch
+        self._key = key
+        self._mac = hmac.new(key, digestmod=hashlib.sha256)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def sign(self, payload: bytes) -> str:
+        return _sign_all(self._mac, [payload])[0]
+
+    def verify(self, payload: bytes, signature: str) -> bool:
+        return hmac.compare_digest(self.sign(payload), signature)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a process that holds DB connections and server threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker, initargs=(self._key,),
+                )
+            return self._pool
+
+    def sign_many(self, payloads: Sequence[bytes]) -> List[str]:
+        if self.workers < 2 or len(payloads) < self.pool_min_batch:
+            return _sign_all(self._mac, payloads)
+        size = -(-len(payloads) // self.workers)
+        chunks = [list(payloads[i:i + size]) for i in range(0, len(payloads), size)]
+        signatures: List[str] = []
+        for part in self._executor().map(_sign_in_worker, chunks):
+            signatures.extend(part)
+        return signatures
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+_signers: Dict[tuple, EbmSigner] = {}
+_signers_lock = threading.Lock()
+
+
+def get_signer() -> EbmSigner:
+    """The process-wide signer for the configured key, created on first use."""
+    key = signing_key()
+    config = (key, settings.EBM_KEY_ID, settings.EBM_SIGNING_WORKERS)
+    with _signers_lock:
+        signer = _signers.get(config)
+        if signer is None:
+            signer = _signers[config] = EbmSigner(key, settings.EBM_KEY_ID, settings.EBM_SIGNING_WORKERS)
+        return signer
+
+
+def receipt_payload(receipt) -> bytes:
+    return canonical_payload(
+        receipt.receipt_number, receipt.shipment_id, receipt.amount, receipt.signed_at, settings.EBM_SELLER_TIN,
+    )
+
+
+def sign_receipts(shipment_ids: Optional[Iterable[int]] = None, batch_size: int = EBM_BATCH_SIZE,
+                  signer: Optional[EbmSigner] = None) -> int:
+    """
+    Signs a receipt for every paid shipment that has none (or only those in shipment_ids).
+    Each batch is one keyset-paginated SELECT, one sign_many() and one bulk INSERT.
+    Receipts created concurrently by another worker are skipped by the unique
+    shipment index, so running this twice never double-signs. Returns receipts
+    written by this call, not counting ones another worker inserted first.
+    """
+    from Core.models import Shipment
+    from gov.models import EbmReceipt
+    signer = signer or get_signer()
+    pending = Shipment.objects.filter(status__in=EBM_SIGNABLE_STATUSES, ebm_receipt__isnull=True)
+    if shipment_ids is not None:
+        pending = pending.filter(id__in=list(shipment_ids))
+    signed = 0
+    last_id = 0
+    while True:
+        rows = list(pending.filter(id__gt=last_id).order_by("id").values_list("id", "tariff")[:batch_size])
+        if not rows:
+            return signed
+        last_id = rows[-1][0]
+        signed_at = timezone.now()
+        receipts = [
+            EbmReceipt(shipment_id=shipment_id, receipt_number=receipt_number(shipment_id), amount=tariff,
+                       key_id=signer.key_id, signed_at=signed_at)
+            for shipment_id, tariff in rows
+        ]
+        for receipt, signature in zip(receipts, signer.sign_many([receipt_payload(r) for r in receipts])):
+            receipt.signature = signature
+        EbmReceipt.objects.bulk_create(receipts, batch_size=1000, ignore_conflicts=True)
+        # ignore_conflicts reports no row count; this batch's rows are the ones with its timestamp
+        signed += EbmReceipt.objects.filter(
+            shipment_id__gte=rows[0][0], shipment_id__lte=last_id, signed_at=signed_at,
+        ).count()
+
+
+def receipt_json(receipt) -> Dict[str, Any]:
+    return {
+        "receipt_id": receipt.receipt_number,
+        "shipment_id": receipt.shipment_id,
+        "amount": receipt.amount,
+        "currency": EBM_CURRENCY,
+        "seller_tin": settings.EBM_SELLER_TIN,
+        "key_id": receipt.key_id,
+        "signature": receipt.signature,
+        "timestamp": receipt.signed_at.isoformat(),
+    }
+
+
+class RraClient:
+    """
+    Posts signed receipts to the RRA EBM endpoint in batches.
+    Expects {"results": [{"receipt_id", "status": "accepted" | "rejected", "reference", "error"}]}
+    in input order; gov.fakes.FakeRraServer speaks this protocol.
+    """
+    def __init__(self, url: str, timeout: float = 30.0):
+        self.url = url
+        self.timeout = timeout
+
+    def submit(self, receipts: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"receipts": list(receipts)}).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())["results"]
+
+
+def _claim_for_submission(batch_size: int, after_id: int) -> list:
+    from gov.models import EbmReceipt
+    now = timezone.now()
+    with transaction.atomic():
+        claim = EbmReceipt.objects.filter(submitted_at__isnull=True, id__gt=after_id).exclude(
+            submit_leased_until__gt=now
+        ).order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            claim = claim.select_for_update(skip_locked=True)
+        batch = list(claim[:batch_size])
+        EbmReceipt.objects.filter(id__in=[r.id for r in batch]).update(
+            submit_leased_until=now + timedelta(seconds=EBM_SUBMIT_LEASE_SECONDS)
+        )
+    return batch
+
+
+def submit_pending(client: RraClient, batch_size: int = EBM_SUBMIT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Sends unsubmitted receipts to RRA in batches.
+    - Each batch is claimed and leased in one short transaction (SKIP LOCKED where
+      supported), so several submitters share the backlog and no row lock is held
+      while RRA answers
+    - Results are written in a second transaction; a transport error releases the
+      batch for the next run and aborts this one
+    Rejected receipts stay unsubmitted for inspection; they are not retried within this run.
+    """
+    from gov.models import EbmReceipt
+    stats = {"accepted": 0, "rejected": 0}
+    last_id = 0
+    while True:
+        batch = _claim_for_submission(batch_size, last_id)
+        if not batch:
+            return stats
+        last_id = batch[-1].id
+        try:
+            results = client.submit([receipt_json(r) for r in batch])
+        except BaseException:
+            EbmReceipt.objects.filter(id__in=[r.id for r in batch]).update(submit_leased_until=None)
+            raise
+        now = timezone.now()
+        accepted = 0
+        for receipt, result in zip(batch, results):
+            receipt.submit_leased_until = None
+            if result.get("status") == "accepted":
+                receipt.submitted_at = now
+                receipt.rra_reference = result.get("reference", "")
+                accepted += 1
+        EbmReceipt.objects.bulk_update(batch, ["submitted_at", "rra_reference", "submit_leased_until"])
+        stats["accepted"] += accepted
+        stats["rejected"] += len(batch) - accepted
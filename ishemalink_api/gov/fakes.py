@@ -0,0 +1,157 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime
+from typing import Optional, Tuple
+from gov.ebm import canonical_payload
+
+
+class _RraHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if server.latency:
+            time.sleep(server.latency)
+        results = [server.check(receipt) for receipt in payload.get("receipts", [])]
+        with server.lock:
+            server.requests += 1
+            server.accepted += sum(1 for r in results if r["status"] == "accepted")
+        body = json.dumps({"results": results}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeRraServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the RRA EBM receipt endpoint, for tests and offline runs.
+    Accepts POST {"receipts": [...]} on any path. With `key` set it recomputes each
+    signature and rejects receipts that do not match, as RRA would.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), key: Optional[bytes] = None,
+                 latency: float = 0.0):
+        super().__init__(address, _RraHandler)
+        self.key = key
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.accepted = 0
+
+    def check(self, receipt: dict) -> dict:
+        number = receipt.get("receipt_id", "")
+        if self.key is not None:
+            expected = hmac.new(self.key, canonical_payload(
+                number, receipt["shipment_id"], receipt["amount"],
+                datetime.fromisoformat(receipt["timestamp"]), receipt["seller_tin"],
+            ), hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(expected, receipt.get("signature", "")):
+                return {"receipt_id": number, "status": "rejected", "error": "signature mismatch"}
+        return {"receipt_id": number, "status": "accepted", "reference": f"RRA-{number}"}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/receipts"
+
+    def start(self) -> "FakeRraServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _RuraHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve(self, license_numbers):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            server.lookups += len(license_numbers)
+        if server.failing:
+            return None
+        return [server.lookup(no) for no in license_numbers]
+
+    def do_GET(self):
+        prefix = "/licenses/"
+        if not self.path.startswith(prefix):
+            return self._reply(404, {"error": "not found"})
+        no = urllib.parse.unquote(self.path[len(prefix):])
+        results = self._serve([no])
+        if results is None:
+            return self._reply(503, {"error": "simulated outage"})
+        if not results[0]["valid"]:
+            return self._reply(404, {"error": "licence not found"})
+        self._reply(200, results[0])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        results = self._serve(payload.get("license_numbers", []))
+        if results is None:
+            return self._reply(503, {"error": "simulated outage"})
+        self._reply(200, {"results": results})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeRuraServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the RURA licence API, for tests and cache benchmarks.
+    Licences starting with `valid_prefix` are active; everything else is unknown.
+    Each request sleeps `latency` seconds; set `failing` to simulate an outage.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), latency: float = 0.0, valid_prefix: str = "RWA"):
+        super().__init__(address, _RuraHandler)
+        self.latency = latency
+        self.valid_prefix = valid_prefix
+        self.failing = False
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.lookups = 0
+
+    def lookup(self, no: str) -> dict:
+        valid = no.startswith(self.valid_prefix)
+        return {"license_no": no, "valid": valid, "status": "active" if valid else "not_found"}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeRuraServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from gov.ebm import signing_key
+from gov.fakes import FakeRraServer
+
+
+class Command(BaseCommand):
+    help = "Run the local RRA EBM stand-in (point RRA_EBM_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=9098)
+        parser.add_argument("--latency", type=float, default=0.05, help="Seconds per request.")
+        parser.add_argument("--no-verify", action="store_true", help="Accept receipts without checking signatures.")
+
+    def handle(self, *args, **options):
+        key = None if options["no_verify"] else signing_key()
+        server = FakeRraServer((options["host"], options["port"]), key, options["latency"])
+        self.stdout.write(f"RRA EBM stand-in listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f"Served {server.requests} request(s), accepted {server.accepted} receipt(s).")
+            server.server_close()
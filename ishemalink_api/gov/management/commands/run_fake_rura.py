@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from gov.fakes import FakeRuraServer
+
+
+class Command(BaseCommand):
+    help = "Run the local RURA licence API stand-in (point RURA_API_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=9097)
+        parser.add_argument("--latency", type=float, default=0.2, help="Seconds per request.")
+
+    def handle(self, *args, **options):
+        server = FakeRuraServer((options["host"], options["port"]), options["latency"])
+        self.stdout.write(f"RURA stand-in listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f"Served {server.requests} request(s) for {server.lookups} licence(s).")
+            server.server_close()
@@ -0,0 +1,29 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from gov.ebm import EBM_BATCH_SIZE, EbmSigner, RraClient, sign_receipts, signing_key, submit_pending
+
+
+class Command(BaseCommand):
+    help = "Sign EBM receipts for every paid shipment without one, optionally submitting them to RRA."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=EBM_BATCH_SIZE)
+        parser.add_argument("--workers", type=int, default=settings.EBM_SIGNING_WORKERS,
+                            help="Signing processes for large batches (0 = in process).")
+        parser.add_argument("--submit", action="store_true", help="Post unsubmitted receipts to RRA_EBM_URL.")
+
+    def handle(self, *args, **options):
+        signer = EbmSigner(signing_key(), settings.EBM_KEY_ID, options["workers"])
+        started = time.monotonic()
+        try:
+            signed = sign_receipts(batch_size=options["batch_size"], signer=signer)
+        finally:
+            signer.close()
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Signed {signed} receipt(s) in {elapsed:.1f}s.")
+        if options["submit"]:
+            if not settings.RRA_EBM_URL:
+                raise CommandError("RRA_EBM_URL is not set")
+            stats = submit_pending(RraClient(settings.RRA_EBM_URL))
+            self.stdout.write(f"RRA accepted {stats['accepted']}, rejected {stats['rejected']}.")
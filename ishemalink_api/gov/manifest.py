@@ -0,0 +1,259 @@
+import math
+import os
+import re
+import uuid
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from io import StringIO
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from xml.sax.saxutils import XMLGenerator
+from django.conf import settings
+from django.utils import timezone
+from Core.state_machine import PAID_STATUSES
+
+MANIFEST_NAMESPACE = "urn:eac:customs:manifest:1"
+MANIFEST_DECLARANT = "IshemaLink"
+
+# Consignments written between flushes to the client, and rows fetched per DB round trip
+MANIFEST_FLUSH_ROWS = 200
+MANIFEST_ITERATOR_CHUNK = 2000
+
+# Excluded consignments are always counted, but only this many are itemised
+MANIFEST_MAX_LISTED_EXCLUSIONS = 1000
+
+# Paid international shipments are the ones that cross the border
+MANIFEST_STATUSES = PAID_STATUSES
+
+# Task writing a manifest to MANIFEST_DIR for later download (gov.tasks)
+MANIFEST_TASK = "customs.manifest"
+
+# Consignment elements in document order: (element, Shipment column, required, type, max length)
+CONSIGNMENT_SCHEMA: Tuple[Tuple[str, str, bool, str, Optional[int]], ...] = (
+    ("ConsignmentID", "id", True, "integer", None),
+    ("Origin", "origin", True, "string", 50),
+    ("Destination", "destination", True, "string", 50),
+    ("Commodity", "commodity", True, "string", 50),
+    ("GrossWeightKg", "weight", True, "decimal", None),
+    ("DeclaredValueRWF", "tariff", True, "decimal", None),
+    ("ConsigneePhone", "phone_number", True, "phone", 20),
+    ("Status", "status", True, "string", 30),
+    ("DriverName", "assigned_driver__name", False, "string", 100),
+    ("DriverLicence", "assigned_driver__license_number", False, "string", 50),
+    ("BookedAt", "created_at", True, "datetime", None),
+)
+
+# Characters XML 1.0 cannot carry at all, even escaped
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_PHONE = re.compile(r"^\+?[0-9]{3,20}$")
+_MANIFEST_ID = re.compile(r"^IL-[0-9]{14}-[0-9A-F]{8}$")
+
+
+class ManifestValidationError(ValueError):
+    def __init__(self, element: str, reason: str):
+        super().__init__(f"{element}: {reason}")
+        self.element = element
+        self.reason = reason
+
+
+def _integer(value: Any, max_length: Optional[int]) -> str:
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError("must be a positive integer")
+    return str(value)
+
+
+def _decimal(value: Any, max_length: Optional[int]) -> str:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+        raise ValueError("must be a non-negative number")
+    return f"{value:.2f}"
+
+
+def _string(value: Any, max_length: Optional[int]) -> str:
+    text = str(value).strip()
+    if not text:
+        raise ValueError("must not be empty")
+    if max_length is not None and len(text) > max_length:
+        raise ValueError(f"longer than {max_length} characters")
+    if _XML_INVALID.search(text):
+        raise ValueError("contains characters not allowed in XML")
+    return text
+
+
+def _phone(value: Any, max_length: Optional[int]) -> str:
+    text = str(value).strip()
+    if not _PHONE.match(text):
+        raise ValueError("must be 3-20 digits with an optional leading +")
+    return text
+
+
+def _datetime(value: Any, max_length: Optional[int]) -> str:
+    if not isinstance(value, datetime) or timezone.is_naive(value):
+        raise ValueError("must be a timezone-aware datetime")
+    return value.isoformat(timespec="seconds")
+
+
+_TYPES: Dict[str, Callable[[Any, Optional[int]], str]] = {
+    "integer": _integer,
+    "decimal": _decimal,
+    "string": _string,
+    "phone": _phone,
+    "datetime": _datetime,
+}
+
+
+class CompiledSchema(NamedTuple):
+    """A consignment schema resolved once into column names and per-element checkers."""
+    columns: Tuple[str, ...]
+    fields: Tuple[Tuple[str, bool, Callable[[Any, Optional[int]], str], Optional[int]], ...]
+
+    def validate(self, row: Sequence[Any]) -> List[Tuple[str, str]]:
+        """Returns (element, text) pairs for one values_list row; optional empty elements are omitted."""
+        out = []
+        for (element, required, check, max_length), value in zip(self.fields, row):
+            if value is None or value == "":
+                if required:
+                    raise ManifestValidationError(element, "is required")
+                continue
+            try:
+                out.append((element, check(value, max_length)))
+            except ValueError as e:
+                raise ManifestValidationError(element, str(e))
+        return out
+
+
+@lru_cache(maxsize=None)
+def compile_schema(schema: Tuple[Tuple[str, str, bool, str, Optional[int]], ...] = CONSIGNMENT_SCHEMA) -> CompiledSchema:
+    unknown = {kind for _, _, _, kind, _ in schema} - _TYPES.keys()
+    if unknown:
+        raise ValueError(f"Unknown schema type(s): {', '.join(sorted(unknown))}")
+    return CompiledSchema(
+        columns=tuple(column for _, column, _, _, _ in schema),
+        fields=tuple((element, required, _TYPES[kind], max_length) for element, _, required, kind, max_length in schema),
+    )
+
+
+def manifest_queryset(shipment_ids: Optional[Iterable[int]] = None, destination: Optional[str] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      schema: Optional[CompiledSchema] = None):
+    """values_list rows for the manifest, in consignment order; nothing is fetched until iterated."""
+    from Core.models import Shipment
+    schema = schema or compile_schema()
+    shipments = Shipment.objects.filter(shipment_type="international", status__in=MANIFEST_STATUSES)
+    if shipment_ids is not None:
+        shipments = shipments.filter(id__in=list(shipment_ids))
+    if destination:
+        shipments = shipments.filter(destination=destination)
+    if start is not None:
+        shipments = shipments.filter(created_at__gte=start)
+    if end is not None:
+        shipments = shipments.filter(created_at__lte=end)
+    return shipments.order_by("id").values_list(*schema.columns)
+
+
+def new_manifest_id() -> str:
+    return f"IL-{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8].upper()}"
+
+
+def manifest_path(manifest_id: str) -> str:
+    """Where a background manifest is stored, gzipped; ValueError for anything but a manifest id."""
+    if not _MANIFEST_ID.match(manifest_id):
+        raise ValueError(f"Invalid manifest id: {manifest_id}")
+    return os.path.join(settings.MANIFEST_DIR, f"{manifest_id}.xml.gz")
+
+
+def write_manifest(manifest_id: str, rows: Iterable[Sequence[Any]]) -> str:
+    """
+    Streams a manifest into MANIFEST_DIR and returns its path. The file appears
+    under its final name only when complete, so a download never sees half a manifest.
+    """
+    path = manifest_path(manifest_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.part"
+    with open(partial, "wb") as f:
+        for chunk in gzip_stream(stream_manifest(rows, manifest_id)):
+            f.write(chunk)
+    os.replace(partial, path)
+    return path
+
+
+def _drain(buffer: StringIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data.encode("utf-8")
+
+
+def stream_manifest(rows: Iterable[Sequence[Any]], manifest_id: str, schema: Optional[CompiledSchema] = None,
+                    flush_rows: int = MANIFEST_FLUSH_ROWS) -> Iterator[bytes]:
+    """
+    Writes the EAC manifest incrementally and yields UTF-8 chunks.
+    - The header is yielded before `rows` is touched, so the first byte never waits on the database
+    - Only the current chunk of XML is held in memory; totals are running sums
+    - Consignments failing the schema are left out and listed under <Excluded> with the reason
+    """
+    schema = schema or compile_schema()
+    buffer = StringIO()
+    xml = XMLGenerator(buffer, encoding="utf-8", short_empty_elements=True)
+
+    def element(name: str, text: str, attrs: Optional[Dict[str, str]] = None) -> None:
+        xml.startElement(name, attrs or {})
+        xml.characters(text)
+        xml.endElement(name)
+
+    xml.startDocument()
+    xml.startElement("Manifest", {"xmlns": MANIFEST_NAMESPACE})
+    xml.startElement("Header", {})
+    element("ManifestID", manifest_id)
+    element("Declarant", MANIFEST_DECLARANT)
+    element("GeneratedAt", timezone.now().isoformat(timespec="seconds"))
+    xml.endElement("Header")
+    xml.startElement("Consignments", {})
+    yield _drain(buffer)
+
+    weight_at, value_at = schema.columns.index("weight"), schema.columns.index("tariff")
+    count = excluded_count = 0
+    weight = value = 0.0
+    excluded: List[Tuple[Any, str]] = []
+    for row in rows:
+        try:
+            fields = schema.validate(row)
+        except ManifestValidationError as e:
+            excluded_count += 1
+            if len(excluded) < MANIFEST_MAX_LISTED_EXCLUSIONS:
+                excluded.append((row[0], str(e)))
+            continue
+        xml.startElement("Consignment", {})
+        for name, text in fields:
+            element(name, text)
+        xml.endElement("Consignment")
+        count += 1
+        weight += row[weight_at]
+        value += row[value_at]
+        if count % flush_rows == 0:
+            yield _drain(buffer)
+    xml.endElement("Consignments")
+
+    if excluded_count:
+        xml.startElement("Excluded", {"count": str(excluded_count)})
+        for consignment_id, reason in excluded:
+            element("Consignment", reason, {"id": str(consignment_id)})
+        xml.endElement("Excluded")
+    xml.startElement("Summary", {})
+    element("ConsignmentCount", str(count))
+    element("TotalGrossWeightKg", f"{weight:.2f}")
+    element("TotalDeclaredValueRWF", f"{value:.2f}")
+    element("ExcludedCount", str(excluded_count))
+    xml.endElement("Summary")
+    xml.endElement("Manifest")
+    xml.endDocument()
+    yield _drain(buffer)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """gzip-encodes a byte stream chunk by chunk; each chunk is sync-flushed so clients see it at once."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
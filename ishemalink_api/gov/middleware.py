@@ -0,0 +1,44 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import empty
+from gov.audit import record_access
+
+
+def _username(request) -> str:
+    user = getattr(request, "user", None)
+    # request.user is lazy: resolving it here would add a session query to every request,
+    # so only a user the view already loaded is recorded
+    if user is None or getattr(user, "_wrapped", empty) is empty:
+        return "anonymous"
+    return user.get_username() if user.is_authenticated else "anonymous"
+
+
+class AuditMiddleware:
+    """
+    Records every shipment, licence, receipt, manifest and audit-log access
+    (see gov.audit.AUDIT_RULES) into the in-memory audit buffer after the view has run.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        response = self.get_response(request)
+        self._record(request, response)
+        return response
+
+    async def _acall(self, request):
+        response = await self.get_response(request)
+        self._record(request, response)
+        return response
+
+    @staticmethod
+    def _record(request, response) -> None:
+        record_access(_username(request), request.method, request.path, response.status_code,
+                      request.META.get("REMOTE_ADDR"))
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('Core', '0007_tariff_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EbmReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('receipt_number', models.CharField(max_length=30, unique=True)),
+                ('amount', models.FloatField()),
+                ('key_id', models.CharField(max_length=20)),
+                ('signature', models.CharField(max_length=64)),
+                ('signed_at', models.DateTimeField()),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('rra_reference', models.CharField(blank=True, default='', max_length=50)),
+                ('shipment', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='ebm_receipt', to='Core.shipment')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('submitted_at__isnull', True)), fields=['id'], name='ebm_unsubmitted_idx')],
+            },
+        ),
+    ]
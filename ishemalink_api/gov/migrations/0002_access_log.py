@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gov', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurred_at', models.DateTimeField()),
+                ('user', models.CharField(max_length=150)),
+                ('action', models.CharField(max_length=10)),
+                ('resource_type', models.CharField(max_length=30)),
+                ('resource_id', models.CharField(blank=True, default='', max_length=64)),
+                ('method', models.CharField(max_length=8)),
+                ('path', models.CharField(max_length=255)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('remote_addr', models.GenericIPAddressField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-occurred_at', '-id'], name='access_log_user_idx'), models.Index(fields=['resource_type', 'resource_id', '-occurred_at', '-id'], name='access_log_resource_idx'), models.Index(fields=['-occurred_at', '-id'], name='access_log_time_idx')],
+            },
+        ),
+    ]
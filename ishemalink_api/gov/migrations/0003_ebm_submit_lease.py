@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gov', '0002_access_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ebmreceipt',
+            name='submit_leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
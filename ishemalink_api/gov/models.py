@@ -0,0 +1,63 @@
+from django.db import models
+from Core.models import Shipment
+
+class EbmReceipt(models.Model):
+    """
+    An RRA EBM tax receipt for one paid shipment, signed by gov.ebm.
+    The one-to-one link is the idempotency key: signing a shipment twice inserts nothing.
+    submitted_at stays empty until the receipt has been accepted by RRA;
+    submit_leased_until is set while a submitter has the receipt in flight.
+    """
+    shipment = models.OneToOneField(Shipment, on_delete=models.PROTECT, related_name="ebm_receipt")
+    receipt_number = models.CharField(max_length=30, unique=True)
+    amount = models.FloatField()
+    key_id = models.CharField(max_length=20)
+    signature = models.CharField(max_length=64)
+    signed_at = models.DateTimeField()
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    rra_reference = models.CharField(max_length=50, blank=True, default="")
+    submit_leased_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(submitted_at__isnull=True), name="ebm_unsubmitted_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.receipt_number} ({self.amount} RWF)"
+
+
+class AccessLogEntry(models.Model):
+    """
+    One audited request: who touched which resource, when, and with what outcome.
+    Written in batches by gov.audit.AuditWriter. Rows are append-only: the model
+    refuses updates and deletes, and retention is handled outside the application.
+    """
+    occurred_at = models.DateTimeField()
+    user = models.CharField(max_length=150)
+    action = models.CharField(max_length=10)
+    resource_type = models.CharField(max_length=30)
+    resource_id = models.CharField(max_length=64, blank=True, default="")
+    method = models.CharField(max_length=8)
+    path = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField()
+    remote_addr = models.GenericIPAddressField(null=True, blank=True)
+
+    class Meta:
+        # Read API filters: by user, by resource, or by time alone; all newest first
+        indexes = [
+            models.Index(fields=["user", "-occurred_at", "-id"], name="access_log_user_idx"),
+            models.Index(fields=["resource_type", "resource_id", "-occurred_at", "-id"], name="access_log_resource_idx"),
+            models.Index(fields=["-occurred_at", "-id"], name="access_log_time_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Access log entries are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Access log entries are append-only")
+
+    def __str__(self):
+        return f"{self.occurred_at:%Y-%m-%d %H:%M:%S} {self.user} {self.action} {self.resource_type}:{self.resource_id}"
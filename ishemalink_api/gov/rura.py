@@ -0,0 +1,374 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from Core.cachelib import LruTtlCache, SingleFlight
+
+# Licences held in each process's LRU tier
+RURA_LOCAL_CACHE_SIZE = 10000
+
+# Licences per upstream bulk request, and bulk requests in flight at once from averify_many()
+RURA_BULK_CHUNK = 200
+RURA_CONCURRENCY = 8
+
+# Consecutive upstream failures that open the circuit, and seconds before one trial call
+RURA_BREAKER_THRESHOLD = 5
+RURA_BREAKER_RESET_SECONDS = 30.0
+
+RURA_SHARED_CACHE_PREFIX = "rura:"
+
+Result = Dict[str, Any]
+
+
+class RuraUnavailable(Exception):
+    """RURA could not be reached (or the circuit is open) and no cached answer exists."""
+
+
+def normalize(license_no: str) -> str:
+    return license_no.strip().upper()
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open -> half-open after
+    `reset_timeout`, when a single trial call decides between closed and open again.
+    """
+    def __init__(self, threshold: int = RURA_BREAKER_THRESHOLD, reset_timeout: float = RURA_BREAKER_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self._trial_running = False
+
+    def release(self) -> None:
+        """Ends a call that gave no verdict (it was cancelled), so a half-open breaker can try again."""
+        with self._lock:
+            self._trial_running = False
+
+
+class PrefixRuraBackend:
+    """Offline stand-in used when RURA_API_URL is empty: the original RWA-prefix rule."""
+    def verify_many(self, license_numbers: List[str]) -> Dict[str, Result]:
+        return {
+            no: {"license_no": no, "valid": no.startswith("RWA"), "status": "active" if no.startswith("RWA") else "invalid"}
+            for no in license_numbers
+        }
+
+    async def averify_many(self, license_numbers: List[str]) -> Dict[str, Result]:
+        return self.verify_many(license_numbers)
+
+
+class HttpRuraBackend:
+    """
+    RURA licence API client.
+    GET  {url}/licenses/<no>     -> {"license_no", "valid", "status", ...}; 404 means invalid
+    POST {url}/licenses/batch    {"license_numbers": [...]} -> {"results": [...]}
+    gov.fakes.FakeRuraServer speaks this protocol.
+    """
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        # Built on first async use and shared by every client: loading the CA bundle costs ~20 ms
+        self._ssl_context = None
+
+    def _fetch(self, request: urllib.request.Request) -> Any:
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise RuraUnavailable(f"RURA returned HTTP {e.code}")
+        except (OSError, ValueError) as e:
+            raise RuraUnavailable(f"RURA unreachable: {e}")
+
+    def verify_many(self, license_numbers: List[str]) -> Dict[str, Result]:
+        if len(license_numbers) == 1:
+            no = license_numbers[0]
+            found = self._fetch(urllib.request.Request(f"{self.url}/licenses/{urllib.parse.quote(no, safe='')}"))
+            return {no: found or {"license_no": no, "valid": False, "status": "not_found"}}
+        body = json.dumps({"license_numbers": license_numbers}).encode("utf-8")
+        found = self._fetch(urllib.request.Request(
+            f"{self.url}/licenses/batch", data=body, headers={"Content-Type": "application/json"}, method="POST",
+        ))
+        return {r["license_no"]: r for r in (found or {}).get("results", [])}
+
+    async def averify_many(self, license_numbers: List[str]) -> Dict[str, Result]:
+        """verify_many() over httpx, for the event loop; the same protocol and errors."""
+        if self._ssl_context is None:
+            self._ssl_context = httpx.create_ssl_context()
+        async with httpx.AsyncClient(timeout=self.timeout, verify=self._ssl_context) as client:
+            try:
+                if len(license_numbers) == 1:
+                    no = license_numbers[0]
+                    response = await client.get(f"{self.url}/licenses/{urllib.parse.quote(no, safe='')}")
+                else:
+                    response = await client.post(f"{self.url}/licenses/batch",
+                                                 json={"license_numbers": license_numbers})
+                if response.status_code == 404:
+                    found = None
+                elif response.status_code >= 400:
+                    raise RuraUnavailable(f"RURA returned HTTP {response.status_code}")
+                else:
+                    found = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                raise RuraUnavailable(f"RURA unreachable: {e}")
+        if len(license_numbers) == 1:
+            no = license_numbers[0]
+            return {no: found or {"license_no": no, "valid": False, "status": "not_found"}}
+        return {r["license_no"]: r for r in (found or {}).get("results", [])}
+
+
+class RuraVerifier:
+    """
+    Licence verification in front of a slow upstream.
+    - Two cache tiers: a per-process LRU, then the shared Django cache (Redis in production)
+    - Invalid licences are cached too, for the shorter negative TTL
+    - Concurrent lookups of one licence make a single upstream call (SingleFlight)
+    - A circuit breaker stops calling RURA while it is failing; stale local answers
+      are served meanwhile, marked "stale": true
+    - verify_many() answers a whole fleet with bulk cache reads and chunked bulk upstream calls;
+      averify_many() does the same from async views, with the chunks requested concurrently
+    """
+    def __init__(self, backend, ttl: float = 3600, negative_ttl: float = 300,
+                 local: Optional[LruTtlCache] = None, shared=None, breaker: Optional[CircuitBreaker] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = local if local is not None else LruTtlCache(RURA_LOCAL_CACHE_SIZE)
+        self.shared = shared
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.flights = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "upstream_calls": 0, "coalesced": 0, "stale": 0}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        if n:
+            with self._stats_lock:
+                self.stats[name] += n
+
+    def _shared_get_many(self, keys: List[str]) -> Dict[str, Result]:
+        if self.shared is None or not keys:
+            return {}
+        try:
+            found = self.shared.get_many([RURA_SHARED_CACHE_PREFIX + k for k in keys])
+        except Exception:
+            # The shared tier is an optimisation; an outage must not fail verification
+            return {}
+        return {k[len(RURA_SHARED_CACHE_PREFIX):]: v for k, v in found.items()}
+
+    def _store_local(self, results: Dict[str, Result]) -> Dict[float, Dict[str, Result]]:
+        """Caches results in this process and returns them as shared-tier entries grouped by TTL."""
+        by_ttl: Dict[float, Dict[str, Result]] = {}
+        for no, result in results.items():
+            ttl = self.ttl if result.get("valid") else self.negative_ttl
+            self.local.set(no, result, ttl)
+            by_ttl.setdefault(ttl, {})[RURA_SHARED_CACHE_PREFIX + no] = result
+        return by_ttl
+
+    def _store(self, results: Dict[str, Result]) -> None:
+        by_ttl = self._store_local(results)
+        if self.shared is not None:
+            try:
+                for ttl, entries in by_ttl.items():
+                    self.shared.set_many(entries, timeout=ttl)
+            except Exception:
+                pass
+
+    def _before_upstream(self) -> None:
+        if not self.breaker.allow():
+            raise RuraUnavailable("RURA circuit is open")
+        self._count("upstream_calls")
+
+    def _after_upstream(self, license_numbers: List[str], results: Dict[str, Result]) -> Dict[str, Result]:
+        self.breaker.record_success()
+        for no in license_numbers:
+            results.setdefault(no, {"license_no": no, "valid": False, "status": "not_found"})
+        return results
+
+    def _upstream(self, license_numbers: List[str]) -> Dict[str, Result]:
+        self._before_upstream()
+        try:
+            results = self.backend.verify_many(license_numbers)
+        except Exception:
+            # A malformed answer is a failure too; only recording it ends a half-open trial
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (client disconnect) or interrupted: no verdict, but the trial must not stay running
+            self.breaker.release()
+            raise
+        results = self._after_upstream(license_numbers, results)
+        self._store(results)
+        return results
+
+    async def _aupstream(self, license_numbers: List[str]) -> Dict[str, Result]:
+        self._before_upstream()
+        try:
+            results = await self.backend.averify_many(license_numbers)
+        except Exception:
+            # A malformed answer is a failure too; only recording it ends a half-open trial
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (client disconnect) or interrupted: no verdict, but the trial must not stay running
+            self.breaker.release()
+            raise
+        results = self._after_upstream(license_numbers, results)
+        await sync_to_async(self._store)(results)
+        return results
+
+    def _stale(self, no: str, error: RuraUnavailable) -> Result:
+        stale = self.local.get(no, allow_stale=True)
+        if stale is None:
+            raise error
+        self._count("stale")
+        return {**stale, "stale": True}
+
+    def verify(self, license_no: str) -> Result:
+        no = normalize(license_no)
+        cached = self.local.get(no)
+        if cached is not None:
+            self._count("local_hits")
+            return cached
+        shared = self._shared_get_many([no]).get(no)
+        if shared is not None:
+            self._count("shared_hits")
+            self.local.set(no, shared, self.ttl if shared.get("valid") else self.negative_ttl)
+            return shared
+        self._count("misses")
+        try:
+            results, coalesced = self.flights.do(no, lambda: self._upstream([no]))
+        except RuraUnavailable as e:
+            return self._stale(no, e)
+        self._count("coalesced", int(coalesced))
+        return results[no]
+
+    def _local_many(self, license_numbers: Iterable[str]) -> Tuple[Dict[str, Result], List[str]]:
+        """Local-tier answers, and the normalized licences still missing, in request order."""
+        results: Dict[str, Result] = {}
+        missing = []
+        for no in dict.fromkeys(normalize(no) for no in license_numbers):
+            cached = self.local.get(no)
+            if cached is None:
+                missing.append(no)
+            else:
+                results[no] = cached
+        self._count("local_hits", len(results))
+        return results, missing
+
+    def _merge_shared(self, results: Dict[str, Result], missing: List[str], shared: Dict[str, Result]) -> List[str]:
+        self._count("shared_hits", len(shared))
+        for no, result in shared.items():
+            self.local.set(no, result, self.ttl if result.get("valid") else self.negative_ttl)
+        results.update(shared)
+        missing = [no for no in missing if no not in shared]
+        self._count("misses", len(missing))
+        return missing
+
+    def _unavailable(self, chunk: List[str], error: RuraUnavailable) -> Dict[str, Result]:
+        results = {}
+        for no in chunk:
+            try:
+                results[no] = self._stale(no, error)
+            except RuraUnavailable:
+                results[no] = {"license_no": no, "valid": None, "status": "unavailable"}
+        return results
+
+    def verify_many(self, license_numbers: Iterable[str]) -> Dict[str, Result]:
+        results, missing = self._local_many(license_numbers)
+        missing = self._merge_shared(results, missing, self._shared_get_many(missing))
+        for start in range(0, len(missing), RURA_BULK_CHUNK):
+            chunk = missing[start:start + RURA_BULK_CHUNK]
+            try:
+                results.update(self._upstream(chunk))
+            except RuraUnavailable as e:
+                results.update(self._unavailable(chunk, e))
+        return results
+
+    async def averify_many(self, license_numbers: Iterable[str]) -> Dict[str, Result]:
+        """verify_many() for async views: the missing chunks go to RURA concurrently, RURA_CONCURRENCY at a time."""
+        results, missing = self._local_many(license_numbers)
+        # One thread hop for the whole batch: the cache API's async methods make one per key
+        missing = self._merge_shared(results, missing, await sync_to_async(self._shared_get_many)(missing))
+        slots = asyncio.Semaphore(RURA_CONCURRENCY)
+
+        async def one(chunk: List[str]) -> Dict[str, Result]:
+            async with slots:
+                try:
+                    return await self._aupstream(chunk)
+                except RuraUnavailable as e:
+                    return self._unavailable(chunk, e)
+
+        chunks = [missing[start:start + RURA_BULK_CHUNK] for start in range(0, len(missing), RURA_BULK_CHUNK)]
+        for found in await asyncio.gather(*(one(chunk) for chunk in chunks)):
+            results.update(found)
+        return results
+
+    def hit_rate(self) -> float:
+        s = self.stats
+        lookups = s["local_hits"] + s["shared_hits"] + s["misses"]
+        return (s["local_hits"] + s["shared_hits"]) / lookups if lookups else 0.0
+
+
+_verifier: Optional[RuraVerifier] = None
+_verifier_lock = threading.Lock()
+
+
+def get_verifier() -> RuraVerifier:
+    """The process-wide verifier built from settings on first use."""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None:
+            backend = HttpRuraBackend(settings.RURA_API_URL) if settings.RURA_API_URL else PrefixRuraBackend()
+            _verifier = RuraVerifier(
+                backend, settings.RURA_CACHE_TTL, settings.RURA_NEGATIVE_CACHE_TTL, shared=caches["default"],
+            )
+        return _verifier
+
+
+def reset_verifier() -> None:
+    """Drops the process-wide verifier (and its local cache); the next get_verifier() rebuilds it."""
+    global _verifier
+    with _verifier_lock:
+        _verifier = None
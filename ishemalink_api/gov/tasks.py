@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from Core import taskqueue
+from gov import ebm, manifest
+
+
+@taskqueue.task(ebm.EBM_SIGN_TASK, priority=taskqueue.LOW, batch_size=ebm.EBM_BATCH_SIZE, every=300.0)
+def sign_receipts(payloads: List[Dict[str, Any]]) -> None:
+    """Signs the batch's shipments in one pass; the periodic sweep (no shipment_id) signs every paid shipment."""
+    if not (settings.EBM_SIGNING_KEY or settings.EBM_SIGNING_KEY_FILE):
+        # No key (development): nothing to retry; the sweep signs the backlog once one is configured
+        return
+    shipment_ids = [p["shipment_id"] for p in payloads if "shipment_id" in p]
+    ebm.sign_receipts(shipment_ids if len(shipment_ids) == len(payloads) else None)
+    if settings.RRA_EBM_URL:
+        ebm.submit_pending(ebm.RraClient(settings.RRA_EBM_URL))
+
+
+@taskqueue.task(manifest.MANIFEST_TASK, priority=taskqueue.LOW)
+def generate_manifest(manifest_id: str, shipment_ids: Optional[List[int]] = None, destination: Optional[str] = None,
+                      start: Optional[str] = None, end: Optional[str] = None) -> None:
+    rows = manifest.manifest_queryset(
+        shipment_ids, destination,
+        datetime.fromisoformat(start) if start else None,
+        datetime.fromisoformat(end) if end else None,
+    )
+    manifest.write_manifest(manifest_id, rows.iterator(chunk_size=manifest.MANIFEST_ITERATOR_CHUNK))
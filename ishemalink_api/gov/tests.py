@@ -0,0 +1,436 @@
+import asyncio
+import gzip
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, Client, override_settings
+from Core import cachelib
+from Core.caching import get_response_cache
+from Core.models import Driver, Shipment
+from Core.profiling import QueryBudgetMixin
+from gov import audit, ebm, manifest, rura
+from gov.fakes import FakeRraServer, FakeRuraServer
+from gov.models import AccessLogEntry, EbmReceipt
+
+NS = {"m": manifest.MANIFEST_NAMESPACE}
+
+
+class CustomsManifestTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        driver = Driver.objects.create(name="Jean", phone_number="0788", license_number="RWA-1")
+        self.shipments = [
+            Shipment.objects.create(
+                shipment_type="international", weight=100 + i, phone_number="0788000000", tariff=300000 + i,
+                status="confirmed", origin="Kigali", destination="Kampala" if i % 2 else "Nairobi",
+                commodity="Coffee", assigned_driver=driver if i == 0 else None,
+            )
+            for i in range(5)
+        ]
+        # Not part of any manifest: domestic, unpaid
+        Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="078", status="confirmed")
+        Shipment.objects.create(shipment_type="international", weight=1, phone_number="078", commodity="Tea")
+        # Paid but missing its commodity: excluded with a reason
+        self.incomplete = Shipment.objects.create(
+            shipment_type="international", weight=5, phone_number="0788000000", status="confirmed",
+            origin="Kigali", destination="Kampala",
+        )
+
+    def _manifest(self, response):
+        body = b"".join(response.streaming_content)
+        if response.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return ET.fromstring(body)
+
+    def test_streams_valid_consignments_with_summary(self):
+        response = self.client.post("/gov/customs/generate-manifest/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        root = self._manifest(response)
+        self.assertEqual(root.find("m:Header/m:ManifestID", NS).text, response["X-Manifest-ID"])
+        consignments = root.findall("m:Consignments/m:Consignment", NS)
+        self.assertEqual([int(c.find("m:ConsignmentID", NS).text) for c in consignments],
+                         [s.id for s in self.shipments])
+        self.assertEqual(consignments[0].find("m:DriverLicence", NS).text, "RWA-1")
+        self.assertIsNone(consignments[1].find("m:DriverName", NS))
+        self.assertEqual(root.find("m:Summary/m:TotalGrossWeightKg", NS).text, "510.00")
+        excluded = root.find("m:Excluded/m:Consignment", NS)
+        self.assertEqual(excluded.get("id"), str(self.incomplete.id))
+        self.assertEqual(excluded.text, "Commodity: is required")
+
+    def test_filters_and_gzip(self):
+        response = self.client.post(
+            "/gov/customs/generate-manifest/", data={"destination": "Kampala"},
+            content_type="application/json", HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        root = self._manifest(response)
+        self.assertEqual(root.find("m:Summary/m:ConsignmentCount", NS).text, "2")
+
+        ids = f"{self.shipments[0].id},{self.shipments[3].id}"
+        root = self._manifest(self.client.get("/gov/customs/generate-manifest/", {"shipment_ids": ids}))
+        self.assertEqual(root.find("m:Summary/m:ConsignmentCount", NS).text, "2")
+        self.assertEqual(self.client.get("/gov/customs/generate-manifest/", {"shipment_ids": "x"}).status_code, 400)
+
+    def test_large_manifests_are_generated_in_the_background(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(MANIFEST_DIR=directory, TASKS_EAGER=True):
+            with self.captureOnCommitCallbacks() as queued:
+                response = self.client.post("/gov/customs/generate-manifest/?async=1",
+                                            data={"destination": "Kampala"}, content_type="application/json")
+            self.assertEqual(response.status_code, 202)
+            download = response.json()["download"]
+            self.assertEqual(self.client.get(download).status_code, 404)
+            queued[0]()
+            response = self.client.get(download)
+            root = ET.fromstring(b"".join(response.streaming_content))
+            self.assertEqual(root.find("m:Header/m:ManifestID", NS).text, download.split("/")[-2])
+            self.assertEqual(root.find("m:Summary/m:ConsignmentCount", NS).text, "2")
+            gzipped = self.client.get(download, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(self._manifest(gzipped).find("m:Summary/m:ConsignmentCount", NS).text, "2")
+        self.assertEqual(self.client.get("/gov/customs/manifests/..secret/").status_code, 400)
+
+    def test_header_is_sent_before_the_database_is_queried(self):
+        rows = manifest.manifest_queryset().iterator(chunk_size=2)
+        stream = manifest.stream_manifest(rows, "IL-TEST", flush_rows=2)
+        with self.assertNumQueries(0):
+            first = next(stream)
+        self.assertIn(b"<ManifestID>IL-TEST</ManifestID>", first)
+        self.assertGreater(len(list(stream)), 2)
+
+    def test_schema_is_compiled_once(self):
+        self.assertIs(manifest.compile_schema(), manifest.compile_schema())
+        with self.assertRaises(manifest.ManifestValidationError):
+            manifest.compile_schema().validate((1, "Kigali", "Kampala", "Tea", 1.0, 1.0, "not a phone",
+                                                "confirmed", None, None, None))
+
+
+@override_settings(EBM_SIGNING_KEY="test-ebm-key", EBM_SELLER_TIN="100000001")
+class EbmSigningTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.paid = [
+            Shipment.objects.create(shipment_type="domestic", weight=10, phone_number="078",
+                                    status="confirmed", tariff=10000 + i)
+            for i in range(4)
+        ]
+        self.unpaid = Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="078")
+
+    def test_single_receipt_is_signed_once(self):
+        response = self.client.post("/gov/ebm/sign-receipt/", data={"shipment_id": self.paid[0].id},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        receipt = response.json()
+        self.assertEqual(receipt["amount"], 10000)
+        again = self.client.post("/gov/ebm/sign-receipt/", data={"shipment_id": self.paid[0].id},
+                                 content_type="application/json").json()
+        self.assertEqual(again, receipt)
+        self.assertEqual(EbmReceipt.objects.count(), 1)
+        stored = EbmReceipt.objects.get()
+        self.assertTrue(ebm.get_signer().verify(ebm.receipt_payload(stored), stored.signature))
+
+        unpaid = self.client.post("/gov/ebm/sign-receipt/", data={"shipment_id": self.unpaid.id},
+                                  content_type="application/json")
+        self.assertEqual(unpaid.status_code, 404)
+
+    def test_batch_endpoint_is_idempotent(self):
+        ids = [s.id for s in self.paid[:2]] + [self.unpaid.id]
+        first = self.client.post("/gov/ebm/sign-receipts/", data={"shipment_ids": ids},
+                                 content_type="application/json").json()
+        self.assertEqual((first["signed"], first["already_signed"], first["not_signable"]), (2, 0, 1))
+
+        ids = [s.id for s in self.paid]
+        second = self.client.post("/gov/ebm/sign-receipts/", data={"shipment_ids": ids},
+                                  content_type="application/json").json()
+        self.assertEqual((second["signed"], second["already_signed"]), (2, 2))
+        self.assertEqual(EbmReceipt.objects.count(), 4)
+
+    def test_month_end_run_uses_constant_queries_per_batch(self):
+        # SELECT pending, one INSERT, a COUNT of the rows it wrote, and an empty SELECT to finish
+        with self.assertNumQueries(4):
+            self.assertEqual(ebm.sign_receipts(batch_size=10), 4)
+        self.assertEqual(ebm.sign_receipts(), 0)
+
+    def test_receipts_inserted_by_another_worker_are_not_counted(self):
+        signer = ebm.get_signer()
+        paid = self.paid
+
+        class RacingSigner:
+            key_id = signer.key_id
+
+            def sign_many(self, payloads):
+                # Another worker signs the first shipment while this batch is being signed
+                ebm.sign_receipts([paid[0].id])
+                return signer.sign_many(payloads)
+
+        self.assertEqual(ebm.sign_receipts(signer=RacingSigner()), 3)
+        self.assertEqual(EbmReceipt.objects.count(), 4)
+
+    def test_process_pool_matches_in_process_signatures(self):
+        payloads = [f"receipt-{i}".encode() for i in range(40)]
+        pooled = ebm.EbmSigner(b"k", "k1", workers=2, pool_min_batch=10)
+        self.addCleanup(pooled.close)
+        self.assertEqual(pooled.sign_many(payloads), ebm.EbmSigner(b"k", "k1").sign_many(payloads))
+
+    def test_submission_to_rra_stand_in(self):
+        ebm.sign_receipts()
+        tampered = EbmReceipt.objects.get(shipment=self.paid[3])
+        tampered.amount = 1
+        tampered.save()
+        rra = FakeRraServer(key=b"test-ebm-key").start()
+        self.addCleanup(rra.stop)
+
+        stats = ebm.submit_pending(ebm.RraClient(rra.url), batch_size=2)
+        self.assertEqual(stats, {"accepted": 3, "rejected": 1})
+        self.assertEqual(rra.requests, 2)
+        self.assertEqual(EbmReceipt.objects.filter(submitted_at__isnull=True).get(), tampered)
+        self.assertTrue(EbmReceipt.objects.exclude(rra_reference="").exists())
+
+    def test_rra_is_called_outside_the_claim_transaction(self):
+        ebm.sign_receipts()
+        depth = len(connection.atomic_blocks)
+
+        class Client:
+            def submit(self, receipts):
+                self.depth = len(connection.atomic_blocks)
+                self.leased = EbmReceipt.objects.filter(submit_leased_until__isnull=False).count()
+                raise ConnectionError("RRA unreachable")
+
+        client = Client()
+        with self.assertRaises(ConnectionError):
+            ebm.submit_pending(client)
+        # No row lock is held while RRA answers, and a failed call releases its lease
+        self.assertEqual((client.depth, client.leased), (depth, 4))
+        self.assertFalse(EbmReceipt.objects.filter(submit_leased_until__isnull=False).exists())
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RuraVerifierTest(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeRuraServer().start()
+        self.addCleanup(self.server.stop)
+        self.clock = FakeClock()
+        self.verifier = rura.RuraVerifier(
+            rura.HttpRuraBackend(self.server.url), ttl=60, negative_ttl=10,
+            local=cachelib.LruTtlCache(rura.RURA_LOCAL_CACHE_SIZE, clock=self.clock),
+            breaker=rura.CircuitBreaker(threshold=2, reset_timeout=30, clock=self.clock),
+        )
+
+    def test_positive_and_negative_answers_are_cached_with_their_ttl(self):
+        self.assertTrue(self.verifier.verify("rwa-100")["valid"])
+        self.assertEqual(self.verifier.verify("XYZ-1")["status"], "not_found")
+        self.verifier.verify("RWA-100")
+        self.verifier.verify("XYZ-1")
+        self.assertEqual(self.server.requests, 2)
+
+        self.clock.now = 11  # negative entry expired, positive one still fresh
+        self.verifier.verify("RWA-100")
+        self.verifier.verify("XYZ-1")
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.verifier.hit_rate(), 3 / 6)
+
+    def test_concurrent_lookups_are_coalesced(self):
+        self.server.latency = 0.2
+        barrier = threading.Barrier(8)
+
+        def lookup():
+            barrier.wait()
+            self.verifier.verify("RWA-7")
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.verifier.stats["coalesced"] + self.verifier.stats["local_hits"], 7)
+
+    def test_circuit_breaker_serves_stale_answers_during_outage(self):
+        self.verifier.verify("RWA-1")
+        self.clock.now = 61
+        self.server.failing = True
+        self.assertEqual(self.verifier.verify("RWA-1"), {"license_no": "RWA-1", "valid": True, "status": "active", "stale": True})
+        with self.assertRaises(rura.RuraUnavailable):
+            self.verifier.verify("RWA-2")
+        self.assertEqual(self.verifier.breaker.state, "open")
+        requests = self.server.requests
+        with self.assertRaises(rura.RuraUnavailable):
+            self.verifier.verify("RWA-3")
+        self.assertEqual(self.server.requests, requests)
+
+        self.server.failing = False
+        self.clock.now += 30
+        self.assertTrue(self.verifier.verify("RWA-3")["valid"])
+        self.assertEqual(self.verifier.breaker.state, "closed")
+
+    def test_breaker_trial_ends_when_the_call_is_cancelled_or_malformed(self):
+        class Broken:
+            def verify_many(self, license_numbers):
+                raise KeyError("results")
+
+            async def averify_many(self, license_numbers):
+                raise asyncio.CancelledError()
+
+        self.server.failing = True
+        for no in ("RWA-1", "RWA-2"):
+            with self.assertRaises(rura.RuraUnavailable):
+                self.verifier.verify(no)
+        backend, self.verifier.backend = self.verifier.backend, Broken()
+        self.clock.now += 30
+        with self.assertRaises(asyncio.CancelledError):
+            async_to_sync(self.verifier.averify_many)(["RWA-3"])
+        # The cancelled trial gave no verdict; the next call is the trial, and a malformed answer reopens
+        with self.assertRaises(KeyError):
+            self.verifier.verify("RWA-4")
+        self.assertEqual(self.verifier.breaker.state, "open")
+        self.verifier.backend, self.server.failing = backend, False
+        self.clock.now += 30
+        self.assertTrue(self.verifier.verify("RWA-5")["valid"])
+        self.assertEqual(self.verifier.breaker.state, "closed")
+
+    def test_fleet_lookup_uses_chunked_bulk_calls_and_shared_tier(self):
+        shared = LocMemCache("rura-test", {"OPTIONS": {"MAX_ENTRIES": 10000}})
+        self.addCleanup(shared.clear)
+        self.verifier.shared = shared
+        fleet = [f"RWA-{i}" for i in range(450)] + ["BAD-1"]
+        results = self.verifier.verify_many(fleet)
+        self.assertEqual(sum(r["valid"] for r in results.values()), 450)
+        self.assertEqual(self.server.requests, 3)
+
+        # A second worker with an empty local tier is served by the shared cache
+        other = rura.RuraVerifier(rura.HttpRuraBackend(self.server.url), shared=shared)
+        other.verify_many(fleet)
+        self.assertEqual((self.server.requests, other.stats["shared_hits"]), (3, 451))
+
+    def test_async_fleet_lookup_requests_chunks_concurrently(self):
+        self.server.latency = 0.3
+        fleet = [f"RWA-{i}" for i in range(450)] + ["BAD-1"]
+        started = time.perf_counter()
+        results = async_to_sync(self.verifier.averify_many)(fleet)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(sum(r["valid"] for r in results.values()), 450)
+        self.assertEqual(results["BAD-1"]["status"], "not_found")
+        # Three bulk calls, overlapping rather than one after another
+        self.assertEqual(self.server.requests, 3)
+        self.assertLess(elapsed, 0.8)
+
+        self.server.failing = True
+        self.clock.now = 61
+        answers = async_to_sync(self.verifier.averify_many)(["RWA-1", "RWA-NEW"])
+        self.assertEqual((answers["RWA-1"]["stale"], answers["RWA-NEW"]["status"]), (True, "unavailable"))
+
+
+class RuraEndpointTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        rura.reset_verifier()
+        get_response_cache().clear()
+        self.addCleanup(rura.reset_verifier)
+        self.addCleanup(cache.clear)
+
+    def test_single_and_fleet_verification(self):
+        self.assertTrue(self.client.get("/gov/rura/verify-license/RWA123/").json()["valid"])
+        self.assertFalse(self.client.get("/gov/rura/verify-license/KE999/").json()["valid"])
+
+        Driver.objects.create(name="A", phone_number="0788", license_number="RWA-1")
+        Driver.objects.create(name="B", phone_number="0788", license_number="UG-2")
+        fleet = self.client.post("/gov/rura/verify-licenses/").json()
+        self.assertEqual((fleet["valid"], fleet["invalid"]), (1, 1))
+        self.assertIn("driver_id", fleet["results"][0])
+
+        listed = self.client.post("/gov/rura/verify-licenses/", data={"license_numbers": ["RWA-9", "X"]},
+                                  content_type="application/json").json()
+        self.assertEqual([r["valid"] for r in listed["results"]], [True, False])
+        bad = self.client.post("/gov/rura/verify-licenses/", data={"license_numbers": [1]},
+                               content_type="application/json")
+        self.assertEqual(bad.status_code, 400)
+
+
+class AuditLogTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        # Start from an empty buffer: other tests' requests were audited too
+        audit.audit_log.flush()
+
+    def test_classification(self):
+        self.assertEqual(audit.classify("/tracking/12/live/"), ("shipment", "12"))
+        self.assertEqual(audit.classify("/gov/rura/verify-license/RWA-1/"), ("license", "RWA-1"))
+        self.assertIsNone(audit.classify("/health/"))
+
+    def test_writer_batches_and_requeues_on_failure(self):
+        writer = audit.AuditWriter(flush_size=3)
+        for i in range(2):
+            audit.record_access("officer", "GET", f"/tracking/{i}/live/", 200, "127.0.0.1", writer=writer)
+        self.assertEqual(writer.pending(), 2)
+        # The third event completes a batch, flushed inline since no writer thread runs
+        with self.assertNumQueries(1):
+            audit.record_access("officer", "POST", "/gov/ebm/sign-receipt/", 200, writer=writer)
+        self.assertEqual((writer.pending(), writer.written), (0, 3))
+
+        audit.record_access("officer", "GET", "/tracking/9/live/", 200, writer=writer)
+        writer.record(("not a timestamp",) + ("x",) * 8)
+        with self.assertRaises(TypeError):
+            writer.flush()
+        self.assertEqual(writer.pending(), 2)
+
+    def test_requests_are_audited_and_read_back_by_cursor(self):
+        for i in range(5):
+            self.client.get(f"/gov/rura/verify-license/RWA-{i}/")
+        self.client.get("/health/")
+        first = self.client.get("/gov/audit/access-log/", {"resource_type": "license", "limit": 3}).json()
+        self.assertEqual([e["resource_id"] for e in first["audit_log"]], ["RWA-4", "RWA-3", "RWA-2"])
+        second = self.client.get("/gov/audit/access-log/", {"resource_type": "license", "limit": 3,
+                                                            "cursor": first["next_cursor"]}).json()
+        self.assertEqual([e["resource_id"] for e in second["audit_log"]], ["RWA-1", "RWA-0"])
+        self.assertIsNone(second["next_cursor"])
+        self.assertEqual(second["audit_log"][0]["action"], "read")
+
+        # Reading the audit log is itself audited; health checks are not
+        audit.audit_log.flush()
+        self.assertEqual(AccessLogEntry.objects.filter(resource_type="audit_log").count(), 2)
+        self.assertFalse(AccessLogEntry.objects.filter(path="/health/").exists())
+        self.assertEqual(self.client.get("/gov/audit/access-log/", {"cursor": "junk"}).status_code, 400)
+
+    def test_entries_are_append_only(self):
+        audit.record_access("officer", "GET", "/tracking/1/live/", 200)
+        audit.audit_log.flush()
+        entry = AccessLogEntry.objects.latest("id")
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+
+class AuditWriterThreadTest(SimpleTestCase):
+    def test_background_thread_flushes_on_interval_and_on_stop(self):
+        flushed = []
+
+        class RecordingWriter(audit.AuditWriter):
+            def flush(self):
+                batch = []
+                while self._buffer:
+                    batch.append(self._buffer.popleft())
+                flushed.extend(batch)
+                return len(batch)
+
+        writer = RecordingWriter().start(interval=0.05)
+        audit.record_access("officer", "GET", "/tracking/1/live/", 200, writer=writer)
+        for _ in range(100):
+            if flushed:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(len(flushed), 1)
+        audit.record_access("officer", "GET", "/tracking/2/live/", 200, writer=writer)
+        writer.stop()
+        self.assertEqual(len(flushed), 2)
@@ -2,6 +2,7 @@
 ASGI config for ishemalink_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP is served by Django; WebSocket connections are routed to the tracking channel.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -13,4 +14,23 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ishemalink_api.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the tracking channel uses the app registry
+from tracking.websocket import tracking_websocket  # noqa: E402
+from gov.audit import audit_log  # noqa: E402
+from tracking.trajectory import trajectories  # noqa: E402
+from Core.taskqueue import start_local_workers  # noqa: E402
+
+# Serving processes flush the audit log and GPS history from background threads
+audit_log.start()
+trajectories.start()
+# and, without a shared task broker, work their own task queue
+start_local_workers()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await tracking_websocket(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -29,7 +29,8 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
-ALLOWED_HOSTS = ['localhost', '127.0.0.1', 'your-domain.com', 'your-server-ip']
+# 'web' is the app container's name, used by Prometheus scrapes from inside the compose network
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', 'web', 'your-domain.com', 'your-server-ip']
 
 
 # Application definition
@@ -43,15 +44,22 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'Core',
     'Domestic',
-    'International'
+    'International',
+    'notifications',
+    'analytics',
+    'tracking',
+    'gov',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'Core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gov.middleware.AuditMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,6 +98,17 @@ DATABASES = {
     }
 }
 
+# Local runs and load tests without Postgres: SQLITE_PATH=/tmp/ishemalink.sqlite3
+if os.getenv('SQLITE_PATH'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH'),
+        # Writers take the lock up front instead of failing on upgrade under concurrency
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        # On disk rather than in memory, so threaded tests see one database
+        'TEST': {'NAME': os.getenv('SQLITE_PATH') + '.test'},
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -126,4 +145,100 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
-STATIC_ROOT = BASE_DIR / 'staticfiles'
\ No newline at end of file
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Driver matching strategy used by Core.dispatch: lru, capacity or nearest
+DISPATCH_STRATEGY = os.getenv('DISPATCH_STRATEGY', 'lru')
+
+# Outbound notifications: empty SMS_GATEWAY_URL prints messages instead of sending them
+SMS_GATEWAY_URL = os.getenv('SMS_GATEWAY_URL', '')
+# Outbound email: with neither EMAIL_HOST nor EMAIL_BACKEND set, emails are logged instead of sent
+EMAIL_HOST = os.getenv('EMAIL_HOST', '')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', '1') == '1'
+if os.getenv('EMAIL_BACKEND'):
+    EMAIL_BACKEND = os.getenv('EMAIL_BACKEND')
+# Messages per second allowed per provider
+NOTIFICATION_RATE_LIMITS = {
+    'mtn': float(os.getenv('MTN_SMS_RATE', 100)),
+    'airtel': float(os.getenv('AIRTEL_SMS_RATE', 100)),
+    'email': float(os.getenv('EMAIL_RATE', 20)),
+}
+
+# Mobile money collections: with neither URL set, payments.MomoMock answers offline
+MTN_MOMO_URL = os.getenv('MTN_MOMO_URL', '')
+MTN_MOMO_SUBSCRIPTION_KEY = os.getenv('MTN_MOMO_SUBSCRIPTION_KEY', '')
+MTN_MOMO_API_TOKEN = os.getenv('MTN_MOMO_API_TOKEN', '')
+MTN_MOMO_ENVIRONMENT = os.getenv('MTN_MOMO_ENVIRONMENT', 'sandbox')
+AIRTEL_MONEY_URL = os.getenv('AIRTEL_MONEY_URL', '')
+AIRTEL_MONEY_API_TOKEN = os.getenv('AIRTEL_MONEY_API_TOKEN', '')
+# Seconds to wait for a provider, extra attempts on transient errors, prompts in flight per batch
+PAYMENT_TIMEOUT = float(os.getenv('PAYMENT_TIMEOUT', 10))
+PAYMENT_RETRIES = int(os.getenv('PAYMENT_RETRIES', 2))
+PAYMENT_CONCURRENCY = int(os.getenv('PAYMENT_CONCURRENCY', 50))
+
+# RRA EBM receipts: HMAC-SHA256 signing key (or a file holding it), its id and the seller TIN
+EBM_SIGNING_KEY = os.getenv('EBM_SIGNING_KEY', '')
+EBM_SIGNING_KEY_FILE = os.getenv('EBM_SIGNING_KEY_FILE', '')
+EBM_KEY_ID = os.getenv('EBM_KEY_ID', 'ebm-1')
+EBM_SELLER_TIN = os.getenv('EBM_SELLER_TIN', '')
+# Signing processes for large batches; 0 signs in the calling process
+EBM_SIGNING_WORKERS = int(os.getenv('EBM_SIGNING_WORKERS', 0))
+# Empty RRA_EBM_URL keeps signed receipts local instead of submitting them
+RRA_EBM_URL = os.getenv('RRA_EBM_URL', '')
+
+# Shared cache tier and live tracking positions: Redis when REDIS_URL is set (requires the redis package),
+# else per-process memory. Required when several server workers share tracking traffic
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# Response cache for read-mostly views (Core.caching.cached_view); VIEW_CACHE=0 serves every request from the view
+VIEW_CACHE = os.getenv('VIEW_CACHE', '1') == '1'
+
+# Background tasks (Core.taskqueue): TASK_BROKER_URL is a Redis broker shared with the run_tasks workers
+# (use a database the cache cannot evict from); empty keeps tasks in each serving process, worked by
+# TASK_LOCAL_WORKERS threads. TASKS_EAGER runs every task inline when its transaction commits (tests, debugging)
+TASK_BROKER_URL = os.getenv('TASK_BROKER_URL', '')
+TASK_LOCAL_WORKERS = int(os.getenv('TASK_LOCAL_WORKERS', 2))
+TASKS_EAGER = os.getenv('TASKS_EAGER', '0') == '1'
+# Customs manifests generated in the background; shared by the web and worker containers
+MANIFEST_DIR = os.getenv('MANIFEST_DIR', str(BASE_DIR / 'manifests'))
+
+# RURA license verification: empty RURA_API_URL applies the offline RWA-prefix rule
+RURA_API_URL = os.getenv('RURA_API_URL', '')
+RURA_CACHE_TTL = int(os.getenv('RURA_CACHE_TTL', 3600))
+# Invalid licenses are cached for less time, so a newly issued licence is seen soon
+RURA_NEGATIVE_CACHE_TTL = int(os.getenv('RURA_NEGATIVE_CACHE_TTL', 300))
+
+# Structured JSON logs on stderr; app INFO records are sampled at LOG_SAMPLE_RATE, warnings and errors always kept
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.1))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {'sampled': {'()': 'Core.logs.SampleFilter', 'rate': LOG_SAMPLE_RATE}},
+    'formatters': {'json': {'()': 'Core.logs.JsonFormatter'}},
+    'handlers': {'console': {'class': 'logging.StreamHandler', 'formatter': 'json', 'filters': ['sampled']}},
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    'loggers': {
+        **{app: {'level': LOG_LEVEL} for app in ('Core', 'payments', 'notifications', 'gov', 'tracking', 'analytics')},
+        # Server errors with tracebacks; 4xx responses are counted in /metrics/ instead
+        'django.request': {'level': 'ERROR'},
+    },
+}
+
+# Prometheus metrics at /metrics/: with METRICS_DIR set, every worker process writes its samples
+# there and any worker answers a scrape with their sum (required with several worker processes)
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+# Development and CI query profiler (Core.profiling): per-call-site grouping, N+1 and slow-query
+# detection with EXPLAIN plans, and @query_budget checks; QUERY_PROFILER_RAISE fails the request instead of logging
+QUERY_PROFILER = os.getenv('QUERY_PROFILER', '') == '1'
+QUERY_PROFILER_RAISE = os.getenv('QUERY_PROFILER_RAISE', '') == '1'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+if QUERY_PROFILER:
+    MIDDLEWARE.insert(0, 'Core.profiling.QueryProfilerMiddleware')
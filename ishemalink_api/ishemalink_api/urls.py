@@ -14,15 +14,23 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import admin
 from django.urls import path
-from Core.views import create_shipment_view, payment_webhook_view
-import random
+from Core.caching import cached_view
+from Core.profiling import query_budget
+from Core.views import (
+    create_shipment_view, bulk_create_shipments_view, list_shipments_view, payment_webhook_view,
+    tracking_pings_view, tracking_live_view, tracking_stream_view, tracking_trajectory_view,
+)
+import json
 from django.db import models
 
 @csrf_exempt
+@cached_view(3600)
 def api_root(request):
     return JsonResponse({
         "name": "IshemaLink API",
@@ -36,57 +44,91 @@ def health_check(request):
         "database": "connected"
     })
 
-@csrf_exempt
-def tracking_live_view(request, shipment_id):
-    # Simulate real-time coordinates (in production, fetch from GPS or DB)
-    coords = {
-        "lat": round(-1.95 + random.uniform(-0.05, 0.05), 6),
-        "lng": round(30.06 + random.uniform(-0.05, 0.05), 6),
-        "shipment_id": shipment_id
+def _broadcast_job_json(job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "segment": job.segment,
+        "total": job.total,
+        "queued": job.queued,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
     }
-    return JsonResponse(coords)
 
 @csrf_exempt
-def notifications_broadcast_view(request):
+async def notifications_broadcast_view(request):
     if request.method == 'POST':
-        from Core.models import Driver
-        from notifications import NotificationEngine
-        notifier = NotificationEngine()
-        drivers = Driver.objects.all()
-        message = request.GET.get('message', 'Admin broadcast to all drivers')
-        for driver in drivers:
-            notifier.send_sms(driver.phone_number, message)
-        return JsonResponse({"status": "broadcast sent", "driver_count": drivers.count()})
+        from notifications.broadcast import parse_segment, start_broadcast
+        try:
+            data = json.loads(request.body) if request.content_type == 'application/json' and request.body else {}
+            message = data.get('message') or request.GET.get('message', 'Admin broadcast to all drivers')
+            raw_segment = data.get('segment') or {k: v for k, v in request.GET.items() if k != 'message'}
+            segment = parse_segment(raw_segment)
+        except (json.JSONDecodeError, AttributeError, ValueError) as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        # Records the job; the sends run in a background task, never in this request
+        job = await sync_to_async(start_broadcast)(message, segment)
+        body = _broadcast_job_json(job)
+        body["poll"] = f"/notifications/broadcast/{job.id}/"
+        return JsonResponse(body, status=202)
     return JsonResponse({"error": "Invalid method"}, status=405)
 
 @csrf_exempt
+@query_budget(1)
+async def notifications_broadcast_status_view(request, job_id):
+    from notifications.models import BroadcastJob
+    job = await BroadcastJob.objects.filter(pk=job_id).afirst()
+    if job is None:
+        return JsonResponse({"error": "Broadcast job not found"}, status=404)
+    return JsonResponse(_broadcast_job_json(job))
+
+@csrf_exempt
+@query_budget(1)
 def admin_dashboard_summary_view(request):
-    from Core.models import Shipment, Driver
-    active_trucks = Shipment.objects.filter(status="confirmed").count()
-    total_revenue = Shipment.objects.filter(status="confirmed").aggregate(total=models.Sum('tariff'))['total'] or 0
-    available_drivers = Driver.objects.filter(is_available=True).count()
-    return JsonResponse({
-        "active_trucks": active_trucks,
-        "total_revenue": total_revenue,
-        "available_drivers": available_drivers
-    })
+    from Core import counters
+    # O(1): reads the materialized counters, never scans Shipment or Driver
+    return JsonResponse(counters.snapshot())
+
+@csrf_exempt
+def metrics_view(request):
+    from Core.metrics import load_dumps, registry
+    if settings.METRICS_DIR:
+        # Every worker's latest dump, this one's refreshed first
+        registry.dump(settings.METRICS_DIR)
+        body = registry.render(load_dumps(settings.METRICS_DIR))
+    else:
+        body = registry.render()
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/", api_root),
     path("api/status/", health_check),
+    path("api/shipments/", list_shipments_view),
+    path("api/shipments/transitions/", __import__('Core.views', fromlist=['bulk_shipment_transitions_view']).bulk_shipment_transitions_view),
+    path("api/shipments/<int:shipment_id>/transitions/", __import__('Core.views', fromlist=['shipment_transitions_view']).shipment_transitions_view),
     path("api/shipments/create/", create_shipment_view),
+    path("api/shipments/bulk/", bulk_create_shipments_view),
     path("api/payments/webhook/", payment_webhook_view),
+    path("tracking/pings/", tracking_pings_view),
     path("tracking/<int:shipment_id>/live/", tracking_live_view),
+    path("tracking/<int:shipment_id>/stream/", tracking_stream_view),
+    path("tracking/<int:shipment_id>/trajectory/", tracking_trajectory_view),
     path("notifications/broadcast/", notifications_broadcast_view),
+    path("notifications/broadcast/<int:job_id>/", notifications_broadcast_status_view),
     path("dashboard/summary/", admin_dashboard_summary_view),
+    path("metrics/", metrics_view),
     path("dashboard/",  __import__('Core.views', fromlist=['dashboard_html_view']).dashboard_html_view),
     path("analytics/routes/top/", __import__('Core.views', fromlist=['analytics_routes_top_view']).analytics_routes_top_view),
     path("analytics/commodities/breakdown/", __import__('Core.views', fromlist=['analytics_commodities_breakdown_view']).analytics_commodities_breakdown_view),
     path("analytics/revenue/heatmap/", __import__('Core.views', fromlist=['analytics_revenue_heatmap_view']).analytics_revenue_heatmap_view),
     path("analytics/drivers/leaderboard/", __import__('Core.views', fromlist=['analytics_drivers_leaderboard_view']).analytics_drivers_leaderboard_view),
     path("gov/ebm/sign-receipt/", __import__('Core.views', fromlist=['gov_ebm_sign_receipt_view']).gov_ebm_sign_receipt_view),
+    path("gov/ebm/sign-receipts/", __import__('Core.views', fromlist=['gov_ebm_sign_receipts_batch_view']).gov_ebm_sign_receipts_batch_view),
     path("gov/rura/verify-license/<str:license_no>/", __import__('Core.views', fromlist=['gov_rura_verify_license_view']).gov_rura_verify_license_view),
+    path("gov/rura/verify-licenses/", __import__('Core.views', fromlist=['gov_rura_verify_licenses_view']).gov_rura_verify_licenses_view),
     path("gov/customs/generate-manifest/", __import__('Core.views', fromlist=['gov_customs_generate_manifest_view']).gov_customs_generate_manifest_view),
+    path("gov/customs/manifests/<str:manifest_id>/", __import__('Core.views', fromlist=['gov_customs_manifest_view']).gov_customs_manifest_view),
     path("gov/audit/access-log/", __import__('Core.views', fromlist=['gov_audit_access_log_view']).gov_audit_access_log_view),
 ]
\ No newline at end of file
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ishemalink_api.settings')
 
 application = get_wsgi_application()
+
+# Serving processes flush the audit log and GPS history from background threads
+from gov.audit import audit_log  # noqa: E402
+from tracking.trajectory import trajectories  # noqa: E402
+from Core.taskqueue import start_local_workers  # noqa: E402
+
+audit_log.start()
+trajectories.start()
+# and, without a shared task broker, work their own task queue
+start_local_workers()
@@ -1,14 +1,74 @@
-from typing import Any
+from typing import Any, Dict, Iterable, Tuple
+
+# SMS routing by Rwandan mobile prefix; anything unknown goes to MTN
+SMS_PROVIDER_PREFIXES = {
+    "078": "mtn", "079": "mtn",
+    "072": "airtel", "073": "airtel",
+}
+EMAIL_PROVIDER = "email"
+
+# Task that runs the NotificationDispatcher, enqueued whenever notifications are queued (notifications.tasks)
+DELIVER_TASK = "notifications.deliver"
+
+def _schedule_delivery() -> None:
+    # Queued deliveries coalesce into one dispatcher run per worker batch
+    from Core import taskqueue
+    taskqueue.enqueue(DELIVER_TASK)
+
+def sms_provider_for(phone_number: str) -> str:
+    number = phone_number.replace("+250", "0").replace(" ", "")
+    return SMS_PROVIDER_PREFIXES.get(number[:3], "mtn")
 
 class NotificationEngine:
     """
-    Handles sending notifications via SMS and Email.
-    Methods can be expanded to integrate with real gateways.
+    Queues SMS and Email notifications for asynchronous delivery.
+    - Messages are persisted as Notification rows and returned immediately
+    - Delivery, batching per provider, rate limits and retries are handled
+      by notifications.dispatcher.NotificationDispatcher, run by the DELIVER_TASK
+      each send enqueues (or the send_notifications command)
     """
     def send_sms(self, phone_number: str, message: str) -> Any:
-        print(f"SMS sent to {phone_number}: {message}")
-        return {"status": "sent", "type": "sms"}
+        from notifications.models import Notification
+        notification = Notification.objects.create(
+            channel="sms",
+            provider=sms_provider_for(phone_number),
+            recipient=phone_number,
+            body=message
+        )
+        _schedule_delivery()
+        return {"status": "queued", "type": "sms", "id": notification.id}
 
     def send_email(self, email: str, subject: str, body: str) -> Any:
-        print(f"Email sent to {email}: {subject} - {body}")
-        return {"status": "sent", "type": "email"}
+        from notifications.models import Notification
+        notification = Notification.objects.create(
+            channel="email",
+            provider=EMAIL_PROVIDER,
+            recipient=email,
+            subject=subject,
+            body=body
+        )
+        _schedule_delivery()
+        return {"status": "queued", "type": "email", "id": notification.id}
+
+    def send_sms_bulk(self, messages: Iterable[Tuple[str, str]], batch_size: int = 1000) -> Dict[str, Any]:
+        # (phone_number, message) pairs, inserted batch_size rows per statement
+        from notifications.models import Notification
+        queued = 0
+        batch = []
+        for phone_number, message in messages:
+            batch.append(Notification(
+                channel="sms",
+                provider=sms_provider_for(phone_number),
+                recipient=phone_number,
+                body=message
+            ))
+            if len(batch) >= batch_size:
+                Notification.objects.bulk_create(batch)
+                queued += len(batch)
+                batch = []
+        if batch:
+            Notification.objects.bulk_create(batch)
+            queued += len(batch)
+        if queued:
+            _schedule_delivery()
+        return {"status": "queued", "type": "sms", "count": queued}
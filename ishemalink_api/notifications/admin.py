@@ -0,0 +1,5 @@
+from django.contrib import admin
+from .models import BroadcastJob, Notification
+
+admin.site.register(Notification)
+admin.site.register(BroadcastJob)
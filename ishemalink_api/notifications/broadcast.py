@@ -0,0 +1,98 @@
+from datetime import timedelta
+from typing import Any, Dict
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+from Core import taskqueue
+from Core.models import Driver
+from notifications import NotificationEngine
+from notifications.models import BroadcastJob
+
+# Drivers fetched per server-side cursor round-trip and per notification INSERT
+BROADCAST_CHUNK_SIZE = 2000
+
+# Seconds a run holds its job between chunks; a job whose lease lapsed (dead worker) can be claimed again
+BROADCAST_LEASE_SECONDS = 300
+
+# Segment keys accepted from callers, mapped to indexed Driver columns
+SEGMENT_FIELDS = {
+    "region": "region",
+    "license_class": "license_class",
+    "available": "is_available",
+}
+
+# Task running one broadcast job off the request thread (notifications.tasks)
+BROADCAST_TASK = "notifications.broadcast"
+
+
+def parse_segment(raw: Dict[str, Any]) -> Dict[str, Any]:
+    segment = {}
+    for key, value in raw.items():
+        if key not in SEGMENT_FIELDS:
+            raise ValueError(f"Unknown segment filter: {key}")
+        if key == "available" and not isinstance(value, bool):
+            value = str(value).lower() in ("1", "true", "yes")
+        segment[key] = value
+    return segment
+
+
+def segment_queryset(segment: Dict[str, Any]) -> QuerySet:
+    return Driver.objects.filter(**{SEGMENT_FIELDS[key]: value for key, value in segment.items()})
+
+
+def run_broadcast(job_id: int, chunk_size: int = BROADCAST_CHUNK_SIZE,
+                  lease_seconds: float = BROADCAST_LEASE_SECONDS) -> BroadcastJob:
+    """
+    Enqueues the segment's SMS chunk by chunk, walking drivers by primary key,
+    so memory stays flat whatever the fleet size.
+    - Claims the job with a conditional UPDATE; a run that finds it completed, or
+      leased by a live run, returns without sending anything
+    - Each chunk advances last_driver_id in the transaction that inserts its
+      notifications, so a redelivered task resumes after the last committed chunk
+    - Errors release the job and propagate, so the task queue retries it
+    """
+    now = timezone.now()
+    claimed = BroadcastJob.objects.filter(
+        Q(status="pending") | Q(status="running", leased_until__lt=now), pk=job_id,
+    ).update(status="running", leased_until=now + timedelta(seconds=lease_seconds))
+    job = BroadcastJob.objects.get(pk=job_id)
+    if not claimed:
+        return job
+    recipients = segment_queryset(job.segment)
+    if job.started_at is None:
+        job.started_at, job.total = now, recipients.count()
+        BroadcastJob.objects.filter(pk=job.pk).update(started_at=job.started_at, total=job.total)
+    notifier = NotificationEngine()
+    last_id = job.last_driver_id
+    try:
+        while True:
+            chunk = list(recipients.filter(pk__gt=last_id).order_by("pk").values_list("pk", "phone_number")[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic():
+                # Conditional on the cursor this run read, so a run that lost its lease stops here
+                advanced = BroadcastJob.objects.filter(pk=job.pk, status="running", last_driver_id=last_id).update(
+                    last_driver_id=chunk[-1][0], queued=F("queued") + len(chunk),
+                    leased_until=timezone.now() + timedelta(seconds=lease_seconds),
+                )
+                if not advanced:
+                    break
+                notifier.send_sms_bulk(((phone, job.message) for _, phone in chunk), batch_size=chunk_size)
+            last_id = chunk[-1][0]
+    except BaseException as e:
+        BroadcastJob.objects.filter(pk=job.pk, status="running", last_driver_id=last_id).update(
+            status="pending", leased_until=None, error=str(e)
+        )
+        raise
+    BroadcastJob.objects.filter(pk=job.pk, status="running", last_driver_id=last_id).update(
+        status="completed", error="", leased_until=None, finished_at=timezone.now()
+    )
+    job.refresh_from_db()
+    return job
+
+
+def start_broadcast(message: str, segment: Dict[str, Any]) -> BroadcastJob:
+    """Records the job and queues BROADCAST_TASK for it once the row is committed."""
+    job = BroadcastJob.objects.create(message=message, segment=segment)
+    taskqueue.enqueue(BROADCAST_TASK, {"job_id": job.id})
+    return job
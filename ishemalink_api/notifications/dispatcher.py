@@ -0,0 +1,141 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from notifications.models import Notification
+from notifications.transports import ConsoleTransport, EmailTransport, HttpSmsTransport, Transport
+
+
+# A claimed notification becomes due again after this long, so a crashed dispatcher strands nothing
+NOTIFICATION_LEASE_SECONDS = 300
+
+
+class TokenBucket:
+    """
+    Thread-safe rate limiter: `rate` tokens per second, bursts up to `capacity`.
+    A batch larger than the bucket waits for a full bucket and is charged in full,
+    leaving the bucket in debt, so later callers wait it off and the rate holds.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> None:
+        needed = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def default_transports() -> Dict[str, Transport]:
+    gateway_url = settings.SMS_GATEWAY_URL
+    email_configured = settings.EMAIL_HOST or settings.is_overridden("EMAIL_BACKEND")
+    transports: Dict[str, Transport] = {"email": EmailTransport() if email_configured else ConsoleTransport()}
+    for provider in ("mtn", "airtel"):
+        transports[provider] = HttpSmsTransport(gateway_url, provider) if gateway_url else ConsoleTransport()
+    return transports
+
+
+class NotificationDispatcher:
+    """
+    Drains queued notifications and delivers them concurrently.
+    - Claims due rows in one short transaction (SKIP LOCKED where supported) and
+      leases them: rows left in "sending" by a crashed dispatcher are claimed again
+    - Coalesces messages per provider into batches, one transport call per batch
+    - Sends batches on a thread pool, throttled by a per-provider TokenBucket
+    - Retries failures with exponential backoff, then marks them failed
+    Only the dispatcher thread touches the database.
+    """
+    def __init__(self, transports: Optional[Dict[str, Transport]] = None,
+                 rate_limits: Optional[Dict[str, float]] = None,
+                 batch_size: int = 100, max_workers: int = 8,
+                 max_attempts: int = 5, backoff_seconds: float = 2.0,
+                 lease_seconds: float = NOTIFICATION_LEASE_SECONDS):
+        self.transports = transports if transports is not None else default_transports()
+        rate_limits = rate_limits if rate_limits is not None else settings.NOTIFICATION_RATE_LIMITS
+        self.buckets = {provider: TokenBucket(rate) for provider, rate in rate_limits.items()}
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notify")
+
+    def claim(self, limit: int) -> List[Notification]:
+        now = timezone.now()
+        with transaction.atomic():
+            due = Notification.objects.filter(
+                status__in=("queued", "sending")
+            ).exclude(next_attempt_at__gt=now).order_by("id")
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            claimed = list(due[:limit])
+            Notification.objects.filter(id__in=[n.id for n in claimed]).update(
+                status="sending", next_attempt_at=now + timedelta(seconds=self.lease_seconds)
+            )
+        return claimed
+
+    def _send_batch(self, provider: str, batch: List[Notification]):
+        bucket = self.buckets.get(provider)
+        if bucket:
+            bucket.acquire(len(batch))
+        transport = self.transports.get(provider)
+        if transport is None:
+            return [f"no transport for provider {provider}"] * len(batch)
+        try:
+            return transport.send(batch)
+        except Exception as e:
+            return [str(e)] * len(batch)
+
+    def run_once(self, limit: int = 1000) -> int:
+        """Delivers up to `limit` due notifications and returns how many were claimed."""
+        claimed = self.claim(limit)
+        if not claimed:
+            return 0
+        by_provider: Dict[str, List[Notification]] = {}
+        for n in claimed:
+            by_provider.setdefault(n.provider, []).append(n)
+        futures = []
+        for provider, items in by_provider.items():
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                futures.append((batch, self.executor.submit(self._send_batch, provider, batch)))
+
+        now = timezone.now()
+        for batch, future in futures:
+            for n, error in zip(batch, future.result()):
+                n.attempts += 1
+                if error is None:
+                    n.status = "sent"
+                    n.sent_at = now
+                    n.last_error = ""
+                    n.next_attempt_at = None
+                elif n.attempts >= self.max_attempts:
+                    n.status = "failed"
+                    n.last_error = error
+                    n.next_attempt_at = None
+                else:
+                    n.status = "queued"
+                    n.last_error = error
+                    n.next_attempt_at = now + timedelta(seconds=self.backoff_seconds * 2 ** (n.attempts - 1))
+        Notification.objects.bulk_update(
+            claimed, ["status", "attempts", "sent_at", "last_error", "next_attempt_at"], batch_size=500
+        )
+        return len(claimed)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,65 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if server.latency:
+            time.sleep(server.latency)
+        results = []
+        for _ in payload.get("messages", []):
+            if random.random() < server.fail_rate:
+                results.append({"status": "rejected", "error": "simulated delivery failure"})
+            else:
+                results.append({"status": "accepted"})
+        with server.lock:
+            server.requests += 1
+            server.accepted += sum(1 for r in results if r["status"] == "accepted")
+        body = json.dumps({"results": results}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SmsGatewayStub(ThreadingHTTPServer):
+    """
+    Local stand-in for the MTN/Airtel SMS gateways, for offline throughput tests.
+    Accepts POST {"provider", "messages": [{"to", "body"}]} on any path and
+    answers per-message results after `latency` seconds, rejecting `fail_rate` of them.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), latency: float = 0.0, fail_rate: float = 0.0):
+        super().__init__(address, _GatewayHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.accepted = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/messages"
+
+    def start(self) -> "SmsGatewayStub":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from notifications.gateway import SmsGatewayStub
+
+
+class Command(BaseCommand):
+    help = "Run the local SMS gateway stand-in (point SMS_GATEWAY_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=9099)
+        parser.add_argument("--latency", type=float, default=0.05, help="Seconds per gateway request.")
+        parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of messages to reject.")
+
+    def handle(self, *args, **options):
+        gateway = SmsGatewayStub((options["host"], options["port"]), options["latency"], options["fail_rate"])
+        self.stdout.write(f"SMS gateway stand-in listening on {gateway.url}")
+        try:
+            gateway.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f"Served {gateway.requests} request(s), accepted {gateway.accepted} message(s).")
+            gateway.server_close()
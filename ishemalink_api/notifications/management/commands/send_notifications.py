@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.dispatcher import NotificationDispatcher
+
+
+class Command(BaseCommand):
+    help = "Deliver queued SMS/Email notifications in per-provider batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=1000, help="Notifications claimed per round.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Messages per transport call.")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--loop", action="store_true", help="Keep delivering until interrupted.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Idle sleep in seconds when looping.")
+
+    def handle(self, *args, **options):
+        dispatcher = NotificationDispatcher(batch_size=options["batch_size"], max_workers=options["workers"])
+        total = 0
+        started = time.monotonic()
+        try:
+            while True:
+                claimed = dispatcher.run_once(options["limit"])
+                total += claimed
+                if claimed:
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        finally:
+            dispatcher.close()
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Processed {total} notification(s) in {elapsed:.2f}s.")
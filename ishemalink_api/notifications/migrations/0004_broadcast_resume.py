@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='last_driver_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import models
+
+class Notification(models.Model):
+    """
+    One outbound SMS or Email and its delivery status.
+    Rows are created by NotificationEngine and moved through
+    queued -> sending -> sent | failed by NotificationDispatcher.
+    A sending row is leased until next_attempt_at, then claimed again.
+    """
+    CHANNEL_CHOICES = [
+        ("sms", "SMS"),
+        ("email", "Email"),
+    ]
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    provider = models.CharField(max_length=20)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True, default="")
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["next_attempt_at", "id"], condition=models.Q(status__in=["queued", "sending"]), name="notification_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
+
+
+class BroadcastJob(models.Model):
+    """
+    A fan-out of one SMS to a segment of drivers, run in the background.
+    Progress (queued / total) is polled through /notifications/broadcast/<id>/.
+    A run leases the job and records the last driver messaged after each chunk,
+    so a redelivered task resumes where the previous run stopped.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+    message = models.TextField()
+    segment = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    total = models.PositiveIntegerField(default=0)
+    queued = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    last_driver_id = models.BigIntegerField(default=0)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Broadcast {self.id} ({self.status} {self.queued}/{self.total})"
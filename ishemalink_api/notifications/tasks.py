@@ -0,0 +1,33 @@
+import threading
+from typing import Any, Dict, List, Optional
+from Core import taskqueue
+from notifications import DELIVER_TASK
+from notifications.broadcast import BROADCAST_TASK, run_broadcast
+from notifications.dispatcher import NotificationDispatcher
+
+# Notifications claimed per dispatcher round
+DELIVER_CLAIM_LIMIT = 1000
+
+_dispatcher: Optional[NotificationDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> NotificationDispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher()
+        return _dispatcher
+
+
+# Periodic as well, so retries the dispatcher has backed off are picked up when due
+@taskqueue.task(DELIVER_TASK, batch_size=1000, every=5.0)
+def deliver(payloads: List[Dict[str, Any]]) -> None:
+    dispatcher = get_dispatcher()
+    while dispatcher.run_once(DELIVER_CLAIM_LIMIT) == DELIVER_CLAIM_LIMIT:
+        pass
+
+
+@taskqueue.task(BROADCAST_TASK, priority=taskqueue.LOW)
+def broadcast(job_id: int) -> None:
+    run_broadcast(job_id)
@@ -0,0 +1,147 @@
+import time
+from datetime import timedelta
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, Client, override_settings
+from django.utils import timezone
+from Core.models import Driver
+from Core.profiling import QueryBudgetMixin
+from notifications import NotificationEngine, sms_provider_for
+from notifications import tasks as notification_tasks
+from notifications.dispatcher import NotificationDispatcher, TokenBucket, default_transports
+from notifications.gateway import SmsGatewayStub
+from notifications.broadcast import parse_segment, run_broadcast
+from notifications.models import BroadcastJob, Notification
+from notifications.transports import ConsoleTransport, EmailTransport, HttpSmsTransport
+
+
+class NotificationDispatcherTest(TestCase):
+    def setUp(self):
+        self.gateway = SmsGatewayStub().start()
+        self.addCleanup(self.gateway.stop)
+
+    def _dispatcher(self, **kwargs):
+        transports = {p: HttpSmsTransport(self.gateway.url, p) for p in ("mtn", "airtel")}
+        dispatcher = NotificationDispatcher(transports=transports, rate_limits={}, batch_size=50, **kwargs)
+        self.addCleanup(dispatcher.close)
+        return dispatcher
+
+    def test_queued_messages_are_coalesced_per_provider(self):
+        engine = NotificationEngine()
+        engine.send_sms_bulk((f"078{i:07d}", "hello") for i in range(120))
+        engine.send_sms_bulk((f"073{i:07d}", "hello") for i in range(30))
+        self.assertEqual(self._dispatcher().run_once(), 150)
+        self.assertEqual(Notification.objects.filter(status="sent").count(), 150)
+        # 120 MTN -> 3 batches of <=50, 30 Airtel -> 1 batch
+        self.assertEqual(self.gateway.requests, 4)
+
+    def test_failed_deliveries_back_off_then_fail(self):
+        self.gateway.fail_rate = 1.0
+        NotificationEngine().send_sms("0781234567", "hello")
+        dispatcher = self._dispatcher(max_attempts=2, backoff_seconds=0)
+        dispatcher.run_once()
+        notification = Notification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), ("queued", 1))
+        dispatcher.run_once()
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ("failed", 2))
+        self.assertEqual(notification.last_error, "simulated delivery failure")
+
+    def test_rows_left_sending_are_claimed_again_after_the_lease(self):
+        NotificationEngine().send_sms("0781234567", "hello")
+        dispatcher = self._dispatcher(lease_seconds=0)
+        # A dispatcher that crashed after claiming
+        self.assertEqual(len(dispatcher.claim(10)), 1)
+        self.assertEqual(Notification.objects.get().status, "sending")
+        self.assertEqual(dispatcher.run_once(), 1)
+        self.assertEqual(Notification.objects.get().status, "sent")
+        self.assertEqual(self._dispatcher().claim(10), [])
+
+    def test_provider_routing(self):
+        self.assertEqual(sms_provider_for("0731234567"), "airtel")
+        self.assertEqual(sms_provider_for("+250781234567"), "mtn")
+
+
+class DefaultTransportsTest(SimpleTestCase):
+    def test_email_is_logged_until_a_mail_server_is_configured(self):
+        self.assertIsInstance(default_transports()["email"], ConsoleTransport)
+        with override_settings(EMAIL_HOST="smtp.example.com"):
+            self.assertIsInstance(default_transports()["email"], EmailTransport)
+        with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            self.assertIsInstance(default_transports()["email"], EmailTransport)
+
+
+class TokenBucketTest(SimpleTestCase):
+    def test_oversized_batches_are_charged_in_full(self):
+        bucket = TokenBucket(rate=200)
+        bucket.acquire(240)
+        started = time.monotonic()
+        # 40 tokens of debt, then the single token itself, at 200 per second
+        bucket.acquire(1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+
+class BroadcastTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        regions = ["Kigali", "Kigali", "Musanze", "Huye"]
+        for i, region in enumerate(regions):
+            Driver.objects.create(name=f"Driver {i}", phone_number=f"078000000{i}", license_number=f"RWA{i}",
+                                  region=region, license_class="C" if i % 2 else "D", is_available=i != 0)
+
+    def test_broadcast_returns_pollable_job(self):
+        client = Client()
+        response = client.post("/notifications/broadcast/?message=Road+closed&region=Kigali")
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["job_id"]
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertFalse(Notification.objects.exists())
+        run_broadcast(job_id)
+        status = client.get(f"/notifications/broadcast/{job_id}/").json()
+        self.assertEqual((status["status"], status["total"], status["queued"]), ("completed", 2, 2))
+        self.assertEqual(Notification.objects.filter(body="Road closed").count(), 2)
+
+    def test_segments_combine_and_stream_in_chunks(self):
+        job = BroadcastJob.objects.create(message="hi", segment=parse_segment({"region": "Kigali", "available": "true"}))
+        job = run_broadcast(job.id, chunk_size=1)
+        self.assertEqual((job.status, job.total, job.queued), ("completed", 1, 1))
+        everyone = BroadcastJob.objects.create(message="all")
+        self.assertEqual(run_broadcast(everyone.id, chunk_size=3).queued, 4)
+
+    def test_redelivered_task_does_not_message_drivers_twice(self):
+        job = BroadcastJob.objects.create(message="all")
+        notification_tasks.broadcast.run([{"job_id": job.id}])
+        notification_tasks.broadcast.run([{"job_id": job.id}])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.queued), ("completed", 4, 4))
+        self.assertEqual(Notification.objects.count(), 4)
+
+    def test_job_leased_by_a_live_run_is_left_to_it(self):
+        job = BroadcastJob.objects.create(message="all", status="running",
+                                          leased_until=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(run_broadcast(job.id).queued, 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_failed_chunk_is_retried_from_where_the_run_stopped(self):
+        job = BroadcastJob.objects.create(message="all")
+        send = NotificationEngine.send_sms_bulk
+        calls = []
+
+        def flaky(engine, messages, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise ConnectionError("database went away")
+            return send(engine, messages, **kwargs)
+
+        with mock.patch.object(NotificationEngine, "send_sms_bulk", flaky):
+            with self.assertRaises(ConnectionError):
+                run_broadcast(job.id, chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.queued), ("pending", 2))
+        job = run_broadcast(job.id, chunk_size=2)
+        self.assertEqual((job.status, job.total, job.queued), ("completed", 4, 4))
+        phones = Notification.objects.values_list("recipient", flat=True)
+        self.assertEqual(len(phones), len(set(phones)))
+
+    def test_unknown_segment_is_rejected(self):
+        response = Client().post("/notifications/broadcast/", data={"segment": {"colour": "red"}},
+                                 content_type="application/json")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,74 @@
+import json
+import logging
+import urllib.request
+from typing import List, Optional, Sequence
+from django.core import mail
+
+# Delivery result per message: None when accepted, otherwise the error text
+DeliveryResult = Optional[str]
+
+logger = logging.getLogger(__name__)
+
+
+class Transport:
+    """
+    Delivers a batch of notifications for one provider.
+    Implementations must not touch the database: they run on dispatcher threads.
+    """
+    def send(self, batch: Sequence) -> List[DeliveryResult]:
+        raise NotImplementedError
+
+
+class ConsoleTransport(Transport):
+    """Development transport: logs each message instead of sending it."""
+    def send(self, batch: Sequence) -> List[DeliveryResult]:
+        for n in batch:
+            if n.channel == "email":
+                logger.info("Email sent to %s: %s - %s", n.recipient, n.subject, n.body)
+            else:
+                logger.info("SMS sent to %s: %s", n.recipient, n.body)
+        return [None] * len(batch)
+
+
+class HttpSmsTransport(Transport):
+    """
+    Posts a whole batch to an SMS gateway in one request.
+    Expects {"results": [{"status": "accepted" | "rejected", "error": ...}, ...]} in input order;
+    notifications.gateway provides a local stand-in speaking this protocol.
+    """
+    def __init__(self, url: str, provider: str, timeout: float = 10.0):
+        self.url = url
+        self.provider = provider
+        self.timeout = timeout
+
+    def send(self, batch: Sequence) -> List[DeliveryResult]:
+        payload = json.dumps({
+            "provider": self.provider,
+            "messages": [{"to": n.recipient, "body": n.body} for n in batch],
+        }).encode("utf-8")
+        request = urllib.request.Request(
+            self.url, data=payload, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                results = json.loads(response.read())["results"]
+        except Exception as e:
+            return [f"gateway error: {e}"] * len(batch)
+        return [None if r.get("status") == "accepted" else r.get("error", "rejected") for r in results]
+
+
+class EmailTransport(Transport):
+    """Sends a batch over one Django mail connection instead of one connection per email."""
+    def __init__(self, from_email: Optional[str] = None):
+        self.from_email = from_email
+
+    def send(self, batch: Sequence) -> List[DeliveryResult]:
+        results: List[DeliveryResult] = []
+        with mail.get_connection() as connection:
+            for n in batch:
+                try:
+                    mail.EmailMessage(n.subject, n.body, self.from_email, [n.recipient], connection=connection).send()
+                    results.append(None)
+                except Exception as e:
+                    results.append(str(e))
+        return results
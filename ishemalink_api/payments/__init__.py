@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 class MomoMock:
     """
@@ -12,6 +12,13 @@ class MomoMock:
             "message": "Payment prompt sent to user."
         }
 
+    def initiate_payments(self, payments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Batch variant: one gateway round-trip for many prompts, results in input order
+        return [
+            self.initiate_payment(p["amount"], p["phone_number"], p["reference"])
+            for p in payments
+        ]
+
     def simulate_webhook(self, transaction_id: str, success: bool = True) -> Dict[str, Any]:
         return {
             "transaction_id": transaction_id,
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+import httpx
+from payments import MomoMock
+from payments.providers import AirtelMoneyProvider, MtnMomoProvider, PaymentProvider, provider_for
+
+# Seconds to connect and to wait for a provider's answer
+PAYMENT_CONNECT_TIMEOUT = 3.0
+PAYMENT_READ_TIMEOUT = 10.0
+
+# Extra attempts after a timeout, connection error, 429 or 5xx; backoff doubles from the first delay
+PAYMENT_RETRIES = 2
+PAYMENT_BACKOFF_SECONDS = 0.2
+
+# Pooled connections overall and kept alive between prompts, and prompts in flight per initiate_payments()
+PAYMENT_MAX_CONNECTIONS = 100
+PAYMENT_MAX_KEEPALIVE = 50
+PAYMENT_CONCURRENCY = 50
+
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class AsyncPaymentClient:
+    """
+    Sends payment prompts to MTN / Airtel over one pooled httpx.AsyncClient.
+    - Connections are kept alive and reused across prompts and providers
+    - Each prompt is routed to a provider by the payer's number prefix
+    - Timeouts, connection errors, 429 and 5xx are retried with exponential backoff;
+      providers de-duplicate retries by our reference
+    - initiate_payments() runs a batch concurrently, at most `concurrency` in flight
+    Failures are returned as {"status": "failed", ...} results, never raised.
+    """
+    def __init__(self, providers: Dict[str, PaymentProvider], retries: int = PAYMENT_RETRIES,
+                 backoff_seconds: float = PAYMENT_BACKOFF_SECONDS, concurrency: int = PAYMENT_CONCURRENCY,
+                 timeout: Optional[httpx.Timeout] = None, limits: Optional[httpx.Limits] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.providers = providers
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.concurrency = concurrency
+        self.http = httpx.AsyncClient(
+            timeout=timeout or httpx.Timeout(PAYMENT_READ_TIMEOUT, connect=PAYMENT_CONNECT_TIMEOUT),
+            limits=limits or httpx.Limits(max_connections=PAYMENT_MAX_CONNECTIONS,
+                                          max_keepalive_connections=PAYMENT_MAX_KEEPALIVE),
+            transport=transport,
+        )
+
+    def provider(self, phone_number: str) -> PaymentProvider:
+        name = provider_for(phone_number)
+        provider = self.providers.get(name)
+        if provider is None:
+            raise ValueError(f"No payment provider configured for {name}")
+        return provider
+
+    async def initiate_payment(self, amount: float, phone_number: str, reference: str) -> Dict[str, Any]:
+        try:
+            provider = self.provider(phone_number)
+        except ValueError as e:
+            return {"status": "failed", "reference": reference, "transaction_id": None, "message": str(e)}
+        request = provider.build_request(amount, phone_number, reference)
+        error = ""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+            try:
+                response = await self.http.request(
+                    request.method, provider.base_url + request.path, headers=request.headers, json=request.json
+                )
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+            if response.status_code in _RETRY_STATUSES:
+                error = f"HTTP {response.status_code}"
+                continue
+            try:
+                body = response.json() if response.content else None
+            except ValueError:
+                body = None
+            return provider.parse_response(reference, request, response.status_code, body)
+        return {
+            "status": "failed", "provider": provider.name, "reference": reference, "transaction_id": None,
+            "message": f"{provider.name} unavailable after {self.retries + 1} attempt(s): {error}",
+        }
+
+    async def initiate_payments(self, payments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Results in input order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(p: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.initiate_payment(p["amount"], p["phone_number"], p["reference"])
+
+        return list(await asyncio.gather(*(one(p) for p in payments)))
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def __aenter__(self) -> "AsyncPaymentClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+class PaymentGateway:
+    """
+    Blocking facade over AsyncPaymentClient with the MomoMock interface, for
+    synchronous callers (views, the outbox relay's threads).
+    The client lives on one background event loop, so its connection pool is
+    shared by every caller in the process and survives between calls.
+    """
+    def __init__(self, providers: Dict[str, PaymentProvider], **client_options: Any):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="payments-io", daemon=True)
+        self._thread.start()
+        self.client: AsyncPaymentClient = self._run(self._create(providers, client_options))
+
+    @staticmethod
+    async def _create(providers: Dict[str, PaymentProvider], options: Dict[str, Any]) -> AsyncPaymentClient:
+        # httpx binds its pool to the loop it is created on
+        return AsyncPaymentClient(providers, **options)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def initiate_payment(self, amount: float, phone_number: str, reference: str) -> Dict[str, Any]:
+        return self._run(self.client.initiate_payment(amount, phone_number, reference))
+
+    def initiate_payments(self, payments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._run(self.client.initiate_payments(payments))
+
+    def close(self) -> None:
+        if self._loop.is_running():
+            self._run(self.client.aclose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._loop.close()
+
+
+def build_providers(mtn_url: str = "", airtel_url: str = "", mtn_subscription_key: str = "",
+                    mtn_api_token: str = "", mtn_environment: str = "sandbox",
+                    airtel_api_token: str = "") -> Dict[str, PaymentProvider]:
+    providers: Dict[str, PaymentProvider] = {}
+    if mtn_url:
+        providers["mtn"] = MtnMomoProvider(mtn_url, mtn_subscription_key, mtn_api_token, mtn_environment)
+    if airtel_url:
+        providers["airtel"] = AirtelMoneyProvider(airtel_url, airtel_api_token)
+    return providers
+
+
+def get_gateway():
+    """
+    The gateway configured in settings: a pooled PaymentGateway when any provider
+    URL is set, otherwise the offline MomoMock.
+    """
+    from django.conf import settings
+    providers = build_providers(
+        settings.MTN_MOMO_URL, settings.AIRTEL_MONEY_URL, settings.MTN_MOMO_SUBSCRIPTION_KEY,
+        settings.MTN_MOMO_API_TOKEN, settings.MTN_MOMO_ENVIRONMENT, settings.AIRTEL_MONEY_API_TOKEN,
+    )
+    if not providers:
+        return MomoMock()
+    return PaymentGateway(
+        providers, retries=settings.PAYMENT_RETRIES, concurrency=settings.PAYMENT_CONCURRENCY,
+        timeout=httpx.Timeout(settings.PAYMENT_TIMEOUT, connect=PAYMENT_CONNECT_TIMEOUT),
+    )
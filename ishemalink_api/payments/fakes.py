@@ -0,0 +1,117 @@
+import json
+import random
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+
+class _MomoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            unavailable = server.fail_next > 0
+            if unavailable:
+                server.fail_next -= 1
+        if unavailable:
+            return self._reply(503, {"message": "simulated outage"})
+        if self.path.startswith("/collection/v1_0/requesttopay"):
+            reference, transaction_id = payload.get("externalId", ""), self.headers.get("X-Reference-Id", "")
+            self._accept(reference, transaction_id)
+            return self._reply(202, None)
+        if self.path.startswith("/merchant/v1/payments"):
+            reference = (payload.get("transaction") or {}).get("id", "")
+            self._accept(reference, reference)
+            return self._reply(200, {
+                "data": {"transaction": {"id": reference, "status": "Success."}},
+                "status": {"code": "200", "message": "Success.", "success": True},
+            })
+        self._reply(404, {"message": "unknown endpoint"})
+
+    def _accept(self, reference: str, transaction_id: str) -> None:
+        server = self.server
+        with server.lock:
+            server.accepted += 1
+        if server.callback_url:
+            success = random.random() < server.success_rate
+            threading.Thread(target=server.send_callback, args=(reference, transaction_id, success), daemon=True).start()
+
+    def _reply(self, status: int, body: Optional[dict]) -> None:
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockMomoServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the MTN MoMo and Airtel Money collection APIs, for tests
+    and offline load runs; point MTN_MOMO_URL and AIRTEL_MONEY_URL at `url`.
+    - Answers request-to-pay on both providers' paths after `latency` seconds
+    - The next `fail_next` requests get 503, to exercise client retries
+    - With `callback_url` set, each accepted prompt is settled by a webhook POST
+      {"transaction_id", "reference", "status"}, successful for `success_rate` of them
+    `connections` collects distinct client sockets, to observe keep-alive reuse.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), latency: float = 0.0,
+                 callback_url: str = "", success_rate: float = 1.0, callback_delay: float = 0.0):
+        super().__init__(address, _MomoHandler)
+        self.latency = latency
+        self.callback_url = callback_url
+        self.success_rate = success_rate
+        self.callback_delay = callback_delay
+        self.fail_next = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.accepted = 0
+        self.connections = set()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def send_callback(self, reference: str, transaction_id: str, success: bool) -> None:
+        if self.callback_delay:
+            time.sleep(self.callback_delay)
+        body = json.dumps({
+            "transaction_id": transaction_id, "reference": reference, "status": "success" if success else "failed",
+        }).encode("utf-8")
+        request = urllib.request.Request(
+            self.callback_url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError:
+            pass
+
+    def handle_error(self, request, client_address):
+        # A client that timed out hangs up mid-reply; that is the scenario under test, not a fault
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self) -> "MockMomoServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
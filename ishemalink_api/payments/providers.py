@@ -0,0 +1,120 @@
+import uuid
+from typing import Any, Dict, NamedTuple, Optional, Protocol
+# Mobile money runs on the same networks as SMS, so prompts follow the SMS prefix routing
+from notifications import sms_provider_for as provider_for
+
+CURRENCY = "RWF"
+COUNTRY = "RW"
+
+# Stable namespace so a retried prompt reuses its X-Reference-Id and MTN de-duplicates it
+_REFERENCE_NAMESPACE = uuid.UUID("7b4c2f9e-52a1-4f0e-9a57-6d1c3e0b8a21")
+
+
+def local_msisdn(phone_number: str) -> str:
+    """07XXXXXXXX -> 2507XXXXXXXX, the form both networks expect."""
+    number = phone_number.replace("+", "").replace(" ", "")
+    return "250" + number[1:] if number.startswith("0") else number
+
+
+class ProviderRequest(NamedTuple):
+    method: str
+    path: str
+    headers: Dict[str, str]
+    json: Dict[str, Any]
+
+
+class PaymentProvider(Protocol):
+    """
+    One mobile money network. Adapters only translate: the client owns the
+    connection pool, timeouts and retries.
+    """
+    name: str
+    base_url: str
+
+    def build_request(self, amount: float, phone_number: str, reference: str) -> ProviderRequest:
+        ...
+
+    def parse_response(self, reference: str, request: ProviderRequest, status_code: int,
+                       body: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        ...
+
+
+class MtnMomoProvider:
+    """
+    MTN MoMo Collections "request to pay".
+    POST {base}/collection/v1_0/requesttopay answers 202 with no body; the
+    transaction is identified by the X-Reference-Id we chose.
+    """
+    name = "mtn"
+
+    def __init__(self, base_url: str, subscription_key: str = "", api_token: str = "",
+                 target_environment: str = "sandbox"):
+        self.base_url = base_url.rstrip("/")
+        self.subscription_key = subscription_key
+        self.api_token = api_token
+        self.target_environment = target_environment
+
+    def build_request(self, amount: float, phone_number: str, reference: str) -> ProviderRequest:
+        headers = {
+            "X-Reference-Id": str(uuid.uuid5(_REFERENCE_NAMESPACE, f"mtn:{reference}")),
+            "X-Target-Environment": self.target_environment,
+            "Ocp-Apim-Subscription-Key": self.subscription_key,
+        }
+        if self.api_token:
+            headers["Authorization"] = f"Bearer {self.api_token}"
+        return ProviderRequest("POST", "/collection/v1_0/requesttopay", headers, {
+            "amount": f"{amount:.0f}",
+            "currency": CURRENCY,
+            "externalId": reference,
+            "payer": {"partyIdType": "MSISDN", "partyId": local_msisdn(phone_number)},
+            "payerMessage": f"IshemaLink shipment {reference}",
+            "payeeNote": reference,
+        })
+
+    def parse_response(self, reference: str, request: ProviderRequest, status_code: int,
+                       body: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        accepted = status_code == 202
+        return {
+            "status": "pending" if accepted else "failed",
+            "provider": self.name,
+            "reference": reference,
+            "transaction_id": request.headers["X-Reference-Id"],
+            "message": "Payment prompt sent to user." if accepted else (body or {}).get("message", f"HTTP {status_code}"),
+        }
+
+
+class AirtelMoneyProvider:
+    """
+    Airtel Money merchant collections.
+    POST {base}/merchant/v1/payments/ answers {"data": {"transaction": {"id", "status"}},
+    "status": {"success", "message"}}.
+    """
+    name = "airtel"
+
+    def __init__(self, base_url: str, api_token: str = ""):
+        self.base_url = base_url.rstrip("/")
+        self.api_token = api_token
+
+    def build_request(self, amount: float, phone_number: str, reference: str) -> ProviderRequest:
+        headers = {"X-Country": COUNTRY, "X-Currency": CURRENCY}
+        if self.api_token:
+            headers["Authorization"] = f"Bearer {self.api_token}"
+        return ProviderRequest("POST", "/merchant/v1/payments/", headers, {
+            "reference": f"IshemaLink shipment {reference}",
+            "subscriber": {"country": COUNTRY, "currency": CURRENCY, "msisdn": local_msisdn(phone_number)[3:]},
+            "transaction": {"amount": round(amount), "country": COUNTRY, "currency": CURRENCY, "id": reference},
+        })
+
+    def parse_response(self, reference: str, request: ProviderRequest, status_code: int,
+                       body: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        body = body or {}
+        status = body.get("status") or {}
+        transaction = (body.get("data") or {}).get("transaction") or {}
+        accepted = status_code == 200 and bool(status.get("success"))
+        return {
+            "status": "pending" if accepted else "failed",
+            "provider": self.name,
+            "reference": reference,
+            "transaction_id": transaction.get("id", reference),
+            "message": status.get("message") or ("Payment prompt sent to user." if accepted else f"HTTP {status_code}"),
+        }
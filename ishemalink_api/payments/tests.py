@@ -0,0 +1,69 @@
+import asyncio
+import time
+import httpx
+from django.test import SimpleTestCase
+from payments.client import AsyncPaymentClient, PaymentGateway, build_providers
+from payments.fakes import MockMomoServer
+
+
+class PaymentClientTest(SimpleTestCase):
+    def setUp(self):
+        self.server = MockMomoServer().start()
+        self.addCleanup(self.server.stop)
+        self.providers = build_providers(self.server.url, self.server.url, "sub-key")
+
+    def _gateway(self, **options):
+        gateway = PaymentGateway(self.providers, backoff_seconds=0, **options)
+        self.addCleanup(gateway.close)
+        return gateway
+
+    def test_prompts_are_routed_by_network(self):
+        gateway = self._gateway()
+        mtn, airtel = gateway.initiate_payments([
+            {"amount": 2000, "phone_number": "0781234567", "reference": "1"},
+            {"amount": 3000, "phone_number": "0731234567", "reference": "2"},
+        ])
+        self.assertEqual((mtn["provider"], mtn["status"], mtn["reference"]), ("mtn", "pending", "1"))
+        self.assertEqual((airtel["provider"], airtel["status"], airtel["transaction_id"]), ("airtel", "pending", "2"))
+        # Retries of one prompt reuse its X-Reference-Id, so MTN can de-duplicate them
+        self.assertEqual(gateway.initiate_payment(2000, "0781234567", "1")["transaction_id"], mtn["transaction_id"])
+
+    def test_batches_run_concurrently_over_pooled_connections(self):
+        self.server.latency = 0.1
+        gateway = self._gateway(concurrency=20)
+        started = time.monotonic()
+        results = gateway.initiate_payments([
+            {"amount": 1000, "phone_number": "078", "reference": str(i)} for i in range(40)
+        ])
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual({r["status"] for r in results}, {"pending"})
+        self.assertEqual([r["reference"] for r in results], [str(i) for i in range(40)])
+        gateway.initiate_payments([{"amount": 1000, "phone_number": "078", "reference": "x"}] * 10)
+        # 50 requests, at most 20 connections: the second batch reused kept-alive sockets
+        self.assertEqual(self.server.requests, 50)
+        self.assertLessEqual(len(self.server.connections), 20)
+
+    def test_transient_errors_are_retried(self):
+        gateway = self._gateway(retries=2)
+        self.server.fail_next = 2
+        self.assertEqual(gateway.initiate_payment(1000, "078", "1")["status"], "pending")
+        self.server.fail_next = 3
+        result = gateway.initiate_payment(1000, "078", "2")
+        self.assertEqual(result["status"], "failed")
+        self.assertIn("HTTP 503", result["message"])
+        self.assertEqual(self.server.requests, 6)
+
+    def test_timeouts_fail_the_prompt_without_raising(self):
+        self.server.latency = 0.5
+        gateway = self._gateway(retries=0, timeout=httpx.Timeout(0.1))
+        result = gateway.initiate_payment(1000, "078", "1")
+        self.assertEqual(result["status"], "failed")
+        self.assertIn("Timeout", result["message"])
+
+    def test_unconfigured_network_is_reported(self):
+        async def run():
+            async with AsyncPaymentClient(build_providers(mtn_url=self.server.url)) as client:
+                return await client.initiate_payment(1000, "0731234567", "1")
+        result = asyncio.run(run())
+        self.assertEqual(result["status"], "failed")
+        self.assertIn("airtel", result["message"])
@@ -0,0 +1 @@
+# Real-time tracking service (WebSocket/SSE/Polling)
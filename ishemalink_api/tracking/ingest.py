@@ -0,0 +1,63 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.utils.dateparse import parse_datetime
+from Core.models import Shipment
+from tracking.store import Position, PositionStore, positions
+from tracking.trajectory import TrajectoryBuffer, trajectories
+
+# Largest ping batch accepted from one device request
+MAX_PINGS_PER_BATCH = 1000
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        when = parse_datetime(value)
+        if when is not None and when.tzinfo is not None:
+            return when.timestamp()
+    raise ValueError("ts must be epoch seconds or an ISO 8601 datetime with timezone")
+
+
+def parse_ping(raw: Dict[str, Any]) -> Tuple[int, Position]:
+    if not isinstance(raw, dict):
+        raise ValueError("ping must be a JSON object")
+    try:
+        shipment_id = int(raw["shipment_id"])
+        lat, lng = float(raw["lat"]), float(raw["lng"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("shipment_id, lat and lng are required")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("coordinates out of range")
+    speed = raw.get("speed")
+    return shipment_id, Position(lat, lng, _timestamp(raw.get("ts", time.time())),
+                                 float(speed) if speed is not None else None)
+
+
+def ingest(raw_pings: Iterable[Dict[str, Any]], store: PositionStore = positions,
+           history: Optional[TrajectoryBuffer] = trajectories) -> Dict[str, Any]:
+    """
+    Validates a device batch and appends it to the position store.
+    Shipment ids are checked with one query per batch, not one per ping.
+    Every valid ping, including ones too old for the live store, goes to the trajectory history.
+    """
+    parsed: List[Tuple[int, Position]] = []
+    rejected: List[Dict[str, Any]] = []
+    for index, raw in enumerate(raw_pings):
+        try:
+            parsed.append(parse_ping(raw))
+        except ValueError as e:
+            rejected.append({"index": index, "error": str(e)})
+    known = set(Shipment.objects.filter(id__in={sid for sid, _ in parsed}).values_list("id", flat=True))
+    valid = []
+    for sid, position in parsed:
+        if sid in known:
+            valid.append((sid, position))
+        else:
+            rejected.append({"shipment_id": sid, "error": "unknown shipment"})
+    # Oldest first, so a batch replayed from a device buffer keeps its order
+    valid.sort(key=lambda ping: ping[1].ts)
+    accepted = store.append_many(valid)
+    if history is not None:
+        history.extend(valid)
+    return {"accepted": accepted, "stale": len(valid) - accepted, "rejected": rejected}
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from tracking.trajectory import DOWNSAMPLE_AFTER_DAYS, DOWNSAMPLE_TOLERANCE_M, compact
+
+
+class Command(BaseCommand):
+    help = "Merge finished shipment-days into one trajectory chunk and downsample old days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--after-days", type=int, default=DOWNSAMPLE_AFTER_DAYS,
+                            help="Downsample days older than this.")
+        parser.add_argument("--tolerance", type=float, default=DOWNSAMPLE_TOLERANCE_M,
+                            help="Douglas-Peucker tolerance in metres.")
+
+    def handle(self, *args, **options):
+        stats = compact(options["after_days"], options["tolerance"])
+        self.stdout.write(
+            f"Compacted {stats['days']} shipment-day(s): "
+            f"{stats['points_before']} -> {stats['points_after']} point(s)."
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('Core', '0007_tariff_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrajectoryChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('start_ts', models.FloatField()),
+                ('end_ts', models.FloatField()),
+                ('points', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('downsampled', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('shipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trajectory_chunks', to='Core.shipment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shipment', 'day', 'start_ts'], name='trajectory_shipment_day_idx'), models.Index(condition=models.Q(('downsampled', False)), fields=['day'], name='trajectory_raw_day_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import models
+from Core.models import Shipment
+
+class TrajectoryChunk(models.Model):
+    """
+    A run of GPS points for one shipment on one day, stored as one compressed blob.
+    Points are delta-encoded integer arrays (see tracking.trajectory.encode_points),
+    so a day of pings costs a few bytes per point instead of one table row each.
+    """
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name="trajectory_chunks")
+    day = models.DateField()
+    start_ts = models.FloatField()
+    end_ts = models.FloatField()
+    points = models.PositiveIntegerField()
+    data = models.BinaryField()
+    downsampled = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["shipment", "day", "start_ts"], name="trajectory_shipment_day_idx"),
+            models.Index(fields=["day"], condition=models.Q(downsampled=False), name="trajectory_raw_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"Shipment {self.shipment_id} {self.day} ({self.points} points)"
@@ -0,0 +1,218 @@
+import json
+import threading
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+
+class Position(NamedTuple):
+    lat: float
+    lng: float
+    ts: float  # Unix epoch seconds reported by the device
+    speed: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        return {"lat": self.lat, "lng": self.lng, "ts": self.ts, "speed": self.speed}
+
+
+# Called with (shipment_id, version, position) from the ingesting thread, or the Redis pub/sub thread
+Listener = Callable[[int, int, Position], None]
+
+
+class PositionStore:
+    """
+    In-process ring buffer of the most recent GPS positions per shipment.
+    - Every accepted ping bumps the shipment's version, which doubles as the polling ETag
+    - Listeners (SSE streams, WebSocket sockets) are notified synchronously and must not block
+    - Pings older than the latest known position are dropped
+    The store lives in one process. With several server workers set REDIS_URL, so RedisPositionStore is used.
+    """
+    def __init__(self, history: int = 32):
+        self.history = history
+        self._tracks: Dict[int, Deque[Position]] = {}
+        self._versions: Dict[int, int] = {}
+        self._listeners: Dict[int, Set[Listener]] = {}
+        self._lock = threading.Lock()
+        # Versions restart with the process; the epoch keeps old ETags from matching new data
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def etag(self, shipment_id: int, version: int) -> str:
+        return f'"{self.epoch}-{shipment_id}-{version}"'
+
+    def append_many(self, pings: Iterable[Tuple[int, Position]]) -> int:
+        accepted: List[Tuple[int, int, Position]] = []
+        with self._lock:
+            for shipment_id, position in pings:
+                track = self._tracks.get(shipment_id)
+                if track is None:
+                    track = self._tracks[shipment_id] = deque(maxlen=self.history)
+                elif track and position.ts < track[-1].ts:
+                    continue
+                track.append(position)
+                version = self._versions.get(shipment_id, 0) + 1
+                self._versions[shipment_id] = version
+                accepted.append((shipment_id, version, position))
+            listeners = {sid: list(self._listeners.get(sid, ())) for sid, _, _ in accepted}
+        for shipment_id, version, position in accepted:
+            for listener in listeners[shipment_id]:
+                listener(shipment_id, version, position)
+        return len(accepted)
+
+    def latest(self, shipment_id: int) -> Optional[Tuple[int, Position]]:
+        with self._lock:
+            track = self._tracks.get(shipment_id)
+            if not track:
+                return None
+            return self._versions[shipment_id], track[-1]
+
+    def recent(self, shipment_id: int) -> List[Position]:
+        with self._lock:
+            return list(self._tracks.get(shipment_id, ()))
+
+    def subscribe(self, shipment_id: int, listener: Listener) -> Callable[[], None]:
+        with self._lock:
+            self._listeners.setdefault(shipment_id, set()).add(listener)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                listeners = self._listeners.get(shipment_id)
+                if listeners is not None:
+                    listeners.discard(listener)
+                    if not listeners:
+                        del self._listeners[shipment_id]
+        return unsubscribe
+
+    def forget(self, shipment_id: int) -> None:
+        with self._lock:
+            self._tracks.pop(shipment_id, None)
+            self._versions.pop(shipment_id, None)
+
+
+# Positions of a shipment that stops reporting are dropped from Redis after a week
+TRACK_TTL_SECONDS = 7 * 24 * 3600
+
+# Appends one ping unless it is older than the shipment's latest; returns the new version, or 0 when stale
+_APPEND_SCRIPT = """
+local last = redis.call('LINDEX', KEYS[1], -1)
+if last and tonumber(cjson.decode(last)[3]) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[3]), -1)
+local version = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('PUBLISH', ARGV[4], version .. ' ' .. ARGV[1])
+return version
+"""
+
+
+def _decode(raw) -> Position:
+    return Position(*json.loads(raw))
+
+
+class RedisPositionStore:
+    """
+    Position store shared by every server process through Redis (REDIS_URL; requires the redis package).
+    - A capped list and a version counter per shipment, appended by one Lua script that also drops stale pings
+    - Each accepted ping is published on the shipment's channel; one pub/sub thread per process
+      notifies that process's listeners, so a ping ingested by any worker reaches every stream
+    Versions live in Redis, so ETags match across workers and restarts.
+    """
+    def __init__(self, url: str, history: int = 32, prefix: str = "tracking:", client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.redis = client
+        self.history = history
+        self.prefix = prefix
+        self._append = client.register_script(_APPEND_SCRIPT)
+        self._listeners: Dict[int, Set[Listener]] = {}
+        self._lock = threading.Lock()
+        self._pubsub = None
+        self._thread = None
+        self._epoch: Optional[str] = None
+
+    @property
+    def epoch(self) -> str:
+        # Set once per Redis: only losing the stored versions invalidates old ETags
+        if self._epoch is None:
+            self.redis.set(self.prefix + "epoch", uuid.uuid4().hex[:8], nx=True)
+            self._epoch = self.redis.get(self.prefix + "epoch").decode()
+        return self._epoch
+
+    def etag(self, shipment_id: int, version: int) -> str:
+        return f'"{self.epoch}-{shipment_id}-{version}"'
+
+    def _keys(self, shipment_id: int) -> List[str]:
+        return [f"{self.prefix}{shipment_id}:track", f"{self.prefix}{shipment_id}:version"]
+
+    def _channel(self, shipment_id: int) -> str:
+        return f"{self.prefix}{shipment_id}"
+
+    def append_many(self, pings: Iterable[Tuple[int, Position]]) -> int:
+        pipe = self.redis.pipeline(transaction=False)
+        for shipment_id, position in pings:
+            self._append(keys=self._keys(shipment_id), client=pipe, args=[
+                json.dumps(list(position)), position.ts, self.history, self._channel(shipment_id), TRACK_TTL_SECONDS,
+            ])
+        return sum(1 for version in pipe.execute() if version)
+
+    def latest(self, shipment_id: int) -> Optional[Tuple[int, Position]]:
+        track_key, version_key = self._keys(shipment_id)
+        # One MULTI, so the version belongs to the position read with it
+        pipe = self.redis.pipeline()
+        pipe.get(version_key)
+        pipe.lindex(track_key, -1)
+        version, raw = pipe.execute()
+        if raw is None:
+            return None
+        return int(version), _decode(raw)
+
+    def recent(self, shipment_id: int) -> List[Position]:
+        return [_decode(raw) for raw in self.redis.lrange(self._keys(shipment_id)[0], 0, -1)]
+
+    def subscribe(self, shipment_id: int, listener: Listener) -> Callable[[], None]:
+        with self._lock:
+            listeners = self._listeners.setdefault(shipment_id, set())
+            listeners.add(listener)
+            if len(listeners) == 1:
+                if self._pubsub is None:
+                    self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                self._pubsub.subscribe(**{self._channel(shipment_id): self._dispatch})
+                if self._thread is None:
+                    self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                listeners = self._listeners.get(shipment_id)
+                if listeners is not None:
+                    listeners.discard(listener)
+                    if not listeners:
+                        del self._listeners[shipment_id]
+                        self._pubsub.unsubscribe(self._channel(shipment_id))
+        return unsubscribe
+
+    def _dispatch(self, message) -> None:
+        # Runs on the pub/sub thread; listeners hand over to their own loops and never block
+        shipment_id = int(message["channel"].decode()[len(self.prefix):])
+        version, raw = message["data"].decode().split(" ", 1)
+        with self._lock:
+            listeners = list(self._listeners.get(shipment_id, ()))
+        position = _decode(raw)
+        for listener in listeners:
+            listener(shipment_id, int(version), position)
+
+    def forget(self, shipment_id: int) -> None:
+        self.redis.delete(*self._keys(shipment_id))
+
+
+def get_position_store():
+    from django.conf import settings
+    if settings.REDIS_URL:
+        return RedisPositionStore(settings.REDIS_URL)
+    return PositionStore()
+
+
+# Process-wide store shared by the ingestion views, polling views and the WebSocket channel
+positions = get_position_store()
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, Client
+from django.utils import timezone
+from Core.models import Shipment
+from Core.profiling import QueryBudgetMixin
+from tracking import trajectory
+from tracking.models import TrajectoryChunk
+from tracking.store import Position, PositionStore, positions
+from tracking.websocket import tracking_websocket
+
+
+class TrackingApiTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.shipment = Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="078")
+        self.addCleanup(positions.forget, self.shipment.id)
+        self.addCleanup(trajectory.trajectories.flush)
+
+    def _ping(self, pings):
+        return self.client.post("/tracking/pings/", data={"pings": pings}, content_type="application/json")
+
+    def test_batch_ingestion_and_etag_polling(self):
+        response = self._ping([
+            {"shipment_id": self.shipment.id, "lat": -1.95, "lng": 30.06, "ts": 1000},
+            {"shipment_id": self.shipment.id, "lat": -1.94, "lng": 30.07, "ts": 1010},
+            {"shipment_id": 999999, "lat": -1.9, "lng": 30.0, "ts": 1010},
+            {"shipment_id": self.shipment.id, "lat": 200, "lng": 30.0},
+        ])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["accepted"], 2)
+        self.assertEqual(len(response.json()["rejected"]), 2)
+
+        url = f"/tracking/{self.shipment.id}/live/"
+        with self.assertNumQueries(0):
+            live = self.client.get(url)
+        self.assertEqual((live.json()["lat"], live.json()["version"]), (-1.94, 2))
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=live["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+        self._ping([{"shipment_id": self.shipment.id, "lat": -1.93, "lng": 30.08, "ts": 1020}])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=live["ETag"]).status_code, 200)
+
+    def test_stale_pings_do_not_move_the_truck(self):
+        self._ping([{"shipment_id": self.shipment.id, "lat": -1.93, "lng": 30.08, "ts": 2000}])
+        response = self._ping([{"shipment_id": self.shipment.id, "lat": -1.99, "lng": 30.01, "ts": 1000}])
+        self.assertEqual(response.json()["stale"], 1)
+        self.assertEqual(self.client.get(f"/tracking/{self.shipment.id}/live/").json()["lat"], -1.93)
+
+    def test_unknown_position_is_404(self):
+        self.assertEqual(self.client.get(f"/tracking/{self.shipment.id}/live/").status_code, 404)
+
+
+class TrajectoryEncodingTest(SimpleTestCase):
+    def test_delta_encoding_round_trips_within_fixed_point_precision(self):
+        rng = np.random.default_rng(1)
+        points = np.column_stack((
+            -1.95 + np.cumsum(rng.normal(0, 1e-4, 1000)),
+            30.06 + np.cumsum(rng.normal(0, 1e-4, 1000)),
+            1_700_000_000 + np.arange(1000) * 5.0,
+        ))
+        data, start_ts = trajectory.encode_points(points)
+        decoded = trajectory.decode_points(data, start_ts, len(points))
+        self.assertLess(np.abs(decoded[:, :2] - points[:, :2]).max(), 1e-6)
+        self.assertLess(np.abs(decoded[:, 2] - points[:, 2]).max(), 0.05)
+        self.assertLess(len(data), points.nbytes / 2)
+
+    def test_douglas_peucker_keeps_only_turns(self):
+        straight = [(-1.95, 30.0 + i * 0.001, float(i)) for i in range(50)]
+        corner = [(-1.95 + i * 0.001, 30.049, 50.0 + i) for i in range(1, 50)]
+        simplified = trajectory.douglas_peucker(np.array(straight + corner), tolerance_m=5)
+        self.assertEqual(len(simplified), 3)
+        self.assertEqual(simplified[1, 2], 49.0)
+
+    def test_time_bucket_keeps_last_point_per_bucket(self):
+        points = np.array([(0, 0, ts) for ts in (0, 10, 59, 60, 61, 130)], dtype=float)
+        self.assertEqual(trajectory.time_bucket(points, 60)[:, 2].tolist(), [59, 61, 130])
+
+    def test_polyline_matches_reference_encoding(self):
+        points = np.array([(38.5, -120.2, 0), (40.7, -120.95, 1), (43.252, -126.453, 2)])
+        self.assertEqual(trajectory.encode_polyline(points), "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+
+
+class TrajectoryStoreTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.shipment = Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="078")
+        self.addCleanup(positions.forget, self.shipment.id)
+        self.start = timezone.now().timestamp() - 3600
+
+    def _pings(self, count, start, step=0.0005):
+        return [(self.shipment.id, Position(-1.95, 30.0 + i * step, start + i * 10)) for i in range(count)]
+
+    def test_buffer_flushes_one_chunk_per_shipment_day(self):
+        buffer = trajectory.TrajectoryBuffer(max_points=100, max_age=3600)
+        buffer.extend(self._pings(60, self.start))
+        self.assertEqual(TrajectoryChunk.objects.count(), 0)
+        with self.assertNumQueries(1):
+            buffer.extend(self._pings(60, self.start + 600))
+        chunk = TrajectoryChunk.objects.get()
+        self.assertEqual(chunk.points, 120)
+
+    def test_trajectory_endpoint_filters_range_and_simplifies(self):
+        trajectory.write_chunks(self._pings(200, self.start))
+        url = f"/tracking/{self.shipment.id}/trajectory/"
+        full = self.client.get(url, {"format": "json"}).json()
+        self.assertEqual(full["points"], 200)
+
+        window = {"from": datetime.fromtimestamp(self.start + 100, tz=dt_timezone.utc).isoformat(),
+                  "to": datetime.fromtimestamp(self.start + 190, tz=dt_timezone.utc).isoformat(),
+                  "format": "json"}
+        self.assertEqual(self.client.get(url, window).json()["points"], 10)
+
+        # A straight east-bound drive reduces to its two end points
+        simplified = self.client.get(url, {"tolerance": 10}).json()
+        self.assertEqual(simplified["points"], 2)
+        self.assertIn("polyline", simplified)
+        self.assertEqual(self.client.get(url, {"tolerance": -1}).status_code, 400)
+
+    def test_ingested_pings_reach_the_trajectory(self):
+        self.client.post("/tracking/pings/", data={"pings": [
+            {"shipment_id": self.shipment.id, "lat": -1.95, "lng": 30.06, "ts": self.start},
+            {"shipment_id": self.shipment.id, "lat": -1.94, "lng": 30.07, "ts": self.start + 10},
+        ]}, content_type="application/json")
+        # Serving processes flush from their writer thread; reads never write
+        trajectory.trajectories.flush()
+        response = self.client.get(f"/tracking/{self.shipment.id}/trajectory/", {"format": "json"})
+        self.assertEqual(response.json()["path"][1][:2], [-1.94, 30.07])
+
+    def test_compaction_merges_chunks_and_downsamples_old_days(self):
+        old = (timezone.now() - timedelta(days=10)).replace(hour=8).timestamp()
+        recent = (timezone.now() - timedelta(days=2)).replace(hour=8).timestamp()
+        for start in (old, old + 2000, recent, recent + 2000):
+            trajectory.write_chunks(self._pings(100, start, step=0.0001))
+        self.assertEqual(TrajectoryChunk.objects.count(), 4)
+
+        stats = trajectory.compact(downsample_after_days=7, tolerance_m=10)
+        self.assertEqual(stats["days"], 2)
+        old_chunk, recent_chunk = TrajectoryChunk.objects.order_by("day")
+        self.assertTrue(old_chunk.downsampled)
+        self.assertLess(old_chunk.points, 200)
+        self.assertEqual((recent_chunk.downsampled, recent_chunk.points), (False, 200))
+        # Merged and downsampled days are not revisited
+        self.assertEqual(trajectory.compact(downsample_after_days=7, tolerance_m=10)["days"], 0)
+
+
+class TrajectoryWriterTest(TransactionTestCase):
+    def test_writer_thread_flushes_without_more_traffic(self):
+        shipment = Shipment.objects.create(shipment_type="domestic", weight=1, phone_number="078")
+        buffer = trajectory.TrajectoryBuffer(max_points=100, max_age=0.05)
+        buffer.extend([(shipment.id, Position(-1.95, 30.0, 1000.0 + i)) for i in range(3)])
+        buffer.start()
+        deadline = time.monotonic() + 5
+        while not TrajectoryChunk.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        buffer.stop()
+        self.assertEqual(TrajectoryChunk.objects.get().points, 3)
+
+
+class TrackingWebSocketTest(SimpleTestCase):
+    def test_subscriber_receives_latest_and_new_positions(self):
+        store = PositionStore()
+        store.append_many([(7, Position(-1.95, 30.06, 1.0))])
+
+        async def scenario():
+            incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+            await incoming.put({"type": "websocket.connect"})
+            task = asyncio.ensure_future(tracking_websocket(
+                {"type": "websocket", "path": "/ws/tracking/7/"}, incoming.get, outgoing.put, store=store
+            ))
+            self.assertEqual((await outgoing.get())["type"], "websocket.accept")
+            first = json.loads((await outgoing.get())["text"])
+            # Ingestion happens on another thread in production
+            await asyncio.get_running_loop().run_in_executor(
+                None, store.append_many, [(7, Position(-1.90, 30.10, 2.0))]
+            )
+            second = json.loads((await outgoing.get())["text"])
+            await incoming.put({"type": "websocket.disconnect"})
+            await asyncio.wait_for(task, 1)
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual((first["version"], first["lat"]), (1, -1.95))
+        self.assertEqual((second["version"], second["lat"]), (2, -1.90))
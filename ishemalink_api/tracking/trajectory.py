@@ -0,0 +1,278 @@
+import atexit
+import logging
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+from tracking.store import Position
+
+logger = logging.getLogger(__name__)
+
+# Fixed-point scales: 1e-6 degree (~0.1 m) and 0.1 s resolution
+COORD_SCALE = 1_000_000
+TS_SCALE = 10
+
+# Buffered pings are written once either limit is reached
+FLUSH_MAX_POINTS = 5000
+FLUSH_MAX_AGE_SECONDS = 30.0
+
+# Days older than this are simplified with Douglas-Peucker at this tolerance
+DOWNSAMPLE_AFTER_DAYS = 7
+DOWNSAMPLE_TOLERANCE_M = 15.0
+
+# Metres per degree of latitude (and of longitude at the equator)
+METRES_PER_DEGREE = 111_320.0
+
+
+def encode_points(points: np.ndarray) -> Tuple[bytes, float]:
+    """
+    Packs an (n, 3) array of [lat, lng, ts] sorted by ts into a compressed blob.
+    Each column is stored as int32 deltas of fixed-point values, which zlib shrinks
+    to a few bytes per point for a moving truck. Returns (blob, start_ts).
+    """
+    start_ts = float(points[0, 2])
+    fixed = np.empty((3, len(points)), dtype=np.int64)
+    fixed[0] = np.rint(points[:, 0] * COORD_SCALE)
+    fixed[1] = np.rint(points[:, 1] * COORD_SCALE)
+    fixed[2] = np.rint((points[:, 2] - start_ts) * TS_SCALE)
+    deltas = np.diff(fixed, axis=1, prepend=0)
+    return zlib.compress(deltas.astype("<i4").tobytes(), 6), start_ts
+
+
+def decode_points(data: bytes, start_ts: float, count: int) -> np.ndarray:
+    fixed = np.frombuffer(zlib.decompress(bytes(data)), dtype="<i4").reshape(3, count).astype(np.int64).cumsum(axis=1)
+    points = np.empty((count, 3))
+    points[:, 0] = fixed[0] / COORD_SCALE
+    points[:, 1] = fixed[1] / COORD_SCALE
+    points[:, 2] = start_ts + fixed[2] / TS_SCALE
+    return points
+
+
+def douglas_peucker(points: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Returns the subset of points needed to keep the path within tolerance_m of the original."""
+    n = len(points)
+    if n < 3:
+        return points
+    # Local equirectangular projection to metres is accurate enough at city/country scale
+    cos_lat = np.cos(np.radians(points[:, 0].mean()))
+    xy = np.column_stack((points[:, 1] * METRES_PER_DEGREE * cos_lat, points[:, 0] * METRES_PER_DEGREE))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        segment = end - start
+        length = np.hypot(*segment)
+        d = xy[first + 1:last] - start
+        if length == 0:
+            distances = np.hypot(*d.T)
+        else:
+            # 2-D cross product written out: np.cross on 2-vectors is deprecated since NumPy 2.0
+            distances = np.abs(segment[0] * d[:, 1] - segment[1] * d[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return points[keep]
+
+
+def time_bucket(points: np.ndarray, seconds: float) -> np.ndarray:
+    """Keeps the last point of every `seconds`-long bucket."""
+    if len(points) < 2:
+        return points
+    buckets = np.floor(points[:, 2] / seconds)
+    last_in_bucket = np.append(buckets[1:] != buckets[:-1], True)
+    return points[last_in_bucket]
+
+
+def encode_polyline(points: np.ndarray) -> str:
+    """Google encoded polyline (precision 5) of the lat/lng columns."""
+    fixed = np.rint(points[:, :2] * 1e5).astype(np.int64)
+    deltas = np.diff(fixed, axis=0, prepend=[[0, 0]]).ravel()
+    out = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+def _local_day(ts: float) -> date:
+    return timezone.localtime(datetime.fromtimestamp(ts, tz=dt_timezone.utc)).date()
+
+
+def write_chunks(pings: Iterable[Tuple[int, Position]]) -> int:
+    """Groups pings by shipment and local day and stores one chunk per group in a single INSERT."""
+    from tracking.models import TrajectoryChunk
+    groups: Dict[Tuple[int, date], List[Tuple[float, float, float]]] = defaultdict(list)
+    for shipment_id, p in pings:
+        groups[(shipment_id, _local_day(p.ts))].append((p.lat, p.lng, p.ts))
+    chunks = []
+    for (shipment_id, day), rows in groups.items():
+        points = np.array(rows)
+        points = points[np.argsort(points[:, 2], kind="stable")]
+        data, start_ts = encode_points(points)
+        chunks.append(TrajectoryChunk(
+            shipment_id=shipment_id, day=day, start_ts=start_ts, end_ts=float(points[-1, 2]),
+            points=len(points), data=data,
+        ))
+    TrajectoryChunk.objects.bulk_create(chunks)
+    return sum(chunk.points for chunk in chunks)
+
+
+class TrajectoryBuffer:
+    """
+    Collects accepted pings in memory and writes them as chunks, so ingestion
+    costs one INSERT per flush rather than one row per ping.
+    - Flushes when FLUSH_MAX_POINTS are buffered or the oldest is FLUSH_MAX_AGE_SECONDS old
+    - With start() a daemon thread also flushes every FLUSH_MAX_AGE_SECONDS, so pings are
+      written when traffic stops, and once more at exit
+    - A failed INSERT puts the pings back for the next flush
+    """
+    def __init__(self, max_points: int = FLUSH_MAX_POINTS, max_age: float = FLUSH_MAX_AGE_SECONDS):
+        self.max_points = max_points
+        self.max_age = max_age
+        self._pending: List[Tuple[int, Position]] = []
+        self._oldest = 0.0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def extend(self, pings: Iterable[Tuple[int, Position]]) -> None:
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.extend(pings)
+            due = len(self._pending) >= self.max_points or time.monotonic() - self._oldest >= self.max_age
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            return write_chunks(pending)
+        except Exception:
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.max_age):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Trajectory flush failed; %d ping(s) kept for retry", len(self._pending))
+            finally:
+                close_old_connections()
+
+    def start(self) -> "TrajectoryBuffer":
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="trajectory-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is not None:
+            self._stopping.set()
+            thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Final trajectory flush failed; %d ping(s) lost", len(self._pending))
+
+
+def load_track(shipment_id: int, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> np.ndarray:
+    """All stored points of a shipment within [start_ts, end_ts], as an (n, 3) array sorted by ts."""
+    from tracking.models import TrajectoryChunk
+    chunks = TrajectoryChunk.objects.filter(shipment_id=shipment_id)
+    if start_ts is not None:
+        chunks = chunks.filter(day__gte=_local_day(start_ts) - timedelta(days=1), end_ts__gte=start_ts)
+    if end_ts is not None:
+        chunks = chunks.filter(day__lte=_local_day(end_ts) + timedelta(days=1), start_ts__lte=end_ts)
+    arrays = [
+        decode_points(data, chunk_start, count)
+        for data, chunk_start, count in chunks.order_by("day", "start_ts").values_list("data", "start_ts", "points")
+    ]
+    if not arrays:
+        return np.empty((0, 3))
+    points = np.concatenate(arrays)
+    points = points[np.argsort(points[:, 2], kind="stable")]
+    mask = np.ones(len(points), dtype=bool)
+    if start_ts is not None:
+        mask &= points[:, 2] >= start_ts
+    if end_ts is not None:
+        mask &= points[:, 2] <= end_ts
+    return points[mask]
+
+
+def compact_day(shipment_id: int, day: date, tolerance_m: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Merges a shipment-day into a single chunk, optionally simplified with Douglas-Peucker.
+    Returns (points before, points after).
+    """
+    from tracking.models import TrajectoryChunk
+    with transaction.atomic():
+        chunks = list(TrajectoryChunk.objects.select_for_update().filter(shipment_id=shipment_id, day=day))
+        if not chunks:
+            return 0, 0
+        points = np.concatenate([decode_points(c.data, c.start_ts, c.points) for c in chunks])
+        points = points[np.argsort(points[:, 2], kind="stable")]
+        before = len(points)
+        if tolerance_m is not None:
+            points = douglas_peucker(points, tolerance_m)
+        data, start_ts = encode_points(points)
+        TrajectoryChunk.objects.filter(id__in=[c.id for c in chunks]).delete()
+        TrajectoryChunk.objects.create(
+            shipment_id=shipment_id, day=day, start_ts=start_ts, end_ts=float(points[-1, 2]),
+            points=len(points), data=data,
+            downsampled=tolerance_m is not None or any(c.downsampled for c in chunks),
+        )
+    return before, len(points)
+
+
+def compact(downsample_after_days: int = DOWNSAMPLE_AFTER_DAYS,
+            tolerance_m: float = DOWNSAMPLE_TOLERANCE_M) -> Dict[str, int]:
+    """
+    Merges every finished shipment-day into one chunk and downsamples days
+    older than downsample_after_days. Today's chunks are left for ingestion.
+    """
+    from tracking.models import TrajectoryChunk
+    today = timezone.localdate()
+    cutoff = today - timedelta(days=downsample_after_days)
+    stats = {"days": 0, "points_before": 0, "points_after": 0}
+    pending = (
+        TrajectoryChunk.objects.filter(day__lt=today, downsampled=False)
+        .values_list("shipment_id", "day").annotate(chunks=Count("id")).order_by("day", "shipment_id")
+    )
+    for shipment_id, day, chunks in pending.iterator(chunk_size=1000):
+        if chunks == 1 and day >= cutoff:
+            continue
+        before, after = compact_day(shipment_id, day, tolerance_m if day < cutoff else None)
+        stats["days"] += 1
+        stats["points_before"] += before
+        stats["points_after"] += after
+    return stats
+
+
+# Process-wide buffer fed by tracking.ingest
+trajectories = TrajectoryBuffer()
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import re
+from tracking.store import Position, PositionStore, positions
+
+PATH_PATTERN = re.compile(r"^/ws/tracking/(?P<shipment_id>\d+)/?$")
+
+
+async def tracking_websocket(scope, receive, send, store: PositionStore = positions):
+    """
+    Raw ASGI WebSocket endpoint: /ws/tracking/<shipment_id>/
+    Sends the latest known position on connect, then every new position as it is ingested.
+    """
+    match = PATH_PATTERN.match(scope["path"])
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    if match is None:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+    shipment_id = int(match.group("shipment_id"))
+    await send({"type": "websocket.accept"})
+
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue(maxsize=100)
+
+    def on_position(sid: int, version: int, position: Position) -> None:
+        # Called from the ingesting or Redis pub/sub thread; hand over to this socket's event loop
+        loop.call_soon_threadsafe(offer_newest, updates, (version, position))
+
+    unsubscribe = store.subscribe(shipment_id, on_position)
+    try:
+        latest = store.latest(shipment_id)
+        if latest is not None:
+            await _send_position(send, shipment_id, *latest)
+        disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+        while True:
+            update = asyncio.ensure_future(updates.get())
+            done, _ = await asyncio.wait({update, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                update.cancel()
+                break
+            await _send_position(send, shipment_id, *update.result())
+    finally:
+        unsubscribe()
+
+
+def offer_newest(queue: asyncio.Queue, item) -> None:
+    # Slow clients only need the newest position: drop the oldest when full
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+async def _send_position(send, shipment_id: int, version: int, position: Position) -> None:
+    payload = {"shipment_id": shipment_id, "version": version, **position.as_dict()}
+    await send({"type": "websocket.send", "text": json.dumps(payload)})
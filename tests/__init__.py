@@ -1 +1,3 @@
 # Advanced test suites (unit, integration, load, security)
+# Unit and integration tests live beside each app (*/tests.py); load and
+# performance suites in ishemalink_api/benchmarks (see README, Testing)